@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import User, Product, Inventory, Order, OrderItem, CompetitorPrice
+from .models import User, Product, Inventory, Order, OrderItem, CompetitorPrice, DemandForecast, ProductAlias, Location, IdempotencyKey
 
 # Register your models here.
 admin.site.register(User)
@@ -8,3 +8,7 @@ admin.site.register(Inventory)
 admin.site.register(Order)
 admin.site.register(OrderItem)
 admin.site.register(CompetitorPrice)
+admin.site.register(DemandForecast)
+admin.site.register(ProductAlias)
+admin.site.register(Location)
+admin.site.register(IdempotencyKey)
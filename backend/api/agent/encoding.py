@@ -0,0 +1,298 @@
+import json
+import logging
+import threading
+from api.utils.tokens import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Hard cap on the size of any single tool result handed back to the LLM
+DEFAULT_MAX_TOKENS = 1500
+MAX_TEXT_CHARS = 200  # Long text values are shortened to this before whole fields are dropped
+
+# Per-tool output shaping.
+#   'lists':  path -> {'fields': [...], 'limit': N}. A path is a tuple of keys
+#             leading to a list of dicts; '*' matches every value of a dict and
+#             () is the result itself.
+#   'format': 'table' renders lists of dicts as {"columns": [...], "rows": [[...]]},
+#             'json' keeps them as compact objects.
+#   'drop_empty': remove empty lists matched by a path.
+TOOL_OUTPUT_SPECS = {
+    'find_product_listings': {
+        'lists': {
+            (): {
+                'fields': ['supplier_name', 'supplier_id', 'price_per_unit', 'total_price',
+                           'distance_km', 'delivery_cost', 'quantity_available', 'available_date', 'expiry_date'],
+                'limit': 10,
+            },
+        },
+        'format': 'table',
+    },
+    'optimize_basket': {
+        'lists': {
+            ('plan',): {
+                'fields': ['supplier_name', 'supplier_id', 'items', 'subtotal'],
+                'limit': 15,
+            },
+            ('order_items',): {
+                'fields': ['product_name', 'quantity', 'supplier_id'],
+                'limit': 40,
+            },
+        },
+        'format': 'table',
+    },
+    'get_demand_forecast': {
+        'lists': {
+            ('daily',): {
+                'fields': ['date', 'quantity', 'low', 'high'],
+                'limit': 14,
+            },
+        },
+        'format': 'table',
+    },
+    'get_my_inventory': {
+        'lists': {
+            ('inventory',): {
+                'fields': ['inventory_id', 'product_name', 'quantity_available', 'price_per_unit',
+                           'available_date', 'expiry_date'],
+                'limit': 30,
+            },
+            ('expiring_soon',): {
+                'fields': ['inventory_id', 'product_name', 'quantity_available', 'price_per_unit',
+                           'days_until_expiry', 'expires_on'],
+                'limit': 30,
+            },
+        },
+        'format': 'table',
+    },
+    'import_inventory': {
+        'lists': {
+            ('rows',): {
+                'fields': ['row', 'product_name', 'matched_product', 'status', 'errors', 'pricing_hint'],
+                'limit': 50,
+            },
+        },
+        'format': 'table',
+    },
+    'update_orders_bulk': {
+        'lists': {
+            ('results',): {
+                'fields': ['order_id', 'new_status', 'error'],
+                'limit': 50,
+            },
+        },
+        'format': 'table',
+    },
+    'get_my_orders': {
+        'lists': {
+            ('orders', '*'): {
+                'fields': ['order_id', 'customer', 'order_date', 'items', 'total_amount'],
+                'limit': 10,
+            },
+        },
+        'format': 'table',
+        'drop_empty': True,
+    },
+}
+
+_stats_lock = threading.Lock()
+TOOL_OUTPUT_STATS = {}
+
+
+def encode_tool_result(tool_name: str, result, max_tokens: int = None) -> str:
+    """
+    Serializes a database_tool result for the LLM in a compact, token-capped form.
+
+    Applies the tool's field projection and top-N truncation (with a note saying
+    how many entries were left out), renders lists as columnar tables where
+    configured, and enforces a hard token cap by removing whole entries (see
+    _fit), so the output is always valid JSON. Tokens saved compared to the
+    previous json.dumps(result, indent=2) output are logged and aggregated in
+    TOOL_OUTPUT_STATS.
+    """
+    spec = TOOL_OUTPUT_SPECS.get(tool_name, {})
+    max_tokens = max_tokens or spec.get('max_tokens', DEFAULT_MAX_TOKENS)
+    limits = {path: options['limit'] for path, options in spec.get('lists', {}).items()}
+
+    while True:
+        shaped = _shape(result, spec, limits)
+        encoded = _encode(shaped)
+        encoded_tokens = estimate_tokens(encoded)
+
+        # Over the cap: halve the list limits and try again
+        if encoded_tokens <= max_tokens or not limits or all(limit <= 1 for limit in limits.values()):
+            break
+        limits = {path: max(1, limit // 2) for path, limit in limits.items()}
+
+    if encoded_tokens > max_tokens:
+        encoded = _fit(shaped, max_tokens)
+        encoded_tokens = estimate_tokens(encoded)
+
+    _record_stats(tool_name, result, encoded_tokens)
+    return encoded
+
+
+def _shape(value, spec: dict, limits: dict):
+    for path, options in spec.get('lists', {}).items():
+        value = _apply_at_path(value, path, options, limits[path], spec)
+    return value
+
+
+def _apply_at_path(value, path: tuple, options: dict, limit: int, spec: dict):
+    if not path:
+        if isinstance(value, list):
+            return _shape_list(value, options['fields'], limit, spec.get('format', 'json'))
+        return value
+
+    if not isinstance(value, dict):
+        return value
+
+    key, rest = path[0], path[1:]
+    keys = list(value.keys()) if key == '*' else [key]
+
+    shaped = dict(value)
+    for k in keys:
+        if k not in shaped:
+            continue
+        if spec.get('drop_empty') and not rest and shaped[k] == []:
+            del shaped[k]
+            continue
+        shaped[k] = _apply_at_path(shaped[k], rest, options, limit, spec)
+    return shaped
+
+
+def _shape_list(items: list, fields: list, limit: int, output_format: str) -> dict:
+    """Projects, truncates and (optionally) tabulates a list of dicts."""
+    total = len(items)
+    kept = items[:limit]
+
+    if output_format == 'table':
+        shaped = {
+            'columns': fields,
+            'rows': [[item.get(f) if isinstance(item, dict) else item for f in fields] for item in kept],
+        }
+    else:
+        shaped = {
+            'items': [{f: item.get(f) for f in fields} if isinstance(item, dict) else item for item in kept],
+        }
+
+    shaped['total'] = total
+    if total > len(kept):
+        shaped['more_available'] = _more_available(len(kept), total)
+    return shaped
+
+
+def _more_available(shown: int, total: int) -> str:
+    return (
+        f"Showing {shown} of {total}. {total - shown} more available; "
+        f"ask the user to narrow the request to see them."
+    )
+
+
+def _encode(value) -> str:
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False, default=str)
+
+
+def _containers(value):
+    """Every dict and list in value, outermost first."""
+    stack = [value]
+    while stack:
+        current = stack.pop()
+        if isinstance(current, (dict, list)):
+            yield current
+            stack.extend(current.values() if isinstance(current, dict) else current)
+
+
+def _entry_lists(value: dict):
+    """
+    (owner, key) of every list whose elements are whole entries: the rows or
+    items of the shaped lists (dicts with a 'total') and the result's own
+    top-level lists. Table columns and the cells of a row are never included.
+    """
+    for container in _containers(value):
+        if isinstance(container, dict) and 'total' in container:
+            for key in ('rows', 'items'):
+                if isinstance(container.get(key), list):
+                    yield container, key
+    for key, item in value.items():
+        if isinstance(item, list) and key not in ('columns', 'rows', 'items'):
+            yield value, key
+
+
+_KEPT_FIELDS = ('error', 'total', 'more_available', 'truncated', 'columns')
+
+
+def _fit(value, max_tokens: int) -> str:
+    """
+    Shrinks a shaped result until its JSON fits max_tokens without ever
+    cutting the JSON text (a cut string could be invalid JSON or a partial
+    ID): first drops trailing rows of the longest entry lists (down to one
+    each), then shortens long text values, then drops the remaining rows and
+    finally the largest top-level fields. Table columns and row cells are
+    never touched. Shaped lists update their more_available note; other
+    removals are counted in 'truncated'.
+    """
+    value = json.loads(_encode(value))
+    if not isinstance(value, dict):
+        value = {'items': value}
+    dropped = 0
+    shortened = False
+    while estimate_tokens(_encode(value)) > max_tokens:
+        # Keep one entry per list until long texts have been shortened
+        keep = 0 if shortened else 1
+        lists = [(owner, key) for owner, key in _entry_lists(value) if len(owner[key]) > keep]
+        if lists:
+            owner, key = max(lists, key=lambda entry: len(entry[0][entry[1]]))
+            entries = owner[key]
+            count = max(1, min(len(entries) // 4, len(entries) - keep))
+            del entries[-count:]
+            if 'total' in owner:
+                owner['more_available'] = _more_available(len(entries), owner['total'])
+            else:
+                dropped += count
+            continue
+
+        texts = [
+            (container, key) for container in _containers(value)
+            for key, item in (container.items() if isinstance(container, dict) else enumerate(container))
+            if isinstance(item, str) and len(item) > MAX_TEXT_CHARS and key != 'more_available'
+        ]
+        if texts:
+            for container, key in texts:
+                container[key] = container[key][:MAX_TEXT_CHARS] + '…'
+            continue
+        if not shortened:
+            shortened = True
+            continue
+
+        fields = [(len(_encode(item)), key) for key, item in value.items() if key not in _KEPT_FIELDS]
+        if not fields:
+            break
+        del value[max(fields)[1]]
+        dropped += 1
+
+    if dropped:
+        value['truncated'] = dropped
+    return _encode(value)
+
+
+def _record_stats(tool_name: str, result, encoded_tokens: int) -> None:
+    # Baseline: what the tool wrappers used to send to the LLM
+    baseline_tokens = estimate_tokens(json.dumps(result, indent=2, default=str))
+    saved = baseline_tokens - encoded_tokens
+
+    with _stats_lock:
+        stats = TOOL_OUTPUT_STATS.setdefault(tool_name, {'calls': 0, 'baseline_tokens': 0, 'encoded_tokens': 0})
+        stats['calls'] += 1
+        stats['baseline_tokens'] += baseline_tokens
+        stats['encoded_tokens'] += encoded_tokens
+
+    logger.info(f"Tool output {tool_name}: {encoded_tokens} tokens (was {baseline_tokens}, saved {saved})")
+
+
+def get_tool_output_stats() -> dict:
+    """Returns per-tool call counts and total tokens before/after encoding."""
+    with _stats_lock:
+        return {
+            name: {**stats, 'saved_tokens': stats['baseline_tokens'] - stats['encoded_tokens']}
+            for name, stats in TOOL_OUTPUT_STATS.items()
+        }
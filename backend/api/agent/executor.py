@@ -0,0 +1,190 @@
+import json
+import contextvars
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Optional
+from django.db import close_old_connections
+from langchain.agents import AgentExecutor
+from langchain_core.agents import AgentAction, AgentStep
+from api.utils import tracing
+
+logger = logging.getLogger(__name__)
+
+# Tools that only read data: safe to memoize within a run and to run concurrently
+READ_ONLY_TOOLS = {
+    'chipchip_knowledge_search',
+    'find_product_listings',
+    'optimize_basket',
+    'check_existing_inventory',
+    'get_pricing_suggestion',
+    'get_demand_forecast',
+    'get_my_inventory',
+    'get_my_orders',
+}
+# check_image_job is deliberately not memoized: the agent polls it within one
+# run and every call must see the job's current status.
+
+# Tools that change data: always executed one at a time, in order, and never cached.
+# Any tool not listed as read-only is treated the same way.
+MUTATING_TOOLS = {
+    'create_order',
+    'add_or_update_inventory',
+    'update_order_status',
+}
+
+# Bounded pool shared by all agent runs in this process
+MAX_PARALLEL_TOOLS = 4
+_tool_pool = ThreadPoolExecutor(max_workers=MAX_PARALLEL_TOOLS, thread_name_prefix='kcart-tool')
+
+
+class ToolExecutionLayer:
+    """
+    Executes the tool calls of one agent run.
+
+    - Read-only tools are memoized per run, keyed by tool name and arguments.
+    - Consecutive read-only calls emitted in the same step run concurrently in
+      a bounded thread pool.
+    - Mutating tools run serially, in the order the model emitted them, act as
+      a barrier between read batches and clear the memo (reads after a write
+      must see fresh data).
+    """
+
+    def __init__(self, read_only_tools=READ_ONLY_TOOLS, parallel: bool = True):
+        self.read_only_tools = set(read_only_tools)
+        self.parallel = parallel
+        self.memo = {}
+        self.pending = []
+        self.results = {}
+        self.stats = {'tool_calls': 0, 'memo_hits': 0, 'parallel_batches': 0}
+
+    def reset(self) -> None:
+        """Clears per-run state. Called at the start of every agent invocation."""
+        self.memo = {}
+        self.begin_step()
+        self.stats = {'tool_calls': 0, 'memo_hits': 0, 'parallel_batches': 0}
+
+    def begin_step(self) -> None:
+        self.pending = []
+        self.results = {}
+
+    def is_read_only(self, tool_name: str) -> bool:
+        return tool_name in self.read_only_tools and tool_name not in MUTATING_TOOLS
+
+    def execute(self, actions: list, perform) -> None:
+        """
+        Runs all actions of a step and stores their AgentSteps in self.results,
+        keyed by id(action). perform(action) runs a single action.
+        """
+        batch = []
+        for action in actions:
+            if self.is_read_only(action.tool):
+                batch.append(action)
+                continue
+
+            self._run_read_batch(batch, perform)
+            batch = []
+
+            self.stats['tool_calls'] += 1
+            self.results[id(action)] = perform(action)
+            self.memo.clear()
+
+        self._run_read_batch(batch, perform)
+
+    def _memo_key(self, action: AgentAction) -> tuple:
+        return (action.tool, json.dumps(action.tool_input, sort_keys=True, default=str))
+
+    def _run_read_batch(self, batch: list, perform) -> None:
+        if not batch:
+            return
+
+        # Identical calls in the same batch are executed once
+        unique = {}
+        for action in batch:
+            unique.setdefault(self._memo_key(action), action)
+
+        to_run = []
+        for key, action in unique.items():
+            if key in self.memo:
+                self.stats['memo_hits'] += 1
+            else:
+                to_run.append((key, action))
+
+        if len(to_run) > 1 and self.parallel:
+            self.stats['parallel_batches'] += 1
+            # Each task runs in a copy of the caller's context so context-local
+            # state (e.g. tracing) follows the tool into the pool thread
+            futures = [
+                (key, _tool_pool.submit(contextvars.copy_context().run, _run_in_worker, perform, action))
+                for key, action in to_run
+            ]
+            for key, future in futures:
+                self.memo[key] = future.result().observation
+        else:
+            for key, action in to_run:
+                self.memo[key] = perform(action).observation
+
+        self.stats['tool_calls'] += len(to_run)
+        self.stats['memo_hits'] += len(batch) - len(unique)
+
+        for action in batch:
+            self.results[id(action)] = AgentStep(action=action, observation=self.memo[self._memo_key(action)])
+
+
+def _run_in_worker(perform, action):
+    """Runs a tool in a pool thread, managing that thread's database connection."""
+    close_old_connections()
+    try:
+        return perform(action)
+    finally:
+        close_old_connections()
+
+
+class KcartAgentExecutor(AgentExecutor):
+    """
+    AgentExecutor that routes tool calls through a ToolExecutionLayer, so that
+    read-only lookups are memoized per run and executed concurrently.
+    """
+
+    tool_layer: Optional[Any] = None
+
+    def _call(self, inputs, run_manager=None):
+        if self.tool_layer is not None:
+            self.tool_layer.reset()
+        result = super()._call(inputs, run_manager=run_manager)
+        if self.tool_layer is not None:
+            logger.info(f"Agent tool execution stats: {self.tool_layer.stats}")
+        return result
+
+    def _iter_next_step(self, name_to_tool_map, color_mapping, inputs, intermediate_steps, run_manager=None):
+        if self.tool_layer is None:
+            yield from super()._iter_next_step(name_to_tool_map, color_mapping, inputs, intermediate_steps, run_manager)
+            return
+
+        # The parent yields every AgentAction of the step before performing any
+        # of them, so by the time the first one is performed the whole step is known.
+        self.tool_layer.begin_step()
+        for item in super()._iter_next_step(name_to_tool_map, color_mapping, inputs, intermediate_steps, run_manager):
+            if isinstance(item, AgentAction):
+                self.tool_layer.pending.append(item)
+            yield item
+
+    def _perform_agent_action(self, name_to_tool_map, color_mapping, agent_action, run_manager=None):
+        def perform(action):
+            run = super(KcartAgentExecutor, self)._perform_agent_action
+            if tracing.current_trace() is None:
+                return run(name_to_tool_map, color_mapping, action, run_manager)
+
+            args_size = len(json.dumps(action.tool_input, default=str))
+            with tracing.span(f'tool:{action.tool}', tool=action.tool, args_size=args_size) as tool_span:
+                step = run(name_to_tool_map, color_mapping, action, run_manager)
+                tool_span.set(result_size=len(str(step.observation)))
+                return step
+
+        layer = self.tool_layer
+        if layer is None or not any(a is agent_action for a in layer.pending):
+            return perform(agent_action)
+
+        if id(agent_action) not in layer.results:
+            layer.execute(layer.pending, perform)
+
+        return layer.results.pop(id(agent_action))
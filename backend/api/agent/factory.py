@@ -2,19 +2,40 @@ import os
 import json
 from datetime import datetime
 from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.agents import AgentExecutor, create_tool_calling_agent
+from langchain.agents import create_tool_calling_agent
 from langchain.tools import Tool, StructuredTool
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.messages import HumanMessage, AIMessage
 from pydantic import BaseModel, Field
 from api.tools.rag_tool import chipchip_rag_tool
 from api.tools import database_tool
+from api.utils import idempotency
+from api.agent.encoding import encode_tool_result
+from api.agent.executor import KcartAgentExecutor, ToolExecutionLayer
 
 
-def create_kcart_agent(user=None):
+def get_chat_model():
+    """
+    Returns the chat model that drives the agent (Gemini).
+    Kept separate so tests and load tests can substitute an offline model.
+    """
+    return ChatGoogleGenerativeAI(
+        model="gemini-2.5-flash",
+        google_api_key=os.environ.get('GOOGLE_API_KEY'),
+        temperature=0.7,
+        convert_system_message_to_human=True
+    )
+
+
+def create_kcart_agent(user=None, idempotency_key=None):
     """
     Creates a LangChain agent with tools and prompts based on user authentication and role.
     Returns an AgentExecutor configured for the KcartBot application.
+
+    idempotency_key is the client's key for this chat message: each order the
+    agent places is created with the key '<idempotency_key>:<hash of its items>',
+    so resending the message, or the agent repeating a create_order call,
+    replays the order instead of placing it again.
     """
     
     # Initialize tools and prompt instructions
@@ -51,6 +72,10 @@ RESPONSE GUIDELINES:
 
 When you receive retrieved documents from the RAG tool, use only the relevant ones to answer the query.
 
+TOOL RESULTS FORMAT:
+- Lists in tool results may be returned as tables: {{{{"columns": [...], "rows": [[...], ...], "total": N}}}}. Each row holds the values for the columns in order.
+- If a result contains "more_available", only the first entries are shown; tell the user more exist and offer to narrow the request.
+
 CURRENT DATE AND TIME:
 Today's date is {current_date}. Use this as reference when users mention relative dates like "today", "tomorrow", or "in X days"."""
     
@@ -82,18 +107,33 @@ Today's date is {current_date}. Use this as reference when users mention relativ
             class FindProductsInput(BaseModel):
                 product_name: str = Field(description="Name of the product to search for")
                 quantity: float = Field(description="Quantity needed")
+                delivery_location: str = Field(default='', description="Optional delivery city/location; leave empty to use the customer's saved location")
             
             class CreateOrderInput(BaseModel):
                 items: str = Field(description="JSON string of items list. Each item must have product_name (MUST BE IN ENGLISH - use 'Avocados' not 'አቮካዶ'), quantity, and supplier_id. Example: '[{\"product_name\": \"Avocados\", \"quantity\": 50, \"supplier_id\": \"uuid\"}]'")
                 delivery_date: str = Field(description="Delivery date in YYYY-MM-DD format")
-                delivery_location: str = Field(description="Delivery location/address")
+                delivery_location: str = Field(description="Delivery location/address (city and area); leave empty to use the customer's saved location")
+            
+            class BasketInput(BaseModel):
+                items: str = Field(description="JSON string of the products wanted, each with product_name (IN ENGLISH) and quantity. Example: '[{\"product_name\": \"Tomatoes\", \"quantity\": 10}, {\"product_name\": \"Red Onions\", \"quantity\": 5}]'")
+                minimize_suppliers: bool = Field(default=False, description="True to buy from as few different suppliers as possible (cost is the tie-breaker)")
+                max_suppliers: int = Field(default=0, description="Optional maximum number of different suppliers (0 = no limit)")
             
             # Customer-specific tools
-            def find_products_wrapper(product_name: str, quantity: float) -> str:
+            def find_products_wrapper(product_name: str, quantity: float, delivery_location: str = '') -> str:
                 """Searches for products and available suppliers."""
                 try:
-                    result = database_tool.find_product_listings(user, product_name, quantity)
-                    return json.dumps(result, indent=2)
+                    result = database_tool.find_product_listings(user, product_name, quantity, delivery_location or None)
+                    return encode_tool_result('find_product_listings', result)
+                except Exception as e:
+                    return json.dumps({'error': str(e)})
+            
+            def optimize_basket_wrapper(items: str, minimize_suppliers: bool = False, max_suppliers: int = 0) -> str:
+                """Plans the cheapest supplier assignment for several products."""
+                try:
+                    items_list = json.loads(items) if isinstance(items, str) else items
+                    result = database_tool.find_basket_plan(user, items_list, minimize_suppliers, max_suppliers or None)
+                    return encode_tool_result('optimize_basket', result)
                 except Exception as e:
                     return json.dumps({'error': str(e)})
             
@@ -102,18 +142,32 @@ Today's date is {current_date}. Use this as reference when users mention relativ
                 try:
                     # Parse items from JSON string to list
                     items_list = json.loads(items) if isinstance(items, str) else items
-                    result = database_tool.create_order_in_db(user, items_list, delivery_date, delivery_location)
-                    return json.dumps(result, indent=2)
+                    order_key = None
+                    if idempotency_key:
+                        # Keyed by the items rather than a call count, so a call retried
+                        # after a failure cannot turn into a second order
+                        items_hash = idempotency.fingerprint(database_tool.normalize_order_items(items_list))[:16]
+                        order_key = f"chat:{idempotency_key}:{items_hash}"
+                    result = database_tool.create_order_in_db(
+                        user, items_list, delivery_date, delivery_location, idempotency_key=order_key)
+                    return encode_tool_result('create_order', result)
                 except Exception as e:
                     return json.dumps({'error': str(e)})
             
             find_products_tool = StructuredTool.from_function(
                 func=find_products_wrapper,
                 name="find_product_listings",
-                description="Searches for products and available suppliers. Returns list of suppliers with prices and availability.",
+                description="Searches for products and available suppliers. Returns list of suppliers with prices and availability, best total (price plus delivery to the customer's location) first.",
                 args_schema=FindProductsInput
             )
             
+            basket_tool = StructuredTool.from_function(
+                func=optimize_basket_wrapper,
+                name="optimize_basket",
+                description="Plans the cheapest way to buy SEVERAL products at once: assigns each product to suppliers with enough stock, optionally using as few suppliers as possible. Returns the plan per supplier, the total, and order_items ready for create_order.",
+                args_schema=BasketInput
+            )
+            
             create_order_tool = StructuredTool.from_function(
                 func=create_order_wrapper,
                 name="create_order",
@@ -121,11 +175,12 @@ Today's date is {current_date}. Use this as reference when users mention relativ
                 args_schema=CreateOrderInput
             )
             
-            available_tools.extend([find_products_tool, create_order_tool])
+            available_tools.extend([find_products_tool, basket_tool, create_order_tool])
             
             customer_instruction = """
 You are assisting a CUSTOMER. You can help them:
 - Search for products and compare supplier prices using the find_product_listings tool
+- Plan a multi-product order in ONE call with the optimize_basket tool (cheapest suppliers, optionally fewest suppliers)
 - Place orders with specific suppliers using the create_order tool
 - Get information about products and pricing
 - Answer questions about the ordering process
@@ -138,12 +193,20 @@ When helping customers:
 5. Always use supplier_id in the create_order tool, never supplier names
 6. Confirm order details before creating an order
 7. Be helpful in explaining the marketplace process
+8. If create_order returns idempotent_replay, that order was already placed by an earlier attempt of this request: report it as placed and do not create it again
 
 DISPLAYING PRODUCT LISTINGS:
 - Format: "**[supplier_name]** (Supplier ID: `[supplier_id]`): [price] ETB"
+- Listings come best first by price plus delivery (distance_km, delivery_cost) to the customer's saved location; pass delivery_location when the customer wants delivery elsewhere
 - Do NOT include image_url in the customer-facing response
 - Images are only for supplier's internal use, not shown to customers
 
+MULTI-PRODUCT ORDERS:
+- When the customer wants two or more products, call optimize_basket once instead of find_product_listings per product
+- Present the plan grouped by supplier with the total; mention cheapest_total if it differs (fewer suppliers can cost more)
+- Report not_found and short_stock products to the customer
+- After the customer confirms, pass the plan's order_items to create_order unchanged
+
 SUPPLIER SELECTION PROCESS:
 - Show supplier options with both name and ID
 - Ask customer to choose by supplier_id
@@ -168,20 +231,36 @@ SUPPLIER SELECTION PROCESS:
                 expiry_date: str = Field(default=None, description="Optional expiry date (YYYY-MM-DD)")
                 image_url: str = Field(default='', description="Optional image URL for the product (get from generate_product_image tool)")
             
+            class ImportInventoryInput(BaseModel):
+                rows: str = Field(description="The listings as CSV text with a header row (product,quantity,price,available_date,expiry_date,image_url) or as a JSON list of objects with those keys; only product, quantity and price are required")
+                dry_run: bool = Field(default=False, description="True to only validate the rows and show pricing hints without saving")
+            
             class UpdateOrderInput(BaseModel):
                 order_id: str = Field(description="Order ID to update")
                 new_status: str = Field(description="New status: 'accepted' or 'declined'")
                 decline_reason: str = Field(default='', description="Optional reason for declining the order (only used when status is 'declined')")
             
+            class BulkUpdateOrdersInput(BaseModel):
+                order_ids: str = Field(description="JSON list (or comma-separated string) of the order IDs to update")
+                new_status: str = Field(description="New status for all of them: 'accepted' or 'declined'")
+                decline_reason: str = Field(default='', description="Optional reason for declining (only used when status is 'declined')")
+            
             class ImageGenerationInput(BaseModel):
                 product_description: str = Field(description="Detailed description of the product image to generate. Be specific about appearance, setting, and quality.")
             
+            class ImageJobInput(BaseModel):
+                job_id: str = Field(description="Job ID returned by generate_product_image")
+            
+            class DemandForecastInput(BaseModel):
+                product_name: str = Field(description="Name of the product (in English)")
+                days: int = Field(default=7, description="Number of days ahead to forecast, starting today (1-14)")
+            
             # Supplier-specific tools
             def check_inventory_wrapper(product_name: str) -> str:
                 """Check if you have existing inventory for a product."""
                 try:
                     result = database_tool.check_existing_inventory(user, product_name)
-                    return json.dumps(result if result else {'message': 'No inventory found'}, indent=2)
+                    return encode_tool_result('check_existing_inventory', result if result else {'message': 'No inventory found'})
                 except Exception as e:
                     return json.dumps({'error': str(e)})
             
@@ -189,7 +268,15 @@ SUPPLIER SELECTION PROCESS:
                 """Get market pricing suggestions based on competitor data."""
                 try:
                     result = database_tool.get_comprehensive_pricing_suggestion(user, product_name, days)
-                    return json.dumps(result, indent=2)
+                    return encode_tool_result('get_pricing_suggestion', result)
+                except Exception as e:
+                    return json.dumps({'error': str(e)})
+            
+            def get_forecast_wrapper(product_name: str, days: int = 7) -> str:
+                """Get the forecast marketplace demand for a product."""
+                try:
+                    result = database_tool.get_demand_forecast(user, product_name, days)
+                    return encode_tool_result('get_demand_forecast', result)
                 except Exception as e:
                     return json.dumps({'error': str(e)})
             
@@ -209,7 +296,15 @@ SUPPLIER SELECTION PROCESS:
                         params['image_url'] = image_url
                     
                     result = database_tool.add_or_update_inventory(user, params)
-                    return json.dumps(result, indent=2)
+                    return encode_tool_result('add_or_update_inventory', result)
+                except Exception as e:
+                    return json.dumps({'error': str(e)})
+            
+            def import_inventory_wrapper(rows: str, dry_run: bool = False) -> str:
+                """Add or update many inventory listings at once."""
+                try:
+                    result = database_tool.import_inventory(user, rows, dry_run)
+                    return encode_tool_result('import_inventory', result)
                 except Exception as e:
                     return json.dumps({'error': str(e)})
             
@@ -217,7 +312,7 @@ SUPPLIER SELECTION PROCESS:
                 """Get all your active inventory listings."""
                 try:
                     result = database_tool.get_supplier_inventory(user)
-                    return json.dumps(result, indent=2)
+                    return encode_tool_result('get_my_inventory', result)
                 except Exception as e:
                     return json.dumps({'error': str(e)})
             
@@ -228,7 +323,7 @@ SUPPLIER SELECTION PROCESS:
                     status = status_filter if status_filter else None
                     date = date_filter if date_filter else None
                     result = database_tool.get_supplier_orders(user, status_filter=status, date_filter=date)
-                    return json.dumps(result, indent=2)
+                    return encode_tool_result('get_my_orders', result)
                 except Exception as e:
                     return json.dumps({'error': str(e)})
             
@@ -236,20 +331,47 @@ SUPPLIER SELECTION PROCESS:
                 """Accept or decline an order. Provide decline_reason when declining."""
                 try:
                     result = database_tool.update_order_status(user, order_id, new_status, decline_reason)
-                    return json.dumps(result, indent=2)
+                    return encode_tool_result('update_order_status', result)
+                except Exception as e:
+                    return json.dumps({'error': str(e)})
+            
+            def update_orders_bulk_wrapper(order_ids: str, new_status: str, decline_reason: str = '') -> str:
+                """Accept or decline several orders at once."""
+                try:
+                    try:
+                        ids = json.loads(order_ids) if isinstance(order_ids, str) else order_ids
+                    except json.JSONDecodeError:
+                        ids = order_ids.split(',')
+                    if isinstance(ids, str):
+                        ids = [ids]
+                    updates = [
+                        {'order_id': str(order_id).strip(), 'new_status': new_status, 'decline_reason': decline_reason}
+                        for order_id in ids if str(order_id).strip()
+                    ]
+                    result = database_tool.update_order_statuses(user, updates)
+                    return encode_tool_result('update_orders_bulk', result)
                 except Exception as e:
                     return json.dumps({'error': str(e)})
             
             def generate_image_wrapper(product_description: str) -> str:
-                """Generate a product image based on description."""
+                """Start generating a product image based on description."""
+                try:
+                    from api.utils.image_jobs import submit_image_job
+                    job = submit_image_job(user, product_description)
+                    if job['status'] == 'completed':
+                        job['message'] = 'An image for this description already exists. Show the image URL to the user and ask if they like it.'
+                    else:
+                        job['message'] = ('Image generation started. The image will appear in this chat automatically '
+                                          'in a few seconds. Tell the user to wait for it; do not wait or poll now.')
+                    return encode_tool_result('generate_product_image', job)
+                except Exception as e:
+                    return json.dumps({'error': str(e)})
+            
+            def check_image_job_wrapper(job_id: str) -> str:
+                """Check the status of an image generation job."""
                 try:
-                    from api.utils.image_generator import generate_product_image_sync
-                    image_url = generate_product_image_sync(product_description)
-                    return json.dumps({
-                        'success': True,
-                        'image_url': image_url,
-                        'message': 'Image generated successfully. Please review and confirm if you like it.'
-                    }, indent=2)
+                    from api.utils.image_jobs import get_image_job
+                    return encode_tool_result('check_image_job', get_image_job(job_id))
                 except Exception as e:
                     return json.dumps({'error': str(e)})
             
@@ -267,6 +389,13 @@ SUPPLIER SELECTION PROCESS:
                 args_schema=PricingSuggestionInput
             )
             
+            forecast_tool = StructuredTool.from_function(
+                func=get_forecast_wrapper,
+                name="get_demand_forecast",
+                description="Get the forecast daily marketplace demand for a product over the next days (expected quantity with a low-high range), and the supplier's currently listed quantity. Use it to answer 'how much should I stock?'.",
+                args_schema=DemandForecastInput
+            )
+            
             add_inventory_tool = StructuredTool.from_function(
                 func=add_update_inventory_wrapper,
                 name="add_or_update_inventory",
@@ -274,6 +403,13 @@ SUPPLIER SELECTION PROCESS:
                 args_schema=InventoryInput
             )
             
+            import_inventory_tool = StructuredTool.from_function(
+                func=import_inventory_wrapper,
+                name="import_inventory",
+                description="Add or update SEVERAL inventory listings in one step from a CSV or JSON table. Returns a result per row with a pricing hint against the market price.",
+                args_schema=ImportInventoryInput
+            )
+            
             # Define input schemas for no-argument tools
             class EmptyInput(BaseModel):
                 """Schema for tools that don't require any input."""
@@ -308,21 +444,39 @@ SUPPLIER SELECTION PROCESS:
                 args_schema=UpdateOrderInput
             )
             
+            bulk_update_orders_tool = StructuredTool.from_function(
+                func=update_orders_bulk_wrapper,
+                name="update_orders_bulk",
+                description="Accept or decline SEVERAL customer orders in one step. Returns a result per order.",
+                args_schema=BulkUpdateOrdersInput
+            )
+            
             image_generation_tool = StructuredTool.from_function(
                 func=generate_image_wrapper,
                 name="generate_product_image",
-                description="Generate a product image based on description. Returns an image URL that can be used when adding inventory.",
+                description="Start generating a product image based on description. Returns a job_id right away (or the image_url if the same image was generated before); the finished image is posted to the chat.",
                 args_schema=ImageGenerationInput
             )
             
+            image_job_tool = StructuredTool.from_function(
+                func=check_image_job_wrapper,
+                name="check_image_job",
+                description="Check the status of an image generation job. Returns the image_url once it is completed.",
+                args_schema=ImageJobInput
+            )
+            
             available_tools.extend([
                 check_inventory_tool,
                 pricing_tool,
+                forecast_tool,
                 add_inventory_tool,
+                import_inventory_tool,
                 get_inventory_tool,
                 get_orders_tool,
                 update_order_tool,
-                image_generation_tool
+                bulk_update_orders_tool,
+                image_generation_tool,
+                image_job_tool
             ])
             
             supplier_instruction = """
@@ -336,10 +490,13 @@ BASIC INTERACTIONS:
 YOU CAN HELP SUPPLIERS WITH:
 - Check specific product availability: use check_existing_inventory tool
 - Get market pricing suggestions: use get_pricing_suggestion tool
+- Decide how much to stock: use get_demand_forecast tool
 - Add or update inventory listings: use add_or_update_inventory tool
+- Add or update several products at once (a list, a pasted table or CSV): call import_inventory ONCE with all rows instead of add_or_update_inventory per product; report invalid or skipped rows and prices flagged above_market or below_market
 - View ALL their inventory/stock: use get_my_inventory tool
 - View orders they received: use get_my_orders tool
 - Accept or decline orders: use update_order_status tool
+- Accept or decline several orders at once (e.g. "accept all my pending orders"): get the order IDs with get_my_orders, then call update_orders_bulk ONCE with all of them; report any orders whose result has an error
 
 IMPORTANT - WHEN TO USE EACH TOOL:
 - "check my stock" OR "check my inventory" OR "show my inventory" = use get_my_inventory
@@ -350,6 +507,8 @@ IMPORTANT - WHEN TO USE EACH TOOL:
   * "show accepted orders from today" = get_my_orders(status_filter='accepted', date_filter='today')
   * "show pending orders" = get_my_orders(status_filter='pending_acceptance')
   * No filters = shows all orders grouped by status
+- "how much [product] should I stock?" OR "what demand do you expect for [product]?" = use get_demand_forecast
+  * The forecast is TOTAL marketplace demand shared by all suppliers; compare it with your_listed_quantity and present total_expected with total_range
 
 CRITICAL: When a supplier asks to see their inventory/stock (use get_my_inventory):
 1. The tool returns a dictionary with: inventory list, expiring_soon list, and has_expiring_items flag
@@ -399,11 +558,12 @@ When adding NEW inventory, AFTER you have ALL the details (quantity, price, date
    a) ASK: "Please describe what kind of image you'd like for [product]. Be specific about appearance, quality, and setting."
    b) WAIT for user's description
    c) Call generate_product_image with their description
-   d) SHOW the image URL to user: "Here's the generated image: [URL]"
+   d) If it returns an image_url right away, SHOW it: "Here's the generated image: [URL]"
+      Otherwise tell the user the image is being generated and will appear in the chat in a few seconds (do NOT wait for it)
    e) The frontend will automatically display the image for you to review
    f) ASK: "Do you like this image?"
    g) If user says NO: Go back to step 3a and ask for a new description
-   h) If user says YES: Call add_or_update_inventory WITH the image_url from the generation tool
+   h) If user says YES: Call add_or_update_inventory WITH the image_url (the URL posted in the chat, or from check_image_job with the job_id)
 4. Complete the inventory addition
 
 NOTE: Generated images are only visible to you (the supplier) for review. Customers do not see these images.
@@ -452,12 +612,7 @@ SPECIAL HANDLING FOR ORDER REQUESTS:
     ])
     
     # Initialize Gemini LLM
-    llm = ChatGoogleGenerativeAI(
-        model="gemini-2.5-flash",
-        google_api_key=os.environ.get('GOOGLE_API_KEY'),
-        temperature=0.7,
-        convert_system_message_to_human=True
-    )
+    llm = get_chat_model()
     
     # Create the agent with tool calling
     agent = create_tool_calling_agent(
@@ -466,14 +621,17 @@ SPECIAL HANDLING FOR ORDER REQUESTS:
         prompt=prompt
     )
     
-    # Create and return the agent executor
-    agent_executor = AgentExecutor(
+    # Create and return the agent executor.
+    # Tool calls go through a ToolExecutionLayer: read-only lookups are memoized
+    # per run and executed concurrently, mutating tools run serially.
+    agent_executor = KcartAgentExecutor(
         agent=agent,
         tools=available_tools,
         verbose=True,
         handle_parsing_errors=True,
         max_iterations=5,
-        return_intermediate_steps=False
+        return_intermediate_steps=False,
+        tool_layer=ToolExecutionLayer()
     )
     
     return agent_executor
@@ -0,0 +1,216 @@
+import logging
+from django.core.cache import cache
+from langchain_core.messages import HumanMessage, AIMessage
+from api.models import ConversationHistory
+from api.utils import translator
+from api.utils.tokens import estimate_tokens, truncate_to_tokens
+from api.utils.tracing import traced, annotate_genai_usage
+
+logger = logging.getLogger(__name__)
+
+# Total token budget for the history passed to the agent (summary + verbatim turns)
+TOKEN_BUDGET = 1500
+# Number of most recent messages that are always passed verbatim
+RECENT_MESSAGES = 6
+# Single messages (e.g. long order notifications) are clipped to this size
+MAX_MESSAGE_TOKENS = 400
+# Upper bound on the summary produced by the LLM
+SUMMARY_MAX_TOKENS = 300
+# How many messages to read from the database when the cache is cold
+REBUILD_WINDOW = 40
+CACHE_TIMEOUT = 60 * 60 * 24
+
+
+class ConversationMemory:
+    """
+    Server-maintained, token-budgeted chat memory for a single user.
+
+    The memory is built from ConversationHistory and kept in the Django cache as:
+    a rolling summary of older turns plus a list of recent messages kept verbatim.
+    When the total estimated size exceeds TOKEN_BUDGET, everything except the
+    RECENT_MESSAGES newest messages is folded into the summary. The summary is
+    therefore only regenerated when the budget is exceeded, not on every turn.
+    """
+
+    def __init__(self, user, token_budget: int = TOKEN_BUDGET, recent_messages: int = RECENT_MESSAGES):
+        self.user = user
+        self.token_budget = token_budget
+        self.recent_messages = recent_messages
+        self.cache_key = f'chat_memory:{user.id}'
+        self.state = None
+
+    # ============ LOADING ============
+
+    def load(self) -> 'ConversationMemory':
+        """
+        Loads the memory from cache (or rebuilds it from the database) and
+        catches up on messages written since it was cached, e.g. order
+        notifications saved by database_tool or turns handled by another worker.
+        """
+        state = cache.get(self.cache_key)
+
+        if state is None:
+            state = self._rebuild()
+        else:
+            new_rows = list(
+                ConversationHistory.objects.filter(
+                    user=self.user,
+                    id__gt=state['last_id']
+                ).order_by('id').values_list('id', 'sender', 'message')
+            )
+            if new_rows:
+                self._append_rows(state, new_rows)
+
+        self.state = state
+        if self._compact() or state.get('dirty'):
+            self._save()
+        return self
+
+    def _rebuild(self) -> dict:
+        """Builds a fresh memory state from the most recent stored messages."""
+        rows = list(
+            ConversationHistory.objects.filter(user=self.user)
+            .order_by('-id')
+            .values_list('id', 'sender', 'message')[:REBUILD_WINDOW]
+        )
+        rows.reverse()
+
+        state = {'summary': '', 'summary_tokens': 0, 'messages': [], 'last_id': 0, 'dirty': True}
+        self._append_rows(state, rows)
+        return state
+
+    def _append_rows(self, state: dict, rows) -> None:
+        for row_id, sender, message in rows:
+            text = truncate_to_tokens(message or '', MAX_MESSAGE_TOKENS)
+            state['messages'].append([row_id, sender, text, estimate_tokens(text)])
+            state['last_id'] = max(state['last_id'], row_id)
+        if rows:
+            state['dirty'] = True
+
+    # ============ BUDGETING ============
+
+    def total_tokens(self) -> int:
+        return self.state['summary_tokens'] + sum(m[3] for m in self.state['messages'])
+
+    def _compact(self) -> bool:
+        """
+        Folds older messages into the rolling summary if the budget is exceeded.
+        Returns True if the state was changed.
+        """
+        messages = self.state['messages']
+        if self.total_tokens() <= self.token_budget or len(messages) <= self.recent_messages:
+            return False
+
+        to_fold = messages[:-self.recent_messages]
+        summary = summarize_conversation(self.state['summary'], to_fold)
+
+        self.state['summary'] = summary
+        self.state['summary_tokens'] = estimate_tokens(summary)
+        self.state['messages'] = messages[-self.recent_messages:]
+        self.state['dirty'] = True
+        return True
+
+    def _save(self) -> None:
+        self.state['dirty'] = False
+        cache.set(self.cache_key, self.state, CACHE_TIMEOUT)
+
+    # ============ PUBLIC API ============
+
+    def as_messages(self) -> list:
+        """Returns the memory as LangChain messages for the agent's chat_history."""
+        if self.state is None:
+            self.load()
+
+        chat_history = []
+        if self.state['summary']:
+            chat_history.append(AIMessage(content=f"Summary of our earlier conversation: {self.state['summary']}"))
+
+        for _, sender, text, _ in self.state['messages']:
+            if sender == 'user':
+                chat_history.append(HumanMessage(content=text))
+            elif sender == 'bot':
+                chat_history.append(AIMessage(content=text))
+        return chat_history
+
+    def record(self, *entries: ConversationHistory) -> None:
+        """Adds freshly saved ConversationHistory rows and persists the memory."""
+        if self.state is None:
+            self.load()
+
+        rows = [(e.id, e.sender, e.message) for e in entries if e.id > self.state['last_id']]
+        self._append_rows(self.state, rows)
+        self._compact()
+        self._save()
+
+    def clear(self) -> None:
+        cache.delete(self.cache_key)
+        self.state = None
+
+
+@traced('memory_summarize')
+def summarize_conversation(previous_summary: str, messages: list) -> str:
+    """
+    Folds a list of [id, sender, text, tokens] messages into the previous summary.
+    Falls back to a simple extractive summary if the LLM call fails.
+    """
+    transcript = "\n".join(f"{sender}: {text}" for _, sender, text, _ in messages)
+
+    try:
+        prompt = f"""You maintain a running summary of a conversation between a user and KcartBot,
+an assistant for the ChipChip agricultural marketplace.
+Update the summary with the new messages below. Keep facts that matter for future turns:
+products, quantities, prices, dates, supplier IDs, order IDs, order statuses and open questions.
+Write in English, at most {SUMMARY_MAX_TOKENS * 3 // 4} words, plain text.
+
+Current summary:
+{previous_summary or '(empty)'}
+
+New messages:
+{transcript}
+
+Provide ONLY the updated summary, nothing else:"""
+
+        response = translator.client.models.generate_content(
+            model='gemini-2.5-flash',
+            contents=prompt
+        )
+        annotate_genai_usage(response)
+        summary = (response.text or '').strip()
+        if summary:
+            return truncate_to_tokens(summary, SUMMARY_MAX_TOKENS)
+
+    except Exception as e:
+        logger.error(f"Error summarizing conversation: {e}")
+
+    # Extractive fallback: keep the first line of each folded message
+    lines = [previous_summary] if previous_summary else []
+    lines += [f"{sender}: {text.splitlines()[0] if text else ''}" for _, sender, text, _ in messages]
+    return truncate_to_tokens(" | ".join(lines), SUMMARY_MAX_TOKENS)
+
+
+def trim_client_history(chat_history: list, token_budget: int = TOKEN_BUDGET) -> list:
+    """
+    Converts a client-supplied history array to LangChain messages, keeping the
+    newest messages that fit in the token budget. Used for anonymous users, who
+    have no server-side ConversationHistory.
+    """
+    chat_history_messages = []
+    used_tokens = 0
+
+    for msg in reversed(chat_history or []):
+        if not isinstance(msg, dict):
+            continue
+        content = truncate_to_tokens(str(msg.get('message', '')), MAX_MESSAGE_TOKENS)
+        tokens = estimate_tokens(content)
+        if used_tokens + tokens > token_budget:
+            break
+        used_tokens += tokens
+
+        sender = msg.get('sender', 'user')
+        if sender == 'user':
+            chat_history_messages.append(HumanMessage(content=content))
+        elif sender == 'bot':
+            chat_history_messages.append(AIMessage(content=content))
+
+    chat_history_messages.reverse()
+    return chat_history_messages
@@ -0,0 +1,257 @@
+import re
+import logging
+import threading
+from api.tools import database_tool
+from api.utils.tracing import traced
+
+logger = logging.getLogger(__name__)
+
+# Routed replies are only used at or above this confidence; anything lower
+# falls back to the LLM agent.
+CONFIDENCE_THRESHOLD = 0.85
+
+UUID_PATTERN = r'[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}'
+
+VERB = r'(?:show|check|view|list|see|display|get|give)(?: me)?'
+POLITE = r'(?:please |can you |could you )?'
+TRAILER = r'(?: please| now)?'
+
+INVENTORY_PATTERNS = [
+    re.compile(rf'^{POLITE}{VERB} (?:all )?my (?:current )?(?:inventory|stock|listings?|products){TRAILER}$', re.IGNORECASE),
+    re.compile(rf'^what(?:\'s| is) in my (?:inventory|stock){TRAILER}$', re.IGNORECASE),
+    re.compile(r'^my (?:inventory|stock)$', re.IGNORECASE),
+]
+
+ORDER_STATUS_WORDS = {
+    'pending': 'pending_acceptance',
+    'new': 'pending_acceptance',
+    'accepted': 'accepted',
+    'declined': 'declined',
+    'rejected': 'declined',
+    'completed': 'completed',
+    'delivered': 'completed',
+}
+STATUS_WORD = r'(?P<status>' + '|'.join(ORDER_STATUS_WORDS) + r')'
+DATE_WORD = r'(?:today|yesterday|\d{4}-\d{2}-\d{2})'
+
+ORDER_PATTERNS = [
+    re.compile(
+        rf'^{POLITE}{VERB} (?:all )?(?:my |the )?(?:(?P<date1>today|yesterday)(?:\'s)? )?(?:{STATUS_WORD} )?orders'
+        rf'(?: (?:from|for|on|of) (?P<date2>{DATE_WORD}))?{TRAILER}$',
+        re.IGNORECASE
+    ),
+    re.compile(r'^what orders do i have(?: (?P<date2>today|yesterday))?$', re.IGNORECASE),
+]
+
+ORDER_ACTION_PATTERN = re.compile(
+    rf'^{POLITE}(?P<action>accept|approve|decline|reject) (?:the )?order (?:id )?#?(?P<order_id>{UUID_PATTERN})'
+    r'(?:[,.]? (?:because|reason:?|since) (?P<reason>.+))?$',
+    re.IGNORECASE
+)
+
+HAVE_PRODUCT_PATTERN = re.compile(
+    r'^(?:do i have|check if i have|how much|how many) (?:any )?(?P<product>[a-z][a-z \-]{1,40}?)'
+    r'(?: (?:do i have|in stock|in my inventory|left))?$',
+    re.IGNORECASE
+)
+
+_stats_lock = threading.Lock()
+ROUTER_STATS = {'routed': 0, 'fallback': 0, 'intents': {}}
+
+
+@traced('route_intent')
+def route_intent(user, message: str):
+    """
+    Deterministic fast path for common supplier commands.
+
+    Matches the (English) message against known command patterns and, when the
+    match is confident, executes the corresponding database_tool function
+    directly and renders the reply from a template. Returns the reply text, or
+    None if the message should go to the LLM agent instead.
+    """
+    if not user or not user.is_authenticated or user.role != 'supplier':
+        return None
+
+    try:
+        match = _match_intent(_normalize(message))
+        if match and match['confidence'] >= CONFIDENCE_THRESHOLD:
+            reply = match['handler'](user, **match['args'])
+            if reply:
+                _record(match['intent'])
+                return reply
+    except Exception as e:
+        logger.error(f"Intent router error, falling back to agent: {e}")
+
+    _record(None)
+    return None
+
+
+def _normalize(message: str) -> str:
+    text = (message or '').strip()
+    text = re.sub(r'\s+', ' ', text)
+    text = text.replace('’', "'")
+    return text.rstrip('?!. ')
+
+
+def _match_intent(text: str):
+    for pattern in INVENTORY_PATTERNS:
+        if pattern.match(text):
+            return {'intent': 'get_my_inventory', 'handler': _render_inventory, 'args': {}, 'confidence': 1.0}
+
+    for pattern in ORDER_PATTERNS:
+        m = pattern.match(text)
+        if m:
+            groups = m.groupdict()
+            status = ORDER_STATUS_WORDS.get(groups['status'].lower()) if groups.get('status') else None
+            date = (groups.get('date1') or groups.get('date2') or '').lower() or None
+            return {
+                'intent': 'get_my_orders',
+                'handler': _render_orders,
+                'args': {'status_filter': status, 'date_filter': date},
+                'confidence': 1.0,
+            }
+
+    m = ORDER_ACTION_PATTERN.match(text)
+    if m:
+        new_status = 'accepted' if m.group('action').lower() in ('accept', 'approve') else 'declined'
+        if new_status == 'declined' and not m.group('reason'):
+            # The agent asks the supplier for a reason before declining
+            return None
+        return {
+            'intent': 'update_order_status',
+            'handler': _render_order_update,
+            'args': {'order_id': m.group('order_id'), 'new_status': new_status, 'decline_reason': m.group('reason') or ''},
+            'confidence': 1.0,
+        }
+
+    m = HAVE_PRODUCT_PATTERN.match(text)
+    if m:
+        product_name = m.group('product').strip().lower()
+        product = database_tool.resolve_product(product_name)
+        if product:
+            return {
+                'intent': 'check_existing_inventory',
+                'handler': _render_product_check,
+                'args': {'product_name': product.internal_name},
+                'confidence': _product_confidence(product_name, product),
+            }
+
+    return None
+
+
+def _product_confidence(query: str, product) -> float:
+    """How sure we are that the resolver picked the product the user meant."""
+    names = {product.product_name.lower(), product.internal_name.lower().replace('_', ' ')}
+    if query in names:
+        return 1.0
+    # Singular/plural variants such as "tomato" vs "tomatoes"
+    if any(name.startswith(query) and len(name) - len(query) <= 2 for name in names):
+        return 0.9
+    return 0.5
+
+
+# ============ REPLY TEMPLATES ============
+
+def _render_inventory(user) -> str:
+    result = database_tool.get_supplier_inventory(user)
+    inventory = result.get('inventory', [])
+
+    if not inventory:
+        return "You don't have any active inventory listings yet. Would you like to add a product?"
+
+    lines = []
+    if result.get('has_expiring_items'):
+        lines.append("⚠️ **Items expiring within 5 days:**")
+        for item in result['expiring_soon']:
+            lines.append(
+                f"• {item['product_name']}: {item['quantity_available']} units @ {item['price_per_unit']} ETB "
+                f"— expires on {item['expires_on']} ({item['days_until_expiry']} day(s) left)"
+            )
+        lines.append("Consider reducing the price to sell these before they expire. "
+                     "Would you like to reduce the price for any of these items?")
+        lines.append("")
+
+    lines.append(f"📦 **Your inventory ({len(inventory)} listing(s)):**")
+    for item in inventory:
+        expiry = f", expires {item['expiry_date']}" if item['expiry_date'] else ''
+        lines.append(
+            f"• {item['product_name']}: {item['quantity_available']} units @ {item['price_per_unit']} ETB "
+            f"(available {item['available_date']}{expiry})"
+        )
+    return "\n".join(lines)
+
+
+def _render_orders(user, status_filter=None, date_filter=None) -> str:
+    result = database_tool.get_supplier_orders(user, status_filter=status_filter, date_filter=date_filter)
+    if 'error' in result:
+        return None
+
+    status_label = status_filter.replace('_', ' ') + ' ' if status_filter else ''
+    date_label = f" from {date_filter}" if date_filter else ''
+
+    if result['total_orders'] == 0:
+        return f"You have no {status_label}orders{date_label}."
+
+    lines = [f"🧾 **Your {status_label}orders{date_label} ({result['total_orders']}):**"]
+    for order_status, orders in result['orders'].items():
+        if not orders:
+            continue
+        lines.append("")
+        lines.append(f"**{order_status.replace('_', ' ').title()} ({len(orders)}):**")
+        for order in orders:
+            items = ", ".join(f"{i['product']} {i['quantity']} × {i['price_per_unit']} ETB" for i in order['items'])
+            lines.append(
+                f"• Order `{order['order_id']}` — {order['customer']}, {order['order_date']} — "
+                f"{items} — **Total: {order['total_amount']} ETB**"
+            )
+
+    if result['counts'].get('pending_acceptance'):
+        lines.append("")
+        lines.append("You can accept or decline pending orders by their order ID.")
+    return "\n".join(lines)
+
+
+def _render_order_update(user, order_id, new_status, decline_reason='') -> str:
+    result = database_tool.update_order_status(user, order_id, new_status, decline_reason)
+    if 'error' in result:
+        return f"I couldn't update order `{order_id}`: {result['error']}"
+
+    if new_status == 'accepted':
+        return f"✅ Order `{order_id}` has been accepted. The customer has been notified."
+    reason = f" Reason given: {decline_reason}." if decline_reason else ''
+    return f"❌ Order `{order_id}` has been declined.{reason} The customer has been notified."
+
+
+def _render_product_check(user, product_name) -> str:
+    result = database_tool.check_existing_inventory(user, product_name)
+    if not result:
+        return None  # Let the agent handle the follow-up (e.g. offer to add it)
+
+    expiry = f", expires {result['expiry_date']}" if result['expiry_date'] else ''
+    return (
+        f"Yes, you have **{result['product_name']}** listed: {result['quantity_available']} units "
+        f"@ {result['price_per_unit']} ETB (status: {result['status']}, available {result['available_date']}{expiry})."
+    )
+
+
+# ============ STATS ============
+
+def _record(intent) -> None:
+    with _stats_lock:
+        if intent:
+            ROUTER_STATS['routed'] += 1
+            ROUTER_STATS['intents'][intent] = ROUTER_STATS['intents'].get(intent, 0) + 1
+        else:
+            ROUTER_STATS['fallback'] += 1
+
+
+def get_router_stats() -> dict:
+    """Returns fast-path hit counts and hit rate for supplier turns."""
+    with _stats_lock:
+        total = ROUTER_STATS['routed'] + ROUTER_STATS['fallback']
+        return {
+            'routed': ROUTER_STATS['routed'],
+            'fallback': ROUTER_STATS['fallback'],
+            'hit_rate': ROUTER_STATS['routed'] / total if total else 0.0,
+            'intents': dict(ROUTER_STATS['intents']),
+        }
@@ -102,6 +102,15 @@ class ChatConsumer(AsyncWebsocketConsumer):
             'message': event['message'],
             'message_type': event.get('message_type', 'text'),
             'order_id': event.get('order_id', ''),
+            'job_id': event.get('job_id', ''),
             'timestamp': event.get('timestamp', '')
         }))
-
+    
+    async def chat_messages(self, event):
+        """
+        Called when several chat messages are sent to the user's group at once
+        (e.g. a supplier answering many orders). Forwards them to the WebSocket
+        client one by one, as chat_message frames.
+        """
+        for message in event['messages']:
+            await self.chat_message(message)
@@ -0,0 +1,149 @@
+"""
+Primary/replica database routing.
+
+When a 'replica' alias is configured (DATABASE_REPLICA_URL), reads made
+inside analytic_reads() (or by tools decorated with @analytic) - pricing
+series, order history, demand forecasts - go to the replica. Every other read and every write uses the primary.
+
+Replicas lag. To keep users from reading their own writes stale:
+- once anything is written in the current context (request or tool run,
+  including pool threads started from it), its reads stay on the primary;
+- a write made under a known user pins that user to the primary for
+  PIN_SECONDS, across requests and workers, via the shared cache.
+  pin_to_primary() does the same for users affected by someone else's write
+  (see api/utils/supplier_cache.py).
+
+Views bind the authenticated user with UserRoutingMixin.
+"""
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+PRIMARY_DB = 'default'
+REPLICA_DB = 'replica'
+PIN_SECONDS = 10  # Comfortably above the expected replication lag
+
+
+class _RoutingState:
+    __slots__ = ('user_id', 'wrote', 'pinned')
+
+    def __init__(self, user_id=None):
+        self.user_id = user_id
+        self.wrote = False
+        self.pinned = None  # Cached answer of the shared pin lookup
+
+
+_analytic = ContextVar('db_analytic_reads', default=False)
+_state = ContextVar('db_routing_state', default=None)
+
+
+def _pin_key(user_id) -> str:
+    return f'db_pinned:{user_id}'
+
+
+def replica_configured() -> bool:
+    return REPLICA_DB in settings.DATABASES
+
+
+@contextmanager
+def analytic_reads():
+    """Marks the reads inside the block as safe to serve from the replica."""
+    token = _analytic.set(True)
+    try:
+        yield
+    finally:
+        _analytic.reset(token)
+
+
+def analytic(implementation):
+    """Runs a coroutine implementation (see api/utils/dual_io.py) inside analytic_reads()."""
+    @wraps(implementation)
+    async def wrapper(*args, **kwargs):
+        with analytic_reads():
+            return await implementation(*args, **kwargs)
+    return wrapper
+
+
+@contextmanager
+def routing_context(user_id=None):
+    """Starts a fresh routing context (nothing written yet) for the given user."""
+    token = _state.set(_RoutingState(user_id))
+    try:
+        yield
+    finally:
+        _state.reset(token)
+
+
+def pin_to_primary(*user_ids) -> None:
+    """Keeps these users' reads on the primary for the next PIN_SECONDS."""
+    if not replica_configured():
+        return
+    try:
+        cache.set_many({_pin_key(user_id): True for user_id in user_ids if user_id}, PIN_SECONDS)
+    except Exception as e:
+        logger.warning(f"Could not pin users to the primary database: {e}")
+
+
+def _is_pinned(state) -> bool:
+    if state is None:
+        return False
+    if state.wrote:
+        return True
+    if state.pinned is None:
+        try:
+            state.pinned = bool(state.user_id) and bool(cache.get(_pin_key(state.user_id)))
+        except Exception:
+            state.pinned = True  # Without the cache the pin cannot be checked; stay on the primary
+    return state.pinned
+
+
+class PrimaryReplicaRouter:
+    """Database router: analytic reads to the replica, everything else to the primary."""
+
+    def db_for_read(self, model, **hints):
+        if _analytic.get() and replica_configured() and not _is_pinned(_state.get()):
+            return REPLICA_DB
+        return None  # Django's default: the instance's own database, else the primary
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None and not state.wrote:
+            state.wrote = True
+            if state.user_id:
+                pin_to_primary(state.user_id)
+        return PRIMARY_DB
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary
+        if {obj1._state.db, obj2._state.db} <= {PRIMARY_DB, REPLICA_DB}:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema through replication
+        return db != REPLICA_DB
+
+
+class UserRoutingMixin:
+    """
+    APIView mixin that runs each request in its own routing context, bound
+    to the authenticated user (DRF authenticates inside the view, after
+    Django middleware has run).
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        user_id = request.user.id if request.user.is_authenticated else None
+        self._routing_token = _state.set(_RoutingState(user_id))
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, '_routing_token', None)
+        if token is not None:
+            _state.reset(token)
+            self._routing_token = None
+        return super().finalize_response(request, response, *args, **kwargs)
@@ -0,0 +1,43 @@
+import json
+from django.core.management.base import BaseCommand
+from api.tools.basket_optimizer import run_benchmark, MAX_EXACT_SUPPLIERS
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks the basket optimizer on random baskets: solve time percentiles and, for instances '
+        f'with at most {MAX_EXACT_SUPPLIERS} suppliers, the gap to the exact optimum. Needs no database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--instances', type=int, default=100, help='Random baskets to solve (default: 100)')
+        parser.add_argument('--products', type=int, default=6, help='Products per basket (default: 6)')
+        parser.add_argument('--suppliers', type=int, default=12, help='Suppliers in the market (default: 12)')
+        parser.add_argument('--supplier-cost', type=float, nargs='+', default=[0, 150, 1000, 1e6],
+                            help='Charges per distinct supplier to benchmark; 1e6 approximates "fewest suppliers" '
+                                 '(default: 0 150 1000 1e6)')
+        parser.add_argument('--no-exact', action='store_true', help='Skip the exact solver')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0)')
+        parser.add_argument('--json', action='store_true', help='Print the reports as JSON')
+
+    def handle(self, *args, **options):
+        reports = [
+            run_benchmark(options['instances'], options['products'], options['suppliers'],
+                          supplier_cost, options['seed'], not options['no_exact'])
+            for supplier_cost in options['supplier_cost']
+        ]
+
+        if options['json']:
+            self.stdout.write(json.dumps(reports, indent=2))
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{options['instances']} baskets of {options['products']} products from {options['suppliers']} suppliers"
+        ))
+        self.stdout.write(f"{'supplier cost':>14}{'mean ms':>10}{'p50 ms':>10}{'max ms':>10}{'optimal':>10}{'mean gap':>10}{'max gap':>10}")
+        for report in reports:
+            solve, gap = report['solve_ms'], report.get('gap')
+            line = f"{report['supplier_cost']:>14g}{solve['mean']:>10}{solve['p50']:>10}{solve['max']:>10}"
+            if gap:
+                line += f"{gap['optimal_share']:>10.0%}{gap['mean_pct']:>9}%{gap['max_pct']:>9}%"
+            self.stdout.write(line)
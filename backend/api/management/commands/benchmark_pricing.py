@@ -0,0 +1,69 @@
+import json
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.db import connection, reset_queries
+from django.db.models import Avg
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from api.models import Product, CompetitorPrice, OrderItem
+from api.tools import pricing_analytics
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks the pricing analytics over the full history of every product in the database: '
+        'cold runs (load the series and analyze), warm runs (cached series) and, for comparison, '
+        'the per-request ORM aggregation the suggestion used before.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=None, help='Limit to the first N products')
+        parser.add_argument('--days', type=int, default=30, help='Competitor averaging window (default: 30)')
+        parser.add_argument('--repeat', type=int, default=5, help='Warm runs per product (default: 5)')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+
+    def handle(self, *args, **options):
+        product_ids = list(Product.objects.order_by('pk').values_list('product_id', flat=True)[:options['products']])
+
+        with CaptureQueriesContext(connection) as queries:
+            report = pricing_analytics.run_benchmark(product_ids, options['days'], options['repeat'])
+        report['queries'] = len(queries)
+        report['aggregation_ms'] = self._time_aggregation(product_ids, options['days'])
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        self.stdout.write(self.style.SUCCESS(f"{report['products']} products, {report['queries']} queries in total"))
+        self.stdout.write(f"{'':<28}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+        for label, key in (('analytics, cold', 'cold_ms'), ('analytics, cached series', 'warm_ms'),
+                           ('previous ORM aggregation', 'aggregation_ms')):
+            stats = report.get(key)
+            if stats:
+                self.stdout.write(f"{label:<28}{stats['mean']:>10}{stats['p50']:>10}{stats['p95']:>10}{stats['max']:>10}")
+
+    def _time_aggregation(self, product_ids, days):
+        """The queries get_comprehensive_pricing_suggestion ran on every request before the analytics module."""
+        timings = []
+        end_date = timezone.now().date()
+        for product_id in product_ids:
+            started = time.perf_counter()
+            list(CompetitorPrice.objects.filter(
+                product_id=product_id, date__gte=end_date - timedelta(days=days), date__lte=end_date
+            ).values('competitor_tier').annotate(avg_price=Avg('price_per_unit_etb')))
+            OrderItem.objects.filter(
+                product_id=product_id, order__order_date__gte=timezone.now() - timedelta(days=30)
+            ).order_by('-quantity').first()
+            timings.append((time.perf_counter() - started) * 1000)
+        reset_queries()
+
+        if not timings:
+            return None
+        timings.sort()
+        return {
+            'mean': round(sum(timings) / len(timings), 3),
+            'p50': round(timings[len(timings) // 2], 3),
+            'p95': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+            'max': round(timings[-1], 3),
+        }
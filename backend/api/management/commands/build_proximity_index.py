@@ -0,0 +1,68 @@
+import json
+import time
+import numpy as np
+from django.core.management.base import BaseCommand
+from api.utils.geo import PROXIMITY, DELIVERY_RATE_ETB_PER_KM, sync_locations
+
+
+class Command(BaseCommand):
+    help = (
+        'Seeds the known locations, builds the location-to-location distance matrix and times the '
+        'vectorized price + delivery ranking on random listings. Optionally saves the matrix as .npy.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default='', help='Save the distance matrix to this .npy file')
+        parser.add_argument('--listings', type=int, default=500, help='Random listings per ranking (default: 500)')
+        parser.add_argument('--rounds', type=int, default=1000, help='Rankings to time (default: 1000)')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0)')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+
+    def handle(self, *args, **options):
+        created = sync_locations()
+        PROXIMITY.reset()
+        PROXIMITY.sync()
+        names, distances = PROXIMITY.names, PROXIMITY.distances
+        if not names:
+            self.stderr.write('No locations: run migrate first.')
+            return
+
+        if options['output']:
+            np.save(options['output'], distances)
+
+        rng = np.random.default_rng(options['seed'])
+        count = options['listings']
+        prices = rng.uniform(20, 200, count).round(2).tolist()
+        locations = [names[i] for i in rng.integers(0, len(names), count)]
+        timings = []
+        for i in range(options['rounds']):
+            customer = names[i % len(names)]
+            started = time.perf_counter()
+            PROXIMITY.rank(prices, locations, customer, 10)
+            timings.append((time.perf_counter() - started) * 1e6)
+
+        timings = np.array(timings)
+        report = {
+            'locations': len(names),
+            'created': created,
+            'matrix_bytes': int(distances.nbytes),
+            'max_distance_km': round(float(distances.max()), 1),
+            'delivery_rate_etb_per_km': DELIVERY_RATE_ETB_PER_KM,
+            'listings': count,
+            'rank_us': {
+                'mean': round(float(timings.mean()), 1),
+                'p50': round(float(np.percentile(timings, 50)), 1),
+                'p95': round(float(np.percentile(timings, 95)), 1),
+            },
+        }
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{report['locations']} locations ({created} created), {report['matrix_bytes']} byte matrix, "
+            f"farthest pair {report['max_distance_km']} km"
+        ))
+        rank = report['rank_us']
+        self.stdout.write(f"Ranking {count} listings: mean {rank['mean']} us, p50 {rank['p50']} us, p95 {rank['p95']} us")
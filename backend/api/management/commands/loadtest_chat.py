@@ -0,0 +1,76 @@
+import os
+import json
+import tempfile
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from api.testing.fakes import LatencyModel
+from api.testing.loadtest import run_load_test
+
+
+class Command(BaseCommand):
+    help = (
+        'Replays customer and supplier conversations against the chat API and WebSocket consumer '
+        'with offline service stand-ins, and reports per-stage latency percentiles and DB query counts. '
+        'Runs against a throwaway test database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--conversations', type=int, default=20,
+                            help='Number of virtual users, half customers and half suppliers (default: 20)')
+        parser.add_argument('--concurrency', type=int, default=4,
+                            help='Number of conversations replayed concurrently (default: 4)')
+        parser.add_argument('--llm-latency', type=float, nargs=2, default=[800, 2000], metavar=('MEDIAN_MS', 'P95_MS'),
+                            help='Simulated agent LLM latency (default: 800 2000)')
+        parser.add_argument('--genai-latency', type=float, nargs=2, default=[300, 700], metavar=('MEDIAN_MS', 'P95_MS'),
+                            help='Simulated translation/summary latency (default: 300 700)')
+        parser.add_argument('--embedding-latency', type=float, nargs=2, default=[100, 250], metavar=('MEDIAN_MS', 'P95_MS'),
+                            help='Simulated embedding latency (default: 100 250)')
+        parser.add_argument('--websocket-pushes', type=int, default=5,
+                            help='Ping/push round trips per WebSocket client (default: 5)')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0)')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+
+    def handle(self, *args, **options):
+        # SQLite needs a file-backed test database for concurrent connections from worker threads
+        temp_db = None
+        if connection.vendor == 'sqlite':
+            temp_db = tempfile.NamedTemporaryFile(suffix='.sqlite3', delete=False).name
+            connection.settings_dict['TEST']['NAME'] = temp_db
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+
+        try:
+            report = run_load_test(
+                conversations=options['conversations'],
+                concurrency=options['concurrency'],
+                llm_latency=LatencyModel(*options['llm_latency'], seed=options['seed']),
+                genai_latency=LatencyModel(*options['genai_latency'], seed=options['seed'] + 1),
+                embedding_latency=LatencyModel(*options['embedding_latency'], seed=options['seed'] + 2),
+                websocket_pushes=options['websocket_pushes'],
+                seed=options['seed'],
+            )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            if temp_db and os.path.exists(temp_db):
+                os.remove(temp_db)
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{report['turns']} turns at concurrency {report['concurrency']} in {report['wall_time_s']}s "
+            f"({report['throughput_turns_per_s']} turns/s, {report['errors']} error(s))"
+        ))
+        self.stdout.write(f"{'stage':<32}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for name, stats in report['stages'].items():
+            self.stdout.write(
+                f"{name:<32}{stats['count']:>7}{stats.get('p50_ms', 0):>10}{stats.get('p95_ms', 0):>10}{stats.get('p99_ms', 0):>10}"
+            )
+        queries = report['db_queries']
+        self.stdout.write(
+            f"DB queries: {queries['total']} total, per turn p50 {queries['per_turn_p50']}, "
+            f"p95 {queries['per_turn_p95']}, p99 {queries['per_turn_p99']}, max {queries['per_turn_max']}"
+        )
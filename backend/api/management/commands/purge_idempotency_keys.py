@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from api.utils.idempotency import purge_expired_keys, KEY_TTL
+
+
+class Command(BaseCommand):
+    help = f'Deletes order idempotency keys older than their time to live ({KEY_TTL})'
+    
+    def handle(self, *args, **options):
+        deleted = purge_expired_keys()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired idempotency key(s)."))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from api.models import ProductAlias
+from api.utils.search import get_backend, install_search_index, sync_product_aliases, search_products
+
+
+class Command(BaseCommand):
+    help = (
+        'Creates the product search aliases (names, Amharic names, transliterations) for every product '
+        'and (re)builds the database search index. Optionally runs sample queries.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Database alias (default: default)')
+        parser.add_argument('--query', nargs='*', default=[], help='Queries to run after rebuilding')
+
+    def handle(self, *args, **options):
+        using = options['database']
+        created = sync_product_aliases()
+        install_search_index(using)
+        self.stdout.write(self.style.SUCCESS(
+            f"{get_backend(using).name} index ready: {ProductAlias.objects.using(using).count()} aliases "
+            f"({created} created)"
+        ))
+
+        for query in options['query']:
+            results = search_products(query, limit=3, using=using)
+            matches = ', '.join(f"{r['product_name']} ({r['score']}, '{r['matched']}')" for r in results) or 'no match'
+            self.stdout.write(f"{query!r}: {matches}")
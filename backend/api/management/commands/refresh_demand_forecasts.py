@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from api.tools.demand_forecast import refresh_forecasts, HISTORY_DAYS, HORIZON_DAYS
+
+
+class Command(BaseCommand):
+    help = 'Refits the demand models on OrderItem history and stores the next days of forecasts per product'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--history-days',
+            type=int,
+            default=HISTORY_DAYS,
+            help=f'Days of order history to fit on (default: {HISTORY_DAYS})'
+        )
+        parser.add_argument(
+            '--horizon',
+            type=int,
+            default=HORIZON_DAYS,
+            help=f'Days to forecast, starting today (default: {HORIZON_DAYS})'
+        )
+    
+    def handle(self, *args, **options):
+        report = refresh_forecasts(history_days=options['history_days'], horizon=options['horizon'])
+        
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Stored {report['rows']} forecast(s) for {report['products']} product(s) in {report['seconds']}s."
+            )
+        )
@@ -1,8 +1,12 @@
 from channels.db import database_sync_to_async
+from django.conf import settings
 from channels.middleware import BaseMiddleware
 from django.contrib.auth.models import AnonymousUser
 from rest_framework.authtoken.models import Token
 from urllib.parse import parse_qs
+from api.utils import tracing
+
+TRACE_REQUEST_HEADER = 'X-Kcart-Trace'
 
 
 class TokenAuthMiddleware(BaseMiddleware):
@@ -37,3 +41,37 @@ class TokenAuthMiddleware(BaseMiddleware):
         except Token.DoesNotExist:
             return AnonymousUser()
 
+
+
+class TracingMiddleware:
+    """
+    Opens a trace for every HTTP request when settings.KCART_TRACING is on.
+    When settings.KCART_TRACE_HEADER is also on, a staff user (or anyone in
+    DEBUG) can ask for the per-stage breakdown of one request by sending
+    X-Kcart-Trace: 1; it comes back in a Server-Timing header. Other
+    responses never carry the internal timings.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not tracing.is_enabled():
+            return self.get_response(request)
+
+        with tracing.start_trace('request') as trace:
+            response = self.get_response(request)
+            match = getattr(request, 'resolver_match', None)
+            trace.name = f"request:{match.url_name if match and match.url_name else 'unmatched'}"
+
+        if tracing.debug_header_enabled() and self._wants_timings(request):
+            response['Server-Timing'] = trace.server_timing()
+        return response
+
+    @staticmethod
+    def _wants_timings(request) -> bool:
+        if request.headers.get(TRACE_REQUEST_HEADER) != '1':
+            return False
+        # Set by DRF's authentication by the time the response is built
+        user = getattr(request, 'user', None)
+        return settings.DEBUG or bool(user and user.is_authenticated and user.is_staff)
@@ -63,6 +63,51 @@ class CompetitorPrice(models.Model):
         unique_together = ('product', 'date', 'competitor_tier')
         indexes = [models.Index(fields=['date'])]
 
+class DemandForecast(models.Model):
+    """Precomputed daily marketplace demand per product (refreshed nightly, see api/tools/demand_forecast.py)."""
+    id = models.BigAutoField(primary_key=True)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='demand_forecasts')
+    forecast_date = models.DateField()
+    quantity = models.FloatField()
+    quantity_low = models.FloatField()
+    quantity_high = models.FloatField()
+    model = models.CharField(max_length=50)
+    generated_at = models.DateTimeField()
+    class Meta:
+        unique_together = ('product', 'forecast_date')
+
+class ProductAlias(models.Model):
+    """A name a product is searched by: its own names, Amharic (Fidel) names and Latin transliterations (see api/utils/search.py)."""
+    id = models.BigAutoField(primary_key=True)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='aliases')
+    alias = models.CharField(max_length=255)
+    normalized = models.CharField(max_length=255, db_index=True)
+    KIND_CHOICES = [('name', 'Product name'), ('fidel', 'Amharic (Fidel)'), ('latin', 'Latin script')]
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    class Meta:
+        unique_together = ('product', 'normalized')
+
+class Location(models.Model):
+    """A place users live and deliver to, with coordinates for the precomputed distance matrix (see api/utils/geo.py)."""
+    id = models.AutoField(primary_key=True)
+    name = models.CharField(max_length=255, unique=True)  # "City, Region", as stored in User.default_location
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+
+class IdempotencyKey(models.Model):
+    """A client-supplied request key and the response it produced, replayed on retries until it expires (see api/utils/idempotency.py)."""
+    id = models.BigAutoField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    scope = models.CharField(max_length=50)  # The operation, e.g. 'create_order'
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    response = models.JSONField(null=True, blank=True)  # None while the first request is in progress
+    order = models.ForeignKey(Order, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField()
+    expires_at = models.DateTimeField(db_index=True)
+    class Meta:
+        unique_together = ('user', 'scope', 'key')
+
 class Notification(models.Model):
     id = models.AutoField(primary_key=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -18,6 +18,28 @@ def check_expiring_stock_job():
         logger.error(f"Error running check_expiring_stock job: {e}")
 
 
+def refresh_demand_forecasts_job():
+    """
+    Job that runs the refresh_demand_forecasts management command.
+    """
+    try:
+        logger.info("Running refresh_demand_forecasts job...")
+        call_command('refresh_demand_forecasts')
+        logger.info("refresh_demand_forecasts job completed successfully")
+    except Exception as e:
+        logger.error(f"Error running refresh_demand_forecasts job: {e}")
+
+
+def purge_idempotency_keys_job():
+    """
+    Job that runs the purge_idempotency_keys management command.
+    """
+    try:
+        call_command('purge_idempotency_keys')
+    except Exception as e:
+        logger.error(f"Error running purge_idempotency_keys job: {e}")
+
+
 def start_scheduler():
     """
     Starts the APScheduler for periodic tasks.
@@ -36,6 +58,27 @@ def start_scheduler():
         max_instances=1
     )
     
+    # Refit the demand forecasts nightly, after the day's orders are in
+    scheduler.add_job(
+        refresh_demand_forecasts_job,
+        'cron',
+        hour=2,
+        minute=0,
+        id='refresh_demand_forecasts',
+        replace_existing=True,
+        max_instances=1
+    )
+    
+    # Delete expired order idempotency keys hourly (replays only need them for KEY_TTL)
+    scheduler.add_job(
+        purge_idempotency_keys_job,
+        'interval',
+        hours=1,
+        id='purge_idempotency_keys',
+        replace_existing=True,
+        max_instances=1
+    )
+    
     scheduler.start()
     logger.info("Scheduler started successfully")
 
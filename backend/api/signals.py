@@ -1,8 +1,12 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete, post_migrate
 from django.dispatch import receiver
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
-from api.models import Notification
+from api.models import Notification, Inventory, Product, ProductAlias, Location, User, Order, OrderItem
+from api.utils.catalog import invalidate_product, invalidate_catalog
+from api.utils.supplier_cache import invalidate_supplier_views, invalidate_all_supplier_views
+from api.utils.search import sync_product_aliases, invalidate_search, install_search_index
+from api.utils.geo import sync_locations, invalidate_locations
 
 
 @receiver(post_save, sender=Notification)
@@ -32,3 +36,96 @@ def broadcast_notification(sender, instance, created, **kwargs):
         except Exception as e:
             print(f"Error broadcasting notification: {e}")
 
+
+@receiver(post_save, sender=Inventory)
+@receiver(post_delete, sender=Inventory)
+def refresh_catalog_listing(sender, instance, **kwargs):
+    """Rebuilds the catalog snapshot of the product whose listing changed."""
+    invalidate_product(instance.product_id)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def refresh_catalog_product(sender, instance, **kwargs):
+    """Rebuilds the catalog snapshot of a renamed, added or removed product."""
+    invalidate_product(instance.product_id)
+
+
+@receiver(post_save, sender=User)
+def refresh_catalog_supplier(sender, instance, update_fields=None, **kwargs):
+    """
+    Supplier names and locations are part of every listing, so a supplier
+    save rebuilds the catalog. Saves limited to other fields (e.g.
+    last_login) are ignored.
+    """
+    if instance.role != 'supplier' or kwargs.get('created'):
+        return
+    if update_fields is not None and not {'username', 'default_location'} & set(update_fields):
+        return
+    invalidate_catalog()
+
+
+@receiver(post_save, sender=Inventory)
+@receiver(post_delete, sender=Inventory)
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
+def refresh_supplier_views(sender, instance, **kwargs):
+    """Invalidates the cached inventory and order views of the row's supplier."""
+    invalidate_supplier_views(instance.supplier_id)
+
+
+@receiver(post_save, sender=Order)
+def refresh_order_supplier_views(sender, instance, created, **kwargs):
+    """
+    An order status change shows up in the order views of every supplier
+    with items in it. New orders have no items yet; those invalidate
+    through their OrderItem rows.
+    """
+    if created:
+        return
+    invalidate_supplier_views(*OrderItem.objects.filter(order=instance).values_list('supplier_id', flat=True).distinct())
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=User)
+def refresh_all_supplier_views(sender, instance, update_fields=None, **kwargs):
+    """Product and customer names appear in every supplier's views."""
+    if kwargs.get('created'):
+        return
+    if sender is User and update_fields is not None and 'username' not in update_fields:
+        return
+    invalidate_all_supplier_views()
+
+
+@receiver(post_save, sender=Product)
+def refresh_product_aliases(sender, instance, **kwargs):
+    """Keeps a product searchable by its current names."""
+    sync_product_aliases([instance])
+
+
+@receiver(post_save, sender=ProductAlias)
+@receiver(post_delete, sender=ProductAlias)
+def refresh_product_search(sender, instance, **kwargs):
+    """Drops cached search results when an alias is added, edited or removed."""
+    invalidate_search()
+
+
+@receiver(post_save, sender=Location)
+@receiver(post_delete, sender=Location)
+def refresh_distance_matrix(sender, instance, **kwargs):
+    """Rebuilds the location distance matrix in every worker."""
+    invalidate_locations()
+
+
+@receiver(post_migrate)
+def create_search_index(sender, using, **kwargs):
+    """Creates the product search index, which migrations do not manage."""
+    if sender.name == 'api':
+        install_search_index(using)
+
+
+@receiver(post_migrate)
+def create_locations(sender, using, **kwargs):
+    """Seeds the known locations and their coordinates."""
+    if sender.name == 'api':
+        sync_locations(using)
@@ -0,0 +1,108 @@
+"""
+Local stand-in for the Runware WebSocket API.
+
+Speaks enough of the protocol for the runware SDK: authentication, ping/pong
+heartbeats and imageInference tasks, which are answered after a simulated
+latency with a fake image URL. Counts connections and inference requests so
+tests can check connection reuse and caching.
+"""
+import json
+import uuid
+import asyncio
+import threading
+import websockets
+from api.testing.fakes import LatencyModel, NO_LATENCY
+
+
+class FakeRunwareServer:
+    """
+    Runs on a background thread; use as a context manager:
+
+        with FakeRunwareServer(latency=LatencyModel(200)) as server:
+            queue = ImageJobQueue(api_key='test', url=server.url)
+    """
+
+    def __init__(self, latency: LatencyModel = None, host: str = '127.0.0.1', port: int = 0, fail_prompts=()):
+        self.latency = latency or NO_LATENCY
+        self.host = host
+        self.port = port
+        self.fail_prompts = tuple(fail_prompts)
+        self.connections = 0
+        self.inference_requests = 0
+        self.prompts = []
+        self._loop = None
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f'ws://{self.host}:{self.port}'
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+    def start(self) -> None:
+        ready = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._server = self._loop.run_until_complete(self._serve())
+            self.port = self._server.sockets[0].getsockname()[1]
+            ready.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, name='fake-runware', daemon=True)
+        self._thread.start()
+        ready.wait()
+
+    async def _serve(self):
+        return await websockets.serve(self._handle, self.host, self.port)
+
+    def stop(self) -> None:
+        async def close():
+            self._server.close()
+            await self._server.wait_closed()
+
+        asyncio.run_coroutine_threadsafe(close(), self._loop).result(timeout=10)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=10)
+
+    async def _handle(self, websocket):
+        self.connections += 1
+        async for raw in websocket:
+            for task in json.loads(raw):
+                task_type = task.get('taskType')
+                if task_type == 'authentication':
+                    await websocket.send(json.dumps({'data': [{
+                        'taskType': 'authentication', 'connectionSessionUUID': str(uuid.uuid4()),
+                    }]}))
+                elif task_type == 'ping':
+                    await websocket.send(json.dumps({'data': [{'taskType': 'ping', 'pong': True}]}))
+                elif task_type == 'imageInference':
+                    self.inference_requests += 1
+                    self.prompts.append(task.get('positivePrompt', ''))
+                    asyncio.ensure_future(self._infer(websocket, task))
+
+    async def _infer(self, websocket, task: dict) -> None:
+        await asyncio.sleep(self.latency.sample())
+        prompt = task.get('positivePrompt', '')
+        if any(text in prompt for text in self.fail_prompts):
+            response = {'errors': [{
+                'taskType': 'imageInference', 'taskUUID': task['taskUUID'],
+                'code': 'inferenceFailed', 'message': 'Simulated inference failure',
+            }]}
+        else:
+            image_uuid = str(uuid.uuid4())
+            response = {'data': [{
+                'taskType': 'imageInference',
+                'taskUUID': task['taskUUID'],
+                'imageUUID': image_uuid,
+                'imageURL': f'https://images.fake-runware.local/{image_uuid}.jpg',
+            }]}
+        await websocket.send(json.dumps(response))
@@ -0,0 +1,308 @@
+"""
+Offline stand-ins for the external services used by the chat pipeline:
+Gemini (agent chat model, translator/summarizer client and embeddings),
+ChromaDB and the Redis channel layer/cache.
+
+Each stand-in can simulate service latency through a LatencyModel, so the
+chat path can be measured without network access or API keys.
+"""
+import re
+import json
+import math
+import time
+import random
+import hashlib
+import threading
+from contextlib import ExitStack, contextmanager
+from typing import Any, List
+from unittest import mock
+import chromadb
+from chromadb.config import Settings as ChromaSettings
+from django.test import override_settings
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from api.utils.tokens import ETHIOPIC_PATTERN, estimate_tokens
+
+IN_MEMORY_CHANNEL_LAYERS = {
+    'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'},
+}
+
+LOCMEM_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+}
+
+
+# ============ LATENCY ============
+
+class LatencyModel:
+    """
+    Simulated service latency.
+
+    Samples from a log-normal distribution fitted to the given median and p95
+    (in milliseconds); p95 equal to the median gives a constant latency.
+    """
+
+    def __init__(self, median_ms: float = 0.0, p95_ms: float = None, seed: int = None):
+        self.median_ms = median_ms
+        self.p95_ms = p95_ms if p95_ms is not None else median_ms
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+        # p95 of a log-normal is median * exp(1.645 * sigma)
+        if self.median_ms > 0 and self.p95_ms > self.median_ms:
+            self.sigma = math.log(self.p95_ms / self.median_ms) / 1.645
+        else:
+            self.sigma = 0.0
+
+    def sample(self) -> float:
+        """Returns a latency sample in seconds."""
+        if self.median_ms <= 0:
+            return 0.0
+        with self._lock:
+            value = self._random.lognormvariate(math.log(self.median_ms), self.sigma) if self.sigma else self.median_ms
+        return value / 1000.0
+
+    def sleep(self) -> float:
+        delay = self.sample()
+        if delay:
+            time.sleep(delay)
+        return delay
+
+
+NO_LATENCY = LatencyModel()
+
+
+# ============ AGENT CHAT MODEL ============
+
+class ScriptedTurn:
+    """
+    Scripted behaviour of the fake chat model for user messages matching a pattern.
+
+    steps is a list, one entry per model call within an agent run:
+      - {'tool_calls': [(tool_name, args), ...]} to request tool calls, where args
+        is a dict or a callable taking the message list and returning a dict;
+      - {'reply': text} (or a callable returning text) to finish the run.
+    """
+
+    def __init__(self, pattern: str, steps: list):
+        self.pattern = re.compile(pattern, re.IGNORECASE)
+        self.steps = steps
+
+
+DEFAULT_REPLY = "I'm KcartBot. How can I help you with ChipChip today?"
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Offline replacement for ChatGoogleGenerativeAI in create_kcart_agent.
+
+    The step of the current run is derived from the messages (number of model
+    turns since the last human message), so a single instance is stateless
+    across runs and safe to share between threads.
+    """
+
+    script: List[Any] = []
+    latency: Any = None
+    default_reply: str = DEFAULT_REPLY
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    @property
+    def _llm_type(self) -> str:
+        return 'kcart-fake-chat'
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        (self.latency or NO_LATENCY).sleep()
+
+        last_human_index = max((i for i, m in enumerate(messages) if isinstance(m, HumanMessage)), default=0)
+        user_text = messages[last_human_index].content if messages else ''
+        step_index = sum(1 for m in messages[last_human_index + 1:] if isinstance(m, AIMessage))
+
+        message = self._scripted_message(user_text, step_index, messages)
+
+        input_tokens = sum(estimate_tokens(str(m.content)) for m in messages)
+        output_tokens = estimate_tokens(message.content or json.dumps(message.tool_calls, default=str))
+        message.usage_metadata = {
+            'input_tokens': input_tokens,
+            'output_tokens': output_tokens,
+            'total_tokens': input_tokens + output_tokens,
+        }
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _scripted_message(self, user_text: str, step_index: int, messages) -> AIMessage:
+        for turn in self.script:
+            if not turn.pattern.search(user_text):
+                continue
+            if step_index >= len(turn.steps):
+                break
+            step = turn.steps[step_index]
+
+            if 'tool_calls' in step:
+                tool_calls = []
+                for n, (name, args) in enumerate(step['tool_calls']):
+                    tool_calls.append({
+                        'name': name,
+                        'args': args(messages) if callable(args) else dict(args),
+                        'id': f'call_{step_index}_{n}',
+                    })
+                return AIMessage(content='', tool_calls=tool_calls)
+
+            reply = step['reply']
+            return AIMessage(content=reply(messages) if callable(reply) else reply)
+
+        return AIMessage(content=self.default_reply)
+
+
+def last_tool_result(messages) -> Any:
+    """Returns the JSON-decoded content of the most recent tool message, if any."""
+    for message in reversed(messages):
+        if isinstance(message, ToolMessage):
+            try:
+                return json.loads(message.content)
+            except (TypeError, ValueError):
+                return message.content
+    return None
+
+
+def table_rows(result) -> list:
+    """Converts an encoded {'columns': [...], 'rows': [...]} table back to dicts."""
+    if isinstance(result, dict) and 'columns' in result:
+        return [dict(zip(result['columns'], row)) for row in result['rows']]
+    return result if isinstance(result, list) else []
+
+
+# ============ GENAI CLIENT (translator / summarizer) ============
+
+class _FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class _FakeModels:
+    def __init__(self, owner):
+        self.owner = owner
+
+    def generate_content(self, model: str, contents: str):
+        return self.owner.generate_content(contents)
+
+
+class FakeGenaiClient:
+    """
+    Offline replacement for the google.genai client in api.utils.translator.
+
+    Recognises the prompts sent by identify_language, translate_to_english,
+    translate_from_english and summarize_conversation and answers them
+    deterministically: Fidel text is classified as Amharic, and "translation"
+    returns the quoted text unchanged.
+    """
+
+    def __init__(self, latency: LatencyModel = None):
+        self.latency = latency or NO_LATENCY
+        self.models = _FakeModels(self)
+        self.calls = 0
+
+    def generate_content(self, contents: str) -> _FakeResponse:
+        self.latency.sleep()
+        self.calls += 1
+
+        if contents.startswith('You are a language classifier'):
+            text = contents.rsplit('Text: "', 1)[-1]
+            return _FakeResponse('amharic' if ETHIOPIC_PATTERN.search(text) else 'english')
+
+        if 'running summary' in contents:
+            new_messages = contents.split('New messages:', 1)[-1]
+            return _FakeResponse(f"Earlier the user discussed: {new_messages.strip()[:200]}")
+
+        quoted = re.search(r'text: "(.*)"', contents, re.DOTALL | re.IGNORECASE)
+        return _FakeResponse(quoted.group(1) if quoted else '')
+
+
+# ============ EMBEDDINGS / CHROMA ============
+
+class FakeEmbeddings(Embeddings):
+    """Deterministic, hash-based embeddings with simulated latency."""
+
+    def __init__(self, dimensions: int = 64, latency: LatencyModel = None):
+        self.dimensions = dimensions
+        self.latency = latency or NO_LATENCY
+
+    def _embed(self, text: str) -> list:
+        vector = [0.0] * self.dimensions
+        for word in re.findall(r'\w+', text.lower()):
+            digest = hashlib.md5(word.encode('utf-8')).digest()
+            vector[digest[0] % self.dimensions] += 1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.latency.sleep()
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        self.latency.sleep()
+        return self._embed(text)
+
+
+def create_in_memory_chroma(documents: list, embeddings: Embeddings, collection_name: str = 'chipchip_knowledge'):
+    """
+    Returns an in-memory (ephemeral) ChromaDB client with the given documents
+    loaded into collection_name. documents: list of {'content', 'document_type', 'topic'}.
+    """
+    client = chromadb.EphemeralClient(settings=ChromaSettings(anonymized_telemetry=False, allow_reset=True))
+    client.reset()
+    collection = client.create_collection(name=collection_name)
+    if documents:
+        texts = [d['content'] for d in documents]
+        collection.add(
+            ids=[f"doc_{i + 1}" for i in range(len(texts))],
+            documents=texts,
+            metadatas=[{'document_type': d.get('document_type', ''), 'topic': d.get('topic', '')} for d in documents],
+            embeddings=embeddings.embed_documents(texts),
+        )
+    return client
+
+
+# ============ WIRING ============
+
+@contextmanager
+def advance_cache_clock(seconds: float):
+    """Makes the local-memory cache treat entries as if `seconds` had passed (expired keys disappear)."""
+    from django.core.cache.backends import locmem
+    now = time.time
+    with mock.patch.object(locmem, 'time', mock.Mock(time=lambda: now() + seconds)):
+        yield
+
+
+@contextmanager
+def offline_services(script: list = None, llm_latency: LatencyModel = None, genai_latency: LatencyModel = None,
+                     embedding_latency: LatencyModel = None, knowledge: list = None):
+    """
+    Patches the chat pipeline to use the offline stand-ins:
+    FakeChatModel for the agent, FakeGenaiClient for translation/summaries,
+    FakeEmbeddings + in-memory Chroma for RAG, an InMemoryChannelLayer and a
+    local-memory cache. Yields a dict with the created fakes.
+    """
+    embeddings = FakeEmbeddings(latency=embedding_latency)
+    chroma_client = create_in_memory_chroma(knowledge or [], embeddings)
+    chat_model = FakeChatModel(script=script or [], latency=llm_latency)
+    genai_client = FakeGenaiClient(latency=genai_latency)
+
+    with ExitStack() as stack:
+        stack.enter_context(override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS, CACHES=LOCMEM_CACHES))
+        stack.enter_context(mock.patch('api.agent.factory.get_chat_model', return_value=chat_model))
+        stack.enter_context(mock.patch('api.utils.translator.client', genai_client))
+        stack.enter_context(mock.patch('api.tools.rag_tool.get_chroma_client', return_value=chroma_client))
+        stack.enter_context(mock.patch('api.tools.rag_tool.get_query_embeddings', return_value=embeddings))
+
+        from django.core.cache import cache
+        cache.clear()
+
+        yield {
+            'chat_model': chat_model,
+            'genai_client': genai_client,
+            'embeddings': embeddings,
+            'chroma_client': chroma_client,
+        }
@@ -0,0 +1,391 @@
+"""
+End-to-end load-testing harness for the chat pipeline.
+
+Replays realistic customer and supplier conversations against ChatAPIView
+(through the full Django/DRF stack) at a configurable concurrency, then
+exercises ChatConsumer over an in-memory channel layer. External services are
+replaced by the stand-ins in api.testing.fakes, so the numbers reflect our own
+code plus the simulated service latencies.
+
+Reports p50/p95/p99 latency per pipeline stage and DB query counts per turn,
+collected from the request traces recorded by api.utils.tracing.
+"""
+import json
+import time
+import random
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+import numpy as np
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.db import close_old_connections
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from api.models import User, Product, Inventory, Order, OrderItem, CompetitorPrice
+from api.utils import tracing
+from api.utils.catalog import invalidate_catalog
+from api.utils.supplier_cache import invalidate_all_supplier_views
+from api.testing.fakes import LatencyModel, ScriptedTurn, offline_services, last_tool_result, table_rows
+
+FIXTURE_PRODUCTS = [
+    ('Red Onions', 'red_onions', 'Kg', 45.0),
+    ('ቲማቲም', 'tomatoes', 'Kg', 50.0),
+    ('Potatoes', 'potatoes', 'Kg', 30.0),
+    ('Avocados', 'avocados', 'Kg', 90.0),
+    ('ወተት', 'milk', 'Liter', 85.0),
+    ('ቅቤ', 'butter', 'Kg', 1200.0),
+]
+
+FIXTURE_KNOWLEDGE = [
+    {'content': 'ChipChip delivers orders within Addis Ababa within 24 hours of supplier acceptance.',
+     'document_type': 'policy', 'topic': 'delivery'},
+    {'content': 'ChipChip suppliers receive payment within 3 days after delivery is completed.',
+     'document_type': 'policy', 'topic': 'payments'},
+    {'content': 'ChipChip is an Ethiopian marketplace connecting farmers and suppliers with customers.',
+     'document_type': 'company', 'topic': 'about'},
+]
+
+# ============ CONVERSATIONS ============
+
+CUSTOMER_CONVERSATIONS = [
+    [
+        "Hello!",
+        "I need 5 kg of tomatoes",
+        "Order 5 kg of tomatoes from the cheapest supplier, deliver tomorrow to Addis Ababa",
+    ],
+    [
+        "How should I store avocados?",
+        "I need 10 kg of avocados",
+        "What is ChipChip's delivery policy?",
+    ],
+    [
+        "ሰላም",
+        "I need 3 liters of milk",
+    ],
+]
+
+SUPPLIER_CONVERSATIONS = [
+    [
+        "show my inventory",
+        "What price should I set for tomatoes?",
+        "Add 50 kg of tomatoes at 48 birr, available today",
+    ],
+    [
+        "show today's pending orders",
+        "accept order {pending_order_id}",
+        "show my orders",
+    ],
+    [
+        "Hi, how can you help me?",
+        "What is the market price for potatoes?",
+        "show my stock",
+    ],
+]
+
+
+def _cheapest_order_args(messages):
+    rows = table_rows(last_tool_result(messages))
+    supplier_id = rows[0]['supplier_id'] if rows else ''
+    return {
+        'items': json.dumps([{'product_name': 'tomatoes', 'quantity': 5, 'supplier_id': supplier_id}]),
+        'delivery_date': (date.today() + timedelta(days=1)).isoformat(),
+        'delivery_location': 'Addis Ababa, Addis Ababa',
+    }
+
+
+def _listings_reply(messages):
+    rows = table_rows(last_tool_result(messages))
+    if not rows:
+        return "Sorry, no suppliers currently have enough stock."
+    lines = [f"**{r['supplier_name']}** (Supplier ID: `{r['supplier_id']}`): {r['price_per_unit']} ETB" for r in rows[:5]]
+    return "Here are the available suppliers:\n" + "\n".join(lines)
+
+
+DEFAULT_SCRIPT = [
+    ScriptedTurn(r'^order ', [
+        {'tool_calls': [('find_product_listings', {'product_name': 'tomatoes', 'quantity': 5})]},
+        {'tool_calls': [('create_order', _cheapest_order_args)]},
+        {'reply': lambda messages: f"Your order has been placed: {json.dumps(last_tool_result(messages))[:200]}"},
+    ]),
+    ScriptedTurn(r'i need (\d+) (?:kg|liters?) of (\w+)', [
+        {'tool_calls': [('find_product_listings', lambda m: _need_args(m))]},
+        {'reply': _listings_reply},
+    ]),
+    ScriptedTurn(r'delivery policy', [
+        {'tool_calls': [('chipchip_knowledge_search', {'__arg1': 'delivery policy'})]},
+        {'reply': "ChipChip delivers within Addis Ababa within 24 hours of supplier acceptance."},
+    ]),
+    ScriptedTurn(r'(price should i set|market price) for (\w+)', [
+        {'tool_calls': [('get_pricing_suggestion', lambda m: {'product_name': _last_word(m), 'days': 30}),
+                        ('check_existing_inventory', lambda m: {'product_name': _last_word(m)})]},
+        {'reply': "Based on market data for the last 30 days, here are pricing suggestions."},
+    ]),
+    ScriptedTurn(r'^add (\d+) kg of (\w+) at (\d+)', [
+        {'tool_calls': [('get_pricing_suggestion', {'product_name': 'tomatoes', 'days': 30})]},
+        {'tool_calls': [('add_or_update_inventory', lambda m: {
+            'product_name': 'tomatoes', 'quantity': 50, 'price': 48,
+            'available_date': date.today().isoformat(),
+        })]},
+        {'reply': "Your tomatoes listing has been saved."},
+    ]),
+    ScriptedTurn(r'store|hello|hi|ሰላም', [
+        {'reply': "Hello! Keep avocados at room temperature until ripe, then refrigerate. How can I help?"},
+    ]),
+]
+
+
+def _human_text(messages) -> str:
+    from langchain_core.messages import HumanMessage
+    humans = [m for m in messages if isinstance(m, HumanMessage)]
+    return humans[-1].content if humans else ''
+
+
+def _last_word(messages) -> str:
+    return _human_text(messages).rstrip('?!. ').split()[-1]
+
+
+def _need_args(messages) -> dict:
+    words = _human_text(messages).split()
+    return {'product_name': words[-1], 'quantity': float(words[2])}
+
+
+# ============ TRACE COLLECTION ============
+
+# Traces finished while replaying one turn (the test client runs the request
+# in the calling thread, so the listener sees the caller's context)
+_turn_traces = contextvars.ContextVar('loadtest_turn_traces', default=None)
+
+
+def _collect_trace(trace) -> None:
+    collected = _turn_traces.get()
+    if collected is not None:
+        collected.append(trace)
+
+
+# ============ FIXTURES ============
+
+def seed_fixture_data(num_customers: int, num_suppliers: int, seed: int = 0) -> dict:
+    """
+    Creates products, competitor prices, customers, suppliers with inventory
+    and a pending order per supplier. Returns the created users.
+    """
+    rng = random.Random(seed)
+    today = timezone.now().date()
+
+    products = []
+    for product_name, internal_name, unit, base_price in FIXTURE_PRODUCTS:
+        product, _ = Product.objects.get_or_create(
+            internal_name=internal_name,
+            defaults={'product_name': product_name, 'unit': unit}
+        )
+        products.append((product, base_price))
+
+    CompetitorPrice.objects.bulk_create([
+        CompetitorPrice(product=product, date=today - timedelta(days=d), competitor_tier=tier,
+                        price_per_unit_etb=round(base_price * markup, 2))
+        for product, base_price in products
+        for d in range(30)
+        for tier, markup in (('local_shop', 1.0), ('supermarket', 1.3), ('distribution_center', 0.85))
+    ], ignore_conflicts=True)
+
+    customers = [
+        User.objects.create(username=f'loadtest_customer_{i}', role='customer', default_location='Addis Ababa, Addis Ababa')
+        for i in range(num_customers)
+    ]
+    suppliers = [
+        User.objects.create(username=f'loadtest_supplier_{i}', role='supplier', default_location='Adama, Oromia')
+        for i in range(num_suppliers)
+    ]
+
+    Inventory.objects.bulk_create([
+        Inventory(supplier=supplier, product=product, quantity_available=rng.uniform(50, 500),
+                  price_per_unit_etb=round(base_price * rng.uniform(0.9, 1.2), 2), status='active',
+                  available_date=today, expiry_date=today + timedelta(days=rng.randint(2, 30)))
+        for supplier in suppliers
+        for product, base_price in products
+    ])
+    invalidate_catalog()
+    invalidate_all_supplier_views()
+
+    pending_orders = {}
+    for supplier in suppliers:
+        order = Order.objects.create(user=rng.choice(customers), order_date=timezone.now(), status='pending_acceptance')
+        product, base_price = rng.choice(products)
+        OrderItem.objects.create(order=order, product=product, supplier=supplier, quantity=2, price_per_unit_etb=base_price)
+        pending_orders[supplier.id] = str(order.order_id)
+
+    return {'customers': customers, 'suppliers': suppliers, 'pending_orders': pending_orders}
+
+
+# ============ RUNNER ============
+
+def _percentiles(values) -> dict:
+    if not values:
+        return {'count': 0}
+    arr = np.asarray(values, dtype=float) * 1000.0
+    return {
+        'count': int(arr.size),
+        'mean_ms': round(float(arr.mean()), 2),
+        'p50_ms': round(float(np.percentile(arr, 50)), 2),
+        'p95_ms': round(float(np.percentile(arr, 95)), 2),
+        'p99_ms': round(float(np.percentile(arr, 99)), 2),
+    }
+
+
+def _run_conversation(user, messages: list, context: dict, results: list, lock: threading.Lock) -> None:
+    close_old_connections()
+    client = APIClient()
+    client.force_authenticate(user=user)
+
+    try:
+        for message in messages:
+            message = message.format(**context)
+            traces = []
+            token = _turn_traces.set(traces)
+            start = time.perf_counter()
+            try:
+                response = client.post('/api/chat/', {'message': message}, format='json')
+                ok = response.status_code == 200 and 'reply' in response.data
+            except Exception:
+                ok = False
+            finally:
+                elapsed = time.perf_counter() - start
+                _turn_traces.reset(token)
+            trace = traces[-1] if traces else None
+
+            with lock:
+                results.append({
+                    'role': user.role,
+                    'message': message,
+                    'ok': ok,
+                    'request': elapsed,
+                    'stages': [(span.name, span.duration) for span in trace.spans] if trace else [],
+                    'db_queries': trace.db_queries if trace else 0,
+                    'db_time': trace.db_time if trace else 0.0,
+                    'tokens_in': trace.tokens_in if trace else 0,
+                    'tokens_out': trace.tokens_out if trace else 0,
+                })
+    finally:
+        close_old_connections()
+
+
+async def _websocket_phase(users: list, pushes_per_client: int) -> list:
+    """Connects a ChatConsumer per user, measures ping round trips and group_send delivery."""
+    from api.consumers import ChatConsumer
+
+    samples = []
+    channel_layer = get_channel_layer()
+
+    for user in users:
+        communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), '/ws/chat/')
+        communicator.scope['user'] = user
+
+        start = time.perf_counter()
+        connected, _ = await communicator.connect()
+        await communicator.receive_json_from()  # connection_established
+        samples.append(('ws_connect', time.perf_counter() - start))
+        if not connected:
+            continue
+
+        for _ in range(pushes_per_client):
+            start = time.perf_counter()
+            await communicator.send_json_to({'type': 'ping'})
+            await communicator.receive_json_from()
+            samples.append(('ws_ping', time.perf_counter() - start))
+
+            start = time.perf_counter()
+            await channel_layer.group_send(f'user_{user.id}', {
+                'type': 'chat_message',
+                'message': '🛒 **NEW ORDER RECEIVED** (load test)',
+                'message_type': 'order_notification',
+                'timestamp': timezone.now().isoformat(),
+            })
+            await communicator.receive_json_from()
+            samples.append(('ws_push', time.perf_counter() - start))
+
+        await communicator.disconnect()
+
+    return samples
+
+
+def run_load_test(conversations: int = 20, concurrency: int = 4, llm_latency: LatencyModel = None,
+                  genai_latency: LatencyModel = None, embedding_latency: LatencyModel = None,
+                  websocket_pushes: int = 5, seed: int = 0) -> dict:
+    """
+    Runs the load test against the current database and returns a report:
+    per-stage latency percentiles, DB query counts per turn, errors and throughput.
+    Half of the virtual users are customers and half are suppliers.
+    """
+    num_customers = max(1, conversations // 2)
+    num_suppliers = max(1, conversations - num_customers)
+
+    with offline_services(script=DEFAULT_SCRIPT, llm_latency=llm_latency, genai_latency=genai_latency,
+                          embedding_latency=embedding_latency, knowledge=FIXTURE_KNOWLEDGE), \
+            override_settings(KCART_TRACING=True):
+        fixtures = seed_fixture_data(num_customers, num_suppliers, seed=seed)
+
+        jobs = []
+        for i, user in enumerate(fixtures['customers']):
+            jobs.append((user, CUSTOMER_CONVERSATIONS[i % len(CUSTOMER_CONVERSATIONS)], {}))
+        for i, user in enumerate(fixtures['suppliers']):
+            context = {'pending_order_id': fixtures['pending_orders'][user.id]}
+            jobs.append((user, SUPPLIER_CONVERSATIONS[i % len(SUPPLIER_CONVERSATIONS)], context))
+        random.Random(seed).shuffle(jobs)
+
+        results = []
+        lock = threading.Lock()
+        start = time.perf_counter()
+        tracing.add_trace_listener(_collect_trace)
+        try:
+            if concurrency <= 1:
+                for user, messages, context in jobs:
+                    _run_conversation(user, messages, context, results, lock)
+            else:
+                with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='loadtest') as pool:
+                    futures = [pool.submit(_run_conversation, user, messages, context, results, lock)
+                               for user, messages, context in jobs]
+                    for future in futures:
+                        future.result()
+        finally:
+            tracing.remove_trace_listener(_collect_trace)
+        wall_time = time.perf_counter() - start
+
+        ws_users = (fixtures['suppliers'] + fixtures['customers'])[:max(1, concurrency)]
+        ws_samples = async_to_sync(_websocket_phase)(ws_users, websocket_pushes) if websocket_pushes else []
+
+    return build_report(results, ws_samples, wall_time, concurrency)
+
+
+def build_report(results: list, ws_samples: list, wall_time: float, concurrency: int) -> dict:
+    stage_samples = {'request': [r['request'] for r in results]}
+    for result in results:
+        for name, seconds in result['stages']:
+            stage_samples.setdefault(name, []).append(seconds)
+    for name, seconds in ws_samples:
+        stage_samples.setdefault(name, []).append(seconds)
+
+    query_counts = [r['db_queries'] for r in results]
+    return {
+        'concurrency': concurrency,
+        'turns': len(results),
+        'errors': sum(1 for r in results if not r['ok']),
+        'wall_time_s': round(wall_time, 3),
+        'throughput_turns_per_s': round(len(results) / wall_time, 2) if wall_time else 0.0,
+        'stages': {name: _percentiles(samples) for name, samples in sorted(stage_samples.items())},
+        'tokens': {
+            'in': int(sum(r['tokens_in'] for r in results)),
+            'out': int(sum(r['tokens_out'] for r in results)),
+        },
+        'db_queries': {
+            'total': int(sum(query_counts)),
+            'per_turn_p50': float(np.percentile(query_counts, 50)) if query_counts else 0.0,
+            'per_turn_p95': float(np.percentile(query_counts, 95)) if query_counts else 0.0,
+            'per_turn_p99': float(np.percentile(query_counts, 99)) if query_counts else 0.0,
+            'per_turn_max': int(max(query_counts)) if query_counts else 0,
+            'time': _percentiles([r['db_time'] for r in results]),
+        },
+    }
@@ -1,3 +1,1056 @@
-from django.test import TestCase
+import json
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from unittest import mock
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from api.models import (
+    User, Product, Inventory, ConversationHistory, CompetitorPrice, Order, OrderItem, DemandForecast, ProductAlias,
+    Location, IdempotencyKey
+)
+from api.agent.encoding import TOOL_OUTPUT_SPECS, encode_tool_result
+from api.agent.factory import create_kcart_agent
+from api.utils.tokens import estimate_tokens
+from api.agent.memory import ConversationMemory
+from api.agent.router import route_intent, _match_intent, _normalize
+from api.testing.fakes import LatencyModel, ScriptedTurn, advance_cache_clock, offline_services
+from api.testing.fake_runware import FakeRunwareServer
+from api.testing.loadtest import run_load_test
+from api.utils import tracing
+from api.utils.image_jobs import (
+    STALE_JOB_SECONDS, ImageJobQueue, get_image_job, prompt_hash, _subscribe, _subscribers
+)
+from api.utils.catalog import CATALOG, PRICE, invalidate_product
+from api.utils.supplier_cache import get_supplier_cache_stats
+from api.utils.search import confident_match, search_products
+from api.utils.geo import PROXIMITY, LOCATION_COORDINATES, DELIVERY_RATE_ETB_PER_KM
+from api.utils.idempotency import purge_expired_keys
+from api.tools.database_tool import (
+    find_product_listings, find_basket_plan, create_order_in_db, get_comprehensive_pricing_suggestion,
+    get_demand_forecast, get_supplier_inventory, get_supplier_orders, update_order_status, update_order_statuses
+)
+from api.tools.demand_forecast import refresh_forecasts, HORIZON_DAYS
+from api.tools import database_tool
+from api.db_router import PrimaryReplicaRouter, analytic_reads, routing_context
 
-# Create your tests here.
+
+class OfflineChatTestMixin:
+    """Creates a customer, a supplier and one inventory listing."""
+
+    def setUp(self):
+        CATALOG.reset()
+        PROXIMITY.reset()
+        self.customer = User.objects.create(username='customer', role='customer')
+        self.supplier = User.objects.create(username='supplier', role='supplier')
+        self.product = Product.objects.create(product_name='Tomatoes', internal_name='tomatoes', unit='Kg')
+        Inventory.objects.create(
+            supplier=self.supplier, product=self.product, quantity_available=100, price_per_unit_etb=50,
+            status='active', available_date=timezone.now().date(),
+            expiry_date=timezone.now().date() + timedelta(days=10)
+        )
+
+    def post_chat(self, user, message):
+        client = APIClient()
+        client.force_authenticate(user=user)
+        return client.post('/api/chat/', {'message': message}, format='json')
+
+
+class ChatAPITests(OfflineChatTestMixin, TestCase):
+
+    def test_customer_turn_runs_scripted_tool_call(self):
+        script = [ScriptedTurn(r'tomatoes', [
+            {'tool_calls': [('find_product_listings', {'product_name': 'tomatoes', 'quantity': 5})]},
+            {'reply': lambda messages: f"Found: {messages[-1].content}"},
+        ])]
+        with offline_services(script=script):
+            response = self.post_chat(self.customer, 'I need 5 kg of tomatoes')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('supplier', response.data['reply'])
+        self.assertEqual(ConversationHistory.objects.filter(user=self.customer).count(), 2)
+
+    def test_supplier_fast_path_skips_agent(self):
+        with offline_services(script=[]) as fakes:
+            response = self.post_chat(self.supplier, 'show my inventory')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Tomatoes', response.data['reply'])
+        self.assertEqual(fakes['genai_client'].calls, 1)  # language detection only
+
+    def test_memory_folds_old_messages_into_summary(self):
+        with offline_services():
+            for i in range(20):
+                ConversationHistory.objects.create(user=self.customer, sender='user', message=f"message {i} " + 'word ' * 120)
+            memory = ConversationMemory(self.customer)
+            memory.load()
+            messages = memory.as_messages()
+
+        self.assertTrue(memory.state['summary'])
+        self.assertLessEqual(len(messages), 1 + 6)
+
+
+class ToolEncodingTests(TestCase):
+
+    def test_long_listing_is_truncated_with_note(self):
+        listings = [
+            {'supplier_name': f'Supplier {i}', 'supplier_id': str(i), 'price_per_unit': 50.0, 'total_price': 250.0,
+             'quantity_available': 100.0, 'available_date': '2025-01-01', 'expiry_date': None, 'extra': 'x' * 50}
+            for i in range(40)
+        ]
+        encoded = json.loads(encode_tool_result('find_product_listings', listings))
+
+        self.assertEqual(encoded['total'], 40)
+        self.assertEqual(len(encoded['rows']), 10)
+        self.assertNotIn('extra', encoded['columns'])
+        self.assertIn('more_available', encoded)
+
+    def test_result_over_the_cap_stays_valid_json(self):
+        orders = [
+            {'order_id': f'{i:08d}-aaaa-bbbb-cccc-dddddddddddd', 'notes': 'n' * 400, 'items': list(range(30))}
+            for i in range(20)
+        ]
+        encoded = encode_tool_result('unknown_tool', {'orders': orders, 'error_count': 0}, max_tokens=200)
+        decoded = json.loads(encoded)
+
+        self.assertGreater(decoded['truncated'], 0)
+        self.assertLessEqual(estimate_tokens(encoded), 200)
+        for order in decoded.get('orders', []):
+            self.assertEqual(len(order['order_id']), 36)
+            self.assertEqual(order['items'], list(range(30)))
+
+    def test_tables_over_the_cap_drop_whole_rows(self):
+        listings = [
+            {'supplier_name': 'S' * 150, 'supplier_id': f'{i:08d}-aaaa-bbbb-cccc-dddddddddddd', 'price_per_unit': 50.0}
+            for i in range(10)
+        ]
+        decoded = json.loads(encode_tool_result('find_product_listings', listings, max_tokens=250))
+
+        self.assertEqual(len(decoded['columns']), len(TOOL_OUTPUT_SPECS['find_product_listings']['lists'][()]['fields']))
+        self.assertTrue(decoded['rows'])
+        for row in decoded['rows']:
+            self.assertEqual(len(row), len(decoded['columns']))
+        self.assertEqual(decoded['total'], 10)
+        self.assertIn(f"Showing {len(decoded['rows'])} of 10", decoded['more_available'])
+
+
+class ChatConsumerTests(OfflineChatTestMixin, TransactionTestCase):
+
+    def test_group_send_reaches_connected_consumer(self):
+        from api.consumers import ChatConsumer
+
+        async def exchange():
+            communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), '/ws/chat/')
+            communicator.scope['user'] = self.supplier
+            connected, _ = await communicator.connect()
+            await communicator.receive_json_from()
+            await get_channel_layer().group_send(f'user_{self.supplier.id}', {
+                'type': 'chat_message', 'message': 'New order', 'message_type': 'order_notification',
+                'timestamp': timezone.now().isoformat(),
+            })
+            received = await communicator.receive_json_from()
+            await communicator.disconnect()
+            return connected, received
+
+        with offline_services():
+            connected, received = async_to_sync(exchange)()
+
+        self.assertTrue(connected)
+        self.assertEqual(received['message'], 'New order')
+
+
+class LoadTestHarnessTests(TransactionTestCase):
+
+    def test_small_run_reports_stages_and_queries(self):
+        report = run_load_test(conversations=4, concurrency=1, websocket_pushes=1)
+
+        self.assertEqual(report['errors'], 0)
+        self.assertGreater(report['turns'], 0)
+        for stage in ('request', 'identify_language', 'route_intent', 'llm', 'ws_push'):
+            self.assertIn(stage, report['stages'])
+            self.assertIn('p99_ms', report['stages'][stage])
+        self.assertGreater(report['db_queries']['total'], 0)
+
+
+class TracingTests(OfflineChatTestMixin, TestCase):
+
+    def test_chat_turn_is_traced_when_enabled(self):
+        tracing.METRICS.reset()
+        admin = APIClient()
+        admin.force_authenticate(user=User.objects.create(username='admin', is_staff=True, role='supplier'))
+        supplier = APIClient()
+        supplier.force_authenticate(user=self.supplier)
+        with offline_services(), override_settings(KCART_TRACING=True, KCART_TRACE_HEADER=True):
+            response = admin.post('/api/chat/', {'message': 'show my inventory'}, format='json',
+                                  HTTP_X_KCART_TRACE='1')
+            untimed = admin.post('/api/chat/', {'message': 'show my inventory'}, format='json')
+            refused = supplier.post('/api/chat/', {'message': 'show my inventory'}, format='json',
+                                    HTTP_X_KCART_TRACE='1')
+            metrics = admin.get('/api/metrics/', {'format': 'json'})
+            prometheus = admin.get('/api/metrics/')
+
+        self.assertIn('identify_language;dur=', response['Server-Timing'])
+        # Only staff requests that ask for them get the timings
+        self.assertNotIn('Server-Timing', untimed)
+        self.assertNotIn('Server-Timing', refused)
+        self.assertIn('route_intent', metrics.data['stages'])
+        self.assertGreater(metrics.data['stages']['request:chat']['db_queries']['count'], 0)
+        self.assertIn('kcart_stage_duration_ms_bucket{stage="route_intent"', prometheus.content.decode())
+
+    def test_no_trace_when_disabled(self):
+        tracing.METRICS.reset()
+        with offline_services(), override_settings(KCART_TRACING=False):
+            response = self.post_chat(self.supplier, 'show my inventory')
+
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(tracing.METRICS.traces, 0)
+
+
+class CatalogSnapshotTests(OfflineChatTestMixin, TestCase):
+
+    def test_search_is_served_without_queries(self):
+        with offline_services():
+            first = find_product_listings(self.customer, 'tomato', 5)
+            with self.assertNumQueries(0):
+                second = find_product_listings(self.customer, 'TOMATOES', 5)
+
+        self.assertEqual(first, second)
+        self.assertEqual(second[0]['supplier_name'], 'supplier')
+        self.assertEqual(second[0]['total_price'], 250.0)
+        self.assertEqual(find_product_listings(self.customer, 'tomatoes', 500), [])
+
+    def test_inventory_change_rebuilds_only_that_product(self):
+        other = User.objects.create(username='cheaper', role='supplier')
+        with offline_services():
+            find_product_listings(self.customer, 'tomatoes', 5)
+            full_rebuilds, product_rebuilds = CATALOG.stats['full_rebuilds'], CATALOG.stats['product_rebuilds']
+            with self.captureOnCommitCallbacks(execute=True):
+                Inventory.objects.create(
+                    supplier=other, product=self.product, quantity_available=20, price_per_unit_etb=45,
+                    status='active', available_date=timezone.now().date()
+                )
+            listings = find_product_listings(self.customer, 'tomatoes', 5)
+
+        self.assertEqual([l['supplier_name'] for l in listings], ['cheaper', 'supplier'])
+        self.assertEqual(CATALOG.stats['full_rebuilds'], full_rebuilds)
+        self.assertEqual(CATALOG.stats['product_rebuilds'], product_rebuilds + 1)
+
+    def test_version_counter_outlives_the_default_cache_timeout(self):
+        listing = Inventory.objects.get(product=self.product)
+        with offline_services():
+            find_product_listings(self.customer, 'tomatoes', 5)
+            for price in (48, 46):
+                with advance_cache_clock(3600), self.captureOnCommitCallbacks(execute=True):
+                    Inventory.objects.filter(pk=listing.pk).update(price_per_unit_etb=price)
+                    invalidate_product(self.product.product_id)
+                with advance_cache_clock(3600):
+                    listings = find_product_listings(self.customer, 'tomatoes', 5)
+
+        self.assertEqual(listings[0]['price_per_unit'], 46.0)
+
+
+class ProductSearchTests(OfflineChatTestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.potatoes = Product.objects.create(product_name='Potatoes', internal_name='potatoes', unit='Kg')
+        Product.objects.create(product_name='Sweet Potatoes', internal_name='sweet_potatoes', unit='Kg')
+        ProductAlias.objects.create(product=self.potatoes, alias='Spuds', normalized='spuds', kind='latin')
+
+    def test_misspellings_and_transliterations_rank_the_right_product_first(self):
+        with offline_services():
+            for query, expected in (('tomatos', 'Tomatoes'), ('TIMATIM', 'Tomatoes'), ('ቲማቲም', 'Tomatoes'),
+                                    ('potatos', 'Potatoes'), ('sweet potato', 'Sweet Potatoes'), ('spuds', 'Potatoes')):
+                with self.subTest(query):
+                    self.assertEqual(search_products(query)[0]['product_name'], expected)
+            self.assertEqual(search_products('mangoes'), [])
+
+        # Renaming a product replaces its name aliases but keeps the others
+        self.product.product_name = 'Roma Tomatoes'
+        self.product.save()
+        aliases = set(ProductAlias.objects.filter(product=self.product).values_list('normalized', flat=True))
+        self.assertEqual(aliases, {'roma tomatoes', 'tomatoes', 'ቲማቲም', 'timatim', 'tomato'})
+        self.potatoes.save()
+        self.assertTrue(ProductAlias.objects.filter(product=self.potatoes, normalized='spuds').exists())
+
+    def test_writes_act_only_on_close_matches(self):
+        Product.objects.create(product_name='Oranges', internal_name='oranges', unit='Kg')
+        Product.objects.create(product_name='Red Onions', internal_name='red_onions', unit='Kg')
+        with offline_services():
+            for query in ('orange juice', 'onion rings', 'tomato paste', 'sweet'):
+                with self.subTest(query):
+                    self.assertIsNone(confident_match(query)[0])
+            for query in ('oranges', 'tomato', 'timatim', 'red onion', 'spuds'):
+                with self.subTest(query):
+                    self.assertIsNotNone(confident_match(query)[0])
+
+            listing = database_tool.add_or_update_inventory(self.supplier, {
+                'product_name': 'orange juice', 'quantity': 5, 'price': 30, 'available_date': '2025-01-01'})
+            order = create_order_in_db(self.customer, [
+                {'product_name': 'tomatoes', 'quantity': 1, 'supplier_id': str(self.supplier.id)},
+                {'product_name': 'tomato paste', 'quantity': 1, 'supplier_id': str(self.supplier.id)},
+            ], '2025-01-02', '')
+
+        self.assertIn('Did you mean: Oranges', listing['error'])
+        self.assertFalse(Inventory.objects.filter(product__product_name='Oranges').exists())
+        # No partial order either
+        self.assertIn("'tomato paste' not found", order['error'])
+        self.assertFalse(Order.objects.exists())
+
+    def test_tools_resolve_aliases(self):
+        with offline_services():
+            listings = find_product_listings(self.customer, 'timatim', 5)
+            order = database_tool.create_order_in_db(
+                self.customer, [{'product_name': 'timatim', 'quantity': 2, 'supplier_id': str(self.supplier.id)}],
+                '2030-01-01', 'Bole'
+            )
+            # A misspelling is only suggested when writing
+            misspelled = database_tool.create_order_in_db(
+                self.customer, [{'product_name': 'tomatos', 'quantity': 2, 'supplier_id': str(self.supplier.id)}],
+                '2030-01-01', 'Bole'
+            )
+            existing = database_tool.check_existing_inventory(self.supplier, 'ቲማቲም')
+
+        self.assertEqual(listings[0]['supplier_name'], 'supplier')
+        self.assertEqual(order['items'][0]['product'], 'Tomatoes')
+        self.assertIn('Did you mean: Tomatoes', misspelled['error'])
+        self.assertEqual(existing['product_name'], 'Tomatoes')
+
+
+class SupplierViewCacheTests(OfflineChatTestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.order = Order.objects.create(user=self.customer, order_date=timezone.now(), status='pending_acceptance')
+        OrderItem.objects.create(order=self.order, product=self.product, supplier=self.supplier,
+                                 quantity=5, price_per_unit_etb=50)
+
+    def test_repeated_views_are_served_without_queries(self):
+        with offline_services():
+            hits = get_supplier_cache_stats().get('orders', {}).get('hits', 0)
+            inventory = get_supplier_inventory(self.supplier)
+            orders = get_supplier_orders(self.supplier, status_filter='pending_acceptance')
+            with self.assertNumQueries(0):
+                self.assertEqual(get_supplier_inventory(self.supplier), inventory)
+                self.assertEqual(get_supplier_orders(self.supplier, status_filter='pending_acceptance'), orders)
+
+        self.assertEqual(orders['total_orders'], 1)
+        self.assertEqual(get_supplier_cache_stats()['orders']['hits'], hits + 1)
+        self.assertGreater(get_supplier_cache_stats()['orders']['hit_ratio'], 0)
+
+    def test_supplier_changes_invalidate_their_views(self):
+        other = User.objects.create(username='other', role='supplier')
+        with offline_services():
+            get_supplier_orders(self.supplier)
+            get_supplier_inventory(other)
+            with self.captureOnCommitCallbacks(execute=True):
+                update_order_status(self.supplier, str(self.order.order_id), 'accepted')
+            orders = get_supplier_orders(self.supplier)
+            with self.assertNumQueries(0):
+                get_supplier_inventory(other)
+
+            with self.captureOnCommitCallbacks(execute=True):
+                Inventory.objects.filter(supplier=self.supplier).first().delete()
+            inventory = get_supplier_inventory(self.supplier)
+
+        self.assertEqual(orders['counts']['accepted'], 1)
+        self.assertEqual(inventory['inventory'], [])
+
+
+class DatabaseToolVariantTests(OfflineChatTestMixin, TestCase):
+    """Runs the database tools through both their sync and their async entry points."""
+
+    VARIANTS = ('sync', 'async')
+
+    def call(self, variant, name, *args, **kwargs):
+        if variant == 'sync':
+            return getattr(database_tool, name)(*args, **kwargs)
+        return async_to_sync(getattr(database_tool, f'a{name}'))(*args, **kwargs)
+
+    def test_read_tools_agree(self):
+        order = Order.objects.create(user=self.customer, order_date=timezone.now(), status='pending_acceptance')
+        OrderItem.objects.create(order=order, product=self.product, supplier=self.supplier, quantity=5, price_per_unit_etb=50)
+        calls = [
+            ('resolve_product', 'tomato'),
+            ('find_product_listings', self.customer, 'tomato', 5),
+            ('find_basket_plan', self.customer, [{'product_name': 'tomatoes', 'quantity': 5}]),
+            ('check_existing_inventory', self.supplier, 'tomatoes'),
+            ('get_comprehensive_pricing_suggestion', self.supplier, 'tomatoes'),
+            ('get_demand_forecast', self.supplier, 'tomatoes'),
+            ('get_supplier_inventory', self.supplier),
+            ('get_supplier_orders', self.supplier),
+        ]
+        for name, *args in calls:
+            results = []
+            for variant in self.VARIANTS:
+                CATALOG.reset()
+                with offline_services():
+                    results.append(self.call(variant, name, *args))
+            with self.subTest(name):
+                self.assertIsNotNone(results[0])
+                self.assertEqual(results[0], results[1])
+
+    def test_order_flow_in_both_variants(self):
+        for variant in self.VARIANTS:
+            with self.subTest(variant), offline_services():
+                channel_layer = get_channel_layer()
+                channel_name = async_to_sync(channel_layer.new_channel)()
+                async_to_sync(channel_layer.group_add)(f'user_{self.supplier.id}', channel_name)
+
+                created = self.call(variant, 'create_order_in_db', self.customer,
+                                    [{'product_name': 'tomatoes', 'quantity': 4, 'supplier_id': str(self.supplier.id)}],
+                                    '2030-01-01', 'Bole')
+                pushed = async_to_sync(channel_layer.receive)(channel_name)
+                updated = self.call(variant, 'update_order_status', self.supplier, created['order_id'], 'accepted')
+                stocked = self.call(variant, 'add_or_update_inventory', self.supplier, {
+                    'product_name': 'tomatoes', 'quantity': 80, 'price': 50, 'available_date': '2030-01-01'
+                })
+
+                self.assertEqual(created['total'], 200.0)
+                self.assertEqual(pushed['order_id'], created['order_id'])
+                self.assertTrue(updated['success'])
+                self.assertEqual(Order.objects.get(order_id=created['order_id']).status, 'accepted')
+                self.assertEqual(stocked['action'], 'updated')
+
+
+class ReplicaRoutingTests(TestCase):
+
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+        replica = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}
+        self.settings_override = override_settings(DATABASES={**settings.DATABASES, 'replica': replica})
+
+    def test_analytic_reads_go_to_replica_until_the_user_writes(self):
+        with offline_services(), self.settings_override:
+            with routing_context(user_id=1):
+                self.assertIsNone(self.router.db_for_read(Product))
+                with analytic_reads():
+                    self.assertEqual(self.router.db_for_read(Product), 'replica')
+                    self.router.db_for_write(Order)
+                    self.assertIsNone(self.router.db_for_read(Product))
+
+            # The same user's next request is pinned to the primary; others are not
+            with routing_context(user_id=1), analytic_reads():
+                self.assertIsNone(self.router.db_for_read(Product))
+            with routing_context(user_id=2), analytic_reads():
+                self.assertEqual(self.router.db_for_read(Product), 'replica')
+
+    def test_without_replica_everything_uses_primary(self):
+        with routing_context(user_id=1), analytic_reads():
+            self.assertIsNone(self.router.db_for_read(Product))
+
+
+class ToolExecutionLayerTests(OfflineChatTestMixin, TestCase):
+    """Runs scripted tool calls through the agent executor's ToolExecutionLayer."""
+
+    def run_agent(self, steps):
+        script = [ScriptedTurn(r'stock', steps + [{'reply': 'done'}])]
+        with offline_services(script=script):
+            agent = create_kcart_agent(self.supplier)
+            agent.invoke({'input': 'check my stock', 'chat_history': []})
+        return agent.tool_layer.stats
+
+    def test_repeated_read_only_calls_are_memoized_within_a_run(self):
+        with mock.patch.object(database_tool, 'get_supplier_inventory', return_value=[]) as inventory:
+            stats = self.run_agent([
+                {'tool_calls': [('get_my_inventory', {}), ('get_my_inventory', {})]},
+                {'tool_calls': [('get_my_inventory', {})]},
+            ])
+
+        self.assertEqual(inventory.call_count, 1)
+        self.assertEqual(stats['memo_hits'], 2)
+
+    def test_read_only_batch_runs_concurrently(self):
+        # Each lookup waits for the other one: the barrier only opens if both run at once
+        barrier = threading.Barrier(2, timeout=5)
+        threads = []
+
+        def lookup(*args, **kwargs):
+            threads.append(threading.current_thread().name)
+            barrier.wait()
+            return []
+
+        with mock.patch.object(database_tool, 'get_supplier_inventory', side_effect=lookup), \
+                mock.patch.object(database_tool, 'get_supplier_orders', side_effect=lookup):
+            stats = self.run_agent([{'tool_calls': [('get_my_inventory', {}), ('get_my_orders', {})]}])
+
+        self.assertEqual(stats['parallel_batches'], 1)
+        self.assertEqual(len(threads), 2)
+        self.assertTrue(all(name.startswith('kcart-tool') for name in threads))
+
+    def test_mutating_tool_clears_memo_and_acts_as_barrier(self):
+        calls = []
+
+        def record(name, result):
+            return lambda *args, **kwargs: calls.append(name) or result
+
+        with mock.patch.object(database_tool, 'get_supplier_inventory', side_effect=record('inventory', [])), \
+                mock.patch.object(database_tool, 'update_order_status', side_effect=record('update', {'success': True})):
+            stats = self.run_agent([{'tool_calls': [
+                ('get_my_inventory', {}),
+                ('update_order_status', {'order_id': 'abc', 'new_status': 'accepted'}),
+                ('get_my_inventory', {}),
+            ]}])
+
+        self.assertEqual(calls, ['inventory', 'update', 'inventory'])
+        self.assertEqual(stats['memo_hits'], 0)
+        self.assertEqual(stats['parallel_batches'], 0)
+
+    def test_check_image_job_is_never_memoized(self):
+        statuses = iter([{'status': 'running'}, {'status': 'done', 'image_url': 'https://img/1.png'}])
+
+        with mock.patch('api.utils.image_jobs.get_image_job', side_effect=lambda job_id: next(statuses)) as get_job:
+            stats = self.run_agent([
+                {'tool_calls': [('check_image_job', {'job_id': 'job-1'})]},
+                {'tool_calls': [('check_image_job', {'job_id': 'job-1'})]},
+            ])
+
+        self.assertEqual(get_job.call_count, 2)
+        self.assertEqual(stats['memo_hits'], 0)
+
+
+class BasketPlanTests(OfflineChatTestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        onions = Product.objects.create(product_name='Red Onions', internal_name='red_onions', unit='Kg')
+        cheaper = User.objects.create(username='cheaper', role='supplier')
+        today = timezone.now().date()
+        for supplier, product, quantity, price in (
+            (cheaper, self.product, 20, 45), (cheaper, onions, 50, 35), (self.supplier, onions, 50, 28),
+        ):
+            Inventory.objects.create(supplier=supplier, product=product, quantity_available=quantity,
+                                     price_per_unit_etb=price, status='active', available_date=today)
+
+    def test_cheapest_plan_splits_quantity_across_suppliers(self):
+        items = [{'product_name': 'tomatoes', 'quantity': 30}, {'product_name': 'onions', 'quantity': 10},
+                 {'product_name': 'mangoes', 'quantity': 1}]
+        with offline_services():
+            result = find_basket_plan(self.customer, items)
+
+        self.assertEqual(result['total_cost'], 20 * 45 + 10 * 50 + 10 * 28)
+        self.assertEqual(result['supplier_count'], 2)
+        self.assertEqual(result['not_found'], ['mangoes'])
+        self.assertEqual(sum(i['quantity'] for i in result['order_items'] if i['product_name'] == 'Tomatoes'), 30)
+
+    def test_fewest_suppliers_plan_is_served_without_queries(self):
+        items = [{'product_name': 'tomatoes', 'quantity': 10}, {'product_name': 'onions', 'quantity': 10}]
+        with offline_services():
+            find_basket_plan(self.customer, items)
+            with self.assertNumQueries(0):
+                result = find_basket_plan(self.customer, items, minimize_suppliers=True)
+
+        self.assertEqual(result['supplier_count'], 1)
+        self.assertEqual(result['plan'][0]['supplier_name'], 'supplier')
+        self.assertEqual(result['total_cost'], 780.0)
+        self.assertEqual(result['cheapest_total'], 730.0)
+
+    def test_basket_plan_is_placed_as_an_order(self):
+        items = [{'product_name': 'tomatoes', 'quantity': 30}, {'product_name': 'onions', 'quantity': 10.5}]
+        with offline_services():
+            plan = find_basket_plan(self.customer, items)
+            order = create_order_in_db(self.customer, plan['order_items'], '2025-01-01', '')
+
+        self.assertTrue(order.get('success'), order)
+        self.assertEqual(order['total'], plan['total_cost'])
+        self.assertEqual(OrderItem.objects.filter(order_id=order['order_id']).count(), len(plan['order_items']))
+
+    def test_failed_item_leaves_no_partial_order(self):
+        items = [{'product_name': 'tomatoes', 'quantity': 30}, {'product_name': 'onions', 'quantity': 10}]
+        create = OrderItem.objects.create
+        calls = []
+
+        def fail_second(**kwargs):
+            calls.append(kwargs)
+            if len(calls) == 2:
+                raise RuntimeError('connection lost')
+            return create(**kwargs)
+
+        with offline_services():
+            plan = find_basket_plan(self.customer, items)
+            with mock.patch.object(OrderItem.objects, 'create', side_effect=fail_second):
+                order = create_order_in_db(self.customer, plan['order_items'], '2025-01-01', '')
+
+        self.assertIn('error', order)
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderItem.objects.exists())
+
+
+class GeoRankingTests(OfflineChatTestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        User.objects.filter(pk=self.supplier.pk).update(default_location='Mekele, Tigray')
+        self.customer.default_location = 'Addis Ababa, Addis Ababa'
+        self.customer.save()
+        nearby = User.objects.create(username='nearby', role='supplier', default_location='Adama, Oromia')
+        Inventory.objects.create(supplier=nearby, product=self.product, quantity_available=50,
+                                 price_per_unit_etb=55, status='active', available_date=timezone.now().date())
+
+    def test_locations_are_seeded_with_a_distance_matrix(self):
+        self.assertEqual(Location.objects.count(), len(LOCATION_COORDINATES))
+        with offline_services():
+            self.assertEqual(PROXIMITY.locate('Bole road, addis ababa'), 'Addis Ababa, Addis Ababa')
+            self.assertIsNone(PROXIMITY.locate('Nairobi'))
+            self.assertLess(abs(PROXIMITY.distance('Addis Ababa', 'Adama') - 100), 25)
+            self.assertEqual(PROXIMITY.distances.dtype.name, 'float32')
+
+    def test_version_counter_outlives_the_default_cache_timeout(self):
+        adama = Location.objects.get(name='Adama, Oromia')
+        with offline_services():
+            PROXIMITY.sync()
+            # Move Adama next to Addis Ababa, then back; each change must reach the matrix
+            distances = []
+            for latitude, longitude in ((9.03, 38.75), (8.54, 39.27)):
+                with advance_cache_clock(3600), self.captureOnCommitCallbacks(execute=True):
+                    adama.latitude, adama.longitude = latitude, longitude
+                    adama.save()
+                with advance_cache_clock(3600):
+                    distances.append(PROXIMITY.distance('Addis Ababa', 'Adama'))
+
+        self.assertLess(distances[0], 5)
+        self.assertGreater(distances[1], 50)
+
+    def test_listings_rank_by_price_plus_delivery(self):
+        with offline_services():
+            listings = find_product_listings(self.customer, 'tomatoes', 5)
+            elsewhere = find_product_listings(self.customer, 'tomatoes', 5, 'Mekele')
+            self.customer.default_location = None
+            by_price = find_product_listings(self.customer, 'tomatoes', 5)
+
+        self.assertEqual([l['supplier_name'] for l in listings], ['nearby', 'supplier'])
+        nearby = listings[0]
+        self.assertAlmostEqual(nearby['delivery_cost'], nearby['distance_km'] * DELIVERY_RATE_ETB_PER_KM, places=0)
+        self.assertEqual(nearby['total_with_delivery'], round(nearby['total_price'] + nearby['delivery_cost'], 2))
+        self.assertEqual(elsewhere[0]['supplier_name'], 'supplier')
+        self.assertEqual(elsewhere[0]['distance_km'], 0.0)
+        self.assertEqual([l['supplier_name'] for l in by_price], ['supplier', 'nearby'])
+        self.assertIsNone(by_price[0]['distance_km'])
+
+    def test_order_reports_delivery_area_and_distance(self):
+        items = [{'product_name': 'Tomatoes', 'quantity': 5, 'supplier_id': str(self.supplier.id)}]
+        with offline_services():
+            result = create_order_in_db(self.customer, items, '2030-01-01', 'Bole, Addis Ababa')
+
+        self.assertEqual(result['delivery_location'], 'Bole, Addis Ababa')
+        self.assertEqual(result['delivery_area'], 'Addis Ababa, Addis Ababa')
+        notification = ConversationHistory.objects.get(user=self.supplier, message_type='order_notification')
+        self.assertIn('km from Mekele, Tigray', notification.message)
+
+
+class IdempotentOrderTests(OfflineChatTestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.items = [{'product_name': 'Tomatoes', 'quantity': 5, 'supplier_id': str(self.supplier.id)}]
+
+    def notifications(self):
+        return ConversationHistory.objects.filter(user=self.supplier, message_type='order_notification').count()
+
+    def test_retry_replays_the_original_order(self):
+        with offline_services():
+            first = create_order_in_db(self.customer, self.items, '2030-01-01', 'Adama', idempotency_key='k1')
+            retry = create_order_in_db(self.customer, [dict(self.items[0], quantity=5.0)], '2030-01-01', 'Adama',
+                                       idempotency_key='k1')
+            other = create_order_in_db(self.customer, self.items, '2030-01-01', 'Adama', idempotency_key='k2')
+
+        self.assertTrue(retry.pop('idempotent_replay'))
+        self.assertEqual(retry, first)
+        self.assertNotEqual(other['order_id'], first['order_id'])
+        self.assertEqual(Order.objects.count(), 2)
+        self.assertEqual(self.notifications(), 2)
+
+    def test_reused_key_with_different_items_is_refused(self):
+        with offline_services():
+            first = create_order_in_db(self.customer, self.items, '2030-01-01', 'Adama', idempotency_key='k1')
+            changed = create_order_in_db(self.customer, [dict(self.items[0], quantity=6)], '2030-01-01', 'Adama',
+                                         idempotency_key='k1')
+
+        self.assertEqual(changed['idempotency'], 'conflict')
+        self.assertEqual(changed['original_order_id'], first['order_id'])
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_rest_endpoint_replays_with_header(self):
+        client = APIClient()
+        client.force_authenticate(user=self.customer)
+        body = {'items': self.items, 'delivery_date': '2030-01-01', 'delivery_location': 'Adama'}
+        with offline_services():
+            created = client.post('/api/orders/', body, format='json', HTTP_IDEMPOTENCY_KEY='abc')
+            replayed = client.post('/api/orders/', body, format='json', HTTP_IDEMPOTENCY_KEY='abc')
+
+        self.assertEqual(created.status_code, 201)
+        self.assertEqual(replayed.status_code, 200)
+        self.assertEqual(replayed['Idempotent-Replayed'], 'true')
+        self.assertEqual(replayed.json(), created.json())
+        self.assertEqual(self.notifications(), 1)
+
+    def test_resent_chat_message_places_its_order_once(self):
+        order = ('create_order', {'items': json.dumps(self.items), 'delivery_date': '2030-01-01',
+                                  'delivery_location': 'Adama'})
+        # The agent repeats its create_order call within the turn, then the client resends the message
+        script = [ScriptedTurn(r'tomatoes', [{'tool_calls': [order]}, {'tool_calls': [order]}, {'reply': 'Ordered.'}])]
+        client = APIClient()
+        client.force_authenticate(user=self.customer)
+        with offline_services(script=script):
+            for _ in range(2):
+                response = client.post('/api/chat/', {'message': 'order 5 kg of tomatoes'}, format='json',
+                                       HTTP_IDEMPOTENCY_KEY='message-1')
+                self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(self.notifications(), 1)
+
+    def test_expired_keys_are_purged_and_reusable(self):
+        with offline_services():
+            first = create_order_in_db(self.customer, self.items, '2030-01-01', 'Adama', idempotency_key='k1')
+            IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+            again = create_order_in_db(self.customer, self.items, '2030-01-01', 'Adama', idempotency_key='k1')
+
+        self.assertNotIn('idempotent_replay', again)
+        self.assertNotEqual(again['order_id'], first['order_id'])
+        self.assertEqual(purge_expired_keys(), 0)
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(purge_expired_keys(), 1)
+
+
+class IntentRouterTests(OfflineChatTestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.order = Order.objects.create(user=self.customer, order_date=timezone.now())
+        OrderItem.objects.create(order=self.order, product=self.product, supplier=self.supplier, quantity=2,
+                                 price_per_unit_etb=50)
+
+    def test_patterns_pick_intent_and_arguments(self):
+        order_id = str(self.order.order_id)
+        cases = {
+            'Please show me my inventory': ('get_my_inventory', {}),
+            "show today's pending orders": ('get_my_orders', {'status_filter': 'pending_acceptance',
+                                                              'date_filter': 'today'}),
+            'list orders for 2025-01-02': ('get_my_orders', {'status_filter': None, 'date_filter': '2025-01-02'}),
+            f'accept order {order_id}': ('update_order_status', {'order_id': order_id, 'new_status': 'accepted',
+                                                                'decline_reason': ''}),
+            f'decline order {order_id} because out of stock': (
+                'update_order_status', {'order_id': order_id, 'new_status': 'declined',
+                                        'decline_reason': 'out of stock'}),
+        }
+        for message, (intent, args) in cases.items():
+            with self.subTest(message=message):
+                match = _match_intent(_normalize(message))
+                self.assertEqual((match['intent'], match['args']), (intent, args))
+
+        for message in (f'decline order {order_id}', 'add 20 kg of tomatoes at 45 birr', 'what should I charge?'):
+            with self.subTest(message=message):
+                self.assertIsNone(_match_intent(_normalize(message)))
+
+    def test_decline_without_reason_falls_back_to_agent(self):
+        order_id = str(self.order.order_id)
+        with offline_services():
+            self.assertIsNone(route_intent(self.supplier, f'decline order {order_id}'))
+            self.assertIsNone(route_intent(self.customer, 'show my inventory'))
+            self.assertEqual(Order.objects.get(pk=self.order.pk).status, 'pending_acceptance')
+
+            reply = route_intent(self.supplier, f'reject order {order_id}, reason: no trucks today')
+
+        self.assertIn('declined', reply)
+        self.assertEqual(Order.objects.get(pk=self.order.pk).status, 'declined')
+
+
+class BulkOrderActionTests(OfflineChatTestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        other = User.objects.create(username='other', role='supplier')
+        self.orders = []
+        for supplier in (self.supplier, self.supplier, self.supplier, other):
+            order = Order.objects.create(user=self.customer, order_date=timezone.now())
+            OrderItem.objects.create(order=order, product=self.product, supplier=supplier, quantity=2,
+                                     price_per_unit_etb=50)
+            self.orders.append(str(order.order_id))
+
+    def test_updates_many_orders_in_one_transaction(self):
+        mine, theirs = self.orders[:3], self.orders[3]
+        updates = [
+            {'order_id': mine[0], 'new_status': 'accepted'},
+            {'order_id': mine[1].upper(), 'new_status': 'declined', 'decline_reason': 'Out of stock'},
+            {'order_id': mine[2], 'new_status': 'completed'},
+            {'order_id': theirs, 'new_status': 'accepted'},
+            {'order_id': 'not-an-id', 'new_status': 'accepted'},
+            {'order_id': mine[0], 'new_status': 'declined'},
+        ]
+        with offline_services():
+            channel_layer = get_channel_layer()
+            channel_name = async_to_sync(channel_layer.new_channel)()
+            async_to_sync(channel_layer.group_add)(f'user_{self.customer.id}', channel_name)
+            # Savepoint, select with the ownership check, one UPDATE per status, one INSERT,
+            # the suppliers to invalidate, release
+            with self.assertNumQueries(7):
+                result = update_order_statuses(self.supplier, updates)
+            pushed = async_to_sync(channel_layer.receive)(channel_name)
+
+        self.assertEqual((result['updated'], result['failed']), (2, 4))
+        self.assertEqual([r.get('success', False) for r in result['results']], [True, True, False, False, False, False])
+        self.assertEqual(result['results'][3]['error'], 'You do not have items in this order')
+        self.assertEqual(result['results'][4]['error'], 'Order not found')
+        self.assertEqual(result['results'][5]['error'], 'Duplicate order_id in this request')
+        self.assertEqual(Order.objects.get(pk=mine[1]).status, 'declined')
+        self.assertEqual(Order.objects.get(pk=mine[2]).status, 'pending_acceptance')
+        self.assertEqual(pushed['type'], 'chat_messages')
+        self.assertEqual([m['order_id'] for m in pushed['messages']], mine[:2])
+        self.assertIn('Out of stock', pushed['messages'][1]['message'])
+        self.assertEqual(ConversationHistory.objects.filter(user=self.customer, message_type='order_response').count(), 2)
+
+    def test_bulk_endpoint_applies_one_action_to_all_orders(self):
+        client = APIClient()
+        client.force_authenticate(user=self.supplier)
+        with offline_services():
+            response = client.post('/api/orders/action/bulk/', {'order_ids': self.orders[:3], 'action': 'accept'},
+                                   format='json')
+            refused = client.post('/api/orders/action/bulk/', {'order_ids': 'nope', 'action': 'accept'}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['updated'], 3)
+        self.assertEqual(Order.objects.filter(status='accepted').count(), 3)
+        self.assertEqual(refused.status_code, 400)
+
+
+class InventoryImportTests(OfflineChatTestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.onions = Product.objects.create(product_name='Red Onions', internal_name='red_onions', unit='Kg')
+        today = timezone.now().date()
+        CompetitorPrice.objects.bulk_create([
+            CompetitorPrice(product=self.product, date=today - timedelta(days=1), competitor_tier=tier,
+                            price_per_unit_etb=price)
+            for tier, price in (('local_shop', 45), ('supermarket', 55))
+        ])
+
+    def test_import_upserts_valid_rows_and_reports_the_rest(self):
+        expiry = (timezone.now().date() + timedelta(days=20)).isoformat()
+        upload = (
+            "Product,Qty,Price,Expiry\n"
+            f"tomatoes,80,70,{expiry}\n"
+            "red onions,not a number,30,\n"
+            "red onions,40,30,\n"
+            "mango juice,10,20,\n"
+            "tomatoes,90,52,\n"
+        )
+        with offline_services():
+            CATALOG.sync()
+            with self.captureOnCommitCallbacks(execute=True):
+                result = database_tool.import_inventory(self.supplier, upload)
+            # The bulk upsert bypasses the Inventory signals but still refreshes the catalog snapshot
+            refreshed = CATALOG.listings('tomatoes', 1)
+
+        self.assertEqual((result['created'], result['updated'], result['invalid'], result['skipped']), (1, 1, 2, 1))
+        statuses = [row['status'] for row in result['rows']]
+        self.assertEqual(statuses, ['skipped', 'invalid', 'created', 'invalid', 'updated'])
+        self.assertEqual(result['rows'][1]['errors'], ['quantity must be a number'])
+        self.assertEqual(result['rows'][3]['errors'], ["product 'mango juice' not found"])
+        self.assertEqual(result['rows'][0]['pricing_hint']['position'], 'above_market')
+        self.assertEqual(result['rows'][4]['pricing_hint'],
+                         {'market_price': 50.0, 'suggested_range': [45.0, 55.0], 'difference_pct': 4.0,
+                          'position': 'within_market'})
+        self.assertIsNone(result['rows'][2]['pricing_hint'])
+
+        tomatoes = Inventory.objects.get(supplier=self.supplier, product=self.product)
+        self.assertEqual((tomatoes.quantity_available, float(tomatoes.price_per_unit_etb)), (90, 52))
+        self.assertIsNone(tomatoes.expiry_date)
+        self.assertEqual(Inventory.objects.get(supplier=self.supplier, product=self.onions).quantity_available, 40)
+        self.assertEqual(refreshed[0][PRICE], 52)
+
+    def test_invalid_repeat_does_not_supersede_a_valid_row(self):
+        upload = "Product,Qty,Price\nred onions,40,30\nred onions,not a number,30\n"
+        with offline_services():
+            result = database_tool.import_inventory(self.supplier, upload)
+
+        self.assertEqual([row['status'] for row in result['rows']], ['created', 'invalid'])
+        self.assertEqual(Inventory.objects.get(supplier=self.supplier, product=self.onions).quantity_available, 40)
+
+    def test_dry_run_and_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(user=self.supplier)
+        rows = [{'product': 'Red Onions', 'quantity': 5, 'price': 25}]
+        with offline_services():
+            preview = client.post('/api/inventory/import/', {'rows': rows, 'dry_run': True}, format='json')
+            guessed = client.post('/api/inventory/import/', {'rows': [dict(rows[0], product='onion rings')],
+                                                             'dry_run': True}, format='json')
+            self.assertFalse(Inventory.objects.filter(product=self.onions).exists())
+            saved = client.post('/api/inventory/import/', {'rows': rows}, format='json')
+            missing = client.post('/api/inventory/import/', {'csv': 'product,price\nRed Onions,25'}, format='json')
+            client.force_authenticate(user=self.customer)
+            refused = client.post('/api/inventory/import/', {'rows': rows}, format='json')
+
+        self.assertEqual(preview.status_code, 200)
+        self.assertEqual(preview.json()['rows'][0]['status'], 'would_create')
+        self.assertEqual(guessed.json()['rows'][0]['errors'], ["product 'onion rings' not found (did you mean Red Onions?)"])
+        self.assertEqual(saved.json()['rows'][0]['status'], 'created')
+        self.assertTrue(Inventory.objects.filter(supplier=self.supplier, product=self.onions).exists())
+        self.assertEqual(missing.status_code, 400)
+        self.assertIn('quantity', missing.json()['error'])
+        self.assertEqual(refused.status_code, 403)
+
+
+class PricingAnalyticsTests(OfflineChatTestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        today = timezone.now().date()
+        prices = []
+        for age in range(730):
+            day = today - timedelta(days=age)
+            seasonal = 1 + 0.3 * math.cos(2 * math.pi * (day.month - 8) / 12)  # Peaks in August
+            prices.append(CompetitorPrice(product=self.product, date=day, competitor_tier='local_shop',
+                                          price_per_unit_etb=round(50 * seasonal, 2)))
+        CompetitorPrice.objects.bulk_create(prices)
+
+        for age, (price, quantity) in enumerate(((40, 8), (50, 4), (60, 2)) * 5, start=1):
+            order = Order.objects.create(user=self.customer, order_date=timezone.now() - timedelta(days=age * 5))
+            OrderItem.objects.create(order=order, product=self.product, supplier=self.supplier,
+                                     quantity=quantity, price_per_unit_etb=price)
+
+    def test_suggestion_reports_seasonality_and_is_cached_per_day(self):
+        with offline_services():
+            first = get_comprehensive_pricing_suggestion(self.supplier, 'tomatoes')
+            with self.assertNumQueries(1):  # Product lookup only
+                second = get_comprehensive_pricing_suggestion(self.supplier, 'tomatoes')
+
+        self.assertEqual(first, second)
+        index = first['analytics']['seasonal_index']
+        self.assertEqual(index.index(max(index)), 7)
+        self.assertLess(first['analytics']['elasticity'], -1)
+        low, high = first['suggested_range']
+        self.assertLessEqual(low, first['suggested_price'])
+        self.assertLessEqual(first['suggested_price'], high)
+
+
+class DemandForecastTests(OfflineChatTestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        now = timezone.now()
+        for age in range(1, 57):
+            order_date = now - timedelta(days=age)
+            order = Order.objects.create(user=self.customer, order_date=order_date)
+            quantity = 30 if order_date.weekday() == 5 else 10  # Busy Saturdays
+            OrderItem.objects.create(order=order, product=self.product, supplier=self.supplier,
+                                     quantity=quantity, price_per_unit_etb=50)
+
+    def test_nightly_refresh_stores_weekly_pattern_read_in_one_query(self):
+        report = refresh_forecasts()
+        with offline_services():
+            get_demand_forecast(self.supplier, 'tomatoes')
+            with self.assertNumQueries(1):
+                result = get_demand_forecast(self.supplier, 'tomatoes', days=HORIZON_DAYS)
+
+        self.assertEqual(report['rows'], HORIZON_DAYS)
+        self.assertEqual(DemandForecast.objects.count(), HORIZON_DAYS)
+        by_weekday = {date.fromisoformat(day['date']).weekday(): day['quantity'] for day in result['daily']}
+        self.assertGreater(by_weekday[5], 2 * by_weekday[2])
+        self.assertAlmostEqual(by_weekday[2], 10, delta=3)
+        self.assertEqual(result['your_listed_quantity'], 100.0)
+
+
+class ImageJobQueueTests(OfflineChatTestMixin, TransactionTestCase):
+
+    def wait_for(self, job_id, timeout=10):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            job = get_image_job(job_id)
+            if job['status'] in ('completed', 'failed'):
+                return job
+            time.sleep(0.02)
+        self.fail(f'Image job {job_id} did not finish')
+
+    def test_jobs_share_connection_cache_and_push_to_supplier(self):
+        with offline_services(), FakeRunwareServer(latency=LatencyModel(100)) as server:
+            channel_layer = get_channel_layer()
+            channel_name = async_to_sync(channel_layer.new_channel)()
+            async_to_sync(channel_layer.group_add)(f'user_{self.supplier.id}', channel_name)
+
+            queue = ImageJobQueue(workers=2, api_key='test', url=server.url)
+            try:
+                started = time.perf_counter()
+                first = queue.submit(self.supplier, 'Fresh red tomatoes in a basket')
+                second = queue.submit(self.supplier, '  fresh RED tomatoes, in a basket! ')
+                self.assertLess(time.perf_counter() - started, 0.1)  # never waits for synthesis
+                self.assertEqual(first['status'], 'queued')
+                self.assertEqual(second['job_id'], first['job_id'])
+
+                job = self.wait_for(first['job_id'])
+                other = self.wait_for(queue.submit(self.supplier, 'Golden butter block')['job_id'])
+                cached = queue.submit(self.supplier, 'fresh red tomatoes in a basket')
+            finally:
+                queue.shutdown()
+
+            pushed = async_to_sync(channel_layer.receive)(channel_name)
+
+        self.assertEqual(job['status'], 'completed')
+        self.assertEqual(other['status'], 'completed')
+        self.assertEqual(cached, {'status': 'completed', 'image_url': job['image_url'], 'cached': True})
+        self.assertEqual(server.inference_requests, 2)
+        self.assertEqual(server.connections, 1)
+        self.assertEqual(pushed['message_type'], 'image_ready')
+        self.assertIn(job['image_url'], pushed['message'])
+        self.assertTrue(ConversationHistory.objects.filter(user=self.supplier, message_type='image_ready').exists())
+
+    def test_failed_job_is_reported(self):
+        with offline_services(), FakeRunwareServer(fail_prompts=['broken']) as server:
+            queue = ImageJobQueue(workers=1, api_key='test', url=server.url)
+            try:
+                job = self.wait_for(queue.submit(self.supplier, 'broken image')['job_id'])
+            finally:
+                queue.shutdown()
+
+        self.assertEqual(job['status'], 'failed')
+        self.assertIsNone(job['image_url'])
+        # The saved history matches the live push
+        self.assertTrue(ConversationHistory.objects.filter(user=self.supplier, message_type='image_failed').exists())
+        self.assertFalse(ConversationHistory.objects.filter(user=self.supplier, message_type='image_ready').exists())
+
+    def test_stalled_job_is_taken_over(self):
+        waiting = User.objects.create(username='waiting', role='supplier')
+        description = 'Fresh red tomatoes in a basket'
+        key = prompt_hash(description)
+        with offline_services(), FakeRunwareServer() as server:
+            # A job whose worker died mid-run: still 'running', never updated again
+            cache.set(f'image_inflight:{key}', 'lost-job')
+            cache.set('image_job:lost-job', {
+                'job_id': 'lost-job', 'status': 'running', 'prompt': description, 'prompt_hash': key,
+                'image_url': None, 'error': None, 'updated_at': time.time() - STALE_JOB_SECONDS - 1,
+            })
+            _subscribe('lost-job', str(waiting.id))
+
+            queue = ImageJobQueue(workers=1, api_key='test', url=server.url)
+            try:
+                submitted = queue.submit(self.supplier, description)
+                job = self.wait_for(submitted['job_id'])
+            finally:
+                queue.shutdown()
+
+        self.assertNotEqual(submitted['job_id'], 'lost-job')
+        self.assertEqual(job['status'], 'completed')
+        # Users waiting on the lost job are notified by its replacement
+        for user in (waiting, self.supplier):
+            self.assertTrue(ConversationHistory.objects.filter(user=user, message_type='image_ready').exists())
+
+    def test_concurrent_subscribers_are_all_kept(self):
+        users = [User.objects.create(username=f'supplier{i}', role='supplier') for i in range(8)]
+        with offline_services():
+            _subscribe('job-1', str(self.supplier.id))
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                list(pool.map(lambda user: _subscribe('job-1', str(user.id)), users))
+            _subscribe('job-1', str(self.supplier.id))
+            subscribers = async_to_sync(_subscribers)('job-1')
+
+        self.assertEqual(subscribers[0], str(self.supplier.id))
+        self.assertEqual(sorted(subscribers), sorted([str(self.supplier.id)] + [str(user.id) for user in users]))
@@ -0,0 +1,328 @@
+"""
+Supplier assignment for a multi-product basket.
+
+Each requested product has a demand and a set of listings (price, stock,
+supplier). Stock is per supplier *and* product, so once the set of suppliers
+to buy from is fixed, the cheapest assignment is exact and independent per
+product: fill the demand from the cheapest open listings first. What is hard
+is choosing that set when every additional supplier carries a cost (or the
+number of suppliers is capped) - a capacitated facility-location problem.
+
+BasketSolver handles it with local search from several starting points:
+
+- the unrestricted cheapest assignment (optimal when suppliers are free);
+- greedy covers that repeatedly open the supplier covering most of the
+  remaining basket, plain and seeded with each of the COVER_STARTS
+  widest-reaching suppliers.
+
+Each is improved by dropping suppliers, swapping one open supplier for a
+closed one and merging two open suppliers into one closed one while the
+objective (goods cost + supplier_cost per supplier) decreases, and the best
+result wins. solve_exact() enumerates supplier sets for small instances and
+is used by the benchmark to measure the gap.
+"""
+import time
+import random
+from itertools import combinations
+
+EPSILON = 1e-9
+MAX_SEARCH_ROUNDS = 100
+COVER_STARTS = 5
+MAX_EXACT_SUPPLIERS = 16
+
+
+def _fill(listings: list, demand: float, open_suppliers):
+    """Cheapest way to buy demand from open suppliers: (cost, [(supplier, quantity, price)]) or None."""
+    remaining = demand
+    cost = 0.0
+    allocation = []
+    for price, stock, supplier_id in listings:
+        if stock <= 0 or (open_suppliers is not None and supplier_id not in open_suppliers):
+            continue
+        take = min(remaining, stock)
+        allocation.append((supplier_id, take, price))
+        cost += take * price
+        remaining -= take
+        if remaining <= EPSILON:
+            return cost, allocation
+    return None
+
+
+def _used_suppliers(fills: dict) -> set:
+    return {supplier_id for _, allocation in fills.values() for supplier_id, _, _ in allocation}
+
+
+class BasketSolver:
+    """
+    demands:  {product: quantity}
+    listings: {product: [(price, stock, supplier_id), ...]}
+    supplier_cost: objective charge per distinct supplier used
+    max_suppliers: hard cap on distinct suppliers (best effort if infeasible)
+
+    Products whose total stock is below the demand are bought as far as stock
+    allows and reported in the plan's 'shortfall'.
+    """
+
+    def __init__(self, demands: dict, listings: dict, supplier_cost: float = 0.0, max_suppliers: int = None):
+        self.supplier_cost = supplier_cost
+        self.max_suppliers = max_suppliers
+        self.listings = {product: sorted(listings.get(product, ())) for product in demands}
+        self.demands = {}
+        self.shortfall = {}
+        for product, demand in demands.items():
+            total_stock = sum(stock for _, stock, _ in self.listings[product] if stock > 0)
+            if total_stock + EPSILON < demand:
+                self.shortfall[product] = demand - total_stock
+            if total_stock > EPSILON:
+                self.demands[product] = min(demand, total_stock)
+
+        self.listed_by = {}
+        self.stock = {}
+        for product in self.demands:
+            for _, stock, supplier_id in self.listings[product]:
+                if stock > 0:
+                    self.listed_by.setdefault(supplier_id, set()).add(product)
+                    self.stock[(product, supplier_id)] = stock
+
+    def objective(self, fills: dict) -> float:
+        return sum(cost for cost, _ in fills.values()) + self.supplier_cost * len(_used_suppliers(fills))
+
+    def _refill(self, fills: dict, products, open_suppliers):
+        """Re-solves only the given products for a new supplier set; None if any becomes infeasible."""
+        updated = dict(fills)
+        for product in products:
+            result = _fill(self.listings[product], self.demands[product], open_suppliers)
+            if result is None:
+                return None
+            updated[product] = result
+        return updated
+
+    def _products_using(self, fills: dict) -> dict:
+        using = {}
+        for product, (_, allocation) in fills.items():
+            for supplier_id, _, _ in allocation:
+                using.setdefault(supplier_id, set()).add(product)
+        return using
+
+    # ============ STARTING POINTS ============
+
+    def cheapest_start(self) -> dict:
+        return {product: _fill(self.listings[product], demand, None) for product, demand in self.demands.items()}
+
+    def cover_start(self, first=None) -> dict:
+        """Greedy cover, optionally forced to open `first` before choosing by coverage."""
+        remaining = dict(self.demands)
+        opened = set()
+        while any(q > EPSILON for q in remaining.values()):
+            best = first if first is not None and not opened else None
+            best_score = 0.0
+            if best is None:
+                for supplier_id in self.listed_by:
+                    if supplier_id in opened:
+                        continue
+                    score = self._coverage(supplier_id, remaining)
+                    if score > best_score + EPSILON:
+                        best, best_score = supplier_id, score
+            if best is None:
+                break
+            opened.add(best)
+            for product in self.listed_by[best]:
+                remaining[product] = max(0.0, remaining[product] - self.stock[(product, best)])
+        return self._refill({}, self.demands, opened)
+
+    def _coverage(self, supplier_id, remaining: dict) -> float:
+        """Share of the remaining basket (each product weighted equally) a supplier could cover."""
+        return sum(
+            min(remaining[product], self.stock[(product, supplier_id)]) / self.demands[product]
+            for product in self.listed_by[supplier_id] if remaining[product] > EPSILON
+        )
+
+    # ============ LOCAL SEARCH ============
+
+    def improve(self, fills: dict) -> dict:
+        if not self.supplier_cost and self.max_suppliers is None:
+            return fills  # The cheapest assignment is already optimal
+
+        for _ in range(MAX_SEARCH_ROUNDS):
+            move = self._best_drop(fills) or self._first_swap(fills) or self._first_merge(fills)
+            if move is None:
+                break
+            fills = move
+        return fills
+
+    def _over_cap(self, fills: dict) -> bool:
+        return self.max_suppliers is not None and len(_used_suppliers(fills)) > self.max_suppliers
+
+    def _best_drop(self, fills: dict):
+        current = self.objective(fills)
+        using = self._products_using(fills)
+        open_suppliers = set(using)
+        forced = self._over_cap(fills)
+
+        best, best_value = None, None
+        for supplier_id, products in using.items():
+            candidate = self._refill(fills, products, open_suppliers - {supplier_id})
+            if candidate is None:
+                continue
+            value = self.objective(candidate)
+            if best_value is None or value < best_value:
+                best, best_value = candidate, value
+
+        if best is not None and (forced or best_value < current - EPSILON):
+            return best
+        return None
+
+    def _first_swap(self, fills: dict):
+        current = self.objective(fills)
+        using = self._products_using(fills)
+        open_suppliers = set(using)
+        limit = len(open_suppliers) if self.max_suppliers is None else min(len(open_suppliers), self.max_suppliers)
+
+        for supplier_id, products in using.items():
+            for candidate_id, candidate_products in self.listed_by.items():
+                if candidate_id in open_suppliers:
+                    continue
+                swapped = (open_suppliers - {supplier_id}) | {candidate_id}
+                candidate = self._refill(fills, products | candidate_products, swapped)
+                if candidate is None or len(_used_suppliers(candidate)) > limit:
+                    continue
+                if self.objective(candidate) < current - EPSILON:
+                    return candidate
+        return None
+
+    def _first_merge(self, fills: dict):
+        """Replaces two open suppliers with one closed supplier (escapes optima a single swap cannot)."""
+        current = self.objective(fills)
+        using = self._products_using(fills)
+        open_suppliers = set(using)
+
+        for (first, first_products), (second, second_products) in combinations(using.items(), 2):
+            products = first_products | second_products
+            for candidate_id, candidate_products in self.listed_by.items():
+                if candidate_id in open_suppliers:
+                    continue
+                merged = (open_suppliers - {first, second}) | {candidate_id}
+                candidate = self._refill(fills, products | candidate_products, merged)
+                if candidate is not None and self.objective(candidate) < current - EPSILON:
+                    return candidate
+        return None
+
+    # ============ SOLVE ============
+
+    def solve(self) -> dict:
+        starts = [self.cheapest_start()]
+        if self.supplier_cost or self.max_suppliers is not None:
+            # Greedy covers seeded with each of the widest-reaching suppliers
+            seeds = sorted(self.listed_by, key=lambda s: -self._coverage(s, self.demands))[:COVER_STARTS]
+            for first in [None, *seeds]:
+                cover = self.cover_start(first)
+                if cover is not None:
+                    starts.append(cover)
+
+        best = None
+        for fills in starts:
+            fills = self.improve(fills)
+            key = (self._over_cap(fills), self.objective(fills))
+            if best is None or key < best[0]:
+                best = (key, fills)
+        return self._plan(best[1])
+
+    def _plan(self, fills: dict) -> dict:
+        suppliers = _used_suppliers(fills)
+        cost = sum(cost for cost, _ in fills.values())
+        return {
+            'allocations': {product: allocation for product, (_, allocation) in fills.items()},
+            'cost': cost,
+            'suppliers': sorted(suppliers),
+            'objective': cost + self.supplier_cost * len(suppliers),
+            'within_supplier_limit': self.max_suppliers is None or len(suppliers) <= self.max_suppliers,
+            'shortfall': dict(self.shortfall),
+        }
+
+
+def optimize_basket(demands: dict, listings: dict, supplier_cost: float = 0.0, max_suppliers: int = None) -> dict:
+    """Returns the cheapest plan found; see BasketSolver."""
+    return BasketSolver(demands, listings, supplier_cost, max_suppliers).solve()
+
+
+def solve_exact(demands: dict, listings: dict, supplier_cost: float = 0.0, max_suppliers: int = None):
+    """
+    Optimal plan by enumerating every supplier set (at most MAX_EXACT_SUPPLIERS
+    candidates). Returns the best objective, or None if no set is feasible.
+    """
+    solver = BasketSolver(demands, listings, supplier_cost, max_suppliers)
+    candidates = sorted(solver.listed_by)
+    if len(candidates) > MAX_EXACT_SUPPLIERS:
+        raise ValueError(f"solve_exact supports at most {MAX_EXACT_SUPPLIERS} suppliers, got {len(candidates)}")
+
+    largest = len(candidates) if max_suppliers is None else min(max_suppliers, len(candidates))
+    best = None
+    for size in range(1, largest + 1):
+        for opened in combinations(candidates, size):
+            fills = solver._refill({}, solver.demands, set(opened))
+            if fills is not None:
+                value = solver.objective(fills)
+                if best is None or value < best:
+                    best = value
+    return best
+
+
+# ============ BENCHMARK ============
+
+def random_instance(rng: random.Random, num_products: int, num_suppliers: int, listing_probability: float = 0.5):
+    """A random basket: demands of 5-50 units and listings priced around a per-product base price."""
+    suppliers = [f'supplier_{i}' for i in range(num_suppliers)]
+    demands, listings = {}, {}
+    for p in range(num_products):
+        product = f'product_{p}'
+        base_price = rng.uniform(20, 300)
+        demands[product] = round(rng.uniform(5, 50), 1)
+        listings[product] = [
+            (round(base_price * rng.uniform(0.85, 1.25), 2), round(rng.uniform(5, 120), 1), supplier_id)
+            for supplier_id in suppliers if rng.random() < listing_probability
+        ]
+    return demands, listings
+
+
+def run_benchmark(instances: int = 50, num_products: int = 6, num_suppliers: int = 12,
+                  supplier_cost: float = 150.0, seed: int = 0, exact: bool = True) -> dict:
+    """
+    Solves random instances with the heuristic (and, for small ones, exactly)
+    and reports solve times and the optimality gap.
+    """
+    rng = random.Random(seed)
+    times, gaps = [], []
+    optimal = 0
+    for _ in range(instances):
+        demands, listings = random_instance(rng, num_products, num_suppliers)
+
+        started = time.perf_counter()
+        plan = optimize_basket(demands, listings, supplier_cost)
+        times.append((time.perf_counter() - started) * 1000)
+
+        if exact and num_suppliers <= MAX_EXACT_SUPPLIERS:
+            best = solve_exact(demands, listings, supplier_cost)
+            if best is not None:
+                gap = (plan['objective'] - best) / best
+                gaps.append(gap)
+                optimal += gap <= EPSILON
+
+    times.sort()
+    report = {
+        'instances': instances,
+        'products': num_products,
+        'suppliers': num_suppliers,
+        'supplier_cost': supplier_cost,
+        'solve_ms': {
+            'mean': round(sum(times) / len(times), 3),
+            'p50': round(times[len(times) // 2], 3),
+            'max': round(times[-1], 3),
+        },
+    }
+    if gaps:
+        report['gap'] = {
+            'optimal_share': round(optimal / len(gaps), 3),
+            'mean_pct': round(100 * sum(gaps) / len(gaps), 3),
+            'max_pct': round(100 * max(gaps), 3),
+        }
+    return report
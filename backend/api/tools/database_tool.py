@@ -1,120 +1,367 @@
-from django.db.models import Avg, Q, F
+import uuid
+from decimal import Decimal
+import numpy as np
+from django.db import transaction
+from django.db.models import F, Exists, OuterRef
 from django.utils import timezone
 from datetime import timedelta, datetime
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
 from api.models import (
     User, Product, Inventory, Order, OrderItem, 
-    CompetitorPrice, Notification, ConversationHistory
+    CompetitorPrice, Notification, ConversationHistory, DemandForecast
 )
+from api.utils.catalog import CATALOG, invalidate_product, PRICE, QUANTITY, SUPPLIER_NAME, SUPPLIER_ID, SUPPLIER_LOCATION
+from api.utils.geo import PROXIMITY
+from api.utils.supplier_cache import cached_supplier_view, invalidate_supplier_views
+from api.utils.dual_io import dual
+from api.utils.search import best_match, confident_match, search_products
+from api.db_router import analytic, analytic_reads
+from api.tools.basket_optimizer import optimize_basket
+from api.tools import pricing_analytics, demand_forecast, inventory_import
+from api.utils import idempotency
 
-def find_product_listings(user, product_name: str, requested_quantity: float) -> list:
+# Every function below that touches the database is written once, as a
+# coroutine taking the I/O adapter `db`, and exposed as a sync and an async
+# entry point (e.g. find_product_listings / afind_product_listings); see
+# api/utils/dual_io.py.
+
+async def _resolve_product(db, product_name: str):
+    """
+    Resolves a free-text product name to the best-ranked Product of the
+    product search (names, Amharic names, transliterations, misspellings;
+    see api/utils/search.py). Returns None if no product matches.
+    """
+    if not product_name:
+        return None
+    product_id = await db.run(best_match, product_name)
+    if product_id is None:
+        return None
+    return await db.first(Product.objects.filter(pk=product_id))
+
+resolve_product, aresolve_product = dual(_resolve_product)
+
+
+async def _resolve_product_for_write(db, product_name: str):
+    """
+    Like _resolve_product, but for tools that create or change data: only a
+    close match is used (see confident_match in api/utils/search.py), so
+    "orange juice" never becomes Oranges. Returns (product, suggestions).
+    """
+    if not product_name:
+        return None, []
+    product_id, suggestions = await db.run(confident_match, product_name)
+    if product_id is None:
+        return None, suggestions
+    return await db.first(Product.objects.filter(pk=product_id)), []
+
+
+def _product_not_found(product_name: str, suggestions: list) -> str:
+    if not suggestions:
+        return f"Product '{product_name}' not found"
+    return (f"Product '{product_name}' not found. Did you mean: {', '.join(suggestions)}? "
+            f"Confirm with the user and retry with the exact product name.")
+
+
+def _ranked_listings(listings: list, requested_quantity: float, customer_location) -> list:
+    """
+    Formats catalog listing tuples, best first: by total price plus delivery
+    to the customer's location (see api/utils/geo.py), or by price when the
+    location is unknown.
+    """
+    order, distance_km, delivery_cost = PROXIMITY.rank(
+        [listing[PRICE] for listing in listings], [listing[SUPPLIER_LOCATION] for listing in listings],
+        customer_location, requested_quantity)
+    results = []
+    for i in order.tolist():
+        price, quantity, supplier_name, supplier_id, available_date, expiry_date, image_url, location = listings[i]
+        total_price = price * requested_quantity
+        known = not np.isnan(distance_km[i])
+        results.append({
+            'supplier_name': supplier_name,
+            'supplier_id': supplier_id,
+            'supplier_location': location,
+            'quantity_available': quantity,
+            'price_per_unit': price,
+            'total_price': total_price,
+            'distance_km': round(float(distance_km[i]), 1) if known else None,
+            'delivery_cost': round(float(delivery_cost[i]), 2) if known else None,
+            'total_with_delivery': round(total_price + float(delivery_cost[i]), 2) if known else None,
+            'available_date': available_date,
+            'expiry_date': expiry_date,
+            'image_url': image_url,
+        })
+    return results
+
+
+async def _find_product_listings(db, user, product_name: str, requested_quantity: float, delivery_location: str = None) -> list:
     """
     Finds all suppliers who have enough stock of a product.
-    Returns a price-sorted list of supplier options.
+    Returns supplier options ranked by total price plus delivery cost to
+    delivery_location (default: the customer's default_location), or by
+    price when the location is unknown.
+
+    Served from the in-process catalog snapshot (no queries); falls back to
+    the database when the snapshot cannot be synchronised.
     """
     try:
-        # Find the product by name (case-insensitive search)
-        product = Product.objects.filter(
-            Q(product_name__icontains=product_name) | 
-            Q(internal_name__icontains=product_name)
-        ).first()
-        
-        if not product:
-            return []
-        
-        # Find inventory items with sufficient quantity
-        inventory_items = Inventory.objects.filter(
-            product=product,
-            quantity_available__gte=requested_quantity,
-            status='active'
-        ).select_related('supplier').order_by('price_per_unit_etb')
-        
-        # Format results
-        results = []
-        for item in inventory_items:
-            results.append({
-                'supplier_name': item.supplier.username,
-                'supplier_id': str(item.supplier.id),
-                'quantity_available': float(item.quantity_available),
-                'price_per_unit': float(item.price_per_unit_etb),
-                'total_price': float(item.price_per_unit_etb) * requested_quantity,
-                'available_date': item.available_date.isoformat(),
-                'expiry_date': item.expiry_date.isoformat() if item.expiry_date else None,
-                'image_url': item.image_url if item.image_url else None,
-            })
-        
-        return results
+        customer_location = delivery_location or getattr(user, 'default_location', None)
+        listings = await db.run(CATALOG.listings, product_name, requested_quantity)
+        if listings is None:
+            # Find the product by name (case-insensitive search)
+            product = await _resolve_product(db, product_name)
+
+            if not product:
+                return []
+
+            # Find inventory items with sufficient quantity
+            inventory_items = await db.all(Inventory.objects.filter(
+                product=product,
+                quantity_available__gte=requested_quantity,
+                status='active'
+            ).select_related('supplier').order_by('price_per_unit_etb'))
+            listings = [
+                (float(item.price_per_unit_etb), float(item.quantity_available), item.supplier.username,
+                 str(item.supplier.id), item.available_date.isoformat(),
+                 item.expiry_date.isoformat() if item.expiry_date else None, item.image_url or None,
+                 item.supplier.default_location or None)
+                for item in inventory_items
+            ]
+
+        return await db.run(_ranked_listings, listings, requested_quantity, customer_location)
         
     except Exception as e:
         print(f"Error in find_product_listings: {e}")
         return []
 
+find_product_listings, afind_product_listings = dual(_find_product_listings)
+
+
+async def _basket_listings(db, product_names: list) -> dict:
+    """
+    Resolves every requested name and loads its active listings in one pass:
+    {name: (product_id, product_name, [(price, stock, supplier_id, supplier_name), ...])}.
+    Names that match no product are left out. Served from the catalog snapshot,
+    or with a product search per name and one inventory query when it is unavailable.
+    """
+    if await db.run(CATALOG.sync):
+        resolved = {}
+        for name in product_names:
+            product = await db.run(CATALOG.resolve, name)
+            if product is not None:
+                resolved[name] = (product.product_id, product.product_name, [
+                    (listing[PRICE], listing[QUANTITY], listing[SUPPLIER_ID], listing[SUPPLIER_NAME])
+                    for listing in product.listings
+                ])
+        return resolved
+
+    resolved = {}
+    for name in product_names:
+        matches = await db.run(search_products, name, 1)
+        if matches:
+            resolved[name] = (matches[0]['product_id'], matches[0]['product_name'], [])
+
+    by_product = {product_id: listings for product_id, _, listings in resolved.values()}
+    inventory_rows = await db.all(Inventory.objects.filter(
+        product_id__in=list(by_product), status='active'
+    ).order_by('price_per_unit_etb').values_list(
+        'product_id', 'price_per_unit_etb', 'quantity_available', 'supplier_id', 'supplier__username'
+    ))
+    for product_id, price, quantity, supplier_id, supplier_name in inventory_rows:
+        by_product[str(product_id)].append((float(price), float(quantity), str(supplier_id), supplier_name))
+    return resolved
+
+
+async def _find_basket_plan(db, user, items: list, minimize_suppliers: bool = False, max_suppliers: int = None) -> dict:
+    """
+    Finds the cheapest way to buy a whole basket.
+    items format: [{'product_name': str, 'quantity': float}, ...]
+
+    Assigns each product to one or more suppliers (splitting a quantity when
+    no single supplier has enough stock) to minimize the total cost. With
+    minimize_suppliers, the fewest distinct suppliers come first and cost
+    second; max_suppliers caps their number. Returns a plan grouped by
+    supplier plus 'order_items' ready to pass to create_order_in_db.
+    """
+    try:
+        requested = {}
+        for item in items:
+            name = str(item['product_name']).strip()
+            requested[name] = requested.get(name, 0.0) + float(item['quantity'])
+
+        resolved = await _basket_listings(db, list(requested))
+
+        demands, listings, names, supplier_names = {}, {}, {}, {}
+        for name, quantity in requested.items():
+            if name not in resolved:
+                continue
+            product_id, product_name, product_listings = resolved[name]
+            demands[product_id] = demands.get(product_id, 0.0) + quantity
+            names[product_id] = product_name
+            listings[product_id] = [(price, stock, supplier_id) for price, stock, supplier_id, _ in product_listings]
+            supplier_names.update({supplier_id: supplier_name for _, _, supplier_id, supplier_name in product_listings})
+
+        # Charging more per supplier than any basket can cost makes the supplier count the primary objective
+        supplier_cost = 0.0
+        if minimize_suppliers:
+            supplier_cost = 1.0 + sum(
+                quantity * max((price for price, _, _ in listings[product_id]), default=0.0)
+                for product_id, quantity in demands.items()
+            )
+
+        cheapest = optimize_basket(demands, listings)
+        plan = optimize_basket(demands, listings, supplier_cost, max_suppliers) if supplier_cost or max_suppliers else cheapest
+
+        by_supplier = {}
+        order_items = []
+        for product_id, allocation in plan['allocations'].items():
+            for supplier_id, quantity, price in allocation:
+                entry = by_supplier.setdefault(supplier_id, {
+                    'supplier_id': supplier_id,
+                    'supplier_name': supplier_names.get(supplier_id),
+                    'items': [],
+                    'subtotal': 0.0,
+                })
+                subtotal = round(quantity * price, 2)
+                entry['items'].append({
+                    'product_name': names[product_id],
+                    'quantity': quantity,
+                    'price_per_unit': price,
+                    'subtotal': subtotal,
+                })
+                entry['subtotal'] = round(entry['subtotal'] + subtotal, 2)
+                order_items.append({'product_name': names[product_id], 'quantity': quantity, 'supplier_id': supplier_id})
+
+        return {
+            'plan': sorted(by_supplier.values(), key=lambda entry: -entry['subtotal']),
+            'order_items': order_items,
+            'total_cost': round(plan['cost'], 2),
+            'supplier_count': len(plan['suppliers']),
+            'cheapest_total': round(cheapest['cost'], 2),
+            'within_supplier_limit': plan['within_supplier_limit'],
+            'not_found': [name for name in requested if name not in resolved],
+            'short_stock': [
+                {'product_name': names[product_id], 'requested': demands[product_id],
+                 'available': round(demands[product_id] - shortfall, 2)}
+                for product_id, shortfall in plan['shortfall'].items()
+            ],
+        }
 
-def create_order_in_db(user, items: list, delivery_date: str, delivery_location: str) -> dict:
+    except Exception as e:
+        print(f"Error in find_basket_plan: {e}")
+        return {'error': str(e)}
+
+find_basket_plan, afind_basket_plan = dual(_find_basket_plan)
+
+
+def normalize_order_items(items: list) -> list:
+    """The order items as compared for idempotency: names casefolded, quantities as floats, in a stable order."""
+    normalized = [
+        {'product_name': str(item.get('product_name', '')).strip().casefold(),
+         'quantity': float(item.get('quantity') or 0), 'supplier_id': str(item.get('supplier_id', ''))}
+        for item in items
+    ]
+    return sorted(normalized, key=lambda item: (item['product_name'], item['supplier_id'], item['quantity']))
+
+
+async def _create_order_in_db(db, user, items: list, delivery_date: str, delivery_location: str,
+                              idempotency_key: str = None) -> dict:
     """
     Creates a new order with multiple items.
     items format: [{'product_name': str, 'quantity': float, 'supplier_id': str}, ...]
+    delivery_location is free text (default: the customer's default_location);
+    the known location it names is reported as delivery_area, and suppliers
+    are told their distance to it.
     Returns order details or error.
+
+    With an idempotency_key, a retry of the same request returns the original
+    response (marked idempotent_replay) without creating anything or
+    notifying suppliers again; see api/utils/idempotency.py.
     """
+    # Validate user is a customer
+    if user.role != 'customer':
+        return {'error': 'Only customers can create orders'}
+    if not idempotency_key:
+        return await _place_order(db, user, items, delivery_date, delivery_location)
+
     try:
-        # Validate user is a customer
-        if user.role != 'customer':
-            return {'error': 'Only customers can create orders'}
-        
-        # Create the order
-        order = Order.objects.create(
-            user=user,
-            order_date=timezone.now(),
-            status='pending_acceptance'
-        )
-        
-        suppliers_involved = {}  # Changed to dict to track items per supplier
-        order_items_created = []
-        
-        # Create order items
-        for item_data in items:
-            # Find product
-            product = Product.objects.filter(
-                Q(product_name__icontains=item_data['product_name']) |
-                Q(internal_name__icontains=item_data['product_name'])
-            ).first()
-            
-            if not product:
-                continue
-            
-            # Find inventory item
+        payload = {
+            'items': normalize_order_items(items),
+            'delivery_date': delivery_date,
+            'delivery_location': delivery_location or '',
+        }
+    except (AttributeError, TypeError, ValueError) as e:
+        return {'error': f'Invalid order items: {e}'}
+    claim = await db.run(idempotency.claim, user, 'create_order', str(idempotency_key), payload)
+    if claim.outcome == idempotency.REPLAY:
+        return dict(claim.response, idempotent_replay=True)
+    if claim.outcome != idempotency.NEW:
+        return claim.response
+
+    try:
+        result = await _place_order(db, user, items, delivery_date, delivery_location)
+    except BaseException:
+        await db.run(idempotency.release, claim.record)
+        raise
+    await db.run(idempotency.complete, claim.record, result, result.get('order_id'))
+    return result
+
+create_order_in_db, acreate_order_in_db = dual(_create_order_in_db)
+
+
+def _create_order_rows(user, items: list, products: list) -> tuple:
+    """
+    Creates the order and one item per listing still active, in one transaction.
+    Returns (order, item details, {supplier: item details}).
+    """
+    suppliers_involved = {}
+    order_items_created = []
+    with transaction.atomic():
+        order = Order.objects.create(user=user, order_date=timezone.now(), status='pending_acceptance')
+        for item_data, product in zip(items, products):
             inventory = Inventory.objects.filter(
                 product=product,
                 supplier_id=item_data['supplier_id'],
                 status='active'
-            ).first()
-            
+            ).select_related('supplier').first()
             if not inventory:
                 continue
             
-            # Create order item with supplier reference
-            order_item = OrderItem.objects.create(
+            # Basket plans carry float quantities; prices are Decimal
+            quantity = Decimal(str(item_data['quantity']))
+            OrderItem.objects.create(
                 order=order,
                 product=product,
                 supplier=inventory.supplier,
-                quantity=item_data['quantity'],
+                quantity=quantity,
                 price_per_unit_etb=inventory.price_per_unit_etb
             )
             
             item_details = {
                 'product': product.product_name,
-                'quantity': float(item_data['quantity']),
+                'quantity': float(quantity),
                 'price_per_unit': float(inventory.price_per_unit_etb),
-                'subtotal': float(inventory.price_per_unit_etb * item_data['quantity'])
+                'subtotal': float(inventory.price_per_unit_etb * quantity)
             }
-            
             order_items_created.append(item_details)
-            
-            # Track items per supplier
-            if inventory.supplier not in suppliers_involved:
-                suppliers_involved[inventory.supplier] = []
-            suppliers_involved[inventory.supplier].append(item_details)
+            suppliers_involved.setdefault(inventory.supplier, []).append(item_details)
+    return order, order_items_created, suppliers_involved
+
+
+async def _place_order(db, user, items: list, delivery_date: str, delivery_location: str) -> dict:
+    """Creates the order and its items and notifies each supplier (see create_order_in_db)."""
+    try:
+        delivery_location = delivery_location or user.default_location
+        delivery_area = await db.run(PROXIMITY.locate, delivery_location)
+        
+        # Resolve every product first: an unclear name must not place a partial order
+        products = []
+        for item_data in items:
+            product, suggestions = await _resolve_product_for_write(db, item_data['product_name'])
+            if not product:
+                return {'error': _product_not_found(item_data['product_name'], suggestions)}
+            products.append(product)
+        
+        # The order and its items are written in one transaction
+        order, order_items_created, suppliers_involved = await db.run(_create_order_rows, user, items, products)
         
         # Send order notifications to suppliers as chat messages
         for supplier, supplier_items in suppliers_involved.items():
@@ -127,7 +374,11 @@ def create_order_in_db(user, items: list, delivery_date: str, delivery_location:
 **Order Date:** {order.order_date.strftime('%Y-%m-%d %H:%M')}
 **Delivery Date:** {delivery_date}
 **Delivery Location:** {delivery_location}
-
+"""
+            distance = await db.run(PROXIMITY.distance, supplier.default_location, delivery_area)
+            if distance is not None:
+                notification_message += f"**Distance:** ~{distance:g} km from {supplier.default_location}\n"
+            notification_message += """
 **Items Ordered:**
 """
             
@@ -143,7 +394,8 @@ def create_order_in_db(user, items: list, delivery_date: str, delivery_location:
 Please review the order details and respond by accepting or declining this order."""
             
             # Save as chat message in supplier's conversation history
-            chat_message = ConversationHistory.objects.create(
+            chat_message = await db.create(
+                ConversationHistory,
                 user=supplier,
                 sender='bot',
                 message=notification_message,
@@ -153,9 +405,8 @@ Please review the order details and respond by accepting or declining this order
             
             # Send via WebSocket to supplier's chat
             try:
-                channel_layer = get_channel_layer()
                 user_group_name = f'user_{supplier.id}'
-                async_to_sync(channel_layer.group_send)(
+                await db.group_send(
                     user_group_name,
                     {
                         'type': 'chat_message',
@@ -175,6 +426,7 @@ Please review the order details and respond by accepting or declining this order
             'status': order.status,
             'delivery_date': delivery_date,
             'delivery_location': delivery_location,
+            'delivery_area': delivery_area,
             'items': order_items_created,
             'total': sum(item['subtotal'] for item in order_items_created)
         }
@@ -184,7 +436,7 @@ Please review the order details and respond by accepting or declining this order
         return {'error': str(e)}
 
 
-def check_existing_inventory(user, product_name: str) -> dict:
+async def _check_existing_inventory(db, user, product_name: str) -> dict:
     """
     Checks if the authenticated supplier has inventory for a product.
     Returns inventory details or None.
@@ -195,19 +447,16 @@ def check_existing_inventory(user, product_name: str) -> dict:
             return None
         
         # Find product
-        product = Product.objects.filter(
-            Q(product_name__icontains=product_name) |
-            Q(internal_name__icontains=product_name)
-        ).first()
+        product = await _resolve_product(db, product_name)
         
         if not product:
             return None
         
         # Find inventory
-        inventory = Inventory.objects.filter(
+        inventory = await db.first(Inventory.objects.filter(
             supplier=user,
             product=product
-        ).first()
+        ))
         
         if not inventory:
             return None
@@ -226,77 +475,140 @@ def check_existing_inventory(user, product_name: str) -> dict:
         print(f"Error in check_existing_inventory: {e}")
         return None
 
+check_existing_inventory, acheck_existing_inventory = dual(_check_existing_inventory)
 
-def get_comprehensive_pricing_suggestion(user, product_name: str, days_of_history: int = 30) -> dict:
+
+@analytic
+async def _get_comprehensive_pricing_suggestion(db, user, product_name: str, days_of_history: int = 30) -> dict:
     """
     Provides pricing suggestions based on competitor prices and historical sales.
-    Returns market insights.
+    Returns market insights: per-tier averages over the requested period plus
+    trend, seasonality, volatility and price elasticity over the full history
+    (see api/tools/pricing_analytics.py).
     """
     try:
         # Find product
-        product = Product.objects.filter(
-            Q(product_name__icontains=product_name) |
-            Q(internal_name__icontains=product_name)
-        ).first()
+        product = await _resolve_product(db, product_name)
         
         if not product:
             return {'error': 'Product not found'}
         
-        # Calculate date range
-        end_date = timezone.now().date()
-        start_date = end_date - timedelta(days=days_of_history)
-        
-        # Query competitor prices
-        competitor_prices = CompetitorPrice.objects.filter(
-            product=product,
-            date__gte=start_date,
-            date__lte=end_date
-        ).values('competitor_tier').annotate(avg_price=Avg('price_per_unit_etb'))
-        
-        competitor_avg = {}
-        for cp in competitor_prices:
-            competitor_avg[cp['competitor_tier']] = float(cp['avg_price'])
-        
-        # Query highest-volume sales price in last 30 days
-        recent_orders = OrderItem.objects.filter(
-            product=product,
-            order__order_date__gte=timezone.now() - timedelta(days=30)
-        ).order_by('-quantity').first()
+        today = timezone.now().date()
+        series = await db.run(pricing_analytics.get_series, product.product_id, today)
+        analytics = pricing_analytics.analyze(series)
+        competitor_avg = pricing_analytics.window_averages(series, days_of_history)
+        highest_volume_price = series['highest_volume_price']
         
-        highest_volume_price = None
-        if recent_orders:
-            highest_volume_price = float(recent_orders.price_per_unit_etb)
-        
-        return {
+        result = {
             'product_name': product.product_name,
             'competitor_averages': competitor_avg,
             'highest_volume_price_last_30_days': highest_volume_price,
             'analysis_period_days': days_of_history,
+            'analytics': pricing_analytics.public_analytics(analytics),
+            'insights': pricing_analytics.describe(analytics),
             'recommendation': _generate_price_recommendation(competitor_avg, highest_volume_price)
         }
         
+        reference = _market_reference_price(competitor_avg, highest_volume_price)
+        if reference:
+            suggestion = pricing_analytics.suggest_price(reference, analytics, today)
+            result.update(suggestion)
+            low, high = suggestion['suggested_range']
+            result['recommendation'] = (
+                f"Suggested price: {suggestion['suggested_price']:.2f} ETB per unit "
+                f"(range {low:.2f} - {high:.2f} ETB)"
+            )
+        
+        return result
+        
     except Exception as e:
         print(f"Error in get_comprehensive_pricing_suggestion: {e}")
         return {'error': str(e)}
 
+get_comprehensive_pricing_suggestion, aget_comprehensive_pricing_suggestion = dual(_get_comprehensive_pricing_suggestion)
+
+
+def _market_reference_price(competitor_avg: dict, volume_price: float):
+    """Average of the competitor tier averages and the highest-volume sale price."""
+    prices = list(competitor_avg.values())
+    if volume_price:
+        prices.append(volume_price)
+    return sum(prices) / len(prices) if prices else None
+
 
 def _generate_price_recommendation(competitor_avg: dict, volume_price: float) -> str:
     """Helper function to generate pricing recommendation text."""
     if not competitor_avg and not volume_price:
         return "Insufficient market data for recommendation."
     
-    prices = list(competitor_avg.values())
-    if volume_price:
-        prices.append(volume_price)
-    
-    if prices:
-        avg_market = sum(prices) / len(prices)
+    avg_market = _market_reference_price(competitor_avg, volume_price)
+    if avg_market:
         return f"Suggested price range: {avg_market * 0.9:.2f} - {avg_market * 1.1:.2f} ETB per unit"
     
     return "Unable to generate recommendation."
 
 
-def add_or_update_inventory(user, details: dict) -> dict:
+@analytic
+async def _get_demand_forecast(db, user, product_name: str, days: int = 7) -> dict:
+    """
+    Returns the precomputed daily marketplace demand forecast for a product
+    (see api/tools/demand_forecast.py), with the supplier's listed stock.
+    The forecast is one indexed read; the product comes from the catalog snapshot.
+    """
+    try:
+        # Validate user is a supplier
+        if user.role != 'supplier':
+            return {'error': 'Only suppliers can view demand forecasts'}
+        
+        days = max(1, min(int(days), demand_forecast.HORIZON_DAYS))
+        listed_quantity = None
+        if await db.run(CATALOG.sync):
+            product = await db.run(CATALOG.resolve, product_name)
+            if product:
+                product_id, display_name = product.product_id, product.product_name
+                supplier_id = str(user.id)
+                listed_quantity = next((listing[QUANTITY] for listing in product.listings if listing[SUPPLIER_ID] == supplier_id), 0.0)
+        else:
+            product = await _resolve_product(db, product_name)
+            if product:
+                product_id, display_name = product.product_id, product.product_name
+        
+        if not product:
+            return {'error': 'Product not found'}
+        
+        today = timezone.now().date()
+        rows = await db.all(DemandForecast.objects.filter(
+            product_id=product_id,
+            forecast_date__gte=today,
+            forecast_date__lt=today + timedelta(days=days)
+        ).order_by('forecast_date').values_list('forecast_date', 'quantity', 'quantity_low', 'quantity_high', 'model', 'generated_at'))
+        
+        if not rows:
+            return {'product_name': display_name, 'error': 'No forecast available yet for this product'}
+        
+        return {
+            'product_name': display_name,
+            'days': len(rows),
+            'daily': [
+                {'date': day.isoformat(), 'quantity': quantity, 'low': low, 'high': high}
+                for day, quantity, low, high, _, _ in rows
+            ],
+            'total_expected': round(sum(row[1] for row in rows), 2),
+            'total_range': [round(sum(row[2] for row in rows), 2), round(sum(row[3] for row in rows), 2)],
+            'your_listed_quantity': listed_quantity,
+            'model': rows[0][4],
+            'generated_at': rows[0][5].isoformat(),
+            'note': 'Forecasts are for total marketplace demand across all suppliers.'
+        }
+        
+    except Exception as e:
+        print(f"Error in get_demand_forecast: {e}")
+        return {'error': str(e)}
+
+get_demand_forecast, aget_demand_forecast = dual(_get_demand_forecast)
+
+
+async def _add_or_update_inventory(db, user, details: dict) -> dict:
     """
     Adds new inventory or updates existing inventory for a supplier.
     details: {'product_name': str, 'quantity': float, 'price': float, 
@@ -307,14 +619,11 @@ def add_or_update_inventory(user, details: dict) -> dict:
         if user.role != 'supplier':
             return {'error': 'Only suppliers can manage inventory'}
         
-        # Find or create product
-        product = Product.objects.filter(
-            Q(product_name__icontains=details['product_name']) |
-            Q(internal_name__icontains=details['product_name'])
-        ).first()
+        # Find product
+        product, suggestions = await _resolve_product_for_write(db, details['product_name'])
         
         if not product:
-            return {'error': f"Product '{details['product_name']}' not found"}
+            return {'error': _product_not_found(details['product_name'], suggestions)}
         
         # Parse dates
         available_date = datetime.fromisoformat(details['available_date']).date() if isinstance(details['available_date'], str) else details['available_date']
@@ -335,10 +644,11 @@ def add_or_update_inventory(user, details: dict) -> dict:
         if details.get('image_url'):
             defaults_dict['image_url'] = details['image_url']
         
-        inventory, created = Inventory.objects.update_or_create(
+        inventory, created = await db.update_or_create(
+            Inventory,
+            defaults_dict,
             supplier=user,
-            product=product,
-            defaults=defaults_dict
+            product=product
         )
         
         action = 'created' if created else 'updated'
@@ -356,8 +666,164 @@ def add_or_update_inventory(user, details: dict) -> dict:
         print(f"Error in add_or_update_inventory: {e}")
         return {'error': str(e)}
 
+add_or_update_inventory, aadd_or_update_inventory = dual(_add_or_update_inventory)
+
+
+def _resolve_product_names(names: list) -> tuple:
+    """
+    ({name: (product_id, product_name)} for every name that closely matches a
+    product, {name: suggestions} for the others); see confident_match.
+    """
+    matched, product_ids, unmatched = {}, {}, {}
+    for name in names:
+        product_id, suggestions = confident_match(name)
+        if product_id is None:
+            unmatched[name] = suggestions
+        else:
+            product_ids[name] = product_id
+    product_names = dict(Product.objects.filter(pk__in=set(product_ids.values())).values_list('product_id', 'product_name'))
+    for name, product_id in product_ids.items():
+        matched[name] = (str(product_id), product_names[uuid.UUID(str(product_id))])
+    return matched, unmatched
+
+
+_IMPORT_UPDATE_FIELDS = ['quantity_available', 'price_per_unit_etb', 'available_date', 'expiry_date', 'status']
+
+
+def _upsert_inventory(user, rows: list, dry_run: bool = False) -> dict:
+    """
+    Creates or updates the supplier's listing of each product in rows
+    ([(product_id, quantity, price, available_date, expiry_date, image_url), ...],
+    one per product) with one bulk_create per image/no-image group, upserting on
+    the (supplier, product) unique key. Rows without an image_url keep the
+    listing's current image. Returns {product_id: (inventory_id, created)}.
+    """
+    product_ids = [row[0] for row in rows]
+    with transaction.atomic():
+        existing = {
+            str(product_id): str(inventory_id) for product_id, inventory_id in
+            Inventory.objects.filter(supplier=user, product_id__in=product_ids).values_list('product_id', 'inventory_id')
+        }
+        if dry_run:
+            return {product_id: (existing.get(product_id), product_id not in existing) for product_id in product_ids}
+
+        listings = [
+            Inventory(
+                supplier=user, product_id=product_id, quantity_available=quantity,
+                price_per_unit_etb=Decimal(str(round(price, 2))), status='active',
+                available_date=available_date, expiry_date=expiry_date, image_url=image_url or None,
+            )
+            for product_id, quantity, price, available_date, expiry_date, image_url in rows
+        ]
+        with_image = [listing for listing in listings if listing.image_url]
+        without_image = [listing for listing in listings if not listing.image_url]
+        for batch, update_fields in ((with_image, _IMPORT_UPDATE_FIELDS + ['image_url']), (without_image, _IMPORT_UPDATE_FIELDS)):
+            if batch:
+                Inventory.objects.bulk_create(
+                    batch, update_conflicts=True, unique_fields=['supplier', 'product'], update_fields=update_fields)
+
+        inventory_ids = dict(
+            Inventory.objects.filter(supplier=user, product_id__in=product_ids).values_list('product_id', 'inventory_id'))
+
+        # bulk_create skips the Inventory signals
+        for product_id in product_ids:
+            invalidate_product(product_id)
+        invalidate_supplier_views(user.id)
+
+    inventory_ids = {str(product_id): str(inventory_id) for product_id, inventory_id in inventory_ids.items()}
+    return {product_id: (inventory_ids.get(product_id), product_id not in existing) for product_id in product_ids}
+
+
+async def _import_inventory(db, user, content, dry_run: bool = False) -> dict:
+    """
+    Adds or updates many inventory listings from one CSV or JSON table of
+    (product, quantity, price, available_date, expiry_date, image_url) rows;
+    see api/tools/inventory_import.py.
+
+    Rows are validated column-wise, every distinct product name is resolved
+    once, and all valid rows are upserted together. When a product appears in
+    several rows the last one wins. Returns a report per row (status
+    created / updated / invalid / skipped, errors, and a pricing hint against
+    the market price) plus totals. With dry_run nothing is written and the
+    statuses read would_create / would_update.
+    """
+    try:
+        # Validate user is a supplier
+        if user.role != 'supplier':
+            return {'error': 'Only suppliers can manage inventory'}
+
+        try:
+            frame = inventory_import.parse_table(content)
+        except inventory_import.InvalidUpload as e:
+            return {'error': str(e)}
+        today = timezone.now().date()
+        frame = inventory_import.validate(frame, today)
+
+        names = [name for name in frame['product_name'].unique().tolist() if name]
+        resolved, unresolved = await db.run(_resolve_product_names, names)
+        matches = [resolved.get(name) for name in frame['product_name'].tolist()]
+        frame['product_id'] = [match[0] if match else None for match in matches]
+        for i, name in enumerate(frame['product_name'].tolist()):
+            if name and matches[i] is None:
+                suggestions = unresolved.get(name)
+                hint = f" (did you mean {', '.join(suggestions)}?)" if suggestions else ''
+                frame.at[i, 'errors'].append(f"product '{name}' not found{hint}")
+
+        valid = frame['errors'].map(len).eq(0)
+        # Only a later valid row supersedes one: an invalid repeat is reported and the valid row still imported
+        superseded = frame.loc[valid, 'product_id'].duplicated(keep='last').reindex(frame.index, fill_value=False)
+        upserted = valid & ~superseded
+
+        product_ids = sorted({product_id for product_id in frame['product_id'] if product_id})
+        with analytic_reads():
+            references = await db.run(
+                pricing_analytics.market_reference_prices, product_ids, today, inventory_import.HINT_WINDOW_DAYS)
+        hints = inventory_import.price_hints(
+            frame['price_value'].to_numpy(dtype=float),
+            frame['product_id'].map(lambda product_id: references.get(product_id, np.nan)).to_numpy(dtype=float))
+
+        rows = [
+            (row.product_id, float(row.quantity_value), float(row.price_value), row.available,
+             row.expiry, row.image_url)
+            for row in frame[upserted].itertuples()
+        ]
+        outcome = await db.run(_upsert_inventory, user, rows, dry_run) if rows else {}
+
+        report = []
+        totals = {'created': 0, 'updated': 0, 'invalid': 0, 'skipped': 0}
+        for i, row in enumerate(frame.itertuples()):
+            entry = {
+                'row': i + 1,
+                'product_name': row.product_name,
+                'matched_product': matches[i][1] if matches[i] else None,
+                'quantity': row.quantity,
+                'price': row.price,
+            }
+            if row.errors:
+                entry.update(status='invalid', errors=row.errors)
+                totals['invalid'] += 1
+            elif superseded[i]:
+                entry.update(status='skipped', errors=['a later row lists the same product'])
+                totals['skipped'] += 1
+            else:
+                inventory_id, created = outcome[row.product_id]
+                action = 'created' if created else 'updated'
+                entry.update(status=f'would_{action[:-1]}' if dry_run else action, inventory_id=inventory_id)
+                totals[action] += 1
+            entry['pricing_hint'] = hints[i]
+            report.append(entry)
+
+        return {'success': True, 'dry_run': dry_run, **totals, 'rows': report}
+
+    except Exception as e:
+        print(f"Error in import_inventory: {e}")
+        return {'error': str(e)}
+
+import_inventory, aimport_inventory = dual(_import_inventory)
 
-def get_supplier_inventory(user) -> dict:
+
+@cached_supplier_view('inventory')
+async def _get_supplier_inventory(db, user) -> dict:
     """
     Fetches all active inventory listings for the authenticated supplier.
     Also checks for items expiring within 5 days and alerts the supplier.
@@ -371,10 +837,10 @@ def get_supplier_inventory(user) -> dict:
         today = date.today()
         five_days_from_now = today + timedelta(days=5)
         
-        inventory_items = Inventory.objects.filter(
+        inventory_items = await db.all(Inventory.objects.filter(
             supplier=user,
             status='active'
-        ).select_related('product').order_by('-available_date')
+        ).select_related('product').order_by('-available_date'))
         
         all_inventory = []
         expiring_soon = []
@@ -408,10 +874,14 @@ def get_supplier_inventory(user) -> dict:
         
     except Exception as e:
         print(f"Error in get_supplier_inventory: {e}")
-        return {'inventory': [], 'expiring_soon': [], 'has_expiring_items': False}
+        return {'inventory': [], 'expiring_soon': [], 'has_expiring_items': False, 'error': str(e)}
+
+get_supplier_inventory, aget_supplier_inventory = dual(_get_supplier_inventory)
 
 
-def get_supplier_orders(user, status_filter: str = None, date_filter: str = None) -> dict:
+@cached_supplier_view('orders')
+@analytic
+async def _get_supplier_orders(db, user, status_filter: str = None, date_filter: str = None) -> dict:
     """
     Fetches all orders that contain items from this supplier.
     Returns orders grouped by status.
@@ -454,7 +924,7 @@ def get_supplier_orders(user, status_filter: str = None, date_filter: str = None
         if status_filter:
             order_items_query = order_items_query.filter(order__status=status_filter)
         
-        order_items = order_items_query
+        order_items = await db.all(order_items_query)
         
         # Group orders by status
         orders_by_status = {
@@ -476,10 +946,10 @@ def get_supplier_orders(user, status_filter: str = None, date_filter: str = None
             seen_orders.add(order.order_id)
             
             # Get all items for this order from this supplier
-            supplier_items = OrderItem.objects.filter(
+            supplier_items = await db.all(OrderItem.objects.filter(
                 order=order,
                 supplier=user
-            ).select_related('product')
+            ).select_related('product'))
             
             items_list = []
             total_amount = 0
@@ -520,8 +990,26 @@ def get_supplier_orders(user, status_filter: str = None, date_filter: str = None
         print(f"Error in get_supplier_orders: {e}")
         return {'error': str(e)}
 
+get_supplier_orders, aget_supplier_orders = dual(_get_supplier_orders)
+
+
+def _order_status_message(order_id, new_status: str, supplier_name: str, decline_reason: str = '') -> str:
+    """The chat message telling a customer that a supplier accepted or declined their order."""
+    status_text = 'accepted ✅' if new_status == 'accepted' else 'declined ❌'
+    status_emoji = '✅' if new_status == 'accepted' else '❌'
+    
+    customer_message = f"""{status_emoji} **ORDER {new_status.upper()}**
+
+Your order **#{order_id}** has been **{status_text}** by {supplier_name}."""
+    
+    if new_status == 'declined' and decline_reason:
+        customer_message += f"\n\n**Reason:** {decline_reason}"
+    elif new_status == 'accepted':
+        customer_message += "\n\nYou will receive updates about your order delivery soon."
+    return customer_message
 
-def update_order_status(user, order_id: str, new_status: str, decline_reason: str = '') -> dict:
+
+async def _update_order_status(db, user, order_id: str, new_status: str, decline_reason: str = '') -> dict:
     """
     Allows a supplier to accept or decline an order.
     Verifies the order contains items from this supplier.
@@ -533,15 +1021,15 @@ def update_order_status(user, order_id: str, new_status: str, decline_reason: st
         
         # Find the order
         try:
-            order = Order.objects.get(order_id=order_id)
+            order = await db.get(Order.objects.select_related('user'), order_id=order_id)
         except Order.DoesNotExist:
             return {'error': 'Order not found'}
         
         # Verify this supplier has items in this order
-        supplier_items = OrderItem.objects.filter(
+        supplier_items = await db.exists(OrderItem.objects.filter(
             order=order,
             supplier=user
-        ).exists()
+        ))
         
         if not supplier_items:
             return {'error': 'You do not have items in this order'}
@@ -553,24 +1041,15 @@ def update_order_status(user, order_id: str, new_status: str, decline_reason: st
         
         # Update order status
         order.status = new_status
-        order.save()
+        await db.save(order)
         
         # Send chat message to customer
         if order.user:
-            status_text = 'accepted ✅' if new_status == 'accepted' else 'declined ❌'
-            status_emoji = '✅' if new_status == 'accepted' else '❌'
-            
-            customer_message = f"""{status_emoji} **ORDER {new_status.upper()}**
-
-Your order **#{order.order_id}** has been **{status_text}** by {user.username}."""
-            
-            if new_status == 'declined' and decline_reason:
-                customer_message += f"\n\n**Reason:** {decline_reason}"
-            elif new_status == 'accepted':
-                customer_message += "\n\nYou will receive updates about your order delivery soon."
+            customer_message = _order_status_message(order.order_id, new_status, user.username, decline_reason)
             
             # Save as chat message in customer's conversation history
-            chat_message = ConversationHistory.objects.create(
+            chat_message = await db.create(
+                ConversationHistory,
                 user=order.user,
                 sender='bot',
                 message=customer_message,
@@ -580,9 +1059,8 @@ Your order **#{order.order_id}** has been **{status_text}** by {user.username}."
             
             # Send via WebSocket to customer's chat
             try:
-                channel_layer = get_channel_layer()
                 user_group_name = f'user_{order.user.id}'
-                async_to_sync(channel_layer.group_send)(
+                await db.group_send(
                     user_group_name,
                     {
                         'type': 'chat_message',
@@ -606,3 +1084,127 @@ Your order **#{order.order_id}** has been **{status_text}** by {user.username}."
         print(f"Error in update_order_status: {e}")
         return {'error': str(e)}
 
+update_order_status, aupdate_order_status = dual(_update_order_status)
+
+
+ORDER_DECISIONS = ('accepted', 'declined')
+MAX_BULK_ORDER_UPDATES = 200
+
+
+def _apply_order_statuses(user, wanted: dict) -> tuple:
+    """
+    Applies {order_id: (new_status, decline_reason)} for one supplier in one
+    transaction: one query checks that every order exists and has the
+    supplier's items, one UPDATE per status, one INSERT for all customer
+    messages. Returns ({order_id: error}, created ConversationHistory rows).
+    """
+    if not wanted:
+        return {}, []
+    with transaction.atomic():
+        orders = {
+            str(order.order_id): order
+            for order in Order.objects.filter(order_id__in=list(wanted)).annotate(
+                has_supplier_items=Exists(OrderItem.objects.filter(order=OuterRef('pk'), supplier=user))
+            ).select_related('user').select_for_update(of=('self',))
+        }
+        errors = {}
+        for order_id in wanted:
+            if order_id not in orders:
+                errors[order_id] = 'Order not found'
+            elif not orders[order_id].has_supplier_items:
+                errors[order_id] = 'You do not have items in this order'
+        updates = {order_id: update for order_id, update in wanted.items() if order_id not in errors}
+        if not updates:
+            return errors, []
+
+        for new_status in ORDER_DECISIONS:
+            order_ids = [order_id for order_id, (status, _) in updates.items() if status == new_status]
+            if order_ids:
+                Order.objects.filter(order_id__in=order_ids).update(status=new_status)
+
+        messages = ConversationHistory.objects.bulk_create([
+            ConversationHistory(
+                user=orders[order_id].user,
+                sender='bot',
+                message=_order_status_message(order_id, new_status, user.username, decline_reason),
+                message_type='order_response',
+                order=orders[order_id],
+            )
+            for order_id, (new_status, decline_reason) in updates.items() if orders[order_id].user_id
+        ])
+
+        # queryset.update() skips the Order signals
+        invalidate_supplier_views(*OrderItem.objects.filter(
+            order_id__in=list(updates)).values_list('supplier_id', flat=True).distinct())
+    return errors, messages
+
+
+async def _update_order_statuses(db, user, updates: list) -> dict:
+    """
+    Accepts or declines many of the supplier's orders at once.
+    updates format: [{'order_id': str, 'new_status': 'accepted'|'declined', 'decline_reason': str}, ...]
+
+    All orders are checked and updated in one transaction (see
+    _apply_order_statuses); afterwards each customer gets a single WebSocket
+    push carrying the messages for all of their orders. Returns a result per
+    requested order, in request order, plus updated and failed counts.
+    """
+    try:
+        # Validate user is a supplier
+        if user.role != 'supplier':
+            return {'error': 'Only suppliers can update order status'}
+        if len(updates) > MAX_BULK_ORDER_UPDATES:
+            return {'error': f'At most {MAX_BULK_ORDER_UPDATES} orders can be updated at once'}
+
+        results, wanted = [], {}
+        for update in updates:
+            order_id = str(update.get('order_id') or '').strip()
+            new_status = update.get('new_status')
+            try:
+                order_id = str(uuid.UUID(order_id))
+            except ValueError:
+                results.append({'order_id': order_id, 'error': 'Order not found'})
+                continue
+            result = {'order_id': order_id}
+            if new_status not in ORDER_DECISIONS:
+                result['error'] = f'Invalid status. Must be one of: {list(ORDER_DECISIONS)}'
+            elif order_id in wanted:
+                result['error'] = 'Duplicate order_id in this request'
+            else:
+                wanted[order_id] = (new_status, update.get('decline_reason') or '')
+                result['new_status'] = new_status
+            results.append(result)
+
+        errors, messages = await db.run(_apply_order_statuses, user, wanted)
+
+        for result in results:
+            if 'error' in result:
+                continue
+            if result['order_id'] in errors:
+                result['error'] = errors[result['order_id']]
+                del result['new_status']
+            else:
+                result['success'] = True
+
+        by_customer = {}
+        for message in messages:
+            by_customer.setdefault(message.user_id, []).append({
+                'message': message.message,
+                'message_type': 'order_response',
+                'order_id': str(message.order_id),
+                'timestamp': message.timestamp.isoformat(),
+            })
+        for customer_id, customer_messages in by_customer.items():
+            try:
+                await db.group_send(f'user_{customer_id}', {'type': 'chat_messages', 'messages': customer_messages})
+            except Exception as e:
+                print(f"Error sending chat messages to customer: {e}")
+
+        updated = sum(1 for result in results if result.get('success'))
+        return {'results': results, 'updated': updated, 'failed': len(results) - updated}
+
+    except Exception as e:
+        print(f"Error in update_order_statuses: {e}")
+        return {'error': str(e)}
+
+update_order_statuses, aupdate_order_statuses = dual(_update_order_statuses)
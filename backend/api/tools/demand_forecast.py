@@ -0,0 +1,224 @@
+"""
+Batch demand forecasting from OrderItem history.
+
+refresh_forecasts() builds a (product x day) matrix of units ordered with
+one aggregated query, fits every product at once and stores the next
+HORIZON_DAYS of forecasts in DemandForecast, so the supplier tool only
+reads precomputed rows. It runs nightly from the scheduler
+(manage.py refresh_demand_forecasts).
+
+The model is additive Holt-Winters - level, damped trend and a day-of-week
+term - fitted on demand divided by a monthly seasonal index. The index is
+estimated from the history when it covers at least a year and shrunk
+towards 1 for months with few observations. The recursions run over days
+with NumPy arrays across all products at once; smoothing parameters are
+picked per product from a small grid by one-step-ahead squared error, and
+the residual spread gives an ~80% interval.
+"""
+import time
+import logging
+from datetime import datetime, timedelta
+from itertools import product as grid
+import numpy as np
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from api.models import Product, OrderItem, DemandForecast
+from api.db_router import analytic_reads
+
+logger = logging.getLogger(__name__)
+
+HISTORY_DAYS = 730
+HORIZON_DAYS = 14
+WARMUP_DAYS = 14
+MIN_ANNUAL_DAYS = 365
+DAMPING = 0.9
+INTERVAL_Z = 1.28  # ~80% interval
+MONTH_SHRINKAGE_DAYS = 30  # Months with fewer days are pulled towards an index of 1
+
+ALPHAS = (0.05, 0.15, 0.3)
+BETAS = (0.0, 0.05)
+GAMMAS = (0.05, 0.2)
+
+
+# ============ HISTORY ============
+
+def build_demand_matrix(today, history_days: int = HISTORY_DAYS):
+    """
+    Units ordered per product and day over (at most) the history_days before
+    today; today itself is incomplete and left out. Returns
+    (product_ids, start, matrix) with one matrix column per day from start.
+    """
+    start = today - timedelta(days=history_days)
+    window = (
+        timezone.make_aware(datetime.combine(start, datetime.min.time())),
+        timezone.make_aware(datetime.combine(today, datetime.min.time())),
+    )
+    rows = (
+        OrderItem.objects.filter(order__order_date__gte=window[0], order__order_date__lt=window[1])
+        .annotate(day=TruncDate('order__order_date'))
+        .values('product_id', 'day')
+        .annotate(sold=Sum('quantity'))
+        .values_list('product_id', 'day', 'sold')
+        .order_by()
+    )
+
+    product_ids = list(Product.objects.order_by('pk').values_list('product_id', flat=True))
+    index = {product_id: i for i, product_id in enumerate(product_ids)}
+    matrix = np.zeros((len(product_ids), history_days))
+    for product_id, day, sold in rows:
+        matrix[index[product_id], (day - start).days] += sold
+
+    # Start at the first day with any sales, so a short history is not padded with zeros
+    active = matrix.any(axis=0)
+    first = int(np.argmax(active)) if active.any() else max(0, history_days - WARMUP_DAYS)
+    return product_ids, start + timedelta(days=first), matrix[:, first:]
+
+
+def _weekdays(start, length: int) -> np.ndarray:
+    """Day of week (0 = Monday) of each day on the axis."""
+    days = (np.datetime64(start, 'D') + np.arange(length)).astype('int64')
+    return (days + 3) % 7  # 1970-01-01 was a Thursday
+
+
+def _months(start, length: int) -> np.ndarray:
+    return (np.datetime64(start, 'D') + np.arange(length)).astype('datetime64[M]').astype(int) % 12
+
+
+# ============ MODEL ============
+
+def monthly_index(demand: np.ndarray, months: np.ndarray) -> np.ndarray:
+    """(products x 12) multiplicative month index; all ones when the history is shorter than a year."""
+    products = demand.shape[0]
+    if demand.shape[1] < MIN_ANNUAL_DAYS:
+        return np.ones((products, 12))
+
+    days_per_month = np.bincount(months, minlength=12)
+    totals = np.zeros((products, 12))
+    np.add.at(totals.T, months, demand.T)
+    overall = demand.mean(axis=1, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        raw = np.where(overall > 0, totals / np.maximum(days_per_month, 1) / overall, 1.0)
+    weight = days_per_month / (days_per_month + MONTH_SHRINKAGE_DAYS)
+    index = weight * raw + (1 - weight) * 1.0
+    index[:, days_per_month == 0] = 1.0
+    return np.maximum(index, 0.05)
+
+
+def holt_winters(y: np.ndarray, weekdays: np.ndarray, alpha: float, beta: float, gamma: float):
+    """
+    Runs the additive damped Holt-Winters recursions over all products.
+    Returns the final (level, trend, season) state and the one-step squared
+    error summed after the warm-up period.
+    """
+    products, length = y.shape
+    warmup = min(WARMUP_DAYS, length)
+    level = y[:, :warmup].mean(axis=1)
+    half = max(1, warmup // 2)
+    trend = (y[:, half:warmup].mean(axis=1) - y[:, :half].mean(axis=1)) / half if warmup > half else np.zeros(products)
+    season = np.zeros((products, 7))
+    for day in range(warmup):
+        season[:, weekdays[day]] += (y[:, day] - level) / max(1, np.sum(weekdays[:warmup] == weekdays[day]))
+
+    sse = np.zeros(products)
+    for t in range(length):
+        weekday = weekdays[t]
+        s = season[:, weekday]
+        expected = level + DAMPING * trend
+        error = y[:, t] - (expected + s)
+        if t >= warmup:
+            sse += error ** 2
+        new_level = alpha * (y[:, t] - s) + (1 - alpha) * expected
+        trend = beta * (new_level - level) + (1 - beta) * DAMPING * trend
+        season[:, weekday] = gamma * (y[:, t] - new_level) + (1 - gamma) * s
+        level = new_level
+    return level, trend, season, sse
+
+
+def fit_and_forecast(demand: np.ndarray, start, horizon: int = HORIZON_DAYS) -> dict:
+    """
+    Fits every product (rows of demand) and forecasts the horizon days that
+    follow the history. Returns arrays of shape (products x horizon):
+    'forecast', 'low', 'high', plus per-product 'alpha', 'beta', 'gamma'.
+    """
+    products, length = demand.shape
+    weekdays = _weekdays(start, length + horizon)
+    months = _months(start, length + horizon)
+    index = monthly_index(demand, months[:length])
+    y = demand / index[np.arange(products)[:, None], months[None, :length]]
+
+    best_sse = np.full(products, np.inf)
+    best = {}
+    for alpha, beta, gamma in grid(ALPHAS, BETAS, GAMMAS):
+        level, trend, season, sse = holt_winters(y, weekdays[:length], alpha, beta, gamma)
+        better = sse < best_sse
+        best_sse = np.where(better, sse, best_sse)
+        for name, value in (('level', level), ('trend', trend), ('season', season)):
+            best[name] = np.where(better[:, None] if value.ndim == 2 else better, value, best.get(name, value))
+        for name, value in (('alpha', alpha), ('beta', beta), ('gamma', gamma)):
+            best[name] = np.where(better, value, best.get(name, np.full(products, value)))
+
+    steps = np.arange(1, horizon + 1)
+    damped_steps = np.cumsum(DAMPING ** steps)
+    future_weekdays = weekdays[length:]
+    future_months = months[length:]
+    deseasonalized = best['level'][:, None] + best['trend'][:, None] * damped_steps[None, :] + best['season'][:, future_weekdays]
+    month_factor = index[:, future_months]
+    forecast = np.maximum(deseasonalized * month_factor, 0.0)
+
+    residual_std = np.sqrt(best_sse / max(1, length - WARMUP_DAYS))
+    spread = INTERVAL_Z * residual_std[:, None] * np.sqrt(1 + (steps[None, :] - 1) * best['alpha'][:, None] ** 2) * month_factor
+    return {
+        'forecast': forecast,
+        'low': np.maximum(forecast - spread, 0.0),
+        'high': forecast + spread,
+        'alpha': best['alpha'], 'beta': best['beta'], 'gamma': best['gamma'],
+        'annual': length >= MIN_ANNUAL_DAYS,
+    }
+
+
+# ============ REFRESH ============
+
+def refresh_forecasts(today=None, history_days: int = HISTORY_DAYS, horizon: int = HORIZON_DAYS) -> dict:
+    """Recomputes and stores forecasts for every product; returns a short report."""
+    started = time.perf_counter()
+    today = today or timezone.now().date()
+    with analytic_reads():
+        product_ids, start, demand = build_demand_matrix(today, history_days)
+    if not product_ids:
+        return {'products': 0, 'rows': 0, 'seconds': 0.0}
+
+    loaded = time.perf_counter()
+    result = fit_and_forecast(demand, start, horizon)
+    fitted = time.perf_counter()
+
+    model = 'holt_winters_dow_annual' if result['annual'] else 'holt_winters_dow'
+    generated_at = timezone.now()
+    forecasts = [
+        DemandForecast(
+            product_id=product_id, forecast_date=today + timedelta(days=h), model=model, generated_at=generated_at,
+            quantity=round(float(result['forecast'][i, h]), 2),
+            quantity_low=round(float(result['low'][i, h]), 2),
+            quantity_high=round(float(result['high'][i, h]), 2),
+        )
+        for i, product_id in enumerate(product_ids)
+        for h in range(horizon)
+    ]
+    with transaction.atomic():
+        DemandForecast.objects.filter(forecast_date__lt=today).delete()
+        DemandForecast.objects.bulk_create(
+            forecasts, batch_size=1000, update_conflicts=True, unique_fields=['product', 'forecast_date'],
+            update_fields=['quantity', 'quantity_low', 'quantity_high', 'model', 'generated_at'],
+        )
+
+    report = {
+        'products': len(product_ids),
+        'rows': len(forecasts),
+        'history_days': history_days,
+        'load_seconds': round(loaded - started, 3),
+        'fit_seconds': round(fitted - loaded, 3),
+        'seconds': round(time.perf_counter() - started, 3),
+    }
+    logger.info(f"Demand forecasts refreshed: {report}")
+    return report
@@ -0,0 +1,144 @@
+"""
+Bulk inventory import: a supplier's whole restock as one CSV or JSON table.
+
+Each row is (product, quantity, price, available_date, expiry_date,
+image_url); headers are matched case-insensitively and only product,
+quantity and price are required (available_date defaults to today). The
+table is parsed into a pandas DataFrame and validated column-wise - numbers,
+dates and their relations are checked for every row at once - so the cost
+per row is a few array operations. Product names are resolved once per
+distinct name by the caller (see import_inventory in database_tool.py),
+which then upserts every valid row with one bulk_create.
+
+Pricing hints compare each price with the product's market price (the
+average of the competitor tier averages over HINT_WINDOW_DAYS, loaded for
+all products with one query) and suggest the same +-10% range as
+get_pricing_suggestion's basic recommendation.
+"""
+import io
+import json
+import numpy as np
+import pandas as pd
+
+MAX_IMPORT_ROWS = 500
+HINT_WINDOW_DAYS = 30
+HINT_BAND = 0.10  # Prices within +-10% of the market price are "within" the market
+
+COLUMNS = ('product_name', 'quantity', 'price', 'available_date', 'expiry_date', 'image_url')
+COLUMN_ALIASES = {
+    'product': 'product_name', 'name': 'product_name', 'qty': 'quantity', 'quantity_available': 'quantity',
+    'price_per_unit': 'price', 'price_per_unit_etb': 'price', 'price_etb': 'price',
+    'available': 'available_date', 'expiry': 'expiry_date', 'expires': 'expiry_date', 'image': 'image_url',
+}
+
+
+class InvalidUpload(ValueError):
+    """The upload as a whole cannot be read (rows with bad values are reported per row instead)."""
+
+
+def parse_table(content) -> pd.DataFrame:
+    """
+    Reads rows from a list of dicts, a JSON array (or {"rows": [...]}) or CSV
+    text into a DataFrame with the COLUMNS, all as strings ('' when missing).
+    """
+    if isinstance(content, bytes):
+        content = content.decode('utf-8-sig')
+    if isinstance(content, str):
+        text = content.strip()
+        if not text:
+            raise InvalidUpload('The upload is empty')
+        if text[0] in '[{':
+            try:
+                content = json.loads(text)
+            except json.JSONDecodeError as e:
+                raise InvalidUpload(f'Invalid JSON: {e}')
+        else:
+            try:
+                frame = pd.read_csv(io.StringIO(text), dtype=str, keep_default_na=False, skipinitialspace=True)
+            except (pd.errors.ParserError, pd.errors.EmptyDataError) as e:
+                raise InvalidUpload(f'Invalid CSV: {e}')
+            return _normalize_columns(frame)
+
+    if isinstance(content, dict):
+        content = content.get('rows', content.get('items'))
+    if not isinstance(content, list) or not all(isinstance(row, dict) for row in content):
+        raise InvalidUpload('Expected a CSV table or a JSON list of rows')
+    frame = pd.DataFrame(content, dtype=object)
+    return _normalize_columns(frame.where(frame.notna(), '').astype(str))
+
+
+def _normalize_columns(frame: pd.DataFrame) -> pd.DataFrame:
+    frame = frame.rename(columns=lambda column: str(column).strip().lower().replace(' ', '_'))
+    frame = frame.rename(columns=COLUMN_ALIASES)
+    frame = frame.loc[:, ~frame.columns.duplicated()]
+    missing = [column for column in ('product_name', 'quantity', 'price') if column not in frame.columns]
+    if missing:
+        raise InvalidUpload(f"Missing column(s): {', '.join(missing)}")
+    if len(frame) > MAX_IMPORT_ROWS:
+        raise InvalidUpload(f'At most {MAX_IMPORT_ROWS} rows can be imported at once')
+    frame = frame.reindex(columns=COLUMNS, fill_value='')
+    return frame.apply(lambda column: column.str.strip()).reset_index(drop=True)
+
+
+def validate(frame: pd.DataFrame, today) -> pd.DataFrame:
+    """
+    Adds typed columns (quantity_value, price_value, available, expiry) and
+    an 'errors' column with the list of problems of each row.
+    """
+    frame = frame.copy()
+    frame['quantity_value'] = pd.to_numeric(frame['quantity'], errors='coerce')
+    frame['price_value'] = pd.to_numeric(frame['price'], errors='coerce')
+    today = pd.Timestamp(today)
+    available = pd.to_datetime(frame['available_date'], format='%Y-%m-%d', errors='coerce')
+    available = available.where(frame['available_date'] != '', today)
+    expiry = pd.to_datetime(frame['expiry_date'], format='%Y-%m-%d', errors='coerce')
+
+    has_expiry = frame['expiry_date'] != ''
+    checks = (
+        (frame['product_name'] == '', 'product is required'),
+        (frame['quantity_value'].isna(), 'quantity must be a number'),
+        (frame['quantity_value'] < 0, 'quantity cannot be negative'),
+        (frame['price_value'].isna(), 'price must be a number'),
+        (frame['price_value'] <= 0, 'price must be positive'),
+        (frame['price_value'] >= 1e8, 'price is too large'),
+        (available.isna(), 'available_date must be YYYY-MM-DD'),
+        (has_expiry & expiry.isna(), 'expiry_date must be YYYY-MM-DD'),
+        (has_expiry & (expiry < today), 'expiry_date is in the past'),
+        (has_expiry & (expiry < available), 'expiry_date is before available_date'),
+    )
+    errors = [[] for _ in range(len(frame))]
+    for failed, message in checks:
+        for i in np.flatnonzero(failed.fillna(False).to_numpy(dtype=bool)):
+            errors[i].append(message)
+    frame['errors'] = errors
+    frame['available'] = [None if pd.isna(day) else day.date() for day in available]
+    frame['expiry'] = [None if pd.isna(day) else day.date() for day in expiry]
+    return frame
+
+
+def price_hints(prices, references) -> list:
+    """
+    Pricing hint per row from aligned arrays of prices and market prices
+    (NaN where the market price is unknown): None, or the market price, the
+    suggested range, the difference in percent and the price's position.
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    references = np.asarray(references, dtype=np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        difference = (prices - references) / references * 100
+    position = np.select(
+        [difference > HINT_BAND * 100, difference < -HINT_BAND * 100], ['above_market', 'below_market'], 'within_market')
+    low, high = references * (1 - HINT_BAND), references * (1 + HINT_BAND)
+
+    hints = []
+    for i in range(len(prices)):
+        if np.isnan(references[i]) or np.isnan(prices[i]):
+            hints.append(None)
+            continue
+        hints.append({
+            'market_price': round(float(references[i]), 2),
+            'suggested_range': [round(float(low[i]), 2), round(float(high[i]), 2)],
+            'difference_pct': round(float(difference[i]), 1),
+            'position': str(position[i]),
+        })
+    return hints
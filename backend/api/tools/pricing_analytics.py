@@ -0,0 +1,325 @@
+"""
+Market analytics behind get_comprehensive_pricing_suggestion.
+
+A product's full history is loaded once per day into NumPy arrays - the
+daily competitor price per tier and the daily quantity sold and average
+sale price - using queries that return at most one row per day and tier.
+The series are cached per (product, day) in the shared cache, so every
+later suggestion that day is pure array arithmetic:
+
+- seasonal index: mean detrended log market price per calendar month
+  (needs a full year of history);
+- trend: slope of the deseasonalized log market price over TREND_WINDOW_DAYS;
+- volatility: standard deviation of daily log price changes, scaled to 30 days;
+- price elasticity: slope of log daily quantity sold against log average
+  sale price, with its R^2.
+
+The suggestion projects the current market level SUGGESTION_HORIZON_DAYS
+ahead with trend and seasonality, sizes the range by volatility, and leans
+low for elastic products (buyers respond to price) or high for inelastic ones
+when the elasticity fit explains at least MIN_ELASTICITY_R2 of the variance.
+"""
+import time
+import logging
+from datetime import date, datetime, timedelta
+import numpy as np
+from django.core.cache import cache
+from django.db.models import Avg, Sum, F, FloatField
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from api.models import CompetitorPrice, OrderItem
+
+logger = logging.getLogger(__name__)
+
+SERIES_CACHE_TIMEOUT = 86400
+TREND_WINDOW_DAYS = 90
+VOLATILITY_WINDOW_DAYS = 60
+SUGGESTION_HORIZON_DAYS = 14
+MIN_SEASONAL_DAYS = 365
+MIN_ELASTICITY_DAYS = 14
+MIN_ELASTICITY_R2 = 0.1
+MIN_BAND = 0.05
+MAX_BAND = 0.20
+
+
+def _series_key(product_id, day: date) -> str:
+    return f'pricing_series:{product_id}:{day.isoformat()}'
+
+
+# ============ SERIES ============
+
+def _day_end(day: date):
+    """Start of the following day in the current time zone (range filter that can use an index)."""
+    return timezone.make_aware(datetime.combine(day + timedelta(days=1), datetime.min.time()))
+
+
+def load_series(product_id, today: date = None) -> dict:
+    """
+    Loads the full daily history of a product as arrays aligned on one day axis
+    starting at 'start': 'tier_prices' (tiers x days, NaN when missing),
+    'quantity' and 'sale_price' (average sale price, NaN on days without sales),
+    plus the price of the largest order line in the last 30 days.
+    """
+    today = today or timezone.now().date()
+
+    price_rows = list(
+        CompetitorPrice.objects.filter(product_id=product_id, date__lte=today)
+        .values_list('date', 'competitor_tier', 'price_per_unit_etb')
+    )
+    sales_rows = list(
+        OrderItem.objects.filter(product_id=product_id, order__order_date__lt=_day_end(today))
+        .annotate(day=TruncDate('order__order_date'))
+        .values('day')
+        .annotate(sold=Sum('quantity'), revenue=Sum(F('quantity') * F('price_per_unit_etb'), output_field=FloatField()))
+        .values_list('day', 'sold', 'revenue')
+        .order_by()
+    )
+    # Price of the single largest order line in the last 30 days
+    highest_volume = OrderItem.objects.filter(
+        product_id=product_id,
+        order__order_date__gte=timezone.now() - timedelta(days=30)
+    ).order_by('-quantity').values_list('price_per_unit_etb', flat=True).first()
+
+    days = [row[0] for row in price_rows] + [row[0] for row in sales_rows]
+    start = min(days) if days else today
+    length = (today - start).days + 1
+    tiers = sorted({tier for _, tier, _ in price_rows})
+
+    tier_prices = np.full((len(tiers), length), np.nan)
+    if price_rows:
+        day_index = np.array([(day - start).days for day, _, _ in price_rows])
+        tier_index = np.searchsorted(tiers, [tier for _, tier, _ in price_rows])
+        tier_prices[tier_index, day_index] = np.array([float(price) for _, _, price in price_rows])
+
+    quantity = np.zeros(length)
+    sale_price = np.full(length, np.nan)
+    if sales_rows:
+        day_index = np.array([(day - start).days for day, _, _ in sales_rows])
+        sold = np.array([float(q) for _, q, _ in sales_rows])
+        revenue = np.array([float(r) for _, _, r in sales_rows])
+        quantity[day_index] = sold
+        with np.errstate(invalid='ignore', divide='ignore'):
+            sale_price[day_index] = np.where(sold > 0, revenue / sold, np.nan)
+
+    return {
+        'start': start, 'tiers': tiers, 'tier_prices': tier_prices, 'quantity': quantity, 'sale_price': sale_price,
+        'highest_volume_price': float(highest_volume) if highest_volume is not None else None,
+    }
+
+
+def get_series(product_id, today: date = None) -> dict:
+    """load_series() cached per (product, day)."""
+    today = today or timezone.now().date()
+    key = _series_key(product_id, today)
+    try:
+        series = cache.get(key)
+    except Exception as e:
+        logger.warning(f"Pricing series cache unavailable: {e}")
+        return load_series(product_id, today)
+
+    if series is None:
+        series = load_series(product_id, today)
+        try:
+            cache.set(key, series, SERIES_CACHE_TIMEOUT)
+        except Exception as e:
+            logger.warning(f"Could not cache pricing series: {e}")
+    return series
+
+
+def _forward_fill(values: np.ndarray) -> np.ndarray:
+    valid = ~np.isnan(values)
+    if not valid.any():
+        return values
+    index = np.where(valid, np.arange(len(values)), 0)
+    np.maximum.accumulate(index, out=index)
+    filled = values[index]
+    filled[:np.argmax(valid)] = np.nan  # Nothing to carry forward before the first observation
+    return filled
+
+
+def _months(start: date, length: int) -> np.ndarray:
+    """Calendar month (0-11) of each day on the series axis."""
+    days = np.datetime64(start, 'D') + np.arange(length)
+    return days.astype('datetime64[M]').astype(int) % 12
+
+
+# ============ ANALYTICS ============
+
+def analyze(series: dict) -> dict:
+    """Computes seasonal index, trend, volatility and elasticity from a series."""
+    tier_prices = series['tier_prices']
+    length = tier_prices.shape[1]
+    with np.errstate(all='ignore'):
+        market = _forward_fill(np.nanmean(tier_prices, axis=0)) if len(series['tiers']) else np.full(length, np.nan)
+    months = _months(series['start'], length)
+    observed = ~np.isnan(market)
+    log_market = np.log(market, where=observed, out=np.full(length, np.nan))
+    x = np.arange(length, dtype=float)
+
+    result = {
+        'history_days': int(observed.sum()),
+        'seasonal_index': None,
+        'trend_pct_per_30_days': None,
+        'volatility_pct_30_days': None,
+        'elasticity': None,
+        'elasticity_r2': None,
+        'sales_days': int((series['quantity'] > 0).sum()),
+        '_slope': 0.0,
+        '_seasonal_log': np.zeros(12),
+    }
+
+    # Seasonal index: mean residual of a linear fit per calendar month
+    if observed.sum() >= MIN_SEASONAL_DAYS:
+        slope, intercept = np.polyfit(x[observed], log_market[observed], 1)
+        residual = log_market[observed] - (slope * x[observed] + intercept)
+        counts = np.bincount(months[observed], minlength=12)
+        sums = np.bincount(months[observed], weights=residual, minlength=12)
+        if counts.all():
+            seasonal_log = sums / counts
+            seasonal_log -= seasonal_log.mean()
+            result['_seasonal_log'] = seasonal_log
+            result['seasonal_index'] = np.round(np.exp(seasonal_log), 3).tolist()
+
+    # Trend on the deseasonalized recent window
+    window = observed & (x >= length - TREND_WINDOW_DAYS)
+    if window.sum() >= 2:
+        deseasonalized = log_market[window] - result['_seasonal_log'][months[window]]
+        slope = np.polyfit(x[window], deseasonalized, 1)[0]
+        result['_slope'] = float(slope)
+        result['trend_pct_per_30_days'] = round(float(np.expm1(slope * 30)) * 100, 2)
+
+    # Volatility of daily log changes
+    recent = log_market[-VOLATILITY_WINDOW_DAYS:]
+    changes = np.diff(recent[~np.isnan(recent)])
+    if len(changes) >= 2:
+        result['volatility_pct_30_days'] = round(float(np.std(changes, ddof=1) * np.sqrt(30)) * 100, 2)
+
+    # Elasticity: log quantity sold against log sale price
+    sold = (series['quantity'] > 0) & ~np.isnan(series['sale_price'])
+    if sold.sum() >= MIN_ELASTICITY_DAYS:
+        log_price = np.log(series['sale_price'][sold])
+        log_quantity = np.log(series['quantity'][sold])
+        if np.ptp(log_price) > 0:
+            slope, intercept = np.polyfit(log_price, log_quantity, 1)
+            residual = log_quantity - (slope * log_price + intercept)
+            total = ((log_quantity - log_quantity.mean()) ** 2).sum()
+            result['elasticity'] = round(float(slope), 3)
+            result['elasticity_r2'] = round(float(1 - (residual ** 2).sum() / total), 3) if total else None
+
+    return result
+
+
+def window_averages(series: dict, days: int) -> dict:
+    """Average competitor price per tier over the last `days` days."""
+    recent = series['tier_prices'][:, -(days + 1):]
+    averages = {}
+    for tier, prices in zip(series['tiers'], recent):
+        prices = prices[~np.isnan(prices)]
+        if len(prices):
+            averages[tier] = round(float(prices.mean()), 2)
+    return averages
+
+
+def suggest_price(reference: float, analytics: dict, today: date) -> dict:
+    """Projects the reference price ahead and sizes the suggested range."""
+    months = _months(today, SUGGESTION_HORIZON_DAYS + 1)
+    seasonal_log = analytics['_seasonal_log']
+    projected = reference * float(np.exp(
+        analytics['_slope'] * SUGGESTION_HORIZON_DAYS + seasonal_log[months[-1]] - seasonal_log[months[0]]
+    ))
+
+    volatility = (analytics['volatility_pct_30_days'] or 0) / 100
+    band = min(MAX_BAND, max(MIN_BAND, volatility))
+    elasticity = analytics['elasticity'] if (analytics['elasticity_r2'] or 0) >= MIN_ELASTICITY_R2 else None
+    lean = 0.0
+    if elasticity is not None and elasticity < -1:
+        lean = -band / 2
+    elif elasticity is not None and elasticity < 0:
+        lean = band / 2
+
+    return {
+        'suggested_price': round(projected * (1 + lean), 2),
+        'suggested_range': [round(projected * (1 - band), 2), round(projected * (1 + band), 2)],
+        'projected_market_price': round(projected, 2),
+    }
+
+
+def describe(analytics: dict) -> list:
+    """Short plain-language notes on the analytics for the agent."""
+    notes = []
+    trend = analytics['trend_pct_per_30_days']
+    if trend is not None:
+        direction = 'rising' if trend > 1 else 'falling' if trend < -1 else 'stable'
+        notes.append(f"Market price is {direction} ({trend:+.1f}% per 30 days, seasonality removed).")
+    if analytics['seasonal_index']:
+        index = analytics['seasonal_index']
+        peak = int(np.argmax(index))
+        notes.append(f"Prices peak in {date(2000, peak + 1, 1):%B} ({(index[peak] - 1) * 100:+.0f}% vs. the yearly average).")
+    if analytics['volatility_pct_30_days'] is not None:
+        notes.append(f"Typical 30-day price swing: {analytics['volatility_pct_30_days']:.1f}%.")
+    elasticity = analytics['elasticity']
+    if elasticity is not None and (analytics['elasticity_r2'] or 0) < MIN_ELASTICITY_R2:
+        notes.append("Sales volume shows no clear response to price.")
+    elif elasticity is not None:
+        sensitivity = 'price-sensitive' if elasticity < -1 else 'not very price-sensitive' if elasticity < 0 else 'not price-driven'
+        notes.append(f"Buyers are {sensitivity} (elasticity {elasticity:.2f} over {analytics['sales_days']} sales days).")
+    return notes
+
+
+def public_analytics(analytics: dict) -> dict:
+    return {key: value for key, value in analytics.items() if not key.startswith('_')}
+
+
+def market_reference_prices(product_ids: list, today: date = None, days: int = 30) -> dict:
+    """
+    Market price per product for many products with one query: the average
+    of the competitor tier averages over the last `days` days (a lighter
+    reference than the full suggestion, used for bulk pricing hints).
+    """
+    today = today or timezone.now().date()
+    tier_averages = {}
+    rows = (
+        CompetitorPrice.objects.filter(product_id__in=product_ids, date__gt=today - timedelta(days=days), date__lte=today)
+        .values('product_id', 'competitor_tier').annotate(average=Avg('price_per_unit_etb'))
+        .values_list('product_id', 'average').order_by()
+    )
+    for product_id, average in rows:
+        tier_averages.setdefault(str(product_id), []).append(float(average))
+    return {product_id: sum(averages) / len(averages) for product_id, averages in tier_averages.items()}
+
+
+# ============ BENCHMARK ============
+
+def run_benchmark(product_ids: list, days_of_history: int = 30, repeat: int = 5) -> dict:
+    """
+    Times the analytics per product over its full history: cold (load the
+    series and analyze) and warm (cached series), in milliseconds.
+    """
+    today = timezone.now().date()
+    cold, warm = [], []
+    for product_id in product_ids:
+        cache.delete(_series_key(product_id, today))
+        started = time.perf_counter()
+        series = get_series(product_id, today)
+        analyze(series)
+        cold.append((time.perf_counter() - started) * 1000)
+
+        for _ in range(repeat):
+            started = time.perf_counter()
+            series = get_series(product_id, today)
+            analytics = analyze(series)
+            averages = window_averages(series, days_of_history)
+            if averages:
+                suggest_price(sum(averages.values()) / len(averages), analytics, today)
+            warm.append((time.perf_counter() - started) * 1000)
+
+    def summary(values):
+        values = sorted(values)
+        return {
+            'mean': round(sum(values) / len(values), 3),
+            'p50': round(values[len(values) // 2], 3),
+            'p95': round(values[min(len(values) - 1, int(len(values) * 0.95))], 3),
+            'max': round(values[-1], 3),
+        }
+
+    return {'products': len(product_ids), 'cold_ms': summary(cold), 'warm_ms': summary(warm)} if product_ids else {'products': 0}
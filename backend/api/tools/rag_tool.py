@@ -2,28 +2,34 @@ import os
 import chromadb
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain_chroma import Chroma
+from api.utils.tracing import traced
 
+def get_chroma_client():
+    """Returns the ChromaDB client holding the chipchip_knowledge collection."""
+    return chromadb.HttpClient(host='localhost', port=8001)
+
+
+def get_query_embeddings():
+    """Returns the embedding function used for query retrieval."""
+    return GoogleGenerativeAIEmbeddings(
+        model="models/gemini-embedding-001",
+        task_type="RETRIEVAL_QUERY",
+        google_api_key=os.environ.get('GOOGLE_API_KEY')
+    )
+
+
+@traced('rag_lookup')
 def chipchip_rag_tool(query: str) -> str:
     """
     Performs RAG (Retrieval Augmented Generation) on the chipchip_knowledge collection.
     Returns relevant context as a formatted string.
     """
     try:
-        # Initialize ChromaDB client
-        client = chromadb.HttpClient(host='localhost', port=8001)
-        
-        # Initialize embedding function for query retrieval
-        embeddings = GoogleGenerativeAIEmbeddings(
-            model="models/gemini-embedding-001",
-            task_type="RETRIEVAL_QUERY",
-            google_api_key=os.environ.get('GOOGLE_API_KEY')
-        )
-        
         # Create LangChain vector store
         vectorstore = Chroma(
-            client=client,
+            client=get_chroma_client(),
             collection_name="chipchip_knowledge",
-            embedding_function=embeddings
+            embedding_function=get_query_embeddings()
         )
         
         # Perform similarity search - get top 3 documents
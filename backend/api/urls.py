@@ -1,10 +1,17 @@
 from django.urls import path
-from .views import ChatAPIView, NotificationAPIView, OrderActionAPIView
+from .views import (
+    ChatAPIView, NotificationAPIView, OrderCreateAPIView, OrderActionAPIView, OrderBulkActionAPIView,
+    InventoryImportAPIView, MetricsAPIView
+)
 
 urlpatterns = [
     path('chat/', ChatAPIView.as_view(), name='chat'),
     path('notifications/', NotificationAPIView.as_view(), name='notifications'),
+    path('orders/', OrderCreateAPIView.as_view(), name='order_create'),
     path('orders/action/', OrderActionAPIView.as_view(), name='order_action'),
+    path('orders/action/bulk/', OrderBulkActionAPIView.as_view(), name='order_bulk_action'),
+    path('inventory/import/', InventoryImportAPIView.as_view(), name='inventory_import'),
+    path('metrics/', MetricsAPIView.as_view(), name='metrics'),
 ]
 
 
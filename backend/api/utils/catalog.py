@@ -0,0 +1,238 @@
+"""
+In-process snapshot of the customer-visible catalog.
+
+Customer searches (find_product_listings) read an immutable snapshot per
+product instead of querying Inventory joined with User: listings are kept as
+compact tuples sorted by price, so a search is a name lookup plus a scan
+that stops nowhere near the database.
+
+Snapshots are kept consistent across workers with a version counter in the
+shared cache. Every committed change to a listing, a product or a supplier's
+name increments the counter and records which product changed under the new
+version number. On each search a worker compares its own version with the
+shared one and rebuilds only the products changed in between (one query per
+product); if the change log has expired or the gap is large it rebuilds the
+whole catalog (two queries).
+
+Writes that bypass model signals (bulk_create, queryset.update(), the data
+loader) must call invalidate_catalog() afterwards. When the cache is
+unreachable the catalog reports itself unavailable and callers fall back to
+querying the database directly.
+"""
+import logging
+import threading
+from collections import namedtuple
+from django.core.cache import cache
+from django.db import transaction
+from api.models import Product, Inventory
+from api.utils.search import normalize, best_match
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'catalog:version'
+CHANGE_LOG_TIMEOUT = 3600
+MAX_INCREMENTAL_CHANGES = 200  # Beyond this a full rebuild is cheaper
+FULL_REBUILD = '*'
+
+# One listing: (price_per_unit, quantity_available, supplier_name, supplier_id,
+#               available_date, expiry_date, image_url, supplier_location)
+PRICE, QUANTITY, SUPPLIER_NAME, SUPPLIER_ID, AVAILABLE_DATE, EXPIRY_DATE, IMAGE_URL, SUPPLIER_LOCATION = range(8)
+
+ProductSnapshot = namedtuple('ProductSnapshot', ['product_id', 'product_name', 'internal_name', 'unit', 'listings'])
+
+_LISTING_FIELDS = (
+    'product_id', 'price_per_unit_etb', 'quantity_available', 'supplier__username', 'supplier_id',
+    'available_date', 'expiry_date', 'image_url', 'supplier__default_location',
+)
+
+
+def _change_key(version: int) -> str:
+    return f'catalog:change:{version}'
+
+
+def _listing(row) -> tuple:
+    _, price, quantity, supplier_name, supplier_id, available_date, expiry_date, image_url, location = row
+    return (
+        float(price), float(quantity), supplier_name, str(supplier_id), available_date.isoformat(),
+        expiry_date.isoformat() if expiry_date else None, image_url or None, location or None,
+    )
+
+
+def _active_listings():
+    return Inventory.objects.filter(status='active').order_by('price_per_unit_etb', 'inventory_id')
+
+
+class CatalogSnapshot:
+    """
+    Per-process catalog: a dict of ProductSnapshot by product id plus a name
+    index in primary-key order (matching resolve_product's .first()).
+
+    Both are replaced wholesale on every rebuild, so readers never take a
+    lock and never see a half-built product.
+    """
+
+    def __init__(self):
+        self.version = None
+        self.products = {}
+        self.name_index = ()
+        self.stats = {'searches': 0, 'full_rebuilds': 0, 'product_rebuilds': 0, 'unavailable': 0}
+        self._lock = threading.Lock()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.version = None
+            self.products = {}
+            self.name_index = ()
+
+    # ============ SYNC ============
+
+    def sync(self) -> bool:
+        """
+        Brings the snapshot up to the shared version. Returns False when the
+        shared cache cannot be reached.
+        """
+        try:
+            shared_version = cache.get(VERSION_KEY)
+            if shared_version is None:
+                # Never expires: a counter that restarted could equal a worker's version
+                cache.add(VERSION_KEY, 0, None)
+                shared_version = cache.get(VERSION_KEY, 0)
+        except Exception as e:
+            logger.warning(f"Catalog version unavailable: {e}")
+            self.stats['unavailable'] += 1
+            return False
+
+        if shared_version == self.version:
+            return True
+
+        with self._lock:
+            if shared_version == self.version:
+                return True
+            changed = self._changes_since(shared_version)
+            if changed is None:
+                self._rebuild_all()
+            else:
+                self._rebuild_products(changed)
+            self.version = shared_version
+        return True
+
+    def _changes_since(self, shared_version: int):
+        """Returns the product ids changed since our version, or None if a full rebuild is needed."""
+        if self.version is None or shared_version < self.version:
+            return None
+        if shared_version - self.version > MAX_INCREMENTAL_CHANGES:
+            return None
+
+        keys = [_change_key(v) for v in range(self.version + 1, shared_version + 1)]
+        try:
+            changes = cache.get_many(keys)
+        except Exception:
+            return None
+        if len(changes) != len(keys) or FULL_REBUILD in changes.values():
+            return None
+        return set(changes.values())
+
+    def _rebuild_all(self) -> None:
+        listings = {}
+        for row in _active_listings().values_list(*_LISTING_FIELDS):
+            listings.setdefault(row[0], []).append(_listing(row))
+
+        products = {}
+        for product_id, product_name, internal_name, unit in Product.objects.order_by('pk').values_list(
+                'product_id', 'product_name', 'internal_name', 'unit'):
+            products[str(product_id)] = ProductSnapshot(
+                str(product_id), product_name, internal_name, unit, tuple(listings.get(product_id, ())))
+
+        self.products = products
+        self._reindex()
+        self.stats['full_rebuilds'] += 1
+
+    def _rebuild_products(self, product_ids: set) -> None:
+        products = dict(self.products)
+        for product_id in product_ids:
+            product = Product.objects.filter(pk=product_id).values_list(
+                'product_id', 'product_name', 'internal_name', 'unit').first()
+            if product is None:
+                products.pop(product_id, None)
+                continue
+            listings = _active_listings().filter(product_id=product_id).values_list(*_LISTING_FIELDS)
+            products[product_id] = ProductSnapshot(
+                product_id, product[1], product[2], product[3], tuple(_listing(row) for row in listings))
+            self.stats['product_rebuilds'] += 1
+
+        self.products = products
+        self._reindex()
+
+    def _reindex(self) -> None:
+        self.name_index = tuple(
+            (normalize(product.product_name), normalize(product.internal_name), product.product_id)
+            for product in sorted(self.products.values(), key=lambda p: p.product_id)
+        )
+
+    # ============ LOOKUPS ============
+
+    def resolve(self, product_name: str):
+        """
+        The product a free-text name refers to. Exact and word-prefix matches
+        on product names are answered from the snapshot (the shortest name
+        wins); anything else - misspellings, aliases, transliterations - goes
+        to the ranked product search (api/utils/search.py).
+        """
+        needle = normalize(product_name or '')
+        if not needle:
+            return None
+        products = self.products
+        best = None
+        for display_name, internal_name, product_id in self.name_index:
+            for name in (display_name, internal_name):
+                if name == needle:
+                    return products.get(product_id)
+                if f' {needle}' in f' {name}':
+                    if best is None or len(name) < best[0]:
+                        best = (len(name), product_id)
+        if best is not None:
+            return products.get(best[1])
+        return products.get(best_match(product_name))
+
+    def listings(self, product_name: str, requested_quantity: float):
+        """Returns price-sorted listings with enough stock, or None when the catalog is unavailable."""
+        if not self.sync():
+            return None
+        self.stats['searches'] += 1
+        product = self.resolve(product_name)
+        if product is None:
+            return []
+        return [listing for listing in product.listings if listing[QUANTITY] >= requested_quantity]
+
+
+CATALOG = CatalogSnapshot()
+
+
+# ============ INVALIDATION ============
+
+def _publish_change(product_id: str) -> None:
+    try:
+        try:
+            version = cache.incr(VERSION_KEY)
+        except ValueError:
+            version = 1 if cache.add(VERSION_KEY, 1, None) else cache.incr(VERSION_KEY)
+        cache.set(_change_key(version), product_id, CHANGE_LOG_TIMEOUT)
+    except Exception as e:
+        logger.warning(f"Could not publish catalog change: {e}")
+
+
+def invalidate_product(product_id) -> None:
+    """Schedules a rebuild of one product in every worker once the current transaction commits."""
+    product_id = str(product_id)
+    transaction.on_commit(lambda: _publish_change(product_id))
+
+
+def invalidate_catalog() -> None:
+    """Schedules a full rebuild in every worker once the current transaction commits."""
+    transaction.on_commit(lambda: _publish_change(FULL_REBUILD))
+
+
+def get_catalog_stats() -> dict:
+    stats = dict(CATALOG.stats)
+    stats.update(version=CATALOG.version, products=len(CATALOG.products))
+    return stats
@@ -0,0 +1,142 @@
+"""
+One implementation, two entry points: sync and async.
+
+Functions that touch the database, the cache or the channel layer are
+written once as coroutines taking an I/O adapter as their first argument,
+and every access goes through it (`await db.first(queryset)`,
+`await db.group_send(group, message)`, ...). dual() turns such an
+implementation into a pair of entry points:
+
+- the async one passes AsyncIO, which uses Django's async ORM (afirst,
+  acreate, async iteration), the cache's async methods and awaits
+  group_send directly, so it runs inside an event loop;
+- the sync one passes SyncIO, whose methods do the work immediately in the
+  calling thread and return already-completed awaitables. The coroutine
+  therefore never suspends and is driven to completion without an event
+  loop.
+
+Helpers that are sync by nature (the catalog snapshot, pricing series) go
+through db.run(), which calls them directly or via sync_to_async.
+"""
+from functools import wraps
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.layers import get_channel_layer
+from django.core.cache import cache
+
+
+class _Ready:
+    """An awaitable that is already complete."""
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __await__(self):
+        return self.value
+        yield  # Makes __await__ a generator that finishes immediately
+
+
+# ============ ADAPTERS ============
+
+class SyncIO:
+    """Blocking I/O in the calling thread."""
+
+    def first(self, queryset):
+        return _Ready(queryset.first())
+
+    def get(self, queryset, **lookup):
+        return _Ready(queryset.get(**lookup))
+
+    def exists(self, queryset):
+        return _Ready(queryset.exists())
+
+    def all(self, queryset):
+        return _Ready(list(queryset))
+
+    def create(self, model, **fields):
+        return _Ready(model.objects.create(**fields))
+
+    def save(self, instance):
+        instance.save()
+        return _Ready(None)
+
+    def update_or_create(self, model, defaults, **lookup):
+        return _Ready(model.objects.update_or_create(defaults=defaults, **lookup))
+
+    def cache(self, method: str, *args):
+        return _Ready(getattr(cache, method)(*args))
+
+    def run(self, func, *args, **kwargs):
+        return _Ready(func(*args, **kwargs))
+
+    def group_send(self, group: str, message: dict):
+        return _Ready(async_to_sync(get_channel_layer().group_send)(group, message))
+
+
+class AsyncIO:
+    """Non-blocking I/O for use inside an event loop."""
+
+    async def first(self, queryset):
+        return await queryset.afirst()
+
+    async def get(self, queryset, **lookup):
+        return await queryset.aget(**lookup)
+
+    async def exists(self, queryset):
+        return await queryset.aexists()
+
+    async def all(self, queryset):
+        return [row async for row in queryset]
+
+    async def create(self, model, **fields):
+        return await model.objects.acreate(**fields)
+
+    async def save(self, instance):
+        await instance.asave()
+
+    async def update_or_create(self, model, defaults, **lookup):
+        return await model.objects.aupdate_or_create(defaults=defaults, **lookup)
+
+    async def cache(self, method: str, *args):
+        return await getattr(cache, f'a{method}')(*args)
+
+    async def run(self, func, *args, **kwargs):
+        return await sync_to_async(func)(*args, **kwargs)
+
+    async def group_send(self, group: str, message: dict):
+        return await get_channel_layer().group_send(group, message)
+
+
+SYNC_IO = SyncIO()
+ASYNC_IO = AsyncIO()
+
+
+# ============ ENTRY POINTS ============
+
+def run_ready(coroutine):
+    """Runs a coroutine whose awaits all complete immediately (see SyncIO)."""
+    try:
+        coroutine.send(None)
+    except StopIteration as done:
+        return done.value
+    coroutine.close()
+    raise RuntimeError('Coroutine suspended while running synchronously; use the async entry point')
+
+
+def dual(implementation):
+    """
+    Returns (sync_function, async_function) for a coroutine implementation
+    taking the I/O adapter as its first argument.
+    """
+    @wraps(implementation)
+    def sync_entry(*args, **kwargs):
+        return run_ready(implementation(SYNC_IO, *args, **kwargs))
+
+    @wraps(implementation)
+    async def async_entry(*args, **kwargs):
+        return await implementation(ASYNC_IO, *args, **kwargs)
+
+    name = implementation.__name__.lstrip('_')
+    sync_entry.__name__ = sync_entry.__qualname__ = name
+    async_entry.__name__ = async_entry.__qualname__ = f'a{name}'
+    return sync_entry, async_entry
@@ -0,0 +1,256 @@
+"""
+Location-aware ranking of supplier listings.
+
+Every place users live and deliver to is a Location row with coordinates
+(seeded from LOCATION_COORDINATES, which covers the LOCATIONS list the
+data generator draws default_location from). Each worker holds a
+precomputed location-to-location road distance matrix as one float32 NumPy
+array - a few kilobytes for the whole country - so distances are array
+lookups, never computed per search.
+
+Listings are ranked by what the customer actually pays:
+
+    score = price_per_unit * quantity + DELIVERY_RATE_ETB_PER_KM * distance_km
+
+computed for all listings at once with NumPy (hundreds of listings rank in
+microseconds). Suppliers whose location is unknown are scored as if they
+were as far away as the farthest known location; without a customer
+location the price order is kept.
+
+The matrix is rebuilt when the shared version counter changes; every
+committed Location change increments it (see api/signals.py).
+"""
+import logging
+import threading
+import numpy as np
+from django.core.cache import cache
+from django.db import transaction
+from api.models import Location
+from api.utils.search import normalize
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'geo:version'
+EARTH_RADIUS_KM = 6371.0
+ROAD_FACTOR = 1.3  # Roads are on average ~30% longer than the great-circle distance
+DELIVERY_RATE_ETB_PER_KM = 2.0
+MAX_RESOLVED_NAMES = 1024  # Free-text names remembered per matrix version
+
+# Coordinates of the LOCATIONS in scripts/data_generation/constants.py
+LOCATION_COORDINATES = {
+    'Mekele, Tigray': (13.4967, 39.4753),
+    'Kobo, Amhara': (12.1500, 39.6333),
+    'Meki, Oromia': (8.1500, 38.8167),
+    'Jimma, Oromia': (7.6739, 36.8358),
+    'Sidama, Sidama': (6.7500, 38.4100),
+    'Shashemene, Oromia': (7.2000, 38.6000),
+    'Asella, Oromia': (7.9500, 39.1333),
+    'Addis Ababa, Addis Ababa': (9.0300, 38.7400),
+    'Adama, Oromia': (8.5400, 39.2700),
+    'Bahir Dar, Amhara': (11.5936, 37.3908),
+    'Hawassa, Sidama': (7.0621, 38.4764),
+    'Gondar, Amhara': (12.6000, 37.4667),
+    'Dire Dawa, Dire Dawa': (9.6000, 41.8667),
+    'Arba Minch, SNNPR': (6.0333, 37.5500),
+    'Dessie, Amhara': (11.1333, 39.6333),
+    'Harar, Harari': (9.3100, 42.1200),
+}
+
+
+def distance_matrix(latitudes, longitudes) -> np.ndarray:
+    """Pairwise road distances in km (haversine distance times ROAD_FACTOR) as a float32 matrix."""
+    lat = np.radians(np.asarray(latitudes, dtype=np.float64))[:, None]
+    lon = np.radians(np.asarray(longitudes, dtype=np.float64))[:, None]
+    a = np.sin((lat - lat.T) / 2) ** 2 + np.cos(lat) * np.cos(lat.T) * np.sin((lon - lon.T) / 2) ** 2
+    return (2 * EARTH_RADIUS_KM * ROAD_FACTOR * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))).astype(np.float32)
+
+
+_UNKNOWN = -1  # Row of names that match no location
+_UNSEEN = -2  # Not looked up yet
+
+
+def _city(name: str) -> str:
+    return normalize(name.split(',')[0])
+
+
+class ProximityIndex:
+    """
+    Per-process distance matrix plus a name -> row index lookup. Both are
+    replaced wholesale on every rebuild, so readers never take a lock.
+    """
+
+    def __init__(self):
+        self.version = None
+        self.names = ()
+        self.positions = {}
+        self.distances = np.zeros((0, 0), dtype=np.float32)
+        self.unknown_distance = 0.0
+        self.stats = {'rankings': 0, 'rebuilds': 0, 'unavailable': 0}
+        self._lock = threading.Lock()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.version = None
+            self.names = ()
+            self.positions = {}
+            self.distances = np.zeros((0, 0), dtype=np.float32)
+            self.unknown_distance = 0.0
+
+    # ============ SYNC ============
+
+    def sync(self) -> None:
+        """Brings the matrix up to the shared version (locations rarely change: when the cache is down, keep ours)."""
+        try:
+            shared_version = cache.get(VERSION_KEY)
+            if shared_version is None:
+                # Never expires: a counter that restarted could equal a worker's version
+                cache.add(VERSION_KEY, 0, None)
+                shared_version = cache.get(VERSION_KEY, 0)
+        except Exception as e:
+            logger.warning(f"Location version unavailable: {e}")
+            self.stats['unavailable'] += 1
+            if self.version is not None:
+                return
+            shared_version = -1
+
+        if shared_version == self.version:
+            return
+        with self._lock:
+            if shared_version != self.version:
+                self._rebuild()
+                self.version = shared_version
+
+    def _rebuild(self) -> None:
+        rows = list(Location.objects.order_by('pk').values_list('name', 'latitude', 'longitude'))
+        names = tuple(name for name, _, _ in rows)
+        distances = distance_matrix([row[1] for row in rows], [row[2] for row in rows])
+        positions = {name: i for i, name in enumerate(names)}
+        positions.update({normalize(name): i for i, name in enumerate(names)})
+        positions.update({None: _UNKNOWN, '': _UNKNOWN})
+
+        self.names = names
+        self.distances = distances
+        self.unknown_distance = float(distances.max()) if len(names) else 0.0
+        self.positions = positions
+        self.stats['rebuilds'] += 1
+
+    # ============ LOOKUPS ============
+
+    def _match(self, text: str):
+        """Row of a free-text place: exact name, exact city, a city named in the text, or a city the text starts."""
+        needle = normalize(text)
+        if not needle:
+            return None
+        if self.positions.get(needle, _UNSEEN) >= 0:
+            return self.positions[needle]
+        cities = [(_city(name), i) for i, name in enumerate(self.names)]
+        for city, i in cities:
+            if city == needle:
+                return i
+        named = [(len(city), i) for city, i in cities if f' {city} ' in f' {needle} ']
+        if named:
+            return max(named)[1]
+        prefixed = [(len(city), i) for city, i in cities if f' {city}'.startswith(f' {needle}')]
+        if prefixed:
+            return min(prefixed)[1]
+        return None
+
+    def position(self, text):
+        """Row index of a location name or free-text place, or None when it matches no known location."""
+        positions = self.positions
+        position = positions.get(text, _UNSEEN)
+        if position == _UNSEEN:
+            position = self._match(text) if text else None
+            if len(positions) < MAX_RESOLVED_NAMES:
+                positions[text] = _UNKNOWN if position is None else position
+        return None if position == _UNKNOWN else position
+
+    def locate(self, text):
+        """The known location name a free-text place refers to, or None."""
+        self.sync()
+        position = self.position(text)
+        return None if position is None else self.names[position]
+
+    def distance(self, origin, destination):
+        """Road distance in km between two places, or None when either is unknown."""
+        self.sync()
+        i, j = self.position(origin), self.position(destination)
+        if i is None or j is None:
+            return None
+        return round(float(self.distances[i, j]), 1)
+
+    # ============ RANKING ============
+
+    def rank(self, prices, supplier_locations, customer_location, quantity: float):
+        """
+        Orders listings by total cost including delivery to customer_location.
+
+        Returns (order, distance_km, delivery_cost): an index array into the
+        inputs, best first, and per-listing float arrays aligned with the
+        inputs (NaN where the supplier's location is unknown). Without a
+        known customer location the input order is kept and both arrays are
+        all NaN.
+        """
+        self.sync()
+        self.stats['rankings'] += 1
+        count = len(prices)
+        customer = self.position(customer_location)
+        if customer is None or count == 0:
+            unknown = np.full(count, np.nan)
+            return np.arange(count), unknown, unknown
+
+        positions = self.positions
+        rows = [positions.get(name, _UNSEEN) for name in supplier_locations]
+        if _UNSEEN in rows:
+            for i in [i for i, row in enumerate(rows) if row == _UNSEEN]:
+                row = self.position(supplier_locations[i])
+                rows[i] = _UNKNOWN if row is None else row
+        rows = np.array(rows, dtype=np.intp)
+        known = rows >= 0
+        distance_km = np.where(known, self.distances[customer, np.where(known, rows, 0)], np.nan)
+        delivery_cost = distance_km * DELIVERY_RATE_ETB_PER_KM
+
+        score = np.asarray(prices, dtype=np.float64) * quantity + np.where(
+            known, delivery_cost, self.unknown_distance * DELIVERY_RATE_ETB_PER_KM)
+        # Stable, so equal scores keep the input (price) order
+        return np.argsort(score, kind='stable'), distance_km, delivery_cost
+
+
+PROXIMITY = ProximityIndex()
+
+
+# ============ SEEDING AND INVALIDATION ============
+
+def sync_locations(using: str = 'default') -> int:
+    """Creates the rows of LOCATION_COORDINATES that are missing (existing rows keep their coordinates)."""
+    existing = set(Location.objects.using(using).values_list('name', flat=True))
+    missing = [
+        Location(name=name, latitude=latitude, longitude=longitude)
+        for name, (latitude, longitude) in LOCATION_COORDINATES.items() if name not in existing
+    ]
+    if missing:
+        Location.objects.using(using).bulk_create(missing, ignore_conflicts=True)
+        invalidate_locations()
+    return len(missing)
+
+
+def _bump_version() -> None:
+    try:
+        try:
+            cache.incr(VERSION_KEY)
+        except ValueError:
+            if not cache.add(VERSION_KEY, 1, None):
+                cache.incr(VERSION_KEY)
+    except Exception as e:
+        logger.warning(f"Could not publish location change: {e}")
+
+
+def invalidate_locations() -> None:
+    """Schedules a distance matrix rebuild in every worker once the current transaction commits."""
+    transaction.on_commit(_bump_version)
+
+
+def get_geo_stats() -> dict:
+    stats = dict(PROXIMITY.stats)
+    stats.update(version=PROXIMITY.version, locations=len(PROXIMITY.names))
+    return stats
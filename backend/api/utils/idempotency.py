@@ -0,0 +1,141 @@
+"""
+Idempotency keys for operations that must not run twice (order creation).
+
+A client sends the same key with every retry of one request. The first
+request claims the key by inserting an IdempotencyKey row - the unique
+(user, scope, key) index makes exactly one concurrent attempt win - runs
+the operation and stores its response. Retries with the same key and
+payload get the stored response back without running anything again (no
+second order, no second supplier notification). A retry with the same key
+but a different payload is refused, and so is one that arrives while the
+first attempt is still running.
+
+Failed attempts (error responses or exceptions) release their key so the
+client can retry. Keys expire after KEY_TTL; an attempt that died without
+releasing its key (a killed worker) can be taken over after
+IN_PROGRESS_TIMEOUT. purge_idempotency_keys deletes expired rows.
+"""
+import hashlib
+import json
+import logging
+import threading
+from collections import namedtuple
+from datetime import timedelta
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from api.models import IdempotencyKey
+
+logger = logging.getLogger(__name__)
+
+KEY_TTL = timedelta(hours=24)
+IN_PROGRESS_TIMEOUT = timedelta(minutes=2)
+MAX_KEY_LENGTH = 255
+
+# Outcomes of claim()
+NEW, REPLAY, CONFLICT, IN_PROGRESS = 'new', 'replay', 'conflict', 'in_progress'
+
+Claim = namedtuple('Claim', ['outcome', 'record', 'response'])
+
+IDEMPOTENCY_STATS = {'claimed': 0, 'replayed': 0, 'conflicts': 0, 'in_progress': 0, 'released': 0}
+_stats_lock = threading.Lock()
+
+
+def _count(outcome: str) -> None:
+    with _stats_lock:
+        IDEMPOTENCY_STATS[outcome] += 1
+
+
+def fingerprint(payload) -> str:
+    """Stable hash of a JSON-serializable request payload."""
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _take_over(record, request_hash: str, now):
+    """Re-claims an expired or abandoned key; only one of several concurrent callers succeeds."""
+    taken = IdempotencyKey.objects.filter(pk=record.pk, created_at=record.created_at).update(
+        request_hash=request_hash, response=None, order=None, created_at=now, expires_at=now + KEY_TTL)
+    if not taken:
+        return None
+    record.request_hash, record.response, record.order_id = request_hash, None, None
+    record.created_at, record.expires_at = now, now + KEY_TTL
+    return record
+
+
+def claim(user, scope: str, key: str, payload) -> Claim:
+    """
+    Claims key for a request with this payload. Go ahead only when the
+    outcome is NEW, then call complete() (or release()) with the record;
+    otherwise return the claim's response, which is either the original
+    response (REPLAY) or an error dict.
+    """
+    if len(key) > MAX_KEY_LENGTH:
+        return Claim(CONFLICT, None, {'error': f'Idempotency key is longer than {MAX_KEY_LENGTH} characters',
+                                      'idempotency': CONFLICT})
+
+    request_hash = fingerprint(payload)
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            record = IdempotencyKey.objects.create(
+                user=user, scope=scope, key=key, request_hash=request_hash,
+                created_at=now, expires_at=now + KEY_TTL,
+            )
+        _count('claimed')
+        return Claim(NEW, record, None)
+    except IntegrityError:
+        record = IdempotencyKey.objects.filter(user=user, scope=scope, key=key).first()
+
+    if record is None:
+        # Released or purged in between: claim it again
+        return claim(user, scope, key, payload)
+
+    abandoned = record.response is None and record.created_at <= now - IN_PROGRESS_TIMEOUT
+    if record.expires_at <= now or abandoned:
+        if _take_over(record, request_hash, now) is not None:
+            if abandoned:
+                logger.warning(f"Taking over abandoned idempotency key {scope}:{key}")
+            _count('claimed')
+            return Claim(NEW, record, None)
+        record = IdempotencyKey.objects.filter(pk=record.pk).first() or record
+
+    if record.request_hash != request_hash:
+        _count('conflicts')
+        error = {'error': 'This idempotency key was already used for a different request', 'idempotency': CONFLICT}
+        if record.order_id:
+            error['original_order_id'] = str(record.order_id)
+        return Claim(CONFLICT, None, error)
+
+    if record.response is None:
+        _count('in_progress')
+        return Claim(IN_PROGRESS, None, {'error': 'A request with this idempotency key is still being processed',
+                                         'idempotency': IN_PROGRESS})
+
+    _count('replayed')
+    return Claim(REPLAY, record, record.response)
+
+
+def complete(record, response: dict, order_id=None) -> None:
+    """Stores the response of a successful request; an error response releases the key instead."""
+    if 'error' in response:
+        release(record)
+        return
+    record.response = response
+    record.order_id = order_id
+    record.save(update_fields=['response', 'order'])
+
+
+def release(record) -> None:
+    """Frees a claimed key after a failed attempt so that it can be retried."""
+    IdempotencyKey.objects.filter(pk=record.pk, response__isnull=True).delete()
+    _count('released')
+
+
+def purge_expired_keys() -> int:
+    """Deletes expired keys; returns how many were deleted."""
+    deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted
+
+
+def get_idempotency_stats() -> dict:
+    with _stats_lock:
+        return dict(IDEMPOTENCY_STATS)
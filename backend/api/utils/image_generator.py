@@ -1,81 +1,70 @@
 import os
-import asyncio
 from runware import Runware, IImageInference
 
+# Production Runware endpoint unless overridden (e.g. to point at a local fake server)
+RUNWARE_URL = os.environ.get('RUNWARE_URL', 'wss://ws-api.runware.ai/v1')
 
-async def generate_product_image(product_description: str) -> str:
+
+def create_runware_client(api_key: str = None, url: str = None) -> Runware:
+    """
+    Creates a Runware client. The client connects lazily on its first request
+    and reconnects by itself, so one instance can be kept for the lifetime of
+    the process and shared by concurrent requests.
+    """
+    runware_api_key = api_key or os.environ.get('RUNWARE_API_KEY')
+
+    if not runware_api_key:
+        raise ValueError("RUNWARE_API_KEY not found in environment variables")
+
+    return Runware(api_key=runware_api_key, url=url or RUNWARE_URL)
+
+
+def build_image_request(product_description: str) -> IImageInference:
+    """Builds the image inference request for a product description."""
+    return IImageInference(
+        positivePrompt=f"{product_description}, professional product photography, high quality, well lit, market display",
+        model="runware:101@1",
+        width=1024,
+        height=1024
+    )
+
+
+async def generate_product_image(product_description: str, runware: Runware = None) -> str:
     """
     Generates a product image using Runware API based on the description.
-    
+
     Args:
         product_description: Description of the image to generate
-        
+        runware: Connected client to reuse; a temporary one is created
+            (and disconnected afterwards) when omitted
+
     Returns:
         str: URL of the generated image
-        
+
     Raises:
         Exception: If image generation fails
     """
+    owns_client = runware is None
     try:
-        runware_api_key = os.environ.get('RUNWARE_API_KEY')
-        
-        if not runware_api_key:
-            raise ValueError("RUNWARE_API_KEY not found in environment variables")
-        
-        runware = Runware(api_key=runware_api_key)
-        
-        # Establish connection
-        await runware.connect()
-        
-        # Create image generation request
-        request = IImageInference(
-            positivePrompt=f"{product_description}, professional product photography, high quality, well lit, market display",
-            model="runware:101@1",
-            width=1024,
-            height=1024
-        )
-        
+        if owns_client:
+            runware = create_runware_client()
+            await runware.connect()
+
         # Generate image
-        images = await runware.imageInference(requestImage=request)
-        
+        images = await runware.imageInference(requestImage=build_image_request(product_description))
+
         # Get the first image URL
         image_url = images[0].imageURL if images else None
-        
-        # Disconnect
-        await runware.disconnect()
-        
+
         if not image_url:
             raise Exception("No image was generated")
-        
+
         return image_url
-        
+
     except Exception as e:
         print(f"Error generating image: {e}")
         raise
 
-
-def generate_product_image_sync(product_description: str) -> str:
-    """
-    Synchronous wrapper for generate_product_image.
-    
-    Args:
-        product_description: Description of the image to generate
-        
-    Returns:
-        str: URL of the generated image
-    """
-    try:
-        # Create new event loop if needed
-        try:
-            loop = asyncio.get_event_loop()
-        except RuntimeError:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-        
-        # Run the async function
-        image_url = loop.run_until_complete(generate_product_image(product_description))
-        return image_url
-        
-    except Exception as e:
-        raise Exception(f"Image generation failed: {str(e)}")
-
+    finally:
+        if owns_client and runware is not None:
+            await runware.disconnect()
@@ -0,0 +1,331 @@
+"""
+Background product image generation.
+
+Image synthesis takes several seconds, so the agent never waits for it:
+submit_image_job() returns a job id immediately and a pool of worker
+coroutines, running on a dedicated event loop thread and sharing one
+persistent Runware connection, generates the image. When it is ready the
+image URL is saved in the supplier's conversation and pushed to their
+WebSocket channel.
+
+Generated URLs are cached by a hash of the normalized prompt, so repeated
+descriptions reuse the earlier image, and identical requests that arrive
+while a job is running are attached to that job instead of starting another.
+Subscribers are recorded with an atomic counter (one cache key each), so
+concurrent requests never overwrite each other's subscription. A job that
+has not finished within STALE_JOB_SECONDS of its last update (e.g. its
+worker process was restarted) is taken over by the next identical request.
+"""
+import os
+import re
+import time
+import uuid
+import asyncio
+import hashlib
+import logging
+import threading
+import unicodedata
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.core.cache import cache
+from api.models import User, ConversationHistory
+from api.utils.image_generator import create_runware_client, generate_product_image
+
+logger = logging.getLogger(__name__)
+
+IMAGE_JOB_WORKERS = int(os.environ.get('IMAGE_JOB_WORKERS', 3))
+IMAGE_TIMEOUT_SECONDS = 120
+IMAGE_CACHE_TIMEOUT = 30 * 86400  # Generated images are reused for 30 days
+JOB_CACHE_TIMEOUT = 86400
+# A queued or running job not updated for this long is assumed lost and is restarted
+STALE_JOB_SECONDS = 2 * IMAGE_TIMEOUT_SECONDS
+
+
+def normalize_prompt(description: str) -> str:
+    """Lowercases, strips punctuation and collapses whitespace (keeps Fidel letters)."""
+    text = unicodedata.normalize('NFKC', description or '').lower()
+    text = re.sub(r'[^\w\s]', ' ', text)
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def prompt_hash(description: str) -> str:
+    return hashlib.sha256(normalize_prompt(description).encode('utf-8')).hexdigest()[:32]
+
+
+def _image_key(key: str) -> str:
+    return f'image_prompt:{key}'
+
+
+def _inflight_key(key: str) -> str:
+    return f'image_inflight:{key}'
+
+
+def _job_key(job_id: str) -> str:
+    return f'image_job:{job_id}'
+
+
+def _subscriber_count_key(job_id: str) -> str:
+    return f'image_job:{job_id}:subscribers'
+
+
+def _subscriber_key(job_id: str, n: int) -> str:
+    return f'image_job:{job_id}:subscriber:{n}'
+
+
+def _subscribe(job_id: str, user_id: str) -> None:
+    """Adds user_id to the job's subscribers; safe against concurrent subscribers in any process."""
+    cache.add(_subscriber_count_key(job_id), 0, JOB_CACHE_TIMEOUT)
+    n = cache.incr(_subscriber_count_key(job_id))
+    cache.set(_subscriber_key(job_id, n), user_id, JOB_CACHE_TIMEOUT)
+
+
+def _ordered_subscribers(found: dict) -> list:
+    # The same user may have subscribed more than once
+    return list(dict.fromkeys(found[key] for key in sorted(found, key=lambda key: int(key.rsplit(':', 1)[1]))))
+
+
+async def _subscribers(job_id: str) -> list:
+    count = await cache.aget(_subscriber_count_key(job_id)) or 0
+    return _ordered_subscribers(await cache.aget_many([_subscriber_key(job_id, n) for n in range(1, count + 1)]))
+
+
+def _take_over(stale_id: str, job_id: str) -> None:
+    """Moves the subscribers of a lost job to the job that replaces it."""
+    count = cache.get(_subscriber_count_key(stale_id)) or 0
+    found = cache.get_many([_subscriber_key(stale_id, n) for n in range(1, count + 1)])
+    for user_id in _ordered_subscribers(found):
+        _subscribe(job_id, user_id)
+
+
+def _is_stale(job: dict) -> bool:
+    return job['status'] in ('queued', 'running') and time.time() - job.get('updated_at', 0) > STALE_JOB_SECONDS
+
+
+class ImageJobQueue:
+    """
+    Runs image generation jobs on a private event loop thread.
+
+    The loop, the worker coroutines and the Runware connection are created on
+    first use and live for the rest of the process.
+    """
+
+    def __init__(self, workers: int = IMAGE_JOB_WORKERS, api_key: str = None, url: str = None):
+        self.workers = workers
+        self.api_key = api_key
+        self.url = url
+        self.stats = {'submitted': 0, 'cache_hits': 0, 'deduplicated': 0, 'generated': 0, 'failed': 0}
+        self._loop = None
+        self._thread = None
+        self._queue = None
+        self._tasks = []
+        self._runware = None
+        self._connect_lock = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+    # ============ SUBMISSION (called from request threads) ============
+
+    def submit(self, user, product_description: str) -> dict:
+        """
+        Queues an image for product_description on behalf of user.
+        Returns {'status': 'completed', 'image_url': ...} straight away when the
+        prompt was generated before, otherwise {'status': 'queued', 'job_id': ...}.
+        """
+        key = prompt_hash(product_description)
+        self._count('submitted')
+
+        image_url = cache.get(_image_key(key))
+        if image_url:
+            self._count('cache_hits')
+            return {'status': 'completed', 'image_url': image_url, 'cached': True}
+
+        job_id = str(uuid.uuid4())
+        job = {
+            'job_id': job_id,
+            'status': 'queued',
+            'prompt': product_description,
+            'prompt_hash': key,
+            'image_url': None,
+            'error': None,
+            'updated_at': time.time(),
+        }
+
+        # cache.add is atomic, so only one worker process starts a job per prompt
+        if not cache.add(_inflight_key(key), job_id, JOB_CACHE_TIMEOUT):
+            running_id = cache.get(_inflight_key(key))
+            running = cache.get(_job_key(running_id)) if running_id else None
+            if running and not _is_stale(running):
+                _subscribe(running_id, str(user.id))
+                self._count('deduplicated')
+                # Re-read: the job may have finished (and notified) before we subscribed
+                running = cache.get(_job_key(running_id)) or running
+                if running['status'] == 'completed':
+                    return {'status': 'completed', 'image_url': running['image_url'], 'job_id': running_id}
+                return {'status': running['status'], 'job_id': running_id}
+            cache.set(_inflight_key(key), job_id, JOB_CACHE_TIMEOUT)
+            if running:
+                logger.warning(f"Image job {running_id} stalled in '{running['status']}', restarting it as {job_id}")
+                _take_over(running_id, job_id)
+
+        cache.set(_job_key(job_id), job, JOB_CACHE_TIMEOUT)
+        _subscribe(job_id, str(user.id))
+        self._ensure_started()
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, job_id)
+        return {'status': 'queued', 'job_id': job_id}
+
+    def _count(self, name: str) -> None:
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def _ensure_started(self) -> None:
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+
+            ready = threading.Event()
+
+            def run():
+                self._loop = asyncio.new_event_loop()
+                asyncio.set_event_loop(self._loop)
+                self._queue = asyncio.Queue()
+                self._connect_lock = asyncio.Lock()
+                self._tasks = [
+                    self._loop.create_task(self._worker(), name=f'image-worker-{n}')
+                    for n in range(self.workers)
+                ]
+                ready.set()
+                self._loop.run_forever()
+                self._loop.close()
+
+            self._thread = threading.Thread(target=run, name='kcart-image-jobs', daemon=True)
+            self._thread.start()
+            ready.wait()
+
+    def shutdown(self) -> None:
+        """Disconnects from Runware and stops the loop thread."""
+        if self._loop is None:
+            return
+
+        async def close():
+            for task in self._tasks:
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+            if self._runware is not None:
+                await self._runware.disconnect()
+                self._runware = None
+
+        asyncio.run_coroutine_threadsafe(close(), self._loop).result(timeout=10)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=10)
+        self._thread = None
+
+    # ============ WORKERS (run on the job loop) ============
+
+    async def _client(self):
+        async with self._connect_lock:
+            if self._runware is None:
+                self._runware = create_runware_client(api_key=self.api_key, url=self.url)
+                await self._runware.connect()
+            return self._runware
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run_job(job_id)
+            except Exception as e:
+                logger.error(f"Image job {job_id} crashed: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _run_job(self, job_id: str) -> None:
+        job = await cache.aget(_job_key(job_id))
+        if job is None:
+            return
+
+        job.update({'status': 'running', 'updated_at': time.time()})
+        await cache.aset(_job_key(job_id), job, JOB_CACHE_TIMEOUT)
+
+        try:
+            runware = await self._client()
+            image_url = await asyncio.wait_for(
+                generate_product_image(job['prompt'], runware=runware), IMAGE_TIMEOUT_SECONDS
+            )
+            await cache.aset(_image_key(job['prompt_hash']), image_url, IMAGE_CACHE_TIMEOUT)
+            status, error = 'completed', None
+            self._count('generated')
+        except Exception as e:
+            logger.error(f"Image job {job_id} failed: {e}")
+            image_url, status, error = None, 'failed', str(e) or type(e).__name__
+            self._count('failed')
+
+        # Only this worker writes the job; subscribers are kept under their own keys
+        job.update({'status': status, 'image_url': image_url, 'error': error, 'updated_at': time.time()})
+        await cache.aset(_job_key(job_id), job, JOB_CACHE_TIMEOUT)
+        # A job that ran past STALE_JOB_SECONDS may have been taken over; leave its replacement's key alone
+        if await cache.aget(_inflight_key(job['prompt_hash'])) == job_id:
+            await cache.adelete(_inflight_key(job['prompt_hash']))
+
+        await self._notify(job)
+
+    async def _notify(self, job: dict) -> None:
+        if job['status'] == 'completed':
+            message = (
+                f"🖼️ Your product image is ready:\n{job['image_url']}\n\n"
+                f"Do you like this image? If so, I can add it to your listing."
+            )
+        else:
+            message = "Sorry, I couldn't generate the product image. Please try again with a different description."
+
+        message_type = 'image_ready' if job['status'] == 'completed' else 'image_failed'
+        channel_layer = get_channel_layer()
+        for user_id in await _subscribers(job['job_id']):
+            try:
+                chat_message = await _save_image_message(user_id, message, message_type)
+                await channel_layer.group_send(
+                    f'user_{user_id}',
+                    {
+                        'type': 'chat_message',
+                        'message': message,
+                        'message_type': message_type,
+                        'job_id': job['job_id'],
+                        'timestamp': chat_message.timestamp.isoformat()
+                    }
+                )
+            except Exception as e:
+                logger.error(f"Error sending image notification to {user_id}: {e}")
+
+
+@database_sync_to_async
+def _save_image_message(user_id: str, message: str, message_type: str) -> ConversationHistory:
+    # Saved in the conversation so the agent sees the URL on the supplier's next turn
+    return ConversationHistory.objects.create(
+        user=User.objects.get(id=user_id),
+        sender='bot',
+        message=message,
+        message_type=message_type
+    )
+
+
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+
+def get_image_job_queue() -> ImageJobQueue:
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            _job_queue = ImageJobQueue()
+        return _job_queue
+
+
+def submit_image_job(user, product_description: str) -> dict:
+    return get_image_job_queue().submit(user, product_description)
+
+
+def get_image_job(job_id: str) -> dict:
+    """Returns the job's status and, once completed, its image URL."""
+    job = cache.get(_job_key(job_id))
+    if job is None:
+        return {'error': f'Image job {job_id} not found'}
+    return {key: job[key] for key in ('job_id', 'status', 'image_url', 'error')}
@@ -0,0 +1,362 @@
+"""
+Ranked product search over names, Amharic names and transliterations.
+
+Every name a product can be searched by is a ProductAlias row: the product's
+own display and internal names (kept in sync by signals) plus Amharic (Fidel)
+names and Latin transliterations from DEFAULT_ALIASES or the admin. Queries
+and aliases are compared in normalized form (normalize()): case-folded,
+punctuation removed and Amharic homophone letters unified (ሐ/ኀ -> ሀ, ሠ -> ሰ,
+ዐ -> አ, ፀ -> ጸ).
+
+A search backend finds candidate aliases with an index:
+- SQLiteFTSBackend: an FTS5 trigram index over the aliases (external content
+  table kept current by triggers), plus a B-tree range scan for prefixes;
+- PostgresTrigramBackend: a pg_trgm GIN index (similarity, word similarity
+  and prefix matches);
+- SearchBackend: unindexed prefix/substring matching on other databases.
+The index structures are created after every migrate (see api/signals.py)
+and by manage.py rebuild_search_index.
+
+Candidates are then ranked the same way on every backend (score()): exact
+match, then word prefix, then substring, then trigram similarity, so
+misspellings ("tomatos") and transliterations ("timatim") resolve to the
+right product. Ranked results are cached in the shared cache until an alias
+changes.
+"""
+import hashlib
+import logging
+import re
+import uuid
+import unicodedata
+from django.core.cache import cache
+from django.db import connections, transaction, DatabaseError
+from api.models import Product, ProductAlias
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'product_search:version'
+RESULT_TIMEOUT = 3600
+CANDIDATE_LIMIT = 50
+MIN_SCORE = 0.3  # Below this a candidate is not considered a match
+# Writes (orders, listings) act only on close matches - the exact name or an
+# alias, or a word prefix covering most of it; weaker matches are suggestions
+WRITE_MIN_SCORE = 0.8
+VARIANT_SEPARATOR = '__'  # Scaled datasets name variants "<internal_name>__<n>"
+
+# Amharic names and common Latin spellings of the marketplace catalog, by internal name
+DEFAULT_ALIASES = {
+    'red_onions': ('ቀይ ሽንኩርት', 'key shinkurt', 'onion', 'shinkurt'),
+    'tomatoes': ('ቲማቲም', 'timatim', 'tomato'),
+    'potatoes': ('ድንች', 'dinch', 'potato'),
+    'garlic': ('ነጭ ሽንኩርት', 'nech shinkurt'),
+    'cabbage': ('ጥቅል ጎመን', 'tikil gomen'),
+    'carrots': ('ካሮት', 'karot', 'carrot'),
+    'green_peppers': ('ቃሪያ', 'kariya', 'qaria', 'green pepper'),
+    'collard_greens': ('ጎመን', 'gomen', 'kale'),
+    'avocados': ('አቮካዶ', 'avocado'),
+    'bananas': ('ሙዝ', 'muz', 'banana'),
+    'mangoes': ('ማንጎ', 'mango'),
+    'papayas': ('ፓፓያ', 'papaya'),
+    'oranges': ('ብርቱካን', 'birtukan', 'orange'),
+    'lemons': ('ሎሚ', 'lomi', 'lemon'),
+    'watermelon': ('ሐብሐብ', 'habhab'),
+    'milk': ('ወተት', 'wetet'),
+    'yogurt': ('እርጎ', 'ergo', 'yoghurt'),
+    'butter': ('ቅቤ', 'kibe', 'qibe'),
+    'sweet_potatoes': ('ስኳር ድንች', 'sikuar dinch', 'sweet potato'),
+    'ginger': ('ዝንጅብል', 'zinjibil'),
+}
+
+# Letters that sound the same are spelled interchangeably: map each series to one
+_HOMOPHONES = {}
+for _source, _target in ((0x1210, 0x1200), (0x1280, 0x1200), (0x1220, 0x1230), (0x12D0, 0x12A0), (0x1340, 0x1338)):
+    _HOMOPHONES.update({_source + order: _target + order for order in range(7)})
+
+_QUOTES = re.compile(r"[`'’‘]")
+_SEPARATORS = re.compile(r'[\W_]+')
+
+
+def normalize(text: str) -> str:
+    text = unicodedata.normalize('NFC', str(text)).translate(_HOMOPHONES).casefold()
+    return _SEPARATORS.sub(' ', _QUOTES.sub('', text)).strip()
+
+
+def is_fidel(text: str) -> bool:
+    return any('\u1200' <= char <= '\u139f' for char in text)
+
+
+# ============ RANKING ============
+
+def _trigrams(text: str) -> set:
+    grams = set()
+    for word in text.split():
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def similarity(a: str, b: str) -> float:
+    """Trigram similarity of two normalized strings (as pg_trgm computes it)."""
+    grams_a, grams_b = _trigrams(a), _trigrams(b)
+    if not grams_a or not grams_b:
+        return 0.0
+    return len(grams_a & grams_b) / len(grams_a | grams_b)
+
+
+def score(query: str, term: str) -> float:
+    """Relevance of an alias to a query, both normalized: 1.0 for an exact match."""
+    if query == term:
+        return 1.0
+    coverage = len(query) / max(len(term), 1)
+    fuzzy = similarity(query, term)
+    if f' {term}'.find(f' {query}') >= 0:
+        return max(0.6 + 0.3 * coverage, fuzzy)
+    if query in term:
+        return max(0.4 + 0.3 * coverage, fuzzy)
+    return fuzzy
+
+
+# ============ BACKENDS ============
+
+class SearchBackend:
+    """
+    Finds candidate (product_id, product_name, normalized_alias) rows for a
+    normalized query. This base class needs no index support and scans.
+    """
+    name = 'scan'
+
+    def install(self, using: str) -> None:
+        """Creates the index structures (idempotent)."""
+
+    def candidates(self, query: str, using: str) -> list:
+        aliases = ProductAlias.objects.using(using).values_list('product_id', 'product__product_name', 'normalized')
+        return list(aliases.filter(normalized__contains=query)[:CANDIDATE_LIMIT])
+
+    def _prefix_candidates(self, query: str, using: str) -> list:
+        # A range scan on the normalized column's B-tree index
+        return list(ProductAlias.objects.using(using).filter(
+            normalized__gte=query, normalized__lt=query + '\U0010ffff'
+        ).values_list('product_id', 'product__product_name', 'normalized')[:CANDIDATE_LIMIT])
+
+
+class SQLiteFTSBackend(SearchBackend):
+    name = 'sqlite_fts5'
+
+    def __init__(self):
+        self.table = ProductAlias._meta.db_table
+        self.fts_table = f'{self.table}_fts'
+
+    def install(self, using: str) -> None:
+        table, fts = self.table, self.fts_table
+        with connections[using].cursor() as cursor:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+                f"normalized, content='{table}', content_rowid='id', tokenize='trigram')"
+            )
+            cursor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {table} BEGIN "
+                f"INSERT INTO {fts}(rowid, normalized) VALUES (new.id, new.normalized); END"
+            )
+            cursor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {table} BEGIN "
+                f"INSERT INTO {fts}({fts}, rowid, normalized) VALUES ('delete', old.id, old.normalized); END"
+            )
+            cursor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE ON {table} BEGIN "
+                f"INSERT INTO {fts}({fts}, rowid, normalized) VALUES ('delete', old.id, old.normalized); "
+                f"INSERT INTO {fts}(rowid, normalized) VALUES (new.id, new.normalized); END"
+            )
+            cursor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+    def candidates(self, query: str, using: str) -> list:
+        rows = self._prefix_candidates(query, using)
+        grams = {query[i:i + 3] for i in range(len(query) - 2)}
+        if not grams:
+            return rows  # The trigram index needs at least three characters
+
+        # Any shared trigram makes a candidate; bm25 puts those sharing the most first
+        match = ' OR '.join(f'"{gram}"' for gram in sorted(grams))
+        with transaction.atomic(using=using), connections[using].cursor() as cursor:
+            cursor.execute(
+                f"SELECT a.product_id, p.product_name, a.normalized FROM {self.fts_table} f "
+                f"JOIN {self.table} a ON a.id = f.rowid JOIN {Product._meta.db_table} p ON p.product_id = a.product_id "
+                f"WHERE {self.fts_table} MATCH %s ORDER BY bm25({self.fts_table}) LIMIT %s",
+                [match, CANDIDATE_LIMIT],
+            )
+            return rows + cursor.fetchall()
+
+
+class PostgresTrigramBackend(SearchBackend):
+    name = 'pg_trgm'
+
+    def __init__(self):
+        self.table = ProductAlias._meta.db_table
+
+    def install(self, using: str) -> None:
+        with connections[using].cursor() as cursor:
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {self.table}_normalized_trgm "
+                f"ON {self.table} USING gin (normalized gin_trgm_ops)"
+            )
+
+    def candidates(self, query: str, using: str) -> list:
+        # %, <% and LIKE 'prefix%' are all served by the GIN trigram index
+        with transaction.atomic(using=using), connections[using].cursor() as cursor:
+            cursor.execute(
+                f"SELECT a.product_id, p.product_name, a.normalized FROM {self.table} a "
+                f"JOIN {Product._meta.db_table} p ON p.product_id = a.product_id "
+                f"WHERE a.normalized %% %s OR %s <%% a.normalized OR a.normalized LIKE %s "
+                f"ORDER BY similarity(a.normalized, %s) DESC LIMIT %s",
+                [query, query, query + '%', query, CANDIDATE_LIMIT],
+            )
+            return cursor.fetchall()
+
+
+def get_backend(using: str = 'default') -> SearchBackend:
+    vendor = connections[using].vendor
+    if vendor == 'sqlite':
+        return SQLiteFTSBackend()
+    if vendor == 'postgresql':
+        return PostgresTrigramBackend()
+    return SearchBackend()
+
+
+def install_search_index(using: str = 'default') -> None:
+    backend = get_backend(using)
+    try:
+        backend.install(using)
+    except DatabaseError as e:
+        logger.warning(f"Could not install the {backend.name} product search index: {e}")
+
+
+# ============ SEARCH ============
+
+def _rank(query: str, rows) -> list:
+    best = {}
+    for product_id, product_name, term in rows:
+        product_id = str(uuid.UUID(str(product_id)))  # Raw SQLite rows hold UUIDs as bare hex
+        relevance = score(query, term)
+        if relevance >= MIN_SCORE and relevance > best.get(product_id, (0.0,))[0]:
+            best[product_id] = (relevance, product_name, term)
+    ranked = sorted(best.items(), key=lambda item: (-item[1][0], len(item[1][2]), item[0]))
+    return [
+        {'product_id': product_id, 'product_name': product_name, 'score': round(relevance, 3), 'matched': term}
+        for product_id, (relevance, product_name, term) in ranked
+    ]
+
+
+def search_products(query: str, limit: int = 5, using: str = 'default') -> list:
+    """
+    Products matching a free-text query, best first:
+    [{'product_id', 'product_name', 'score', 'matched'}, ...].
+    """
+    query = normalize(query or '')
+    if not query:
+        return []
+
+    key = None
+    try:
+        version = cache.get(VERSION_KEY, 0)
+        key = f"product_search:{version}:{limit}:{hashlib.md5(query.encode()).hexdigest()}"
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+    except Exception as e:
+        logger.warning(f"Product search cache unavailable: {e}")
+
+    backend = get_backend(using)
+    try:
+        rows = backend.candidates(query, using)
+    except DatabaseError as e:
+        logger.warning(f"{backend.name} product search failed, scanning instead: {e}")
+        rows = SearchBackend.candidates(backend, query, using)
+    results = _rank(query, rows)[:limit]
+
+    if key is not None:
+        try:
+            cache.set(key, results, RESULT_TIMEOUT)
+        except Exception:
+            pass
+    return results
+
+
+def best_match(query: str):
+    """Id of the best-matching product, or None."""
+    results = search_products(query, limit=1)
+    return results[0]['product_id'] if results else None
+
+
+def confident_match(query: str):
+    """
+    (product_id, suggestions) for tools that write: the best product when it
+    scores at least WRITE_MIN_SCORE, otherwise None and the names of the
+    closest products, to confirm with the user before retrying.
+    """
+    results = search_products(query, limit=3)
+    if results and results[0]['score'] >= WRITE_MIN_SCORE:
+        return results[0]['product_id'], []
+    return None, [result['product_name'] for result in results]
+
+
+# ============ ALIASES ============
+
+def _product_terms(product) -> list:
+    """(alias, kind) pairs a product should be searchable by."""
+    base_name, _, variant = product.internal_name.partition(VARIANT_SEPARATOR)
+    terms = [(product.product_name, 'name'), (product.internal_name.replace(VARIANT_SEPARATOR, ' '), 'name')]
+    for alias in DEFAULT_ALIASES.get(base_name, ()):
+        alias = f'{alias} {variant}' if variant else alias
+        terms.append((alias, 'fidel' if is_fidel(alias) else 'latin'))
+    return terms
+
+
+def sync_product_aliases(products=None) -> int:
+    """
+    Creates the name and default aliases of the given products (all products
+    by default) and removes name aliases that no longer match their product.
+    Aliases added by hand are kept. Returns the number of aliases created.
+    """
+    products = list(products if products is not None else Product.objects.all())
+    product_ids = [product.product_id for product in products]
+
+    existing = {}
+    for alias_id, product_id, normalized, kind in ProductAlias.objects.filter(
+            product_id__in=product_ids).values_list('id', 'product_id', 'normalized', 'kind'):
+        existing[(product_id, normalized)] = (alias_id, kind)
+
+    wanted = {}
+    for product in products:
+        for alias, kind in _product_terms(product):
+            normalized = normalize(alias)
+            if normalized:
+                wanted.setdefault((product.product_id, normalized), (alias, kind))
+
+    stale = [alias_id for key, (alias_id, kind) in existing.items() if kind == 'name' and key not in wanted]
+    new = [
+        ProductAlias(product_id=product_id, alias=alias, normalized=normalized, kind=kind)
+        for (product_id, normalized), (alias, kind) in wanted.items()
+        if (product_id, normalized) not in existing
+    ]
+    with transaction.atomic():
+        ProductAlias.objects.filter(id__in=stale).delete()
+        ProductAlias.objects.bulk_create(new, batch_size=1000, ignore_conflicts=True)
+    if stale or new:
+        invalidate_search()
+    return len(new)
+
+
+def _publish_change() -> None:
+    try:
+        try:
+            cache.incr(VERSION_KEY)
+        except ValueError:
+            if not cache.add(VERSION_KEY, 1, None):
+                cache.incr(VERSION_KEY)
+    except Exception as e:
+        logger.warning(f"Could not invalidate product search results: {e}")
+
+
+def invalidate_search() -> None:
+    """Drops cached search results once the current transaction commits."""
+    transaction.on_commit(_publish_change)
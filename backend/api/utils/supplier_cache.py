@@ -0,0 +1,125 @@
+"""
+Read-through cache for the supplier inventory and order views.
+
+Suppliers ask for "my stock" and "my orders" again and again in one
+session, and each answer used to be rebuilt from the database. Results are
+now cached in the shared cache under a per-supplier version counter: any
+committed change to the supplier's Inventory or OrderItem rows, or to an
+Order containing their items, increments the counter, so older entries are
+simply never read again and expire on their own. A global counter covers
+changes that affect every supplier's views (product or customer renames,
+bulk loads).
+
+A hit costs two cache reads and no database work. Results also depend on
+the current date ('expiring soon', 'today'), which is part of the key.
+"""
+import logging
+import threading
+from functools import wraps
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from api.db_router import pin_to_primary
+
+logger = logging.getLogger(__name__)
+
+ENTRY_TIMEOUT = 3600
+GLOBAL_VERSION_KEY = 'supplier_views:version'
+
+_stats_lock = threading.Lock()
+SUPPLIER_CACHE_STATS = {}
+
+
+def _version_key(supplier_id) -> str:
+    return f'supplier_views:version:{supplier_id}'
+
+
+def _record(view: str, outcome: str) -> None:
+    with _stats_lock:
+        stats = SUPPLIER_CACHE_STATS.setdefault(view, {'hits': 0, 'misses': 0, 'errors': 0})
+        stats[outcome] += 1
+
+
+def get_supplier_cache_stats() -> dict:
+    """Returns hits, misses and hit ratio per cached view."""
+    with _stats_lock:
+        report = {}
+        for view, stats in SUPPLIER_CACHE_STATS.items():
+            lookups = stats['hits'] + stats['misses']
+            report[view] = {**stats, 'hit_ratio': round(stats['hits'] / lookups, 3) if lookups else 0.0}
+        return report
+
+
+# ============ LOOKUP ============
+
+def cached_supplier_view(view: str):
+    """
+    Caches a database_tool implementation taking (db, user, *args) per
+    supplier, version and arguments (db is the api.utils.dual_io adapter).
+    Error results and non-supplier users bypass the cache.
+    """
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(db, user, *args, **kwargs):
+            if getattr(user, 'role', None) != 'supplier':
+                return await func(db, user, *args, **kwargs)
+
+            try:
+                versions = await db.cache('get_many', [GLOBAL_VERSION_KEY, _version_key(user.id)])
+                key = (
+                    f'supplier_views:{view}:{user.id}:{versions.get(GLOBAL_VERSION_KEY, 0)}.'
+                    f'{versions.get(_version_key(user.id), 0)}:{timezone.now().date().isoformat()}:'
+                    f'{":".join(str(a) for a in args)}:{":".join(f"{k}={v}" for k, v in sorted(kwargs.items()))}'
+                )
+                result = await db.cache('get', key)
+            except Exception as e:
+                logger.warning(f"Supplier view cache unavailable: {e}")
+                _record(view, 'errors')
+                return await func(db, user, *args, **kwargs)
+
+            if result is not None:
+                _record(view, 'hits')
+                return result
+
+            _record(view, 'misses')
+            result = await func(db, user, *args, **kwargs)
+            if isinstance(result, dict) and 'error' not in result:
+                try:
+                    await db.cache('set', key, result, ENTRY_TIMEOUT)
+                except Exception as e:
+                    logger.warning(f"Could not cache supplier view: {e}")
+            return result
+        return wrapper
+    return decorator
+
+
+# ============ INVALIDATION ============
+
+def _bump(key: str) -> None:
+    try:
+        try:
+            cache.incr(key)
+        except ValueError:
+            if not cache.add(key, 1, None):
+                cache.incr(key)
+    except Exception as e:
+        logger.warning(f"Could not bump supplier view version: {e}")
+
+
+def _bump_suppliers(supplier_ids) -> None:
+    for supplier_id in supplier_ids:
+        _bump(_version_key(supplier_id))
+    # The next views are rebuilt from the primary, not a lagging replica
+    pin_to_primary(*supplier_ids)
+
+
+def invalidate_supplier_views(*supplier_ids) -> None:
+    """Invalidates the cached views of the given suppliers once the current transaction commits."""
+    supplier_ids = {supplier_id for supplier_id in supplier_ids if supplier_id}
+    if supplier_ids:
+        transaction.on_commit(lambda: _bump_suppliers(supplier_ids))
+
+
+def invalidate_all_supplier_views() -> None:
+    """Invalidates every supplier's cached views once the current transaction commits."""
+    transaction.on_commit(lambda: _bump(GLOBAL_VERSION_KEY))
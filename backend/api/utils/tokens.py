@@ -0,0 +1,40 @@
+import re
+
+# Rough characters-per-token ratios for the Gemini tokenizer. Latin text
+# averages about four characters per token, while Ethiopic (Fidel) script
+# is split much more aggressively.
+LATIN_CHARS_PER_TOKEN = 4.0
+ETHIOPIC_CHARS_PER_TOKEN = 1.5
+
+ETHIOPIC_PATTERN = re.compile(r'[\u1200-\u139F\u2D80-\u2DDF]')
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimates the number of LLM tokens in a piece of text without calling the API.
+    Good enough for budgeting prompt size; not meant to be exact.
+    """
+    if not text:
+        return 0
+
+    ethiopic_chars = len(ETHIOPIC_PATTERN.findall(text))
+    other_chars = len(text) - ethiopic_chars
+
+    estimate = other_chars / LATIN_CHARS_PER_TOKEN + ethiopic_chars / ETHIOPIC_CHARS_PER_TOKEN
+    return max(1, int(round(estimate)))
+
+
+def truncate_to_tokens(text: str, max_tokens: int, marker: str = ' …[truncated]') -> str:
+    """
+    Shortens text so that its estimated token count stays within max_tokens.
+    Returns the text unchanged if it already fits.
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+
+    # Shrink proportionally, then trim until the estimate fits
+    ratio = max_tokens / estimate_tokens(text)
+    cut = max(0, int(len(text) * ratio) - len(marker))
+    while cut > 0 and estimate_tokens(text[:cut] + marker) > max_tokens:
+        cut = int(cut * 0.9)
+    return text[:cut] + marker
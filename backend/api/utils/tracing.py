@@ -0,0 +1,413 @@
+"""
+Lightweight per-request tracing for the chat pipeline.
+
+A trace is opened per HTTP request by TracingMiddleware (only when
+settings.KCART_TRACING is on). Code marks pipeline stages with span() or
+@traced(); each span records its duration, DB query count/time and free-form
+attributes (token counts, tool name, argument size, ...). Finished traces feed
+in-process histograms exposed by the metrics endpoint, and can be summarised
+in a Server-Timing debug header.
+
+When tracing is off no trace is active, and span()/@traced() reduce to a
+single context variable lookup.
+"""
+import math
+import time
+import logging
+import threading
+import contextvars
+from functools import wraps
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from langchain_core.callbacks import BaseCallbackHandler
+
+logger = logging.getLogger(__name__)
+
+_current_trace = contextvars.ContextVar('kcart_trace', default=None)
+_current_span = contextvars.ContextVar('kcart_span', default=None)
+
+# Histogram bucket upper bounds, in milliseconds
+DURATION_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, math.inf)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, math.inf)
+
+
+def is_enabled() -> bool:
+    return getattr(settings, 'KCART_TRACING', False)
+
+
+def debug_header_enabled() -> bool:
+    return getattr(settings, 'KCART_TRACE_HEADER', False)
+
+
+# ============ TRACES AND SPANS ============
+
+class Span:
+    def __init__(self, trace, name: str, parent=None, attrs: dict = None):
+        self.trace = trace
+        self.name = name
+        self.parent = parent
+        self.attrs = attrs or {}
+        self.start = None
+        self.duration = 0.0
+        self.db_queries = 0
+        self.db_time = 0.0
+        self._token = None
+
+    def set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.start
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            self.attrs['error'] = exc_type.__name__
+        self.trace.add_span(self)
+        return False
+
+    def as_dict(self) -> dict:
+        return {
+            'name': self.name,
+            'parent': self.parent.name if self.parent else None,
+            'start_ms': round((self.start - self.trace.start) * 1000, 2) if self.start else None,
+            'duration_ms': round(self.duration * 1000, 2),
+            'db_queries': self.db_queries,
+            'db_time_ms': round(self.db_time * 1000, 2),
+            **self.attrs,
+        }
+
+
+class _NoopSpan:
+    """Returned by span() when no trace is active."""
+
+    def set(self, **attrs) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Trace:
+    def __init__(self, name: str):
+        self.name = name
+        self.start = time.perf_counter()
+        self.duration = 0.0
+        self.spans = []
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.tokens_in = 0
+        self.tokens_out = 0
+        self._lock = threading.Lock()
+
+    def add_span(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+            self.tokens_in += span.attrs.get('tokens_in', 0)
+            self.tokens_out += span.attrs.get('tokens_out', 0)
+
+    def record_query(self, span, elapsed: float) -> None:
+        with self._lock:
+            self.db_queries += 1
+            self.db_time += elapsed
+            # Queries count towards the span they ran in and all of its parents
+            while span is not None:
+                span.db_queries += 1
+                span.db_time += elapsed
+                span = span.parent
+
+    def as_dict(self) -> dict:
+        return {
+            'name': self.name,
+            'duration_ms': round(self.duration * 1000, 2),
+            'db_queries': self.db_queries,
+            'db_time_ms': round(self.db_time * 1000, 2),
+            'tokens_in': self.tokens_in,
+            'tokens_out': self.tokens_out,
+            'spans': [s.as_dict() for s in sorted(self.spans, key=lambda s: s.start or 0)],
+        }
+
+    def server_timing(self) -> str:
+        """Renders the trace as a Server-Timing header value (one entry per stage)."""
+        totals = {}
+        for span in self.spans:
+            name = span.name.replace(':', '.')
+            totals[name] = totals.get(name, 0.0) + span.duration
+        entries = [f'{name};dur={seconds * 1000:.1f}' for name, seconds in totals.items()]
+        entries.append(f'db;desc="{self.db_queries} queries";dur={self.db_time * 1000:.1f}')
+        entries.append(f'tokens;desc="in={self.tokens_in} out={self.tokens_out}"')
+        entries.append(f'total;dur={self.duration * 1000:.1f}')
+        return ', '.join(entries)
+
+
+class start_trace:
+    """
+    Opens a trace for the current context; on exit the trace is finished and
+    recorded in METRICS and passed to the registered trace listeners.
+    """
+
+    def __init__(self, name: str):
+        self.trace = Trace(name)
+        self._token = None
+
+    def __enter__(self) -> Trace:
+        _install_query_hook(connections['default'])
+        self._token = _current_trace.set(self.trace)
+        return self.trace
+
+    def __exit__(self, exc_type, exc, tb):
+        self.trace.duration = time.perf_counter() - self.trace.start
+        _current_trace.reset(self._token)
+        METRICS.record_trace(self.trace)
+        for listener in list(TRACE_LISTENERS):
+            try:
+                listener(self.trace)
+            except Exception as e:
+                logger.error(f"Trace listener failed: {e}")
+        return False
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+def span(name: str, **attrs):
+    """Context manager timing a pipeline stage. A no-op when no trace is active."""
+    trace = _current_trace.get()
+    if trace is None:
+        return _NOOP_SPAN
+    return Span(trace, name, parent=_current_span.get(), attrs=attrs)
+
+
+def traced(name: str):
+    """Decorator form of span()."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current_trace.get() is None:
+                return func(*args, **kwargs)
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def annotate(**attrs) -> None:
+    """Adds attributes (e.g. token counts) to the innermost open span."""
+    current = _current_span.get()
+    if current is not None:
+        current.set(**attrs)
+
+
+def annotate_genai_usage(response) -> None:
+    """Records token usage of a google.genai generate_content response on the current span."""
+    if _current_span.get() is None:
+        return
+    usage = getattr(response, 'usage_metadata', None)
+    if usage is not None:
+        annotate(tokens_in=getattr(usage, 'prompt_token_count', 0) or 0,
+                 tokens_out=getattr(usage, 'candidates_token_count', 0) or 0)
+
+
+TRACE_LISTENERS = []
+
+
+def add_trace_listener(listener) -> None:
+    """Registers a callable invoked with every finished Trace."""
+    TRACE_LISTENERS.append(listener)
+
+
+def remove_trace_listener(listener) -> None:
+    if listener in TRACE_LISTENERS:
+        TRACE_LISTENERS.remove(listener)
+
+
+# ============ DATABASE QUERIES ============
+
+def _query_hook(execute, sql, params, many, context):
+    trace = _current_trace.get()
+    if trace is None:
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        trace.record_query(_current_span.get(), time.perf_counter() - start)
+
+
+def _install_query_hook(connection) -> None:
+    if _query_hook not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_query_hook)
+
+
+def _on_connection_created(sender, connection, **kwargs):
+    _install_query_hook(connection)
+
+
+# Connections opened later (e.g. by tool pool threads) get the hook as well
+connection_created.connect(_on_connection_created)
+
+
+# ============ LLM CALLBACKS ============
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """Records each chat model call of an agent run as an 'llm' span with token usage."""
+
+    def __init__(self, trace: Trace):
+        self.trace = trace
+        self._open = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._open[run_id] = Span(self.trace, 'llm', parent=_current_span.get())
+        self._open[run_id].start = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        llm_span = self._open.pop(run_id, None)
+        if llm_span is None:
+            return
+        llm_span.duration = time.perf_counter() - llm_span.start
+
+        tokens_in = tokens_out = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, 'message', None), 'usage_metadata', None) or {}
+                tokens_in += usage.get('input_tokens', 0)
+                tokens_out += usage.get('output_tokens', 0)
+        llm_span.set(tokens_in=tokens_in, tokens_out=tokens_out)
+        self.trace.add_span(llm_span)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        llm_span = self._open.pop(run_id, None)
+        if llm_span is not None:
+            llm_span.duration = time.perf_counter() - llm_span.start
+            llm_span.set(error=type(error).__name__)
+            self.trace.add_span(llm_span)
+
+
+def agent_callbacks() -> list:
+    """Callbacks to pass to agent.invoke(); empty when no trace is active."""
+    trace = _current_trace.get()
+    return [TracingCallbackHandler(trace)] if trace is not None else []
+
+
+# ============ METRICS ============
+
+class Histogram:
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """Estimates a quantile by linear interpolation within the matching bucket."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        cumulative = 0
+        lower = 0.0
+        for bound, count in zip(self.buckets, self.counts):
+            if count and cumulative + count >= target:
+                if math.isinf(bound):
+                    return lower
+                return lower + (bound - lower) * (target - cumulative) / count
+            cumulative += count
+            lower = bound if not math.isinf(bound) else lower
+        return lower
+
+    def summary(self) -> dict:
+        return {
+            'count': self.count,
+            'mean': round(self.sum / self.count, 2) if self.count else 0.0,
+            'p50': round(self.quantile(0.50), 2),
+            'p95': round(self.quantile(0.95), 2),
+            'p99': round(self.quantile(0.99), 2),
+        }
+
+
+class MetricsRegistry:
+    """In-process (per worker) aggregation of finished traces."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.stage_duration = {}
+            self.stage_queries = {}
+            self.tokens = {'in': 0, 'out': 0}
+            self.traces = 0
+
+    def record_trace(self, trace: Trace) -> None:
+        with self._lock:
+            self.traces += 1
+            self._observe(trace.name, trace.duration * 1000, trace.db_queries)
+            for s in trace.spans:
+                self._observe(s.name, s.duration * 1000, s.db_queries)
+            self.tokens['in'] += trace.tokens_in
+            self.tokens['out'] += trace.tokens_out
+
+    def _observe(self, stage: str, duration_ms: float, queries: int) -> None:
+        self.stage_duration.setdefault(stage, Histogram(DURATION_BUCKETS_MS)).observe(duration_ms)
+        self.stage_queries.setdefault(stage, Histogram(QUERY_COUNT_BUCKETS)).observe(queries)
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                'traces': self.traces,
+                'tokens': dict(self.tokens),
+                'stages': {
+                    stage: {
+                        'duration_ms': histogram.summary(),
+                        'db_queries': self.stage_queries[stage].summary(),
+                    }
+                    for stage, histogram in sorted(self.stage_duration.items())
+                },
+            }
+
+    def render_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            for metric, unit, histograms in (
+                ('kcart_stage_duration_ms', 'Stage duration in milliseconds', self.stage_duration),
+                ('kcart_stage_db_queries', 'Database queries per stage', self.stage_queries),
+            ):
+                lines.append(f'# HELP {metric} {unit}')
+                lines.append(f'# TYPE {metric} histogram')
+                for stage, histogram in sorted(histograms.items()):
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        le = '+Inf' if math.isinf(bound) else f'{bound:g}'
+                        lines.append(f'{metric}_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+                    lines.append(f'{metric}_sum{{stage="{stage}"}} {histogram.sum:.3f}')
+                    lines.append(f'{metric}_count{{stage="{stage}"}} {histogram.count}')
+
+            lines.append('# HELP kcart_llm_tokens_total LLM tokens by direction')
+            lines.append('# TYPE kcart_llm_tokens_total counter')
+            for direction, value in self.tokens.items():
+                lines.append(f'kcart_llm_tokens_total{{direction="{direction}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+METRICS = MetricsRegistry()
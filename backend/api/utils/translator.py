@@ -1,9 +1,11 @@
 import os
 from google import genai
+from api.utils.tracing import traced, annotate_genai_usage
 
 # Initialize Gemini client
 client = genai.Client(api_key=os.environ.get('GOOGLE_API_KEY'))
 
+@traced('identify_language')
 def identify_language(text: str) -> str:
     """
     Identifies the language of the input text.
@@ -37,6 +39,7 @@ Text: "{text}"
             model='gemini-2.5-flash',
             contents=prompt
         )
+        annotate_genai_usage(response)
         result = (response.text or '').strip().lower()
         
         # Validate the response
@@ -51,6 +54,7 @@ Text: "{text}"
         return 'other'
 
 
+@traced('translate_to_english')
 def translate_to_english(text: str) -> str:
     """
     Translates Amharic text (Fidel or Latin script) to English.
@@ -69,6 +73,7 @@ Provide ONLY the English translation, nothing else:"""
             model='gemini-2.5-flash',
             contents=prompt
         )
+        annotate_genai_usage(response)
         return (response.text or text).strip()
         
     except Exception as e:
@@ -76,6 +81,7 @@ Provide ONLY the English translation, nothing else:"""
         return text  # Return original text if translation fails
 
 
+@traced('translate_from_english')
 def translate_from_english(text: str, target_language: str) -> str:
     """
     Translates English text to the target language.
@@ -104,6 +110,7 @@ Provide ONLY the translation, nothing else:"""
             model='gemini-2.5-flash',
             contents=prompt
         )
+        annotate_genai_usage(response)
         result = response.text if response.text else text
         return result.strip() if result else ""
         
@@ -2,13 +2,25 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated, AllowAny
+from django.conf import settings
+from django.http import HttpResponse
 from django.utils import timezone
 from api.models import ConversationHistory, Notification
 from api.utils.translator import identify_language, translate_to_english, translate_from_english
 from api.agent.factory import create_kcart_agent
+from api.agent.memory import ConversationMemory, trim_client_history
+from api.agent.router import route_intent
+from api.utils import tracing
+from api.db_router import UserRoutingMixin
 
 
-class ChatAPIView(APIView):
+def _idempotency_key(request):
+    """The client's Idempotency-Key header (or idempotency_key field) for this request, if any."""
+    key = str(request.headers.get('Idempotency-Key') or request.data.get('idempotency_key') or '').strip()
+    return key or None
+
+
+class ChatAPIView(UserRoutingMixin, APIView):
     """
     Handles chat messages from users (authenticated or not).
     Supports multi-language input/output via translation layer.
@@ -25,7 +37,7 @@ class ChatAPIView(APIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            # Get conversation history if provided
+            # Get conversation history if provided (only used for anonymous users)
             chat_history = request.data.get('history', [])
             
             # ============ LANGUAGE IDENTIFICATION ============
@@ -46,44 +58,47 @@ class ChatAPIView(APIView):
             if detected_language in ['amharic', 'amharic_latin']:
                 english_message = translate_to_english(user_message)
             
-            # ============ AGENT EXECUTION ============
-            # Create agent based on user authentication
+            # ============ FAST PATH ============
+            # Common supplier commands are answered directly from templates,
+            # without any LLM round trips
             user = request.user if request.user.is_authenticated else None
-            agent = create_kcart_agent(user)
-            
-            # Format chat history for agent
-            history_text = ""
-            if chat_history:
-                for msg in chat_history[-10:]:  # Last 10 messages for context
-                    sender = msg.get('sender', 'user')
-                    content = msg.get('message', '')
-                    history_text += f"{sender}: {content}\n"
-            
-            # Convert chat history to LangChain message format
-            from langchain_core.messages import HumanMessage, AIMessage
-            chat_history_messages = []
-            if chat_history:
-                for msg in chat_history[-10:]:  # Last 10 messages
-                    sender = msg.get('sender', 'user')
-                    content = msg.get('message', '')
-                    if sender == 'user':
-                        chat_history_messages.append(HumanMessage(content=content))
-                    elif sender == 'bot':
-                        chat_history_messages.append(AIMessage(content=content))
-            
-            # Run agent with context
-            try:
-                agent_response = agent.invoke({
-                    'input': english_message,
-                    'chat_history': chat_history_messages
-                })
+            memory = None
+            agent_reply_english = route_intent(user, english_message)
+            
+            # ============ AGENT EXECUTION ============
+            if agent_reply_english is None:
+                # Create agent based on user authentication
+                agent = create_kcart_agent(user, idempotency_key=_idempotency_key(request))
+            
+                # Build chat history for the agent.
+                # Authenticated users get server-side, token-budgeted memory; the
+                # client-supplied history is only used (trimmed) for anonymous users.
+                chat_history_messages = None
+                if request.user.is_authenticated:
+                    try:
+                        with tracing.span('memory_load'):
+                            memory = ConversationMemory(request.user).load()
+                            chat_history_messages = memory.as_messages()
+                    except Exception as memory_error:
+                        print(f"Conversation memory unavailable, using client history: {memory_error}")
+                        memory = None
+                if chat_history_messages is None:
+                    chat_history_messages = trim_client_history(chat_history)
+            
+                # Run agent with context
+                try:
+                    with tracing.span('agent'):
+                        agent_response = agent.invoke({
+                            'input': english_message,
+                            'chat_history': chat_history_messages
+                        }, config={'callbacks': tracing.agent_callbacks()})
                 
-                # Extract the output
-                agent_reply_english = agent_response.get('output', 'I apologize, but I encountered an error processing your request.')
+                    # Extract the output
+                    agent_reply_english = agent_response.get('output', 'I apologize, but I encountered an error processing your request.')
                 
-            except Exception as agent_error:
-                print(f"Agent execution error: {agent_error}")
-                agent_reply_english = "I apologize, but I'm having trouble processing your request right now. Please try again."
+                except Exception as agent_error:
+                    print(f"Agent execution error: {agent_error}")
+                    agent_reply_english = "I apologize, but I'm having trouble processing your request right now. Please try again."
             
             # ============ TRANSLATION BACK TO USER'S LANGUAGE ============
             final_reply = agent_reply_english
@@ -96,19 +111,27 @@ class ChatAPIView(APIView):
             
             # ============ SAVE CONVERSATION HISTORY ============
             if request.user.is_authenticated:
-                # Save user message
-                ConversationHistory.objects.create(
-                    user=request.user,
-                    sender='user',
-                    message=user_message
-                )
+                with tracing.span('save_history'):
+                    # Save user message
+                    user_entry = ConversationHistory.objects.create(
+                        user=request.user,
+                        sender='user',
+                        message=user_message
+                    )
+                    
+                    # Save bot reply
+                    bot_entry = ConversationHistory.objects.create(
+                        user=request.user,
+                        sender='bot',
+                        message=final_reply
+                    )
                 
-                # Save bot reply
-                ConversationHistory.objects.create(
-                    user=request.user,
-                    sender='bot',
-                    message=final_reply
-                )
+                # Keep the cached conversation memory in sync
+                if memory is not None:
+                    try:
+                        memory.record(user_entry, bot_entry)
+                    except Exception as memory_error:
+                        print(f"Error updating conversation memory: {memory_error}")
             
             # ============ RETURN RESPONSE ============
             return Response({
@@ -155,7 +178,7 @@ class ChatAPIView(APIView):
             )
 
 
-class NotificationAPIView(APIView):
+class NotificationAPIView(UserRoutingMixin, APIView):
     """
     Handles notifications for authenticated users.
     """
@@ -204,7 +227,7 @@ class NotificationAPIView(APIView):
             )
 
 
-class OrderActionAPIView(APIView):
+class OrderActionAPIView(UserRoutingMixin, APIView):
     """
     Handles order acceptance/decline actions by suppliers.
     """
@@ -258,3 +281,203 @@ class OrderActionAPIView(APIView):
                 {'error': 'Failed to process order action'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+
+
+class OrderBulkActionAPIView(UserRoutingMixin, APIView):
+    """
+    Accepts or declines many orders of the authenticated supplier in one
+    request and one transaction.
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def post(self, request):
+        """
+        Expected data: {'orders': [{'order_id': str, 'action': 'accept'|'decline', 'reason': str (optional)}, ...]}
+        or, for the same action on every order: {'order_ids': [str, ...], 'action': ..., 'reason': ...}
+        Returns a result per order: {'order_id', 'success', 'new_status'} or {'order_id', 'error'}.
+        """
+        try:
+            orders = request.data.get('orders')
+            order_ids = request.data.get('order_ids')
+            if orders is None and isinstance(order_ids, list):
+                orders = [
+                    {'order_id': order_id, 'action': request.data.get('action'), 'reason': request.data.get('reason', '')}
+                    for order_id in order_ids
+                ]
+            
+            if not isinstance(orders, list) or not orders or not all(isinstance(order, dict) for order in orders):
+                return Response(
+                    {'error': 'orders (a list of {order_id, action}) or order_ids and action are required'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            
+            actions = {'accept': 'accepted', 'decline': 'declined'}
+            updates = [
+                {'order_id': order.get('order_id'), 'new_status': actions.get(order.get('action'), order.get('action')),
+                 'decline_reason': order.get('reason', '')}
+                for order in orders
+            ]
+            
+            from api.tools import database_tool
+            result = database_tool.update_order_statuses(request.user, updates)
+            
+            if 'error' in result:
+                return Response(
+                    {'error': result['error']},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            
+            return Response(result)
+            
+        except Exception as e:
+            print(f"Error in OrderBulkActionAPIView: {e}")
+            return Response(
+                {'error': 'Failed to process order actions'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class OrderCreateAPIView(UserRoutingMixin, APIView):
+    """
+    Places an order for the authenticated customer.
+    Send an Idempotency-Key header (e.g. a UUID per order, reused on every
+    retry): a retry returns the original response with an
+    Idempotent-Replayed: true header instead of placing a second order.
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def post(self, request):
+        """
+        Expected data: {'items': [{'product_name': str, 'quantity': float, 'supplier_id': str}, ...],
+                        'delivery_date': 'YYYY-MM-DD', 'delivery_location': str (optional)}
+        """
+        try:
+            items = request.data.get('items')
+            delivery_date = request.data.get('delivery_date')
+            
+            if not items or not isinstance(items, list) or not delivery_date:
+                return Response(
+                    {'error': 'items (a list) and delivery_date are required'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            
+            from api.tools import database_tool
+            result = database_tool.create_order_in_db(
+                request.user, items, delivery_date, request.data.get('delivery_location', ''),
+                idempotency_key=_idempotency_key(request)
+            )
+            
+            if 'error' in result:
+                if result.get('idempotency') == 'conflict':
+                    error_status = status.HTTP_422_UNPROCESSABLE_ENTITY
+                elif result.get('idempotency') == 'in_progress':
+                    error_status = status.HTTP_409_CONFLICT
+                elif request.user.role != 'customer':
+                    error_status = status.HTTP_403_FORBIDDEN
+                else:
+                    error_status = status.HTTP_400_BAD_REQUEST
+                return Response(result, status=error_status)
+            
+            replayed = result.pop('idempotent_replay', False)
+            response = Response(result, status=status.HTTP_200_OK if replayed else status.HTTP_201_CREATED)
+            if replayed:
+                response['Idempotent-Replayed'] = 'true'
+            return response
+            
+        except Exception as e:
+            print(f"Error in OrderCreateAPIView: {e}")
+            return Response(
+                {'error': 'Failed to create order'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class InventoryImportAPIView(UserRoutingMixin, APIView):
+    """
+    Adds or updates many of the authenticated supplier's inventory listings
+    from one CSV or JSON upload (see api/tools/inventory_import.py).
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def post(self, request):
+        """
+        Expected data: a multipart 'file' (CSV or JSON), a 'csv' text field, or
+        {'rows': [{'product': str, 'quantity': float, 'price': float,
+                   'available_date': 'YYYY-MM-DD', 'expiry_date': 'YYYY-MM-DD', 'image_url': str}, ...]};
+        'dry_run': true validates and prices the rows without saving them.
+        Returns a report per row plus created/updated/invalid/skipped totals.
+        """
+        try:
+            upload = request.FILES.get('file')
+            if upload is not None:
+                content = upload.read()
+            elif request.data.get('csv'):
+                content = request.data.get('csv')
+            else:
+                content = request.data.get('rows')
+            
+            if not content:
+                return Response(
+                    {'error': 'A file, csv text or rows are required'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            
+            dry_run = str(request.data.get('dry_run', '')).lower() in ('1', 'true', 'yes')
+            
+            from api.tools import database_tool
+            result = database_tool.import_inventory(request.user, content, dry_run)
+            
+            if 'error' in result:
+                return Response(
+                    {'error': result['error']},
+                    status=status.HTTP_403_FORBIDDEN if request.user.role != 'supplier' else status.HTTP_400_BAD_REQUEST
+                )
+            
+            return Response(result)
+            
+        except Exception as e:
+            print(f"Error in InventoryImportAPIView: {e}")
+            return Response(
+                {'error': 'Failed to import inventory'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class MetricsAPIView(APIView):
+    """
+    Exposes chat pipeline metrics of this worker process.
+    Prometheus text format by default; ?format=json for a JSON summary that also
+    includes fast-path, tool output and catalog snapshot statistics. Staff only
+    (open when DEBUG).
+    """
+    permission_classes = [AllowAny]
+    
+    def get(self, request):
+        if not (settings.DEBUG or request.user.is_staff):
+            return Response(
+                {'error': 'Staff access required'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        if request.query_params.get('format') == 'json':
+            from api.agent.router import get_router_stats
+            from api.agent.encoding import get_tool_output_stats
+            from api.utils.catalog import get_catalog_stats
+            from api.utils.supplier_cache import get_supplier_cache_stats
+            from api.utils.geo import get_geo_stats
+            from api.utils.idempotency import get_idempotency_stats
+            return Response({
+                'tracing_enabled': tracing.is_enabled(),
+                **tracing.METRICS.as_dict(),
+                'fast_path': get_router_stats(),
+                'tool_output': get_tool_output_stats(),
+                'catalog': get_catalog_stats(),
+                'supplier_cache': get_supplier_cache_stats(),
+                'geo': get_geo_stats(),
+                'idempotency': get_idempotency_stats(),
+            })
+        
+        return HttpResponse(
+            tracing.METRICS.render_prometheus(),
+            content_type='text/plain; version=0.0.4; charset=utf-8'
+        )
@@ -0,0 +1,72 @@
+"""
+Compares CSV and Parquet for a generated dataset: file size and the time to
+parse each table into a DataFrame.
+
+    python benchmark_formats.py --data-dir /tmp/kcart-10x
+
+Tables present in only one format are converted to the other in a temporary
+directory first, so the comparison always covers both.
+"""
+import os
+import time
+import shutil
+import argparse
+import tempfile
+from dataset_io import SCHEMAS, FORMATS, dataset_path, find_dataset, read_dataset, write_dataset
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), '../../', 'data')
+
+def _best_parse_time(path, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        read_dataset(path)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+def compare_formats(data_dir=DATA_DIR, repeat=3):
+    """Returns one {table, rows, csv_bytes, parquet_bytes, csv_s, parquet_s} entry per table found."""
+    work_dir = tempfile.mkdtemp(prefix='kcart-formats-')
+    results = []
+    try:
+        for name in SCHEMAS:
+            source = find_dataset(data_dir, name)
+            if source is None:
+                continue
+
+            df = read_dataset(source)
+            paths = {}
+            for fmt in FORMATS:
+                existing = dataset_path(data_dir, name, fmt)
+                paths[fmt] = existing if os.path.exists(existing) else write_dataset(df, work_dir, name, fmt)
+
+            results.append({
+                'table': name,
+                'rows': len(df),
+                'csv_bytes': os.path.getsize(paths['csv']),
+                'parquet_bytes': os.path.getsize(paths['parquet']),
+                'csv_s': _best_parse_time(paths['csv'], repeat),
+                'parquet_s': _best_parse_time(paths['parquet'], repeat),
+            })
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+def print_comparison(results):
+    print(f"  {'table':<20}{'rows':>10}{'CSV MB':>10}{'Parquet MB':>12}{'size':>8}{'CSV s':>9}{'Parquet s':>11}{'speedup':>9}")
+    for entry in results:
+        print(
+            f"  {entry['table']:<20}{entry['rows']:>10}"
+            f"{entry['csv_bytes'] / 1e6:>10.2f}{entry['parquet_bytes'] / 1e6:>12.2f}"
+            f"{entry['parquet_bytes'] / entry['csv_bytes']:>7.0%} "
+            f"{entry['csv_s']:>9.3f}{entry['parquet_s']:>11.3f}"
+            f"{entry['csv_s'] / entry['parquet_s']:>8.1f}x"
+        )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare CSV and Parquet size and parse time for a dataset.")
+    parser.add_argument('--data-dir', default=DATA_DIR, help="Directory holding the dataset (default: backend/data)")
+    parser.add_argument('--repeat', type=int, default=3, help="Parses per file; the fastest is reported (default: 3)")
+    args = parser.parse_args()
+
+    print_comparison(compare_formats(os.path.abspath(args.data_dir), args.repeat))
@@ -1,13 +1,14 @@
 import pandas as pd
 import numpy as np
-import random
 import os
-from datetime import datetime, timedelta
-from constants import PRODUCT_ENHANCEMENTS
+import time
+import argparse
+from datetime import datetime
+from constants import product_enhancement
+from generation_utils import uuid4_array
+from dataset_io import FORMATS, DEFAULT_FORMAT, read_table, write_dataset
 
 DATA_DIR = os.path.join(os.path.dirname(__file__), '../../', 'data')
-PRODUCTS_FILE = os.path.join(DATA_DIR, "products.csv")
-OUTPUT_FILE = os.path.join(DATA_DIR, "competitor_prices.csv")
 
 
 DAYS_OF_HISTORY = 365
@@ -19,7 +20,67 @@ COMPETITOR_TIERS = {
     "distribution_center": 0.85
 }
 
-def run_historical_data_pipeline():
+def enhance_products(products_df):
+    """Adds the simulation-only base price and peak month columns (in memory only)."""
+    enhancements = products_df['internal_name'].map(product_enhancement)
+    enhanced_products_df = products_df.copy()
+    enhanced_products_df['base_price_etb'] = enhancements.map(lambda e: e.get('price', 0.0))
+    enhanced_products_df['season_peak_month'] = enhancements.map(lambda e: e.get('peak_month', 1))
+    return enhanced_products_df
+
+def scale_products(products_df, num_products, rng):
+    """
+    Returns num_products rows: the first rows of the catalog, or the catalog
+    repeated with fresh product ids when more products are asked for than exist.
+    Used for scale tests; the products file on disk is left unchanged.
+    """
+    if num_products <= len(products_df):
+        return products_df.head(num_products).reset_index(drop=True)
+
+    scaled = products_df.iloc[np.arange(num_products) % len(products_df)].reset_index(drop=True)
+    scaled['product_id'] = uuid4_array(rng, num_products)
+    return scaled
+
+def generate_competitor_prices(products_df, days_of_history=DAYS_OF_HISTORY, rng=None, end_date=None):
+    """
+    Simulates daily prices for every product, day and competitor tier at once.
+
+    The price grid is built by broadcasting a (product, 1, 1) base price against
+    a (product, day, 1) seasonality and noise factor and a (1, 1, tier) markup,
+    then flattened in product, day, tier order.
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    end_date = pd.Timestamp(end_date or datetime.now()).normalize()
+
+    enhanced_products_df = enhance_products(products_df)
+    base_prices = enhanced_products_df['base_price_etb'].to_numpy(dtype=float)
+    peak_days = enhanced_products_df['season_peak_month'].to_numpy(dtype=float) * 30 - 15
+
+    # Newest day first, as in the exported history
+    dates = pd.date_range(end=end_date, periods=days_of_history, freq='D')[::-1]
+    day_of_year = dates.dayofyear.to_numpy(dtype=float)
+
+    tiers = list(COMPETITOR_TIERS)
+    markups = np.array([COMPETITOR_TIERS[tier] for tier in tiers])
+
+    num_products, num_days, num_tiers = len(base_prices), len(dates), len(tiers)
+
+    sine_values = np.sin(2 * np.pi * (day_of_year[None, :] - peak_days[:, None]) / 365)
+    seasonality_factors = 1 + SEASONALITY_INTENSITY * sine_values
+    noise_factors = rng.uniform(1 - NOISE_INTENSITY, 1 + NOISE_INTENSITY, size=(num_products, num_days))
+    daily_base_prices = base_prices[:, None] * seasonality_factors * noise_factors
+
+    prices = np.round(daily_base_prices[:, :, None] * markups[None, None, :], 2)
+
+    return pd.DataFrame({
+        "date": np.tile(np.repeat(dates.strftime("%Y-%m-%d").to_numpy(), num_tiers), num_products),
+        "product_id": np.repeat(enhanced_products_df['product_id'].to_numpy(), num_days * num_tiers),
+        "competitor_tier": np.tile(np.array(tiers), num_products * num_days),
+        "price_per_unit_etb": prices.ravel(),
+    })
+
+def run_historical_data_pipeline(days_of_history=DAYS_OF_HISTORY, num_products=None, seed=None,
+                                 data_dir=DATA_DIR, output_dir=DATA_DIR, fmt=DEFAULT_FORMAT):
     """
     Orchestrates the pipeline to generate historical competitor prices.
     It enhances product data in-memory for the simulation, ensuring the
@@ -28,64 +89,35 @@ def run_historical_data_pipeline():
     print("--- Starting Historical Data Generation Pipeline ---")
 
     try:
-        products_df = pd.read_csv(PRODUCTS_FILE)
-    except FileNotFoundError:
-        print(f"Error: The file '{PRODUCTS_FILE}' was not found. Please run generate_products.py first.")
+        products_df = read_table(data_dir, 'products')
+    except FileNotFoundError as e:
+        print(f"Error: The file '{e.filename}' was not found. Please run products_data_generation.py first.")
         return
 
-    print("\n[STEP 1/2] Enhancing product data in memory for simulation...")
-    
-    def get_base_price(internal_name):
-        return PRODUCT_ENHANCEMENTS.get(internal_name, {}).get("price", 0.0)
+    rng = np.random.default_rng(seed)
+    if num_products is not None:
+        products_df = scale_products(products_df, num_products, rng)
 
-    def get_peak_month(internal_name):
-        return PRODUCT_ENHANCEMENTS.get(internal_name, {}).get("peak_month", 1)
+    print(f"\nSimulating prices for {len(products_df)} products over {days_of_history} days...")
+    started = time.perf_counter()
+    prices_df = generate_competitor_prices(products_df, days_of_history, rng)
+    print(f"Simulation took {time.perf_counter() - started:.2f}s")
+
+    output_file = write_dataset(prices_df, output_dir, 'competitor_prices', fmt)
 
-    enhanced_products_df = products_df.copy()
-    enhanced_products_df['base_price_etb'] = enhanced_products_df['internal_name'].apply(get_base_price)
-    enhanced_products_df['season_peak_month'] = enhanced_products_df['internal_name'].apply(get_peak_month)
-    print("In-memory data enhancement complete.")
-
-    print("\n[STEP 2/2] Generating 1-year of historical competitor prices...")
-    
-    prices_data = []
-    today = datetime.now()
-
-    print(f"Simulating prices for {len(enhanced_products_df)} products over {DAYS_OF_HISTORY} days...")
-
-    for index, product in enhanced_products_df.iterrows():
-        base_price = product['base_price_etb']
-        peak_month = product['season_peak_month']
-        peak_day_of_year = peak_month * 30 - 15
-
-        for i in range(DAYS_OF_HISTORY):
-            current_date = today - timedelta(days=i)
-            day_of_year = current_date.timetuple().tm_yday
-
-            sine_value = np.sin(2 * np.pi * (day_of_year - peak_day_of_year) / 365)
-            seasonality_factor = 1 + (SEASONALITY_INTENSITY * sine_value)
-            noise_factor = random.uniform(1 - NOISE_INTENSITY, 1 + NOISE_INTENSITY)
-            daily_base_price = base_price * seasonality_factor * noise_factor
-
-            for tier, markup in COMPETITOR_TIERS.items():
-                final_price = round(daily_base_price * markup, 2)
-                prices_data.append({
-                    "date": current_date.strftime("%Y-%m-%d"),
-                    "product_id": product['product_id'],
-                    "competitor_tier": tier,
-                    "price_per_unit_etb": final_price
-                })
-        
-        if (index + 1) % 5 == 0:
-            print(f"  ...processed {index + 1}/{len(enhanced_products_df)} products...")
-
-    prices_df = pd.DataFrame(prices_data)
-    prices_df.to_csv(OUTPUT_FILE, index=False)
-    
     print(f"Successfully generated {len(prices_df)} historical price records.")
-    print(f"Data saved to '{OUTPUT_FILE}'")
-    
+    print(f"Data saved to '{output_file}'")
+
     print("\n--- Historical Data Generation Pipeline Complete ---")
 
 if __name__ == "__main__":
-    run_historical_data_pipeline()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Generate historical competitor prices.")
+    parser.add_argument('--days', type=int, default=DAYS_OF_HISTORY, help=f"Days of history (default: {DAYS_OF_HISTORY})")
+    parser.add_argument('--products', type=int, default=None,
+                        help="Number of products to simulate (default: every product in products.csv)")
+    parser.add_argument('--seed', type=int, default=None, help="Random seed for reproducible output")
+    parser.add_argument('--output-dir', default=DATA_DIR, help="Output directory (default: backend/data)")
+    parser.add_argument('--format', choices=FORMATS, default=DEFAULT_FORMAT, help=f"Output format (default: {DEFAULT_FORMAT})")
+    args = parser.parse_args()
+
+    run_historical_data_pipeline(args.days, args.products, args.seed, output_dir=args.output_dir, fmt=args.format)
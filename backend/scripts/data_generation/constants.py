@@ -142,4 +142,12 @@ PRODUCT_ENHANCEMENTS = {
     "butter":         {"price": 1200.0,"peak_month": 8},
     "sweet_potatoes": {"price": 40.0,  "peak_month": 11},
     "ginger":         {"price": 180.0, "peak_month": 12}
-}
\ No newline at end of file
+}
+
+# Scaled datasets repeat the catalog; variants are named "<internal_name>__<n>"
+# and share the pricing of their base product.
+VARIANT_SEPARATOR = "__"
+
+def product_enhancement(internal_name):
+    """Returns the pricing entry for a product or one of its scaled variants ({} if unknown)."""
+    return PRODUCT_ENHANCEMENTS.get(str(internal_name).split(VARIANT_SEPARATOR)[0], {})
@@ -0,0 +1,189 @@
+"""
+Reading and writing generated datasets as CSV or Parquet.
+
+Parquet files carry typed columns: UUIDs as 16-byte arrow.uuid values, dates
+as date32, order timestamps as timestamp[ms] and prices as decimal128(10, 2).
+Readers return the same columns for either format (UUIDs as strings, prices
+as floats; dates are datetime64 from Parquet and text from CSV; Parquet UUID
+columns use the Arrow-backed string dtype), so the
+generators and loaders accept whichever format they are given.
+"""
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from generation_utils import uuid_chars, parse_uuids
+
+FORMATS = ('csv', 'parquet')
+DEFAULT_FORMAT = 'csv'
+
+UUID = pa.uuid()
+PRICE = pa.decimal128(10, 2)
+
+SCHEMAS = {
+    'users': pa.schema([
+        ('user_id', UUID), ('name', pa.string()), ('phone_number', pa.string()),
+        ('default_location', pa.string()), ('role', pa.string()), ('created_date', pa.date32()),
+    ]),
+    'products': pa.schema([
+        ('product_id', UUID), ('product_name', pa.string()), ('internal_name', pa.string()),
+        ('unit', pa.string()), ('photo_url', pa.string()),
+    ]),
+    'competitor_prices': pa.schema([
+        ('date', pa.date32()), ('product_id', UUID), ('competitor_tier', pa.string()), ('price_per_unit_etb', PRICE),
+    ]),
+    'inventory': pa.schema([
+        ('inventory_id', UUID), ('supplier_id', UUID), ('product_id', UUID), ('quantity_available', pa.float64()),
+        ('price_per_unit_etb', PRICE), ('status', pa.string()), ('available_date', pa.date32()),
+        ('expiry_date', pa.date32()),
+    ]),
+    'orders': pa.schema([
+        ('order_id', UUID), ('user_id', UUID), ('order_date', pa.timestamp('ms')), ('status', pa.string()),
+    ]),
+    'order_items': pa.schema([
+        ('order_item_id', UUID), ('order_id', UUID), ('product_id', UUID), ('quantity', pa.float64()),
+        ('price_per_unit_etb', PRICE),
+    ]),
+}
+
+# ============ PATHS ============
+
+def dataset_path(data_dir, name, fmt):
+    return os.path.join(data_dir, f"{name}.{fmt}")
+
+def find_dataset(data_dir, name):
+    """
+    Returns the path of the newest existing file for a table (Parquet or CSV),
+    or None when neither exists.
+    """
+    paths = [dataset_path(data_dir, name, fmt) for fmt in FORMATS]
+    existing = [path for path in paths if os.path.exists(path)]
+    return max(existing, key=os.path.getmtime) if existing else None
+
+# ============ CONVERSION ============
+
+def _to_arrow_column(series, arrow_type):
+    if arrow_type == UUID:
+        raw = parse_uuids(series.to_numpy())
+        storage = pa.FixedSizeBinaryArray.from_buffers(pa.binary(16), len(raw), [None, pa.py_buffer(raw.tobytes())])
+        return pa.ExtensionArray.from_storage(UUID, storage)
+    if pa.types.is_date32(arrow_type):
+        return pa.array(pd.to_datetime(series).to_numpy().astype('datetime64[D]'), type=arrow_type)
+    if pa.types.is_timestamp(arrow_type):
+        return pa.array(pd.to_datetime(series).to_numpy().astype('datetime64[ms]'), type=arrow_type)
+    if pa.types.is_decimal(arrow_type):
+        return pa.array(series.to_numpy(dtype=float)).cast(arrow_type)
+    if not pa.types.is_string(arrow_type):
+        return pa.array(series.to_numpy(), type=arrow_type, from_pandas=True)
+    # CSV round trips can turn text such as phone numbers into numbers
+    values = series.to_numpy(dtype=object)
+    present = series.notna().to_numpy()
+    values[present] = values[present].astype(str)
+    return pa.array(values, type=arrow_type, from_pandas=True)
+
+def to_arrow(df, name):
+    """Converts a generated DataFrame to an Arrow table with the table's typed schema."""
+    schema = SCHEMAS[name]
+    return pa.Table.from_arrays([_to_arrow_column(df[field.name], field.type) for field in schema], schema=schema)
+
+def _uuid_string_array(raw):
+    # Builds the Arrow string array straight from the formatted characters:
+    # no Python string object is created per UUID
+    chars = uuid_chars(raw)
+    offsets = np.arange(0, 36 * (len(chars) + 1), 36, dtype=np.int32)
+    strings = pa.Array.from_buffers(pa.string(), len(chars), [None, pa.py_buffer(offsets), pa.py_buffer(chars)])
+    return pd.arrays.ArrowStringArray(strings)
+
+def from_arrow(table):
+    """Converts typed Arrow data back to the DataFrame shape the CSV readers produce."""
+    columns = {}
+    for field, column in zip(table.schema, table.columns):
+        if field.type == UUID:
+            storage = column.combine_chunks().storage if column.num_chunks else pa.array([], pa.binary(16))
+            raw = np.frombuffer(storage.buffers()[1], dtype=np.uint8, count=16 * len(storage), offset=16 * storage.offset)
+            columns[field.name] = _uuid_string_array(raw)
+        elif pa.types.is_decimal(field.type):
+            columns[field.name] = np.round(column.cast(pa.float64()).to_numpy(), field.type.scale)
+        else:
+            columns[field.name] = column.to_pandas(date_as_object=False)
+    return pd.DataFrame(columns)
+
+# ============ WRITING ============
+
+class DatasetWriter:
+    """
+    Appends DataFrames to one table's file; used by generators that write
+    their output in blocks.
+
+        with DatasetWriter(output_dir, 'orders', 'parquet') as writer:
+            writer.write(block_df)
+    """
+
+    def __init__(self, output_dir, name, fmt=DEFAULT_FORMAT):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown dataset format '{fmt}'")
+        self.name = name
+        self.fmt = fmt
+        self.path = dataset_path(output_dir, name, fmt)
+        self.rows = 0
+        self._parquet_writer = None
+        os.makedirs(output_dir, exist_ok=True)
+
+    def write(self, df):
+        if self.fmt == 'parquet':
+            if self._parquet_writer is None:
+                self._parquet_writer = pq.ParquetWriter(self.path, SCHEMAS[self.name], compression='zstd')
+            self._parquet_writer.write_table(to_arrow(df, self.name))
+        else:
+            df.to_csv(self.path, mode='a' if self.rows else 'w', header=not self.rows, index=False)
+        self.rows += len(df)
+
+    def close(self):
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+            self._parquet_writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+def write_dataset(df, output_dir, name, fmt=DEFAULT_FORMAT):
+    """Writes one table as <output_dir>/<name>.<fmt> and returns the path."""
+    with DatasetWriter(output_dir, name, fmt) as writer:
+        writer.write(df)
+    return writer.path
+
+# ============ READING ============
+
+def read_dataset(path, columns=None):
+    """Reads a CSV or Parquet table file into a DataFrame."""
+    if path.endswith('.parquet'):
+        return from_arrow(pq.read_table(path, columns=columns))
+    return pd.read_csv(path, usecols=columns)
+
+def read_table(data_dir, name, columns=None):
+    """Reads a table from data_dir in whichever format is present (newest wins)."""
+    path = find_dataset(data_dir, name)
+    if path is None:
+        raise FileNotFoundError(2, "No such file", dataset_path(data_dir, name, DEFAULT_FORMAT))
+    return read_dataset(path, columns)
+
+def iter_dataset(path, chunksize, skip_rows=0, columns=None):
+    """
+    Yields DataFrames of up to chunksize rows, starting after skip_rows data rows.
+    Memory use is bounded by the chunk size for both formats.
+    """
+    if path.endswith('.parquet'):
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=columns):
+            if skip_rows >= batch.num_rows:
+                skip_rows -= batch.num_rows
+                continue
+            yield from_arrow(pa.Table.from_batches([batch.slice(skip_rows)]))
+            skip_rows = 0
+    else:
+        # Row 0 is the header
+        yield from pd.read_csv(path, chunksize=chunksize, usecols=columns, skiprows=lambda i: 0 < i <= skip_rows)
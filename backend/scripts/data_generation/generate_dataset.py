@@ -0,0 +1,130 @@
+"""
+Generates a complete synthetic dataset in one deterministic pipeline:
+users -> products -> competitor prices -> inventory -> orders and order items.
+
+--scale multiplies today's volume (customers, suppliers and orders per day);
+the same --seed and --end-date always produce byte-identical files.
+
+    python generate_dataset.py --scale 10 --seed 42 --output-dir /tmp/kcart-10x
+"""
+import pandas as pd
+import numpy as np
+import os
+import time
+import argparse
+from datetime import datetime
+from user_data_generation import build_users, NUM_CUSTOMERS, NUM_SUPPLIERS
+from products_data_generation import build_product_catalog
+from competitor_data_generator import generate_competitor_prices
+from inventory_data_generation import build_inventory
+from orders_data_generator import write_transaction_data, AVG_ORDERS_PER_DAY, DAYS_OF_HISTORY
+from constants import PRODUCTS_CATALOG
+from dataset_io import FORMATS, DEFAULT_FORMAT, find_dataset, iter_dataset, read_table, write_dataset
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), '../../', 'data')
+
+# Independent random streams, so changing one stage's size does not shift the others
+STAGES = ['users', 'products', 'competitor_prices', 'inventory', 'orders']
+
+def check_integrity(output_dir):
+    """Verifies that every foreign key in the generated files points at a generated row."""
+    def read(name, columns):
+        return read_table(output_dir, name, columns)
+
+    def chunks(name, columns):
+        return iter_dataset(find_dataset(output_dir, name), 1_000_000, columns=columns)
+
+    users = read('users', ['user_id', 'role', 'phone_number'])
+    product_ids = set(read('products', ['product_id'])['product_id'])
+    customers = set(users.loc[users['role'] == 'customer', 'user_id'])
+    suppliers = set(users.loc[users['role'] == 'supplier', 'user_id'])
+
+    inventory = read('inventory', ['supplier_id', 'product_id'])
+    order_ids = set()
+    problems = {
+        'duplicate phone numbers': users['phone_number'].duplicated().sum(),
+        'competitor prices with unknown product': (~read('competitor_prices', ['product_id'])['product_id'].isin(product_ids)).sum(),
+        'inventory with unknown supplier': (~inventory['supplier_id'].isin(suppliers)).sum(),
+        'inventory with unknown product': (~inventory['product_id'].isin(product_ids)).sum(),
+        'duplicate supplier-product listings': inventory.duplicated().sum(),
+        'orders with unknown customer': 0,
+        'order items with unknown order': 0,
+        'order items with unknown product': 0,
+    }
+    for orders in chunks('orders', ['order_id', 'user_id']):
+        problems['orders with unknown customer'] += (~orders['user_id'].isin(customers)).sum()
+        order_ids.update(orders['order_id'])
+    for items in chunks('order_items', ['order_id', 'product_id']):
+        problems['order items with unknown order'] += (~items['order_id'].isin(order_ids)).sum()
+        problems['order items with unknown product'] += (~items['product_id'].isin(product_ids)).sum()
+
+    return {name: int(count) for name, count in problems.items() if count}
+
+def generate_dataset(output_dir=DATA_DIR, scale=1.0, seed=None, days_of_history=DAYS_OF_HISTORY,
+                     num_products=None, end_date=None, workers=1, verify=True, fmt=DEFAULT_FORMAT):
+    """Runs every generator in dependency order and writes their tables to output_dir as fmt."""
+    end_date = pd.Timestamp(end_date or datetime.now()).normalize()
+    seeds = dict(zip(STAGES, np.random.SeedSequence(seed).spawn(len(STAGES))))
+    num_customers = max(1, round(NUM_CUSTOMERS * scale))
+    num_suppliers = max(1, round(NUM_SUPPLIERS * scale))
+    num_products = num_products or len(PRODUCTS_CATALOG)
+    os.makedirs(output_dir, exist_ok=True)
+
+    print(f"--- Generating {scale:g}x dataset into '{output_dir}' (seed={seed}, end date {end_date.date()}) ---")
+    timings = []
+
+    def run_stage(name, build):
+        started = time.perf_counter()
+        result = build()
+        timings.append((name, time.perf_counter() - started))
+        return result
+
+    def write(name, df):
+        write_dataset(df, output_dir, name, fmt)
+        print(f"  {name}: {len(df)} rows")
+        return df
+
+    users_df = run_stage('users', lambda: write('users', build_users(
+        num_customers, num_suppliers, np.random.default_rng(seeds['users']), end_date)))
+    products_df = run_stage('products', lambda: write('products', build_product_catalog(
+        num_products, np.random.default_rng(seeds['products']))))
+    competitor_prices_df = run_stage('competitor_prices', lambda: write('competitor_prices', generate_competitor_prices(
+        products_df, days_of_history, np.random.default_rng(seeds['competitor_prices']), end_date)))
+    run_stage('inventory', lambda: write('inventory', build_inventory(
+        users_df, products_df, competitor_prices_df, np.random.default_rng(seeds['inventory']), end_date)))
+
+    num_orders, num_items = run_stage('orders', lambda: write_transaction_data(
+        users_df, products_df, competitor_prices_df, output_dir, days_of_history, seeds['orders'],
+        workers, end_date, AVG_ORDERS_PER_DAY * scale, fmt))
+    print(f"  orders: {num_orders} rows")
+    print(f"  order_items: {num_items} rows")
+
+    print("\nStage timings:")
+    for name, seconds in timings:
+        print(f"  {name:<20}{seconds:>8.2f}s")
+
+    if verify:
+        problems = check_integrity(output_dir)
+        if problems:
+            raise RuntimeError(f"Referential integrity check failed: {problems}")
+        print("Referential integrity check passed.")
+
+    print("--- Dataset Generation Complete ---")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a complete, reproducible synthetic dataset.")
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help="Multiplier for customers, suppliers and orders per day (default: 1)")
+    parser.add_argument('--seed', type=int, default=None, help="Random seed; the same seed and end date give identical files")
+    parser.add_argument('--output-dir', default=DATA_DIR, help="Directory for the generated files (default: backend/data)")
+    parser.add_argument('--format', choices=FORMATS, default=DEFAULT_FORMAT, help=f"Output format (default: {DEFAULT_FORMAT})")
+    parser.add_argument('--days', type=int, default=DAYS_OF_HISTORY, help=f"Days of history (default: {DAYS_OF_HISTORY})")
+    parser.add_argument('--products', type=int, default=None,
+                        help=f"Number of products (default: the {len(PRODUCTS_CATALOG)}-product catalog)")
+    parser.add_argument('--end-date', default=None, help="Last day of history, YYYY-MM-DD (default: today)")
+    parser.add_argument('--workers', type=int, default=1, help="Processes for order generation (default: 1)")
+    parser.add_argument('--no-verify', action='store_true', help="Skip the referential integrity check")
+    args = parser.parse_args()
+
+    generate_dataset(os.path.abspath(args.output_dir), args.scale, args.seed, args.days,
+                     args.products, args.end_date, args.workers, not args.no_verify, args.format)
@@ -0,0 +1,61 @@
+import numpy as np
+
+#__________________________Vectorized helpers shared by the generators_______________________#
+
+_HEX_DIGITS = np.frombuffer(b'0123456789abcdef', dtype=np.uint8)
+_HEX_VALUES = np.zeros(256, dtype=np.uint8)
+_HEX_VALUES[np.frombuffer(b'0123456789abcdef', dtype=np.uint8)] = np.arange(16)
+_HEX_VALUES[np.frombuffer(b'ABCDEF', dtype=np.uint8)] = np.arange(10, 16)
+_UUID_DASHES = [8, 13, 18, 23]
+
+def uuid_chars(raw):
+    """Formats an (n, 16) uint8 array as an (n, 36) array of canonical UUID characters."""
+    raw = np.asarray(raw, dtype=np.uint8).reshape(-1, 16)
+    nibbles = np.empty((len(raw), 32), dtype=np.uint8)
+    nibbles[:, 0::2] = _HEX_DIGITS[raw >> 4]
+    nibbles[:, 1::2] = _HEX_DIGITS[raw & 0x0F]
+
+    chars = np.full((len(raw), 36), ord('-'), dtype=np.uint8)
+    for start, end, offset in ((0, 8, 0), (8, 12, 1), (12, 16, 2), (16, 20, 3), (20, 32, 4)):
+        chars[:, start + offset:end + offset] = nibbles[:, start:end]
+    return chars
+
+def format_uuids(raw):
+    """Formats an (n, 16) uint8 array as canonical UUID strings."""
+    return uuid_chars(raw).view('S36').ravel().astype(str)
+
+def parse_uuids(values):
+    """Parses canonical UUID strings into an (n, 16) uint8 array."""
+    chars = np.asarray(values, dtype='S36').view(np.uint8).reshape(-1, 36)
+    nibbles = _HEX_VALUES[np.delete(chars, _UUID_DASHES, axis=1)]
+    return (nibbles[:, 0::2] << 4) | nibbles[:, 1::2]
+
+def uuid4_array(rng, n):
+    """Builds n random version-4 UUID strings from the generator, without a Python loop."""
+    raw = rng.integers(0, 256, size=(n, 16), dtype=np.uint8)
+    raw[:, 6] = (raw[:, 6] & 0x0F) | 0x40
+    raw[:, 8] = (raw[:, 8] & 0x3F) | 0x80
+    return format_uuids(raw)
+
+def sample_distinct(rng, counts, population, max_count):
+    """
+    Picks counts[i] distinct indices from range(population) for every row i
+    (at most max_count per row). Returns flat (row index, picked index) arrays.
+    """
+    num_rows = len(counts)
+    max_count = min(max_count, population)
+
+    # The max_count smallest of n uniform keys are a uniform random subset;
+    # sorting them gives a random order, so any prefix is a uniform sample too
+    keys = rng.random((num_rows, population))
+    candidates = np.argpartition(keys, max_count - 1, axis=1)[:, :max_count]
+    order = np.argsort(np.take_along_axis(keys, candidates, axis=1), axis=1)
+    candidates = np.take_along_axis(candidates, order, axis=1)
+
+    mask = np.arange(max_count)[None, :] < np.minimum(counts, max_count)[:, None]
+    rows = np.broadcast_to(np.arange(num_rows)[:, None], mask.shape)[mask]
+    return rows, candidates[mask]
+
+def as_seed_sequence(seed):
+    """Accepts an int, None or an existing SeedSequence (as handed out by the dataset pipeline)."""
+    return seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
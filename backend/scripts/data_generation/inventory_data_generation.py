@@ -1,22 +1,74 @@
 # backend/scripts/generate_inventory.py
 
 import pandas as pd
-import random
+import numpy as np
 import os
-import uuid
-from datetime import datetime, timedelta
+import argparse
+from datetime import datetime
+from generation_utils import uuid4_array, sample_distinct
+from dataset_io import FORMATS, DEFAULT_FORMAT, read_table, write_dataset
 
 
-DATA_DIR = '../../data'
-USERS_FILE = os.path.join(DATA_DIR, "users.csv")
-PRODUCTS_FILE = os.path.join(DATA_DIR, "products.csv")
-COMPETITOR_PRICES_FILE = os.path.join(DATA_DIR, "competitor_prices.csv")
-OUTPUT_FILE = os.path.join(DATA_DIR, "inventory.csv")
+DATA_DIR = os.path.join(os.path.dirname(__file__), '../../', 'data')
 
 MIN_PRODUCTS_PER_SUPPLIER = 3
 MAX_PRODUCTS_PER_SUPPLIER = 20
 
-def generate_inventory_data():
+def todays_market(competitor_prices_df):
+    """Returns the latest local_shop (min_price) and supermarket (max_price) price per product."""
+    latest_date = competitor_prices_df['date'].max()
+    todays_prices_df = competitor_prices_df[competitor_prices_df['date'] == latest_date]
+
+    return todays_prices_df.pivot(
+        index='product_id',
+        columns='competitor_tier',
+        values='price_per_unit_etb'
+    ).rename(columns={'local_shop': 'min_price', 'supermarket': 'max_price'})
+
+def build_inventory(users_df, products_df, competitor_prices_df, rng=None, end_date=None):
+    """
+    Builds inventory listings with realistic pricing. Every supplier lists a
+    random set of distinct products, so each supplier-product pair is unique.
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    end_date = pd.Timestamp(end_date or datetime.now()).normalize()
+
+    supplier_ids = users_df.loc[users_df['role'] == 'supplier', 'user_id'].to_numpy()
+    if len(supplier_ids) == 0:
+        raise ValueError("No suppliers found in users.csv.")
+    product_ids = products_df['product_id'].to_numpy()
+
+    max_per_supplier = min(MAX_PRODUCTS_PER_SUPPLIER, len(product_ids))
+    min_per_supplier = min(MIN_PRODUCTS_PER_SUPPLIER, max_per_supplier)
+    products_per_supplier = rng.integers(min_per_supplier, max_per_supplier + 1, size=len(supplier_ids))
+    supplier_index, product_index = sample_distinct(rng, products_per_supplier, len(product_ids), max_per_supplier)
+    num_listings = len(supplier_index)
+
+    # Price between today's local shop and supermarket prices, or a wide
+    # fallback range for products without a market price
+    market = todays_market(competitor_prices_df).reindex(product_ids)
+    min_prices = market['min_price'].to_numpy(dtype=float)[product_index]
+    max_prices = market['max_price'].to_numpy(dtype=float)[product_index]
+    missing = np.isnan(min_prices) | np.isnan(max_prices)
+    low = np.where(missing, 30.00, min_prices * 1.05)
+    high = np.where(missing, 300.00, max_prices * 0.95)
+    prices = np.round(rng.uniform(low, high), 2)
+
+    available_dates = end_date - pd.to_timedelta(rng.integers(1, 31, size=num_listings), unit='D')
+    expiry_dates = available_dates + pd.to_timedelta(rng.integers(7, 91, size=num_listings), unit='D')
+
+    return pd.DataFrame({
+        "inventory_id": uuid4_array(rng, num_listings),
+        "supplier_id": supplier_ids[supplier_index],
+        "product_id": product_ids[product_index],
+        "quantity_available": np.round(rng.uniform(20.0, 500.0, size=num_listings), 2),
+        "price_per_unit_etb": prices,
+        "status": "active",
+        "available_date": available_dates.strftime("%Y-%m-%d"),
+        "expiry_date": expiry_dates.strftime("%Y-%m-%d")
+    })
+
+def generate_inventory_data(seed=None, fmt=DEFAULT_FORMAT):
     """
     Generates a synthetic dataset of inventory listings with realistic pricing,
     ensuring that each supplier-product pair is unique.
@@ -24,80 +76,34 @@ def generate_inventory_data():
     print("Starting inventory data generation with realistic pricing and uniqueness constraint...")
 
     try:
-        users_df = pd.read_csv(USERS_FILE)
-        products_df = pd.read_csv(PRODUCTS_FILE)
-        competitor_prices_df = pd.read_csv(COMPETITOR_PRICES_FILE)
+        users_df = read_table(DATA_DIR, 'users')
+        products_df = read_table(DATA_DIR, 'products')
+        competitor_prices_df = read_table(DATA_DIR, 'competitor_prices')
     except FileNotFoundError as e:
         print(f"Error: Prerequisite file not found: {e.filename}")
         print("Please ensure all previous generation scripts have been run.")
         return
 
-    print("Analyzing today's market prices from historical data...")
-    latest_date = competitor_prices_df['date'].max()
-    todays_prices_df = competitor_prices_df[competitor_prices_df['date'] == latest_date]
-    
-    todays_market = todays_prices_df.pivot(
-        index='product_id', 
-        columns='competitor_tier', 
-        values='price_per_unit_etb'
-    ).rename(columns={'local_shop': 'min_price', 'supermarket': 'max_price'})
-
-    suppliers = users_df[users_df['role'] == 'supplier']
-    if suppliers.empty:
-        print("Error: No suppliers found in users.csv.")
+    try:
+        inventory_df = build_inventory(users_df, products_df, competitor_prices_df, np.random.default_rng(seed))
+    except ValueError as e:
+        print(f"Error: {e}")
         return
 
-    supplier_ids = suppliers['user_id'].tolist()
-    product_ids = products_df['product_id'].tolist()
-    
-    inventory_data = []
-    existing_pairs = set()
-
-    print(f"Generating inventory for {len(supplier_ids)} suppliers...")
-    for supplier_id in supplier_ids:
-        num_products_for_supplier = random.randint(MIN_PRODUCTS_PER_SUPPLIER, MAX_PRODUCTS_PER_SUPPLIER)
-        products_to_add = random.sample(product_ids, num_products_for_supplier)
-
-        for product_id in products_to_add:
-            if (supplier_id, product_id) in existing_pairs:
-                continue 
-            
-            available_date = datetime.now() - timedelta(days=random.randint(1, 30))
-            expiry_date = available_date + timedelta(days=random.randint(7, 90))
-
-            try:
-                market_info = todays_market.loc[product_id]
-                min_price = market_info['min_price']
-                max_price = market_info['max_price']
-                realistic_price = round(random.uniform(min_price * 1.05, max_price * 0.95), 2)
-            except (KeyError, IndexError):
-                realistic_price = round(random.uniform(30.00, 300.00), 2)
-
-            inventory_item = {
-                "inventory_id": str(uuid.uuid4()),
-                "supplier_id": supplier_id,
-                "product_id": product_id,
-                "quantity_available": round(random.uniform(20.0, 500.0), 2),
-                "price_per_unit_etb": realistic_price,
-                "status": "active",
-                "available_date": available_date.strftime("%Y-%m-%d"),
-                "expiry_date": expiry_date.strftime("%Y-%m-%d")
-            }
-            inventory_data.append(inventory_item)
-            existing_pairs.add((supplier_id, product_id))
-
-    inventory_df = pd.DataFrame(inventory_data)
-
-    os.makedirs(os.path.dirname(OUTPUT_FILE), exist_ok=True)
-    inventory_df.to_csv(OUTPUT_FILE, index=False)
+    output_file = write_dataset(inventory_df, DATA_DIR, 'inventory', fmt)
 
     print("-" * 30)
     print(f"Successfully generated {len(inventory_df)} unique inventory listings.")
-    print(f"Data saved to '{OUTPUT_FILE}'")
+    print(f"Data saved to '{output_file}'")
     print("-" * 30)
 
     print("Sample of generated inventory data:")
     print(inventory_df.head())
 
 if __name__ == "__main__":
-    generate_inventory_data()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Generate supplier inventory listings.")
+    parser.add_argument('--seed', type=int, default=None, help="Random seed for reproducible output")
+    parser.add_argument('--format', choices=FORMATS, default=DEFAULT_FORMAT, help=f"Output format (default: {DEFAULT_FORMAT})")
+    args = parser.parse_args()
+
+    generate_inventory_data(args.seed, args.format)
@@ -1,129 +1,190 @@
 import pandas as pd
-import random
+import numpy as np
 import os
-import uuid
-from datetime import datetime, timedelta
-
-DATA_DIR = '../../data'
-USERS_FILE = os.path.join(DATA_DIR, 'users.csv')
-PRODUCTS_FILE = os.path.join(DATA_DIR, 'products.csv')
-COMPETITOR_PRICES_FILE = os.path.join(DATA_DIR, 'competitor_prices.csv')
-ORDERS_OUTPUT_FILE = os.path.join(DATA_DIR, "orders.csv")
-ORDER_ITEMS_OUTPUT_FILE = os.path.join(DATA_DIR, "order_items.csv")
-
-PRODUCT_ENHANCEMENTS = {
-    "red_onions":     {"price": 45.0}, "tomatoes":       {"price": 50.0},
-    "potatoes":       {"price": 30.0}, "garlic":         {"price": 150.0},
-    "cabbage":        {"price": 25.0}, "carrots":        {"price": 35.0},
-    "green_peppers":  {"price": 60.0}, "collard_greens": {"price": 20.0},
-    "avocados":       {"price": 90.0}, "bananas":        {"price": 50.0},
-    "mangoes":        {"price": 80.0}, "papayas":        {"price": 70.0},
-    "oranges":        {"price": 65.0}, "lemons":         {"price": 75.0},
-    "watermelon":     {"price": 15.0}, "milk":           {"price": 85.0},
-    "yogurt":         {"price": 95.0}, "kibe":           {"price": 1200.0},
-    "sweet_potatoes": {"price": 40.0}, "ginger":         {"price": 180.0}
-}
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from constants import product_enhancement
+from generation_utils import uuid4_array, sample_distinct, as_seed_sequence
+from dataset_io import FORMATS, DEFAULT_FORMAT, DatasetWriter, read_table
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), '../../', 'data')
+
+DEFAULT_BASE_PRICE = 100.0
 
 DAYS_OF_HISTORY = 365
 AVG_ORDERS_PER_DAY = 50
 MAX_ITEMS_PER_ORDER = 5
 
-def generate_transaction_data():
+# Days simulated (and written) together; bounds memory and is the unit of work
+# handed to each process when running in parallel
+DAYS_PER_BLOCK = 30
+
+# Price elasticity: (price below base * 0.9, price above base * 1.1, otherwise)
+# -> quantity drawn uniformly from (low, high)
+CHEAP_QUANTITY = (2.0, 10.0)
+EXPENSIVE_QUANTITY = (0.5, 2.0)
+NORMAL_QUANTITY = (1.0, 5.0)
+
+# ============ HELPERS ============
+
+def build_price_matrix(competitor_prices_df, dates, product_ids):
+    """
+    Pivots the local_shop prices into a dense (day, product) matrix aligned
+    with dates and product_ids. Days or products without a price are NaN.
+    """
+    local_prices = competitor_prices_df[competitor_prices_df['competitor_tier'] == 'local_shop']
+    # Dates are text in CSV files and datetime64 in Parquet files
+    local_prices = local_prices.assign(date=pd.to_datetime(local_prices['date']))
+    matrix = local_prices.pivot_table(index='date', columns='product_id', values='price_per_unit_etb', aggfunc='first')
+    return matrix.reindex(index=dates, columns=product_ids).to_numpy(dtype=float)
+
+# ============ SIMULATION ============
+
+_context = None
+
+def _init_worker(context):
+    global _context
+    _context = context
+
+def simulate_block(day_indices, seed_sequence, context=None):
+    """
+    Simulates the orders and order items for the given day indices.
+    Every block draws from its own seed sequence, so the output does not
+    depend on how blocks are spread over processes.
     """
-    Generates a 1-year historical dataset of orders and their corresponding items.
+    context = context or _context
+    rng = np.random.default_rng(seed_sequence)
+    dates = context['dates']
+    customers = context['customers']
+    price_matrix = context['price_matrix']
+    base_prices = context['base_prices']
+
+    avg_orders_per_day = context['avg_orders_per_day']
+    orders_per_day = rng.integers(int(avg_orders_per_day * 0.5), int(avg_orders_per_day * 1.5) + 1, size=len(day_indices))
+    order_days = np.repeat(day_indices, orders_per_day)
+    num_orders = len(order_days)
+
+    seconds = rng.integers(0, 86400, size=num_orders).astype('timedelta64[s]')
+    orders_df = pd.DataFrame({
+        "order_id": uuid4_array(rng, num_orders),
+        "user_id": customers[rng.integers(0, len(customers), size=num_orders)],
+        "order_date": dates[order_days].astype('datetime64[s]') + seconds,
+        "status": "completed",
+    })
+
+    items_per_order = rng.integers(1, MAX_ITEMS_PER_ORDER + 1, size=num_orders)
+    item_orders, item_products = sample_distinct(rng, items_per_order, len(base_prices), MAX_ITEMS_PER_ORDER)
+
+    prices = price_matrix[order_days[item_orders], item_products]
+    priced = ~np.isnan(prices)
+    item_orders, item_products, prices = item_orders[priced], item_products[priced], prices[priced]
+
+    base = base_prices[item_products]
+    low = np.select([prices < base * 0.9, prices > base * 1.1], [CHEAP_QUANTITY[0], EXPENSIVE_QUANTITY[0]], NORMAL_QUANTITY[0])
+    high = np.select([prices < base * 0.9, prices > base * 1.1], [CHEAP_QUANTITY[1], EXPENSIVE_QUANTITY[1]], NORMAL_QUANTITY[1])
+    quantities = np.round(rng.uniform(low, high), 2)
+
+    order_items_df = pd.DataFrame({
+        "order_item_id": uuid4_array(rng, len(item_orders)),
+        "order_id": orders_df['order_id'].to_numpy()[item_orders],
+        "product_id": context['product_ids'][item_products],
+        "quantity": quantities,
+        "price_per_unit_etb": prices,
+    })
+    return orders_df, order_items_df
+
+def write_transaction_data(users_df, products_df, competitor_prices_df, output_dir, days_of_history=DAYS_OF_HISTORY,
+                           seed=None, workers=1, end_date=None, avg_orders_per_day=AVG_ORDERS_PER_DAY,
+                           fmt=DEFAULT_FORMAT):
+    """
+    Simulates the order history for the given users, products and competitor
+    prices and writes the orders and order_items tables to output_dir.
+    Days are simulated in blocks, optionally spread across a process pool, and
+    each block is appended to the output files as soon as it is ready.
+    Returns (number of orders, number of order items).
+    """
+    customers = users_df.loc[users_df['role'] == 'customer', 'user_id'].to_numpy()
+    if len(customers) == 0:
+        raise ValueError("No customers found in users.csv.")
+
+    end_date = pd.Timestamp(end_date or datetime.now()).normalize()
+    dates = pd.date_range(end=end_date, periods=days_of_history, freq='D')[::-1]
+    product_ids = products_df['product_id'].to_numpy()
+    base_prices = products_df['internal_name'].map(
+        lambda name: product_enhancement(name).get('price', DEFAULT_BASE_PRICE)
+    ).to_numpy(dtype=float)
+
+    context = {
+        'dates': dates.to_numpy(),
+        'customers': customers,
+        'product_ids': product_ids,
+        'base_prices': base_prices,
+        'avg_orders_per_day': avg_orders_per_day,
+        'price_matrix': build_price_matrix(competitor_prices_df, dates, product_ids),
+    }
+
+    blocks = [np.arange(start, min(start + DAYS_PER_BLOCK, days_of_history)) for start in range(0, days_of_history, DAYS_PER_BLOCK)]
+    seed_sequences = as_seed_sequence(seed).spawn(len(blocks))
+
+    print(f"Simulating transactions for {days_of_history} days in {len(blocks)} blocks with {workers} worker(s)...")
+    if workers > 1:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(context,))
+        results = executor.map(simulate_block, blocks, seed_sequences)
+    else:
+        executor = None
+        results = (simulate_block(block, seq, context) for block, seq in zip(blocks, seed_sequences))
+
+    try:
+        with DatasetWriter(output_dir, 'orders', fmt) as orders_writer, \
+                DatasetWriter(output_dir, 'order_items', fmt) as order_items_writer:
+            for orders_df, order_items_df in results:
+                orders_writer.write(orders_df)
+                order_items_writer.write(order_items_df)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    return orders_writer.rows, order_items_writer.rows
+
+def generate_transaction_data(days_of_history=DAYS_OF_HISTORY, seed=None, workers=1, data_dir=DATA_DIR, end_date=None,
+                              fmt=DEFAULT_FORMAT):
+    """
+    Generates a historical dataset of orders and their corresponding items.
     Simulates price elasticity where lower prices lead to higher quantity sales.
     """
     print("Starting historical transaction data generation...")
 
     try:
-        users_df = pd.read_csv(USERS_FILE)
-        products_df = pd.read_csv(PRODUCTS_FILE)
-        competitor_prices_df = pd.read_csv(COMPETITOR_PRICES_FILE)
+        users_df = read_table(data_dir, 'users')
+        products_df = read_table(data_dir, 'products')
+        competitor_prices_df = read_table(data_dir, 'competitor_prices')
     except FileNotFoundError as e:
         print(f"Error: Prerequisite file not found: {e.filename}")
         return
 
-    customers = users_df[users_df['role'] == 'customer']['user_id'].tolist()
-    if not customers:
-        print("Error: No customers found in users.csv.")
+    started = time.perf_counter()
+    try:
+        num_orders, num_items = write_transaction_data(
+            users_df, products_df, competitor_prices_df, data_dir, days_of_history, seed, workers, end_date,
+            fmt=fmt
+        )
+    except ValueError as e:
+        print(f"Error: {e}")
         return
-        
-    product_id_to_internal_name = products_df.set_index('product_id')['internal_name'].to_dict()
-    product_base_prices = {
-        pid: PRODUCT_ENHANCEMENTS.get(iname, {}).get('price', 100.0)
-        for pid, iname in product_id_to_internal_name.items()
-    }
-    all_product_ids = products_df['product_id'].tolist()
-
-    competitor_prices_df.set_index(['date', 'product_id'], inplace=True)
-    competitor_prices_df.sort_index(inplace=True)
-
-    orders_data = []
-    order_items_data = []
-    today = datetime.now().date()
-
-    print(f"Simulating transactions for {DAYS_OF_HISTORY} days...")
-
-    for i in range(DAYS_OF_HISTORY):
-        current_date = today - timedelta(days=i)
-        current_date_str = current_date.strftime("%Y-%m-%d")
-        
-        num_orders_today = random.randint(int(AVG_ORDERS_PER_DAY * 0.5), int(AVG_ORDERS_PER_DAY * 1.5))
-
-        for _ in range(num_orders_today):
-            order_id = str(uuid.uuid4())
-            order_datetime = datetime.combine(current_date, datetime.min.time()) + timedelta(seconds=random.randint(0, 86399))
-            
-            orders_data.append({
-                "order_id": order_id,
-                "user_id": random.choice(customers),
-                "order_date": order_datetime.strftime("%Y-%m-%d %H:%M:%S"),
-                "status": "completed"
-            })
-
-            num_items_in_order = random.randint(1, MAX_ITEMS_PER_ORDER)
-            products_in_order = random.sample(all_product_ids, num_items_in_order)
-
-            for product_id in products_in_order:
-                try:
-                    kcart_price_today = competitor_prices_df.loc[(current_date_str, product_id)]
-                    kcart_price_today = kcart_price_today[kcart_price_today['competitor_tier'] == 'local_shop']['price_per_unit_etb'].iloc[0]
-                except (KeyError, IndexError):
-                    continue
-
-                base_price = product_base_prices.get(product_id, kcart_price_today)
-
-                if kcart_price_today < base_price * 0.9:
-                    quantity = round(random.uniform(2.0, 10.0), 2)
-                elif kcart_price_today > base_price * 1.1:
-                    quantity = round(random.uniform(0.5, 2.0), 2)
-                else:
-                    quantity = round(random.uniform(1.0, 5.0), 2)
-                
-                order_items_data.append({
-                    "order_item_id": str(uuid.uuid4()),
-                    "order_id": order_id,
-                    "product_id": product_id,
-                    "quantity": quantity,
-                    "price_per_unit_etb": kcart_price_today
-                })
-
-    orders_df = pd.DataFrame(orders_data)
-    order_items_df = pd.DataFrame(order_items_data)
-
-    os.makedirs(DATA_DIR, exist_ok=True)
-    orders_df.to_csv(ORDERS_OUTPUT_FILE, index=False)
-    order_items_df.to_csv(ORDER_ITEMS_OUTPUT_FILE, index=False)
 
     print("-" * 30)
-    print(f"Successfully generated {len(orders_df)} orders and {len(order_items_df)} order items.")
-    print(f"Data saved to '{ORDERS_OUTPUT_FILE}' and '{ORDER_ITEMS_OUTPUT_FILE}'")
+    print(f"Successfully generated {num_orders} orders and {num_items} order items in {time.perf_counter() - started:.2f}s.")
+    print(f"Data saved to '{data_dir}' as orders.{fmt} and order_items.{fmt}")
     print("-" * 30)
 
-    print("Sample of generated orders data:")
-    print(orders_df.head())
-    print("\nSample of generated order items data:")
-    print(order_items_df.head())
-
 if __name__ == "__main__":
-    generate_transaction_data()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Generate historical orders and order items.")
+    parser.add_argument('--days', type=int, default=DAYS_OF_HISTORY, help=f"Days of history (default: {DAYS_OF_HISTORY})")
+    parser.add_argument('--seed', type=int, default=None, help="Random seed for reproducible output")
+    parser.add_argument('--workers', type=int, default=1, help="Processes to spread the days over (default: 1)")
+    parser.add_argument('--format', choices=FORMATS, default=DEFAULT_FORMAT, help=f"Output format (default: {DEFAULT_FORMAT})")
+    args = parser.parse_args()
+
+    generate_transaction_data(args.days, args.seed, args.workers, fmt=args.format)
@@ -1,49 +1,68 @@
 import pandas as pd
+import numpy as np
 import os
-import uuid  
-from constants import PRODUCTS_CATALOG
+import argparse
+from constants import PRODUCTS_CATALOG, VARIANT_SEPARATOR
+from generation_utils import uuid4_array
+from dataset_io import FORMATS, DEFAULT_FORMAT, write_dataset
 
 
 
-OUTPUT_DIR = "../../data"
-OUTPUT_FILE = os.path.join(OUTPUT_DIR, "products.csv")
+OUTPUT_DIR = os.path.join(os.path.dirname(__file__), '../../', 'data')
 
-def generate_product_catalog():
+def build_product_catalog(num_products=None, rng=None):
     """
-    Generates the master catalog of unique products available on the platform,
-    using UUIDs for product IDs.
+    Builds the product catalog with UUID product IDs. When more products than
+    the catalog holds are asked for, the catalog is repeated as numbered
+    variants ("Red Onions 2", internal name "red_onions__2").
     """
-    print("Starting master product catalog generation with UUIDs...")
+    rng = rng if rng is not None else np.random.default_rng()
+    catalog = list(PRODUCTS_CATALOG.items())
+    num_products = num_products or len(catalog)
 
     products_data = []
+    for index in range(num_products):
+        display_name, simple_name = catalog[index % len(catalog)]
+        variant = index // len(catalog) + 1
+        if variant > 1:
+            display_name = f"{display_name} {variant}"
+            simple_name = f"{simple_name}{VARIANT_SEPARATOR}{variant}"
 
-    for display_name, simple_name in PRODUCTS_CATALOG.items():
-        if simple_name in ["milk", "yogurt"]:
-            unit = "Liter"
-        else:
-            unit = "Kg"
-
-        product = {
-            "product_id": str(uuid.uuid4()),
+        products_data.append({
             "product_name": display_name,
             "internal_name": simple_name,
-            "unit": unit,
-            "photo_url": "" 
-        }
-        products_data.append(product)
+            "unit": "Liter" if simple_name.split(VARIANT_SEPARATOR)[0] in ["milk", "yogurt"] else "Kg",
+            "photo_url": ""
+        })
 
     products_df = pd.DataFrame(products_data)
+    products_df.insert(0, "product_id", uuid4_array(rng, len(products_df)))
+    return products_df
 
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
-    products_df.to_csv(OUTPUT_FILE, index=False)
+def generate_product_catalog(num_products=None, seed=None, fmt=DEFAULT_FORMAT):
+    """
+    Generates the master catalog of unique products available on the platform,
+    using UUIDs for product IDs.
+    """
+    print("Starting master product catalog generation with UUIDs...")
+
+    products_df = build_product_catalog(num_products, np.random.default_rng(seed))
+
+    output_file = write_dataset(products_df, OUTPUT_DIR, 'products', fmt)
 
     print("-" * 30)
     print(f"Successfully generated master catalog with {len(products_df)} products.")
-    print(f"Data saved to '{OUTPUT_FILE}'")
+    print(f"Data saved to '{output_file}'")
     print("-" * 30)
-    
+
     print("Generated product catalog with UUIDs:")
-    print(products_df.to_string())
+    print(products_df.head(len(PRODUCTS_CATALOG)).to_string())
 
 if __name__ == "__main__":
-    generate_product_catalog()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Generate the product catalog.")
+    parser.add_argument('--products', type=int, default=None, help="Number of products (default: the catalog size)")
+    parser.add_argument('--seed', type=int, default=None, help="Random seed for reproducible output")
+    parser.add_argument('--format', choices=FORMATS, default=DEFAULT_FORMAT, help=f"Output format (default: {DEFAULT_FORMAT})")
+    args = parser.parse_args()
+
+    generate_product_catalog(args.products, args.seed, args.format)
@@ -1,67 +1,54 @@
 import pandas as pd
-from faker import Faker
-import random
-from datetime import datetime, timedelta
+import numpy as np
+from datetime import datetime
 import os
-import uuid
+import argparse
 from constants import LOCATIONS, Names
+from generation_utils import uuid4_array
+from dataset_io import FORMATS, DEFAULT_FORMAT, write_dataset
 
 NUM_CUSTOMERS = 300
 NUM_SUPPLIERS = 70
-OUTPUT_DIR = "../data"
-OUTPUT_FILE = os.path.join(OUTPUT_DIR, "users.csv")
+OUTPUT_DIR = os.path.join(os.path.dirname(__file__), '../../', 'data')
 
 
-def generate_user_data():
+def build_users(num_customers=NUM_CUSTOMERS, num_suppliers=NUM_SUPPLIERS, rng=None, end_date=None):
     """
-    Generates a synthetic dataset of users (customers and suppliers)
-    with an expanded list of regional locations and saves it to a CSV file.
+    Builds customers followed by suppliers, with unique phone numbers and a
+    creation date within the year before end_date.
     """
-    print("Starting user data generation with expanded locations...")
+    rng = rng if rng is not None else np.random.default_rng()
+    end_date = pd.Timestamp(end_date or datetime.now()).normalize()
+    num_users = num_customers + num_suppliers
 
-    fake = Faker()
-    users_data = []
+    phone_suffixes = rng.choice(90_000_000, size=num_users, replace=False) + 10_000_000
+    created_dates = end_date - pd.to_timedelta(rng.integers(0, 366, size=num_users), unit='D')
 
-    print(f"Generating {NUM_CUSTOMERS} customers...")
-    for _ in range(NUM_CUSTOMERS):
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=365)
-        created_date = fake.date_between(start_date=start_date, end_date=end_date)
+    return pd.DataFrame({
+        "user_id": uuid4_array(rng, num_users),
+        "name": np.array(Names)[rng.integers(0, len(Names), size=num_users)],
+        "phone_number": np.char.add("+2519", phone_suffixes.astype(str)),
+        "default_location": np.array(LOCATIONS)[rng.integers(0, len(LOCATIONS), size=num_users)],
+        "role": np.repeat(["customer", "supplier"], [num_customers, num_suppliers]),
+        "created_date": created_dates.strftime("%Y-%m-%d"),
+    })
 
-        user = {
-            "user_id": str(uuid.uuid4()),
-            "name": random.choice(Names),
-            "phone_number": f"+2519{fake.random_int(min=10000000, max=99999999)}",
-            "default_location": random.choice(LOCATIONS),
-            "role": "customer",
-            "created_date": created_date
-        }
-        users_data.append(user)
 
-    print(f"Generating {NUM_SUPPLIERS} suppliers...")
-    for _ in range(NUM_SUPPLIERS):
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=365)
-        created_date = fake.date_between(start_date=start_date, end_date=end_date)
+def generate_user_data(num_customers=NUM_CUSTOMERS, num_suppliers=NUM_SUPPLIERS, seed=None, fmt=DEFAULT_FORMAT):
+    """
+    Generates a synthetic dataset of users (customers and suppliers)
+    with an expanded list of regional locations and saves it as CSV or Parquet.
+    """
+    print("Starting user data generation with expanded locations...")
+    print(f"Generating {num_customers} customers and {num_suppliers} suppliers...")
 
-        user = {
-            "user_id": str(uuid.uuid4()),
-            "name": random.choice(Names),
-            "phone_number": f"+2519{fake.random_int(min=10000000, max=99999999)}",
-            "default_location": random.choice(LOCATIONS),
-            "role": "supplier",
-            "created_date": created_date
-        }
-        users_data.append(user)
+    users_df = build_users(num_customers, num_suppliers, np.random.default_rng(seed))
 
-    users_df = pd.DataFrame(users_data)
+    output_file = write_dataset(users_df, OUTPUT_DIR, 'users', fmt)
 
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
-    users_df.to_csv(OUTPUT_FILE, index=False)
-    
     print("-" * 30)
     print(f"Successfully generated {len(users_df)} users.")
-    print(f"Data saved to '{OUTPUT_FILE}'")
+    print(f"Data saved to '{output_file}'")
     print("-" * 30)
 
     print("Sample of generated data:")
@@ -71,5 +58,11 @@ def generate_user_data():
 
 
 if __name__ == "__main__":
-    generate_user_data()
-    
+    parser = argparse.ArgumentParser(description="Generate customers and suppliers.")
+    parser.add_argument('--customers', type=int, default=NUM_CUSTOMERS, help=f"Number of customers (default: {NUM_CUSTOMERS})")
+    parser.add_argument('--suppliers', type=int, default=NUM_SUPPLIERS, help=f"Number of suppliers (default: {NUM_SUPPLIERS})")
+    parser.add_argument('--seed', type=int, default=None, help="Random seed for reproducible output")
+    parser.add_argument('--format', choices=FORMATS, default=DEFAULT_FORMAT, help=f"Output format (default: {DEFAULT_FORMAT})")
+    args = parser.parse_args()
+
+    generate_user_data(args.customers, args.suppliers, args.seed, args.format)
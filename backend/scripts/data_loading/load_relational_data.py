@@ -1,24 +1,46 @@
+import io
 import os
 import sys
+import json
+import time
+import shutil
+import argparse
+from functools import lru_cache
 import django
 import pandas as pd
-from django.db import transaction, IntegrityError
+from django.db import transaction, connection
 
 backend_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 sys.path.insert(0, backend_dir)
+sys.path.insert(0, os.path.join(backend_dir, 'scripts', 'data_generation'))
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 django.setup()
 
+from django.contrib.auth.hashers import make_password
+from django.db.models import AutoField
+from django.utils import timezone
 from api.models import User, Product, Inventory, Order, OrderItem, CompetitorPrice
+from api.utils.catalog import invalidate_catalog
+from api.utils.supplier_cache import invalidate_all_supplier_views
+from api.utils.search import sync_product_aliases
+from api.utils.geo import sync_locations
+from dataset_io import find_dataset, iter_dataset
 
 DATA_DIR = os.path.join(backend_dir, 'data')
-USERS_FILE = os.path.join(DATA_DIR, 'users.csv')
-PRODUCTS_FILE = os.path.join(DATA_DIR, 'products.csv')
-INVENTORY_FILE = os.path.join(DATA_DIR, 'inventory.csv')
-ORDERS_FILE = os.path.join(DATA_DIR, 'orders.csv')
-ORDER_ITEMS_FILE = os.path.join(DATA_DIR, 'order_items.csv')
-COMPETITOR_PRICES_FILE = os.path.join(DATA_DIR, 'competitor_prices.csv')
+
+DEFAULT_PASSWORD = "password123"
+
+# Rows read, prepared and committed at a time; bounds memory use
+CHUNK_SIZE = 50000
+CHECKPOINT_DIR_NAME = '.load_checkpoints'
+
+# Rows per INSERT statement. Django further caps this at the backend's
+# parameter limit (e.g. 32766 variables on SQLite).
+BATCH_SIZE = 2000
+
+# Characters sent per write during COPY
+COPY_BLOCK_SIZE = 1 << 20
 
 def print_success(message):
     print(f"[SUCCESS] {message}")
@@ -29,142 +51,411 @@ def print_warning(message):
 def print_info(message):
     print(f"[INFO] {message}")
 
-@transaction.atomic
-def load_all_data():
-    print_success("--- Starting Data Loading Process ---")
-    
-    print_info("Clearing existing data...")
-    OrderItem.objects.all().delete()
-    Order.objects.all().delete()
-    Inventory.objects.all().delete()
-    CompetitorPrice.objects.all().delete()
-    Product.objects.all().delete()
-    User.objects.all().delete()
-    print_success("Existing data cleared.")
+# ============ COLUMN PREPARATION ============
+# Each prepare_* function turns a raw CSV or Parquet DataFrame into a DataFrame whose
+# columns are the model's database columns, using vectorized pandas operations.
 
-    load_users()
-    load_products()
-    load_inventory()
-    load_orders()
-    load_order_items()
-    load_competitor_prices()
-    
-    print_success("--- Data Loading Complete ---")
+@lru_cache(maxsize=None)
+def default_password_hash():
+    """Hashes the default password once; every generated user shares the hash."""
+    return make_password(DEFAULT_PASSWORD)
 
-def load_users():
-    print_info("Loading Users for Django Auth System...")
-    df = pd.read_csv(USERS_FILE)
-    
-    for index, row in df.iterrows():
-        base_username = row['name'].lower().replace(' ', '_').replace('.', '')
-        username = f"{base_username}_{row['user_id']}"
-
-        name_parts = row['name'].split(' ')
-        first_name = name_parts[0]
-        last_name = ' '.join(name_parts[1:]) if len(name_parts) > 1 else ''
-
-        user = User(
-            id=row['user_id'],
-            username=username,
-            first_name=first_name,
-            last_name=last_name,
-            phone_number=row['phone_number'],
-            default_location=row['default_location'],
-            role=row['role'],
-            is_staff=False,
-            is_superuser=False,
-        )
-        user.set_password("password123")
-        user.save()
-
-        User.objects.filter(id=row['user_id']).update(date_joined=row['created_date'])
-
-    print_success(f'Successfully loaded and adapted {len(df)} users for Django Auth.')
-
-def load_products():
-    print_info("Loading Products...")
-    df = pd.read_csv(PRODUCTS_FILE)
-    for index, row in df.iterrows():
-        Product.objects.create(
-            product_id=row['product_id'],
-            product_name=row['product_name'],
-            internal_name=row['internal_name'],
-            unit=row['unit'],
-            photo_url=row['photo_url'] if pd.notna(row['photo_url']) else ''
-        )
-    print_success(f'Successfully loaded {len(df)} products.')
-
-def load_inventory():
-    print_info("Loading Inventory...")
-    df = pd.read_csv(INVENTORY_FILE)
-    for index, row in df.iterrows():
-        try:
-            Inventory.objects.create(
-                inventory_id=row['inventory_id'],
-                supplier_id=row['supplier_id'],
-                product_id=row['product_id'],
-                quantity_available=row['quantity_available'],
-                price_per_unit_etb=row['price_per_unit_etb'],
-                status=row['status'],
-                available_date=row['available_date'],
-                expiry_date=row['expiry_date'] if pd.notna(row['expiry_date']) else None
-            )
-        except IntegrityError:
-            print_warning(f"Skipping duplicate inventory for supplier {row['supplier_id']} and product {row['product_id']}")
-    print_success(f'Successfully loaded {len(df)} inventory items.')
-
-def load_orders():
-    print_info("Loading Orders...")
-    df = pd.read_csv(ORDERS_FILE)
-    orders_to_create = []
-    for index, row in df.iterrows():
-        orders_to_create.append(
-            Order(
-                order_id=row['order_id'],
-                user_id=row['user_id'],
-                order_date=row['order_date'],
-                status=row['status']
-            )
+def _aware_datetimes(series):
+    return pd.to_datetime(series).dt.tz_localize(timezone.get_default_timezone())
+
+def _dates(series):
+    return pd.to_datetime(series).dt.date
+
+def prepare_users(df):
+    names = df['name'].astype(str)
+    name_parts = names.str.split(' ', n=1, expand=True).reindex(columns=[0, 1])
+    base_usernames = names.str.lower().str.replace(' ', '_', regex=False).str.replace('.', '', regex=False)
+
+    return pd.DataFrame({
+        'id': df['user_id'],
+        'username': base_usernames + '_' + df['user_id'].astype(str),
+        'first_name': name_parts[0],
+        'last_name': name_parts[1].fillna(''),
+        'phone_number': df['phone_number'],
+        'default_location': df['default_location'],
+        'role': df['role'],
+        'password': default_password_hash(),
+        'is_staff': False,
+        'is_superuser': False,
+        'date_joined': _aware_datetimes(df['created_date']),
+    })
+
+def prepare_products(df):
+    return pd.DataFrame({
+        'product_id': df['product_id'],
+        'product_name': df['product_name'],
+        'internal_name': df['internal_name'],
+        'unit': df['unit'],
+        'photo_url': df['photo_url'].fillna(''),
+    })
+
+def prepare_inventory(df):
+    # Repeated (supplier, product) pairs are skipped by the database on insert, across chunks
+    return pd.DataFrame({
+        'inventory_id': df['inventory_id'],
+        'supplier_id': df['supplier_id'],
+        'product_id': df['product_id'],
+        'quantity_available': df['quantity_available'],
+        'price_per_unit_etb': df['price_per_unit_etb'].round(2),
+        'status': df['status'],
+        'available_date': _dates(df['available_date']),
+        'expiry_date': _dates(df['expiry_date']),
+    })
+
+def prepare_orders(df):
+    return pd.DataFrame({
+        'order_id': df['order_id'],
+        'user_id': df['user_id'],
+        'order_date': _aware_datetimes(df['order_date']),
+        'status': df['status'],
+    })
+
+def prepare_order_items(df):
+    return pd.DataFrame({
+        'order_item_id': df['order_item_id'],
+        'order_id': df['order_id'],
+        'product_id': df['product_id'],
+        'supplier_id': df['supplier_id'] if 'supplier_id' in df else None,
+        'quantity': df['quantity'],
+        'price_per_unit_etb': df['price_per_unit_etb'].round(2),
+    })
+
+def prepare_competitor_prices(df):
+    return pd.DataFrame({
+        'product_id': df['product_id'],
+        'date': _dates(df['date']),
+        'competitor_tier': df['competitor_tier'],
+        'price_per_unit_etb': df['price_per_unit_etb'].round(2),
+    })
+
+# Load order matters: foreign keys point at earlier tables.
+# (name of the .csv/.parquet file, model, prepare function, upsert key columns)
+TABLES = [
+    ('users', User, prepare_users, ['id']),
+    ('products', Product, prepare_products, ['product_id']),
+    ('inventory', Inventory, prepare_inventory, ['supplier_id', 'product_id']),
+    ('orders', Order, prepare_orders, ['order_id']),
+    ('order_items', OrderItem, prepare_order_items, ['order_item_id']),
+    ('competitor_prices', CompetitorPrice, prepare_competitor_prices, ['product_id', 'date', 'competitor_tier']),
+]
+
+# Tables whose upsert key is a unique constraint other than the primary key: in
+# replace mode they are inserted with ON CONFLICT DO NOTHING, so rows repeating a
+# key already loaded (in this or an earlier chunk) are skipped and the first one wins
+NATURAL_KEY_TABLES = {'inventory', 'competitor_prices'}
+
+# Columns an upsert never overwrites on existing rows
+UPSERT_PRESERVE = {
+    'users': ['password', 'date_joined'],
+}
+
+# ============ WRITERS ============
+
+def _with_defaults(model, df):
+    """Adds every remaining concrete column with its model default (needed for COPY)."""
+    df = df.copy()
+    for field in model._meta.concrete_fields:
+        if field.column in df.columns or isinstance(field, AutoField):
+            continue
+        if field.has_default() and callable(field.default):
+            df[field.column] = [field.get_default() for _ in range(len(df))]
+        else:
+            df[field.column] = field.get_default() if field.has_default() else (None if field.null else '')
+    return df
+
+def _none_for_missing(df):
+    return df.astype(object).where(df.notna(), None)
+
+def _build_objects(model, df):
+    columns = list(df.columns)
+    return [model(**dict(zip(columns, values))) for values in _none_for_missing(df).itertuples(index=False, name=None)]
+
+def _field_names(model, columns):
+    names = {field.column: field.name for field in model._meta.concrete_fields}
+    return [names[column] for column in columns]
+
+def _copy_to(table, df):
+    buffer = io.StringIO()
+    df.to_csv(buffer, index=False, header=False, na_rep='\\N')
+    buffer.seek(0)
+
+    columns = ', '.join(connection.ops.quote_name(c) for c in df.columns)
+    # psycopg 3 COPY: stream the CSV in blocks
+    with connection.cursor() as cursor:
+        with cursor.copy(f"COPY {connection.ops.quote_name(table)} ({columns}) FROM STDIN WITH (FORMAT csv, NULL '\\N')") as copy:
+            while block := buffer.read(COPY_BLOCK_SIZE):
+                copy.write(block)
+
+def bulk_insert(model, df, batch_size=BATCH_SIZE, ignore_conflicts=False):
+    """Inserts the prepared rows with bulk_create, building instances from column tuples."""
+    objects = _build_objects(model, df)
+    model.objects.bulk_create(objects, batch_size=batch_size, ignore_conflicts=ignore_conflicts)
+    return len(objects)
+
+def copy_insert(model, df):
+    """PostgreSQL fast path: streams the prepared rows through COPY ... FROM STDIN."""
+    _copy_to(model._meta.db_table, _with_defaults(model, df))
+    return len(df)
+
+def bulk_upsert(model, df, key_columns, preserve=(), batch_size=BATCH_SIZE):
+    """Inserts new rows and updates existing ones (matched on key_columns) with bulk_create."""
+    update_columns = [c for c in df.columns if c not in key_columns and c not in preserve and c != model._meta.pk.column]
+    objects = _build_objects(model, df)
+    model.objects.bulk_create(
+        objects,
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=_field_names(model, key_columns),
+        update_fields=_field_names(model, update_columns),
+    )
+    return len(objects)
+
+def _copy_to_staging(model, df):
+    """COPYs the rows into a temporary table shaped like the model's, dropped on commit."""
+    table = model._meta.db_table
+    staging = f"{table}_staging"
+    quote = connection.ops.quote_name
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"CREATE TEMP TABLE {quote(staging)} (LIKE {quote(table)} INCLUDING DEFAULTS) ON COMMIT DROP")
+    _copy_to(staging, df)
+    return staging
+
+def copy_insert_new(model, df, key_columns):
+    """PostgreSQL insert skipping existing keys: COPY into a temporary table, then INSERT ... ON CONFLICT DO NOTHING."""
+    df = _with_defaults(model, df)
+    quote = connection.ops.quote_name
+    staging = _copy_to_staging(model, df)
+
+    columns = ', '.join(quote(c) for c in df.columns)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {quote(model._meta.db_table)} ({columns}) SELECT {columns} FROM {quote(staging)} "
+            f"ON CONFLICT ({', '.join(quote(c) for c in key_columns)}) DO NOTHING"
         )
-    Order.objects.bulk_create(orders_to_create, batch_size=500, ignore_conflicts=True)
-    print_success(f'Successfully loaded {len(df)} orders.')
-    
-def load_order_items():
-    print_info("Loading Order Items...")
-    df = pd.read_csv(ORDER_ITEMS_FILE)
-    items_to_create = []
-    for index, row in df.iterrows():
-        items_to_create.append(
-            OrderItem(
-                order_item_id=row['order_item_id'],
-                order_id=row['order_id'],
-                product_id=row['product_id'],
-                quantity=row['quantity'],
-                price_per_unit_etb=row['price_per_unit_etb']
-            )
+        return cursor.rowcount
+
+def copy_upsert(model, df, key_columns, preserve=()):
+    """PostgreSQL upsert: COPY into a temporary table, then INSERT ... ON CONFLICT DO UPDATE."""
+    df = _with_defaults(model, df)
+    table = model._meta.db_table
+    quote = connection.ops.quote_name
+    staging = _copy_to_staging(model, df)
+
+    columns = ', '.join(quote(c) for c in df.columns)
+    updates = ', '.join(
+        f"{quote(c)} = EXCLUDED.{quote(c)}"
+        for c in df.columns
+        if c not in key_columns and c not in preserve and c != model._meta.pk.column
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {quote(table)} ({columns}) SELECT {columns} FROM {quote(staging)} "
+            f"ON CONFLICT ({', '.join(quote(c) for c in key_columns)}) DO UPDATE SET {updates}"
         )
-    OrderItem.objects.bulk_create(items_to_create, batch_size=500, ignore_conflicts=True)
-    print_success(f'Successfully loaded {len(df)} order items.')
-
-def load_competitor_prices():
-    print_info("Loading Competitor Prices...")
-    df = pd.read_csv(COMPETITOR_PRICES_FILE)
-    prices_to_create = []
-    for index, row in df.iterrows():
-        prices_to_create.append(
-            CompetitorPrice(
-                product_id=row['product_id'],
-                date=row['date'],
-                competitor_tier=row['competitor_tier'],
-                price_per_unit_etb=row['price_per_unit_etb']
-            )
+    return len(df)
+
+def write_rows(model, df, mode='replace', key_columns=(), preserve=(), batch_size=BATCH_SIZE, use_copy=True,
+               skip_existing=False):
+    """
+    Writes prepared rows, plain inserts in replace mode and idempotent upserts otherwise.
+    With skip_existing, replace mode leaves rows whose key_columns already exist
+    (in the table or earlier in df) to the database to skip.
+    """
+    use_copy = use_copy and connection.vendor == 'postgresql'
+    if mode == 'upsert':
+        # A key may appear only once per statement
+        df = df.drop_duplicates(subset=key_columns, keep='last')
+        if use_copy:
+            return copy_upsert(model, df, key_columns, preserve), 'copy_upsert'
+        return bulk_upsert(model, df, key_columns, preserve, batch_size), 'bulk_upsert'
+
+    if skip_existing:
+        # Within the chunk the first row wins, as it does against earlier chunks
+        df = df.drop_duplicates(subset=key_columns, keep='first')
+        if use_copy:
+            return copy_insert_new(model, df, key_columns), 'copy_new'
+        return bulk_insert(model, df, batch_size, ignore_conflicts=True), 'bulk_new'
+
+    if use_copy:
+        return copy_insert(model, df), 'copy'
+    return bulk_insert(model, df, batch_size), 'bulk_create'
+
+# ============ CHECKPOINTS ============
+# One JSON file per table records how many input rows are committed, so an
+# interrupted load can resume after the last committed chunk.
+
+def _checkpoint_path(data_dir, name):
+    return os.path.join(data_dir, CHECKPOINT_DIR_NAME, f"{name}.json")
+
+def read_checkpoint(data_dir, name):
+    try:
+        with open(_checkpoint_path(data_dir, name)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+def write_checkpoint(data_dir, name, state):
+    path = _checkpoint_path(data_dir, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(state, f)
+    os.replace(path + '.tmp', path)
+
+def clear_checkpoints(data_dir):
+    checkpoint_dir = os.path.join(data_dir, CHECKPOINT_DIR_NAME)
+    if os.path.isdir(checkpoint_dir):
+        shutil.rmtree(checkpoint_dir)
+
+def _fingerprint(data_file):
+    stat = os.stat(data_file)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+# ============ LOADING ============
+
+def load_table(name, model, data_dir, prepare, key_columns, mode='replace', chunksize=CHUNK_SIZE,
+               batch_size=BATCH_SIZE, use_copy=True, resume=False):
+    """
+    Streams one CSV or Parquet file into its table in chunks of chunksize rows.
+    Each chunk is committed in its own transaction and followed by a checkpoint.
+    Returns a timing report entry.
+    """
+    entry = {'table': name, 'rows': 0, 'chunks': 0, 'method': 'skipped', 'read': 0.0, 'prepare': 0.0, 'write': 0.0}
+    data_file = find_dataset(data_dir, name)
+    if data_file is None:
+        print_warning(f"{name}.csv / {name}.parquet not found, skipping {name}.")
+        return entry
+
+    fingerprint = _fingerprint(data_file)
+    state = read_checkpoint(data_dir, name) if resume else None
+    if state and state['fingerprint'] != fingerprint:
+        raise RuntimeError(f"{os.path.basename(data_file)} changed since the last checkpoint; rerun without --resume")
+    if state and state['complete']:
+        print_info(f"{name}: already loaded ({state['rows_done']} rows), skipping.")
+        entry['method'] = 'checkpoint'
+        return entry
+
+    rows_done = state['rows_done'] if state else 0
+    if rows_done:
+        print_info(f"Resuming {name} after row {rows_done}...")
+    else:
+        print_info(f"Loading {name} from {os.path.basename(data_file)}...")
+
+    # Skip the rows that are already committed
+    reader = iter_dataset(data_file, chunksize, skip_rows=rows_done)
+    preserve = UPSERT_PRESERVE.get(name, ())
+    skip_existing = name in NATURAL_KEY_TABLES
+    started = time.perf_counter()
+    for chunk in reader:
+        read_done = time.perf_counter()
+        prepared = prepare(chunk)
+        prepare_done = time.perf_counter()
+
+        # The first chunk after a resume may have been committed just before the
+        # process died (and before its checkpoint was written): write it idempotently
+        chunk_mode = 'upsert' if resume and entry['chunks'] == 0 else mode
+        with transaction.atomic():
+            rows, entry['method'] = write_rows(model, prepared, chunk_mode, key_columns, preserve, batch_size, use_copy,
+                                               skip_existing)
+        write_done = time.perf_counter()
+
+        rows_done += len(chunk)
+        write_checkpoint(data_dir, name, {'rows_done': rows_done, 'complete': False, 'fingerprint': fingerprint})
+
+        entry['rows'] += rows
+        entry['chunks'] += 1
+        entry['read'] += read_done - started
+        entry['prepare'] += prepare_done - read_done
+        entry['write'] += write_done - prepare_done
+        print_info(f"{name}: {rows_done} rows committed")
+        started = time.perf_counter()
+
+    write_checkpoint(data_dir, name, {'rows_done': rows_done, 'complete': True, 'fingerprint': fingerprint})
+    print_success(f"Successfully loaded {entry['rows']} {name}.")
+    return entry
+
+def print_timing_report(report):
+    print_info("Timing report:")
+    print(f"  {'table':<20}{'rows':>10}{'chunks':>8}{'method':>14}{'read s':>9}{'prep s':>9}{'write s':>9}{'rows/s':>11}")
+    for entry in report:
+        total = entry['read'] + entry['prepare'] + entry['write']
+        rate = entry['rows'] / total if total else 0
+        print(
+            f"  {entry['table']:<20}{entry['rows']:>10}{entry['chunks']:>8}{entry['method']:>14}"
+            f"{entry['read']:>9.2f}{entry['prepare']:>9.2f}{entry['write']:>9.2f}{rate:>11.0f}"
         )
-    CompetitorPrice.objects.bulk_create(prices_to_create, batch_size=500, ignore_conflicts=True)
-    print_success(f'Successfully loaded {len(df)} competitor prices.')
+    print(f"  {'total':<20}{sum(e['rows'] for e in report):>10}{'':>22}"
+          f"{sum(e['read'] + e['prepare'] + e['write'] for e in report):>27.2f}")
+
+def clear_existing_data():
+    print_info("Clearing existing data...")
+    with transaction.atomic():
+        OrderItem.objects.all().delete()
+        Order.objects.all().delete()
+        Inventory.objects.all().delete()
+        CompetitorPrice.objects.all().delete()
+        Product.objects.all().delete()
+        User.objects.all().delete()
+    print_success("Existing data cleared.")
+
+def load_all_data(mode='replace', chunksize=CHUNK_SIZE, batch_size=BATCH_SIZE, use_copy=True, resume=False, data_dir=DATA_DIR):
+    """
+    Loads every table file (CSV or Parquet) in data_dir. In 'replace' mode all
+    tables are emptied first; in 'upsert' mode existing rows are updated in
+    place and nothing is deleted.
+    With resume=True, continues an interrupted load from its checkpoints.
+    """
+    print_success("--- Starting Data Loading Process ---")
+
+    run = read_checkpoint(data_dir, '_run') if resume else None
+    if resume and run is None:
+        print_warning("No checkpoint found, starting a fresh load.")
+        resume = False
+    if resume:
+        mode = run['mode']
+        print_info(f"Resuming interrupted {mode} load.")
+    else:
+        clear_checkpoints(data_dir)
+        if mode == 'replace':
+            clear_existing_data()
+        write_checkpoint(data_dir, '_run', {'mode': mode})
+
+    report = [
+        load_table(name, model, data_dir, prepare, key_columns, mode, chunksize, batch_size, use_copy, resume)
+        for name, model, prepare, key_columns in TABLES
+    ]
+
+    clear_checkpoints(data_dir)
+    # Bulk writes skip model signals: create the products' search aliases, and have
+    # running workers rebuild their catalog snapshots explicitly
+    created = sync_product_aliases()
+    print_info(f"Created {created} product search aliases.")
+    print_info(f"Created {sync_locations()} locations.")
+    invalidate_catalog()
+    invalidate_all_supplier_views()
+    print_success("--- Data Loading Complete ---")
+    print_timing_report(report)
+    return report
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load the generated CSV or Parquet data into the relational database.")
+    parser.add_argument('--mode', choices=['replace', 'upsert'], default='replace',
+                        help="replace: empty the tables first (default); upsert: insert or update rows in place")
+    parser.add_argument('--chunksize', type=int, default=CHUNK_SIZE, help=f"Rows per committed chunk (default: {CHUNK_SIZE})")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help=f"Rows per INSERT (default: {BATCH_SIZE})")
+    parser.add_argument('--resume', action='store_true', help="Continue an interrupted load from its checkpoints")
+    parser.add_argument('--data-dir', default=DATA_DIR, help="Directory holding the CSV or Parquet files (default: backend/data)")
+    parser.add_argument('--no-copy', action='store_true', help="Use bulk_create even on PostgreSQL")
+    args = parser.parse_args()
+
     try:
-        load_all_data()
+        load_all_data(mode=args.mode, chunksize=args.chunksize, batch_size=args.batch_size,
+                      use_copy=not args.no_copy, resume=args.resume, data_dir=os.path.abspath(args.data_dir))
     except Exception as e:
         print(f"[ERROR] Error loading data: {e}")
-        sys.exit(1)
\ No newline at end of file
+        sys.exit(1)
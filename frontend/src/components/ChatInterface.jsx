@@ -126,18 +126,30 @@ const ChatInterface = () => {
       timestamp: new Date().toISOString(),
     };
 
+    // Prepare history for API
+    const historyForAPI = messages.map((msg) => ({
+      sender: msg.sender,
+      message: msg.message,
+    }));
+
     setMessages((prev) => [...prev, userMessage]);
     setInputMessage('');
+
+    // One key per user message: resending it after a failure reuses the key,
+    // so the server replays orders the first attempt already placed
+    await deliverMessage(inputMessage, historyForAPI, crypto.randomUUID());
+  };
+
+  const retryMessage = async (failed) => {
+    setMessages((prev) => prev.filter((msg) => msg !== failed));
+    await deliverMessage(failed.retry.message, failed.retry.history, failed.retry.idempotencyKey);
+  };
+
+  const deliverMessage = async (message, historyForAPI, idempotencyKey) => {
     setLoading(true);
 
     try {
-      // Prepare history for API
-      const historyForAPI = messages.map((msg) => ({
-        sender: msg.sender,
-        message: msg.message,
-      }));
-
-      const response = await chatAPI.sendMessage(inputMessage, historyForAPI);
+      const response = await chatAPI.sendMessage(message, historyForAPI, idempotencyKey);
 
       // Check for follow_up (coordinated loading simulation)
       if (response.follow_up) {
@@ -167,6 +179,7 @@ const ChatInterface = () => {
         sender: 'bot',
         message: 'Sorry, I encountered an error. Please try again.',
         timestamp: new Date().toISOString(),
+        retry: { message, history: historyForAPI, idempotencyKey },
       };
       setMessages((prev) => [...prev, errorMessage]);
     } finally {
@@ -411,6 +424,17 @@ const ChatInterface = () => {
                 </div>
               )}
             </div>
+            {msg.retry && (
+              <div className="chat-footer mt-1">
+                <button
+                  className="btn btn-xs bg-red-600 text-white hover:bg-red-700 border-red-600"
+                  onClick={() => retryMessage(msg)}
+                  disabled={loading}
+                >
+                  Retry
+                </button>
+              </div>
+            )}
           </div>
         ))}
 
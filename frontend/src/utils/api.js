@@ -54,8 +54,14 @@ export const authAPI = {
 
 // Chat API
 export const chatAPI = {
-  sendMessage: async (message, history = []) => {
-    const response = await api.post('/api/chat/', { message, history });
+  // Not retried automatically: a chat turn can change data (order actions,
+  // inventory) and only order creation is deduplicated by the server. Callers
+  // pass the same idempotencyKey when they resend a message, so the orders the
+  // first attempt placed are replayed instead of placed twice.
+  sendMessage: async (message, history = [], idempotencyKey = crypto.randomUUID()) => {
+    const response = await api.post('/api/chat/', { message, history }, {
+      headers: { 'Idempotency-Key': idempotencyKey },
+    });
     return response.data;
   },
   
@@ -73,6 +79,21 @@ export const notificationAPI = {
   },
 };
 
+// Order API
+export const orderAPI = {
+  // Pass the same idempotencyKey when retrying a failed call
+  createOrder: async (items, deliveryDate, deliveryLocation = '', idempotencyKey = crypto.randomUUID()) => {
+    const response = await api.post('/api/orders/', {
+      items,
+      delivery_date: deliveryDate,
+      delivery_location: deliveryLocation,
+    }, {
+      headers: { 'Idempotency-Key': idempotencyKey },
+    });
+    return response.data;
+  },
+};
+
 // Order Action API
 export const orderActionAPI = {
   acceptOrder: async (orderId, reason = '') => {
@@ -91,6 +112,35 @@ export const orderActionAPI = {
       reason: reason
     });
     return response.data;
+  },
+
+  // Same action on many orders in one request; returns a result per order
+  bulkAction: async (orderIds, action, reason = '') => {
+    const response = await api.post('/api/orders/action/bulk/', {
+      order_ids: orderIds,
+      action: action,
+      reason: reason
+    });
+    return response.data;
+  }
+};
+
+// Inventory API (suppliers)
+export const inventoryAPI = {
+  // rows: a File (CSV or JSON), CSV text, or an array of {product, quantity, price, ...}
+  importInventory: async (rows, dryRun = false) => {
+    let payload;
+    if (rows instanceof File) {
+      payload = new FormData();
+      payload.append('file', rows);
+      payload.append('dry_run', dryRun);
+    } else if (typeof rows === 'string') {
+      payload = { csv: rows, dry_run: dryRun };
+    } else {
+      payload = { rows: rows, dry_run: dryRun };
+    }
+    const response = await api.post('/api/inventory/import/', payload);
+    return response.data;
   }
 };
 